@@ -2,6 +2,11 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from Rotation import rotation_matrix
 
 
 class Ball:
@@ -60,13 +65,10 @@ class Ball:
 
         # the following for checking performance only
         self.info_display = True
-        self.millisecs = 0
         self.plot_count = 0
         self.dot_count = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
@@ -79,14 +81,15 @@ class Ball:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         self.setup_ball()
 
         # initialize timers
         self.move_timer = pygame.time.get_ticks()
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
     def run(self):
         """
@@ -118,7 +121,7 @@ class Ball:
 
             if self.paused:
                 pygame.time.wait(100)
-                self.millisecs = pygame.time.get_ticks()
+                self.profiler.restart()
 
             else:
                 # main components executed here
@@ -172,7 +175,7 @@ class Ball:
 
         # rotate object
         self.angles += self.rotate_speed
-        matrix = self.rotate_matrix(self.angles)
+        matrix = rotation_matrix(self.angles)
 
         if self.mode == 1:
             # normal 3D rotation
@@ -184,17 +187,6 @@ class Ball:
 
         self.measure_time("rotate")
 
-    def rotate_matrix(self, angles):
-
-        # define rotation matrix for given angles
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                         [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                         [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def clear(self):
 
         # clear plot info area
@@ -414,18 +406,12 @@ class Ball:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Batched polygon clipping, cropping a whole frame's polygons with a handful of NumPy operations per clipping plane.
+
+The polygons are given as one padded vertex array of shape (polygons, max vertices, dimensions) with the number of
+vertices of each polygon, or as a list of node lists (see pad_polygons). clip_polygons() runs the Sutherland-Hodgman
+algorithm against each plane in turn, each pass working on all polygons at once: every edge (previous vertex to
+vertex) of every polygon outputs the point where it crosses the plane, if it does, and the vertex itself, if it is
+inside. The result is a single vertex buffer with the polygons one after the other, and their offsets in it, i.e.
+polygon i is buffer[offsets[i]:offsets[i + 1]]. Polygons entirely outside get no vertices.
+
+A plane is (axis, value, side): vertices with side * (vertex[axis] - value) >= 0 are inside. near_plane() and
+rect_planes() return the planes for the minimum Z (3D vertices, before perspective) and the screen edges (2D).
+Crossing points are calculated from the edge's previous vertex as previous + (vertex - previous) * t, like the
+demos' original cropping code.
+
+@author: kalle
+"""
+import numpy as np
+
+
+def near_plane(min_z, axis=2):
+
+    # the plane keeping vertices with Z (or another axis) at least min_z
+    return (axis, min_z, 1)
+
+
+def rect_planes(left, top, right, bottom, crop_x=True, crop_y=True):
+
+    # the planes keeping 2D vertices within a rectangle (edges included); X and Y can be left uncropped
+    planes = []
+    if crop_x:
+        planes += [(0, left, 1), (0, right, -1)]
+    if crop_y:
+        planes += [(1, top, 1), (1, bottom, -1)]
+    return planes
+
+
+def pad_polygons(node_lists, dimensions=2):
+
+    # convert a list of node lists (sequences of vertices) to a padded vertex array of shape (polygons, max vertices, dimensions) and counts
+    counts = np.array([len(node_list) for node_list in node_lists], dtype=np.int64)
+    polygons = np.zeros((len(node_lists), max([1] + list(counts)), dimensions))
+    for (i, node_list) in enumerate(node_lists):
+        if counts[i] > 0:
+            polygons[i, 0:counts[i], :] = np.asarray(node_list)[:, 0:dimensions]
+    return (polygons, counts)
+
+
+def clip_polygons(polygons, counts, planes):
+    """
+    Clip polygons against planes.
+
+    polygons:  (P, M, D) vertices of each polygon; rows may be padded after counts vertices.
+    counts:    (P, ) number of vertices in each polygon.
+    planes:    list of (axis, value, side), see near_plane() and rect_planes().
+    Returns (buffer, offsets): the (N, D) clipped vertices of all polygons, and (P + 1, ) offsets of each polygon in buffer.
+    """
+    polygons = np.asarray(polygons, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    used = np.arange(np.shape(polygons)[1])[None, :] < counts[:, None]
+    buffer = polygons[used]
+    offsets = np.hstack((0, np.cumsum(counts)))
+    for (axis, value, side) in planes:
+        (buffer, offsets) = clip_pass(buffer, offsets, axis, value, side)
+    return (buffer, offsets)
+
+
+def clip_pass(buffer, offsets, axis, value, side):
+
+    # one Sutherland-Hodgman pass for all polygons in buffer against one plane; returns the new buffer and offsets
+    counts = np.diff(offsets)
+    has_nodes = counts > 0
+    # the previous vertex of each vertex; the last one of its polygon for the first one
+    prev = np.arange(np.shape(buffer)[0]) - 1
+    prev[offsets[:-1][has_nodes]] = offsets[1:][has_nodes] - 1
+    prev_nodes = buffer[prev]
+    inside = side * (buffer[:, axis] - value) >= 0
+    cross = inside != inside[prev]
+
+    # each vertex outputs its edge's crossing point (if any) and then itself (if inside)
+    out_counts = cross.astype(np.int64) + inside
+    out_cumsum = np.hstack((0, np.cumsum(out_counts)))
+    out_pos = out_cumsum[:-1]
+    new_buffer = np.zeros((out_cumsum[-1], np.shape(buffer)[1]))
+    diff = buffer[cross] - prev_nodes[cross]
+    new_buffer[out_pos[cross]] = prev_nodes[cross] + diff * ((value - prev_nodes[cross, axis]) / diff[:, axis])[:, None]
+    new_buffer[(out_pos + cross)[inside]] = buffer[inside]
+    return (new_buffer, out_cumsum[offsets])
+
+
+def split_polygons(buffer, offsets):
+
+    # return a list of the polygons in buffer, as views to it
+    return [buffer[start:end] for (start, end) in zip(offsets[:-1], offsets[1:])]
@@ -2,6 +2,12 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from Rasterizer import fill_polygons, map_colors
+from Rotation import rotation_matrix
 
 
 class Cubester:
@@ -63,11 +69,8 @@ class Cubester:
 
         # the following for checking performance only
         self.info_display = False
-        self.millisecs = 0
         self.timer_avg_frames = 30
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         # self.font = pygame.font.SysFont('CourierNew', 15)
 
         # set up timers
@@ -83,10 +86,11 @@ class Cubester:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # initialize timers
-        self.millisecs = pygame.time.get_ticks()
+        self.profiler.restart()
 
     def run(self):
         """
@@ -285,7 +289,7 @@ class Cubester:
 
         # rotate the nodes of the animated cubies. Note a simpler rotation would be sufficient (this is 3D but the rotation is around a single axis).
         disc_nodes = np.repeat(self.disc_anim_cubies, 8) * 8 + np.resize(np.arange(8), np.size(self.disc_anim_cubies) * 8)
-        matrix = self.rotate_matrix(angles)
+        matrix = rotation_matrix(angles)
         cube.cubie_rotated_disc_nodes[disc_nodes, :] = np.matmul(cube.cubie_rotated_disc_nodes[disc_nodes, :], matrix)
 
         if time - self.disc_anim_start >= self.disc_anim_ms:
@@ -391,7 +395,7 @@ class Cubester:
             # if more than one axes chosen (e.g. UP and LEFT), that will work as well.
             # first rotate the unit vector to point according to current cube angles, then rotate around it.
             unit_vector /= np.sqrt(np.sum(unit_vector ** 2))  # scale to unit vector if multiple axes used
-            matrix = self.rotate_matrix(cube.angles)
+            matrix = rotation_matrix(cube.angles)
             (x, y, z) = np.matmul(unit_vector, matrix)
             angle = 1.0 * time_adjustment
             sa = np.sin(angle)
@@ -415,7 +419,7 @@ class Cubester:
 
     def rotate(self, cube):
 
-        matrix = self.rotate_matrix(cube.angles)
+        matrix = rotation_matrix(cube.angles)
         cube.cubie_rotated_nodes = np.matmul(cube.cubie_rotated_disc_nodes, matrix)
         cube.cube_corner_rotated_nodes = np.matmul(cube.cube_corner_nodes, matrix)
 
@@ -429,16 +433,6 @@ class Cubester:
 
         self.measure_time("calc visible")
 
-    def rotate_matrix(self, angles):
-
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                         [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                         [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def add_labels(self, screen, cube):
 
         # calculate cube corner screen coordinates and add key pics as labels for each separate disc rotation.
@@ -502,14 +496,20 @@ class Cubester:
         surf_z = np.average(cube.cubie_rotated_nodes[cube.surf_nodes[surfs_visible, :], 2], axis=1)
         # sort surfaces so that the most distant will be drawn first
         sorted_z = surf_z.argsort()[::-1]
-        for surf_nr in sorted_z:
-            surf = surfs_visible[surf_nr]
-            # get surface four screen coordinates by going through its surf_nodes in trans_nodes
-            coords = cube.cubie_trans_nodes[cube.surf_nodes[surf], :]
-            color = cube.surf_colors[surf]
-            pygame.draw.polygon(screen, color, coords)
-            if cube.size <= 20:
+        if cube.size <= 20:
+            for surf_nr in sorted_z:
+                surf = surfs_visible[surf_nr]
+                # get surface four screen coordinates by going through its surf_nodes in trans_nodes
+                coords = cube.cubie_trans_nodes[cube.surf_nodes[surf], :]
+                color = cube.surf_colors[surf]
+                pygame.draw.polygon(screen, color, coords)
                 pygame.draw.lines(screen, (20, 20, 20), True, coords, cube.cube_surface_line_width)
+        else:
+            # large cubes have no edge lines, and may have thousands of surfaces: draw them all in one batch, most distant first.
+            surfs = surfs_visible[sorted_z]
+            pixels = pygame.surfarray.pixels2d(screen)
+            fill_polygons(pixels, cube.cubie_trans_nodes, cube.surf_nodes[surfs, :], np.full((np.size(surfs)), 4), map_colors(screen, cube.surf_colors[surfs, :]))
+            del pixels
 
         self.measure_time("draw")
 
@@ -737,18 +737,12 @@ class Cubester:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 class Cube:
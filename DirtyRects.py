@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Dirty rectangle tracking shared by the demos.
+
+Instead of clearing the whole screen and flipping it every frame, a demo tells DirtyRects which areas it has drawn.
+The areas drawn in the current and the previous frame are merged into a small set of regions on a coarse tile grid:
+clear() fills only the areas drawn in the previous frame, and present() updates only the regions changed (the
+previous frame's areas, now cleared, and the current frame's areas) with pygame.display.update(rects).
+If the regions cover more than full_threshold of the screen, a full pygame.display.flip() is used instead, as
+updating many rectangles is then no faster.
+
+A frame goes like this:
+    dirty_rects.clear(screen, background_color)    # instead of screen.fill(background_color)
+    dirty_rects.add(pygame.draw.polygon(...))       # for every area drawn; add_full() if the whole screen is drawn
+    dirty_rects.present()                           # instead of pygame.display.flip()
+
+@author: kalle
+"""
+import pygame
+import numpy as np
+
+
+class DirtyRects:
+    """
+    Tracks the screen areas drawn in each frame.
+
+    size:            screen size (width, height).
+    tile_size:       areas are tracked in tiles of tile_size x tile_size pixels.
+    max_rects:       the regions are merged further until there are at most this many.
+    full_threshold:  if the regions cover more than this share of the screen, the whole screen is flipped.
+    margin:          added to each side of the areas drawn, e.g. for antialiased edges outside the polygon Rect.
+
+    @author: kalle
+    """
+
+    def __init__(self, size, tile_size=32, max_rects=12, full_threshold=0.5, margin=2):
+
+        self.width = size[0]
+        self.height = size[1]
+        self.tile_size = tile_size
+        self.max_rects = max_rects
+        self.full_threshold = full_threshold
+        self.margin = margin
+        self.grid_size = ((self.height + tile_size - 1) // tile_size, (self.width + tile_size - 1) // tile_size)
+        self.drawn = np.zeros(self.grid_size, dtype=bool)       # tiles drawn in the current frame
+        self.previous = np.zeros(self.grid_size, dtype=bool)    # tiles drawn in the previous frame
+        # the first frame is always presented in full, as the screen contents before it are not known.
+        self.full = True
+        self.previous_full = True
+        # statistics for the info display and reports
+        self.rect_count = 0
+        self.coverage = 1.0
+        self.full_frames = 0
+        self.partial_frames = 0
+
+    def add(self, rect):
+
+        # mark an area (a pygame.Rect or (x, y, width, height)) drawn in the current frame
+        if self.full or rect is None:
+            return
+        (x, y, w, h) = rect
+        if w <= 0 or h <= 0:
+            return
+        t = self.tile_size
+        m = self.margin
+        self.drawn[max(0, (y - m) // t):max(0, (y + h + m + t - 1) // t), max(0, (x - m) // t):max(0, (x + w + m + t - 1) // t)] = True
+
+    def add_full(self):
+
+        # the whole screen is drawn in the current frame (e.g. a background image or ground covering it)
+        self.full = True
+
+    def clear(self, surface, color):
+
+        # fill the areas drawn in the previous frame with color
+        if self.previous_full:
+            surface.fill(color)
+        else:
+            for rect in self.regions(self.previous):
+                surface.fill(color, rect)
+
+    def present(self):
+
+        # update the changed regions on the display, or flip the whole screen, and move on to the next frame
+        if self.full or self.previous_full:
+            rects = None
+        else:
+            rects = self.regions(self.drawn | self.previous)
+            self.coverage = sum(rect.w * rect.h for rect in rects) / (self.width * self.height)
+            if self.coverage > self.full_threshold:
+                rects = None
+        if rects is None:
+            pygame.display.flip()
+            self.rect_count = 0
+            self.coverage = 1.0
+            self.full_frames += 1
+        else:
+            pygame.display.update(rects)
+            self.rect_count = len(rects)
+            self.partial_frames += 1
+        (self.previous, self.drawn) = (self.drawn, self.previous)
+        self.drawn[:, :] = False
+        self.previous_full = self.full
+        self.full = False
+
+    def force_full(self):
+
+        # present the next frame in full and clear the whole screen for it, e.g. after the display mode has changed
+        self.full = True
+        self.previous_full = True
+
+    def regions(self, tiles):
+        """
+        Merge a grid of tiles into at most max_rects pygame.Rects covering them.
+        Runs of tiles on each tile row are combined with identical runs on the rows below; if there are still too many
+        rectangles, the pair whose bounding rectangle adds the least uncovered area is merged until there are few enough.
+        """
+        # start and end column of each run of tiles on each row
+        padded = np.zeros((self.grid_size[0], self.grid_size[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = tiles
+        (run_rows, run_cols) = np.nonzero(np.diff(padded, axis=1))
+        rects = []  # as [col_start, row_start, col_end, row_end] in tiles, end exclusive
+        open_rects = {}
+        for i in range(0, np.size(run_rows), 2):
+            (row, col_start, col_end) = (run_rows[i], run_cols[i], run_cols[i + 1])
+            rect = open_rects.get((col_start, col_end))
+            if rect is not None and rect[3] == row:
+                rect[3] = row + 1
+            else:
+                rect = [col_start, row, col_end, row + 1]
+                rects.append(rect)
+                open_rects[(col_start, col_end)] = rect
+
+        if len(rects) > self.max_rects:
+            rects = np.array(rects, dtype=np.int64)
+            areas = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+            while np.shape(rects)[0] > self.max_rects:
+                # uncovered area added by merging each pair
+                low = np.minimum(rects[:, None, 0:2], rects[None, :, 0:2])
+                high = np.maximum(rects[:, None, 2:4], rects[None, :, 2:4])
+                waste = np.prod(high - low, axis=2) - areas[:, None] - areas[None, :]
+                np.fill_diagonal(waste, np.iinfo(np.int64).max)
+                (a, b) = np.unravel_index(np.argmin(waste), np.shape(waste))
+                rects[a] = np.hstack((low[a, b], high[a, b]))
+                areas[a] = np.prod(high[a, b] - low[a, b])
+                rects = np.delete(rects, b, axis=0)
+                areas = np.delete(areas, b)
+
+        t = self.tile_size
+        return [pygame.Rect(x0 * t, y0 * t, min(x1 * t, self.width) - x0 * t, min(y1 * t, self.height) - y0 * t)
+                for (x0, y0, x1, y1) in rects]
@@ -2,6 +2,10 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 
 class Life:
@@ -35,11 +39,8 @@ class Life:
 
         # the following for checking performance only
         self.info_display = True
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
@@ -50,13 +51,14 @@ class Life:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         self.setup_life_array()
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
     def run(self):
         """
@@ -90,7 +92,7 @@ class Life:
 
             if self.paused:
                 pygame.time.wait(100)
-                self.millisecs = pygame.time.get_ticks()
+                self.profiler.restart()
 
             else:
                 # main components executed here
@@ -252,18 +254,12 @@ class Life:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
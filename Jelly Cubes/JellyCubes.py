@@ -2,6 +2,12 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from DirtyRects import DirtyRects
+from Rotation import rotation_matrices
 
 
 class JellyCubes:
@@ -53,16 +59,14 @@ class JellyCubes:
         self.cube_small = 0
         self.cube_big = 1
         self.screen_rect = pygame.Rect((self.mid_screen), (1, 1))
+        self.dirty_rects = DirtyRects((self.width, self.height))  # screen areas changed, so that only those are updated on the display
 
         self.setup_cubes()
 
         # the following for checking performance only
         self.info_display = True
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
@@ -79,11 +83,12 @@ class JellyCubes:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
     def run(self):
         """
@@ -116,7 +121,7 @@ class JellyCubes:
             if self.paused:
                 pygame.time.wait(100)
                 self.rotate_timer = pygame.time.get_ticks()
-                self.millisecs = pygame.time.get_ticks()
+                self.profiler.restart()
 
             else:
                 # main components executed here
@@ -136,8 +141,8 @@ class JellyCubes:
             while self.screen.get_locked():
                 self.screen.unlock()
 
-            # switch between currently showed and the next screen (prepared in "buffer")
-            pygame.display.flip()
+            # switch between currently showed and the next screen (prepared in "buffer"), updating only the areas changed
+            self.dirty_rects.present()
             self.measure_time("display flip")
             self.clock.tick(self.target_fps)  # this keeps code running at max target_fps
             self.measure_time("wait")
@@ -167,8 +172,7 @@ class JellyCubes:
             self.cube_small = 1
             self.cube_big = 0
 
-        matrix_small = self.rotate_matrix_XYZ(self.angles[self.cube_small, :])
-        matrix_big = self.rotate_matrix_XYZ(self.angles[self.cube_big, :])
+        (matrix_small, matrix_big) = rotation_matrices(self.angles[[self.cube_small, self.cube_big], :])
         matrix_big_inv = np.linalg.inv(matrix_big)
 
         # rotate small cube
@@ -179,21 +183,10 @@ class JellyCubes:
         # the result is small cube rotated as if big cube was stationary (or not rotated at all).
         self.rotated_nodes_small = np.matmul(self.rotated_nodes[0:8, :] * self.cube_sizes[self.cube_small], matrix_big_inv)
 
-    def rotate_matrix_XYZ(self, angles):
-
-        # define rotation matrix for given angles
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                         [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                         [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def draw(self):
 
-        # clear screen.
-        self.screen.fill(self.background_color, self.screen_rect)
+        # clear screen (the area drawn in the previous frame).
+        self.dirty_rects.add(self.screen.fill(self.background_color, self.screen_rect))
 
         self.trans_nodes = ((self.rotated_nodes[:, 0:2] * self.z_scale) / (self.rotated_nodes[:, 2:3] + self.z_pos) + self.mid_screen).astype(np.int16)
         rect_small = pygame.Rect(np.min(self.trans_nodes[0:8, :], axis=0),
@@ -201,6 +194,7 @@ class JellyCubes:
         rect_big = pygame.Rect(np.min(self.trans_nodes[8:16, :], axis=0),
                                np.max(self.trans_nodes[8:16, :], axis=0) - np.min(self.trans_nodes[8:16, :], axis=0) + 1)
         self.screen_rect = pygame.Rect(np.min(self.trans_nodes, axis=0), np.max(self.trans_nodes, axis=0) - np.min(self.trans_nodes, axis=0) + 1)
+        self.dirty_rects.add(self.screen_rect)
         self.measure_time("draw: clear")
 
         # draw the back side of the big cube. This can be drawn directly to main surface using the alpha value to adjust color.
@@ -327,6 +321,7 @@ class JellyCubes:
 
         # toggle between fullscreen and windowed mode
         pygame.display.toggle_fullscreen()
+        self.dirty_rects.force_full()
 
     def pause(self):
 
@@ -342,7 +337,7 @@ class JellyCubes:
         # switch between a windowed display and full screen
         if self.info_display:
             self.info_display = False
-            self.screen.fill(self.background_color, (10, 10, 250, 45 + len(self.timer_names) * 15))
+            self.dirty_rects.add(self.screen.fill(self.background_color, (10, 10, 250, 45 + len(self.timer_names) * 15)))
         else:
             self.info_display = True
 
@@ -352,7 +347,7 @@ class JellyCubes:
         while self.screen.get_locked():
             self.screen.unlock()
 
-        self.screen.fill(self.background_color, (10, 10, 250, 45 + len(self.timer_names) * 15))
+        self.dirty_rects.add(self.screen.fill(self.background_color, (10, 10, 250, 45 + len(self.timer_names) * 15)))
         # print object info
         self.plot_info_msg(self.screen, 10, 10, 'frames per sec: ' + str(int(self.clock.get_fps())))
         self.plot_info_msg(self.screen, 10, 25, 'small / big:    ' + str(self.cube_small) + ' / ' + str(self.cube_big))
@@ -392,18 +387,12 @@ class JellyCubes:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
     def setup_cubes(self):
 
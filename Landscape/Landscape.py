@@ -3,6 +3,10 @@ import pygame
 import numpy as np
 import random
 from os import chdir
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Rasterizer import fill_polygons, map_colors
 
 
 class Landscape:
@@ -174,48 +178,52 @@ class Landscape:
         yAdd = self.yAdd
         zAdd = self.zAdd
         
-        # z goes through each grid row ("vertical line")
-        for z in range(self.gridSize):
-            ySea1 = yAdd[z] - self.seaHeight
-            ySea2 = yAdd[z + 1] - self.seaHeight
-            # x goes thriugh each grid column for line z
-            for x in range(self.gridSize):
-                # coordinates for square, two triangles: 0 - 1 - 2 and 1 - 3 - 2.
-                # top left.
-                x0 = zAdd[z] * (x - midGrid) + self.midScreen[0]
-                y0 = yAdd[z] - self.grid[x, z]
-                # top right.
-                x1 = x0 + zAdd[z]
-                y1 = yAdd[z] - self.grid[x + 1, z]
-                # bottom left.
-                x2 = zAdd[z + 1] * (x - midGrid) + self.midScreen[0]
-                y2 = yAdd[z + 1] - self.grid[x, z + 1]
-                # bottom right.
-                x3 = x2 + zAdd[z + 1]
-                y3 = yAdd[z + 1] - self.grid[x + 1, z + 1]
-                # minimum Y for each triangle.
-                yMin = min(y0, y1, y2, y3)
-                if yMin >= ySea1:
-                    # if sea (all coordinates below sea level), draw a flat square
-                    color = self.setColorSea(yAdd[z] - yMin)
-                    node_list = [(x0, ySea1), (x1, ySea1), (x3, ySea2), (x2, ySea2)]
-                    self.drawPolygon(self.screen, color, node_list)
-                else:
-                    # if land, draw two polygons, if they are visible (i.e. "higher" (smaller y) at the back than at the front).
-                    # first triangle 0 - 1 - 2
-                    if y0 < y2 and y2 > 0:
-                        color = self.setColorLand(yAdd[z] - yMin, self.grid[x, z] - self.grid[x + 1, z], self.grid[x, z + 1] - self.grid[x, z])
-                        node_list = [(x0, min(y0, ySea1)), (x1, min(y1, ySea1)), (x2, min(y2, ySea2))]
-                        self.drawPolygon(self.screen, color, node_list)
-                    # then triangle 1 - 3 - 2
-                    if y1 < y3 and y3 > 0:
-                        color = self.setColorLand(yAdd[z] - yMin, self.grid[x + 1, z + 1] - self.grid[x, z + 1], self.grid[x + 1, z + 1] - self.grid[x + 1, z]) 
-                        node_list = [(x1, min(y1, ySea1)), (x3, min(y3, ySea2)), (x2, min(y2, ySea2))]
+        if self.landSize > self.AASize:
+            # no antialiasing for big grids: draw the polygons in batches
+            self.drawGridBatch()
+        else:
+            # z goes through each grid row ("vertical line")
+            for z in range(self.gridSize):
+                ySea1 = yAdd[z] - self.seaHeight
+                ySea2 = yAdd[z + 1] - self.seaHeight
+                # x goes thriugh each grid column for line z
+                for x in range(self.gridSize):
+                    # coordinates for square, two triangles: 0 - 1 - 2 and 1 - 3 - 2.
+                    # top left.
+                    x0 = zAdd[z] * (x - midGrid) + self.midScreen[0]
+                    y0 = yAdd[z] - self.grid[x, z]
+                    # top right.
+                    x1 = x0 + zAdd[z]
+                    y1 = yAdd[z] - self.grid[x + 1, z]
+                    # bottom left.
+                    x2 = zAdd[z + 1] * (x - midGrid) + self.midScreen[0]
+                    y2 = yAdd[z + 1] - self.grid[x, z + 1]
+                    # bottom right.
+                    x3 = x2 + zAdd[z + 1]
+                    y3 = yAdd[z + 1] - self.grid[x + 1, z + 1]
+                    # minimum Y for each triangle.
+                    yMin = min(y0, y1, y2, y3)
+                    if yMin >= ySea1:
+                        # if sea (all coordinates below sea level), draw a flat square
+                        color = self.setColorSea(yAdd[z] - yMin)
+                        node_list = [(x0, ySea1), (x1, ySea1), (x3, ySea2), (x2, ySea2)]
                         self.drawPolygon(self.screen, color, node_list)
-            # every other horizontal set of triangles, flip screen to show landscape being built.
-            # this is not mandatory, but used to mimick the original 1992 code.
-            if z % 2 == 0:
-                pygame.display.flip()
+                    else:
+                        # if land, draw two polygons, if they are visible (i.e. "higher" (smaller y) at the back than at the front).
+                        # first triangle 0 - 1 - 2
+                        if y0 < y2 and y2 > 0:
+                            color = self.setColorLand(yAdd[z] - yMin, self.grid[x, z] - self.grid[x + 1, z], self.grid[x, z + 1] - self.grid[x, z])
+                            node_list = [(x0, min(y0, ySea1)), (x1, min(y1, ySea1)), (x2, min(y2, ySea2))]
+                            self.drawPolygon(self.screen, color, node_list)
+                        # then triangle 1 - 3 - 2
+                        if y1 < y3 and y3 > 0:
+                            color = self.setColorLand(yAdd[z] - yMin, self.grid[x + 1, z + 1] - self.grid[x, z + 1], self.grid[x + 1, z + 1] - self.grid[x + 1, z]) 
+                            node_list = [(x1, min(y1, ySea1)), (x3, min(y3, ySea2)), (x2, min(y2, ySea2))]
+                            self.drawPolygon(self.screen, color, node_list)
+                # every other horizontal set of triangles, flip screen to show landscape being built.
+                # this is not mandatory, but used to mimick the original 1992 code.
+                if z % 2 == 0:
+                    pygame.display.flip()
 
         # clean the front
         node_list = [(zAdd[self.gridSize] * (0 - midGrid) + self.midScreen[0], self.height)]
@@ -242,6 +250,75 @@ class Landscape:
         # clear event queue
         self.clearEvents()
         
+    def drawGridBatch(self):
+        """
+        Draws the grid like drawGrid, but computes the polygons and colors of a batch of rows at a time with NumPy
+        and fills them with the rasterizer. No antialiasing.
+        
+        @author: kalle
+        """
+        
+        midGrid = int(self.gridSize / 2)
+        xr = np.arange(self.gridSize)[:, None] - midGrid
+        # number of rows (z) drawn at a time. Flip screen after each batch to show landscape being built, as in drawGrid.
+        rows = max(2, int(self.gridSize / 32))
+        pixels = pygame.surfarray.pixels2d(self.screen)
+        for z in range(0, self.gridSize, rows):
+            z_end = min(z + rows, self.gridSize)
+            # grid corner coordinates as (x, z) arrays: top left, top right, bottom left, bottom right.
+            zAdd = self.zAdd[None, z:z_end + 1]
+            yAdd = self.yAdd[None, z:z_end + 1]
+            grid = self.grid[:self.gridSize + 1, z:z_end + 1]
+            x0 = zAdd[:, :-1] * xr + self.midScreen[0]
+            y0 = yAdd[:, :-1] - grid[:-1, :-1]
+            x1 = x0 + zAdd[:, :-1]
+            y1 = yAdd[:, :-1] - grid[1:, :-1]
+            x2 = zAdd[:, 1:] * xr + self.midScreen[0]
+            y2 = yAdd[:, 1:] - grid[:-1, 1:]
+            x3 = x2 + zAdd[:, 1:]
+            y3 = yAdd[:, 1:] - grid[1:, 1:]
+            ySea1 = np.repeat(yAdd[:, :-1] - self.seaHeight, self.gridSize, axis=0)
+            ySea2 = np.repeat(yAdd[:, 1:] - self.seaHeight, self.gridSize, axis=0)
+            yMin = np.minimum(np.minimum(y0, y1), np.minimum(y2, y3))
+            yDepth = yAdd[:, :-1] - yMin
+            sea = yMin >= ySea1
+            
+            # each grid square has two polygon slots: a sea square or the first triangle, and the second triangle.
+            # four nodes are stored per polygon; triangles use the first three.
+            shape = np.shape(sea) + (2, )
+            nodes = np.zeros(shape + (4, 2))
+            nodes[:, :, 0, :, 0] = np.where(sea[:, :, None], np.dstack((x0, x1, x3, x2)), np.dstack((x0, x1, x2, x2)))
+            nodes[:, :, 0, :, 1] = np.where(sea[:, :, None], np.dstack((ySea1, ySea1, ySea2, ySea2)),
+                                            np.dstack((np.minimum(y0, ySea1), np.minimum(y1, ySea1), np.minimum(y2, ySea2), y2)))
+            nodes[:, :, 1, :, 0] = np.dstack((x1, x3, x2, x2))
+            nodes[:, :, 1, :, 1] = np.dstack((np.minimum(y1, ySea1), np.minimum(y3, ySea2), np.minimum(y2, ySea2), y2))
+            counts = np.zeros(shape, dtype=int)
+            counts[:, :, 0] = np.where(sea, 4, 3)
+            counts[:, :, 1] = 3
+            # land triangles are drawn only if they are visible (i.e. "higher" (smaller y) at the back than at the front).
+            draw = np.zeros(shape, dtype=bool)
+            draw[:, :, 0] = sea | ((y0 < y2) & (y2 > 0))
+            draw[:, :, 1] = ~sea & (y1 < y3) & (y3 > 0)
+            
+            # colors, as in setColorLand and setColorSea
+            diffX = np.dstack((grid[:-1, :-1] - grid[1:, :-1], grid[1:, 1:] - grid[:-1, 1:]))
+            diffZ = np.dstack((grid[:-1, 1:] - grid[:-1, :-1], grid[1:, 1:] - grid[1:, :-1]))
+            shade = np.maximum(1.0 - np.sqrt(diffX ** 2 + diffZ ** 2) / self.colorScale, 0.2)
+            landRGB = np.where((yDepth > self.mountainHeight)[:, :, None, None], np.array(self.iceRGB),
+                               np.where((yDepth > self.landHeight)[:, :, None, None], np.array(self.mountainRGB), np.array(self.landRGB)))
+            colors = (shade[:, :, :, None] * landRGB + 0.5).astype(int)
+            seaShade = np.maximum(1.0 - (-yDepth + self.seaHeight) * self.seaColorMult, 0.2)
+            colors[:, :, 0, :] = np.where(sea[:, :, None], (seaShade[:, :, None] * np.array(self.seaRGB) + 0.5).astype(int), colors[:, :, 0, :])
+            
+            # draw in the original order: row z by row z, and x by x in each row.
+            use = draw.transpose(1, 0, 2)
+            vertices = nodes.transpose(1, 0, 2, 3, 4)[use].reshape(-1, 2)
+            polygons = np.arange(np.shape(vertices)[0]).reshape(-1, 4)
+            fill_polygons(pixels, vertices, polygons, counts.transpose(1, 0, 2)[use],
+                          map_colors(self.screen, colors.transpose(1, 0, 2, 3)[use]))
+            pygame.display.flip()
+        del pixels
+
     def setColorLand(self, y, diffX, diffZ):
         
         # defines color. diffX and diffZ are the differences in altitude in x and z coordinates, respectively,  going right and towards the viewer
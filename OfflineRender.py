@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Offline rendering of the demos to image files or a video encoder, for making videos without losing frames.
+
+FrameWriter takes the frames from the renderer and writes them in background threads. write() only copies the screen
+to raw RGB bytes and puts them to a bounded queue; it waits only when the queue is full, i.e. when the writers are
+behind. The writer threads then either save each frame as a numbered image file (PNG, BMP, TGA or JPG by the file
+name extension, or .rgb for raw RGB bytes), or pipe the frames, in order, as raw RGB to a local encoder process
+reading them from its standard input, e.g.
+    ffmpeg -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - showreel.mp4
+where {width}, {height} and {fps} are filled in when the first frame arrives. stats() reports the throughput.
+
+FixedClock makes a demo written for real time render offline: it replaces pygame's clock functions, so that time
+advances by exactly one frame (1000 / fps milliseconds) per display flip or update, and every flipped frame is given
+to a FrameWriter. Clock.tick() does not wait, and pygame.time.wait() emits frames of the unchanged screen for the time
+waited. Run the demo with the dummy video driver (SDL_VIDEODRIVER=dummy) and a display of any size, and the frames are
+rendered off-screen at that size and as fast as possible.
+
+@author: kalle
+"""
+import pygame
+import os
+import queue
+import shlex
+import subprocess
+import threading
+import time
+
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.tga', '.jpg', '.jpeg')
+RAW_EXTENSIONS = ('.rgb', '.raw')
+
+
+class FrameWriter:
+    """
+    Writes frames in background threads.
+
+    output:     numbered file name, e.g. 'frames/frame_%05d.png'; the directory is created if needed. None if using encoder.
+    encoder:    command line of an encoder reading raw RGB frames from its standard input (see above).
+    fps:        frame rate, for the encoder command line.
+    workers:    number of writer threads. An encoder is always fed by a single thread, keeping the frames in order.
+    max_queue:  at most this many frames are waiting to be written; write() waits if the queue is full.
+
+    @author: kalle
+    """
+
+    def __init__(self, output=None, encoder=None, fps=60, workers=2, max_queue=8):
+
+        if (output is None) == (encoder is None):
+            raise ValueError('FrameWriter needs either an output file name or an encoder command')
+        self.output = output
+        self.encoder = encoder
+        self.fps = fps
+        self.raw = False
+        if output is not None:
+            extension = os.path.splitext(output)[1].lower()
+            if extension in RAW_EXTENSIONS:
+                self.raw = True
+            elif extension not in IMAGE_EXTENSIONS:
+                raise ValueError('Unsupported frame file type: %s' % output)
+            directory = os.path.dirname(output)
+            if directory != '':
+                os.makedirs(directory, exist_ok=True)
+        else:
+            workers = 1
+        self.process = None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.threads = [threading.Thread(target=self.write_frames, daemon=True) for i in range(workers)]
+        self.error = None
+        # statistics
+        self.frames = 0
+        self.bytes = 0
+        self.wait_time = 0.0  # time write() has waited for a full queue
+        self.start_time = None
+        self.end_time = None
+        for thread in self.threads:
+            thread.start()
+
+    def write(self, surface):
+
+        # copy surface and queue it for writing. Waits only if the queue is full.
+        if self.error is not None:
+            raise self.error
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        size = surface.get_size()
+        if self.encoder is not None and self.process is None:
+            self.start_encoder(size)
+        frame = (self.frames, size, pygame.image.tostring(surface, 'RGB'))
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            wait_start = time.perf_counter()
+            self.queue.put(frame)
+            self.wait_time += time.perf_counter() - wait_start
+        self.frames += 1
+        self.bytes += len(frame[2])
+
+    def start_encoder(self, size):
+
+        # start the encoder process, with the frame size and rate filled in its command line
+        command = self.encoder.format(width=size[0], height=size[1], fps=self.fps)
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+
+    def write_frames(self):
+
+        # writer thread: write frames from the queue until given None
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue  # just empty the queue, so that write() does not wait forever
+            (number, size, data) = frame
+            try:
+                if self.process is not None:
+                    self.process.stdin.write(data)
+                elif self.raw:
+                    with open(self.output % number, 'wb') as f:
+                        f.write(data)
+                else:
+                    pygame.image.save(pygame.image.fromstring(data, size, 'RGB'), self.output % number)
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+
+        # write all frames still in the queue, stop the threads and the encoder, and return the statistics
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.process is not None:
+            # a dead encoder has closed the pipe already; its exit code below is the error to report
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            if self.process.wait() != 0 and self.error is None:
+                self.error = RuntimeError('Encoder exited with code %d' % self.process.returncode)
+        self.end_time = time.perf_counter()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+
+        # frames written (or queued, if not closed yet), throughput and time the renderer has waited for the writers
+        seconds = 0.0
+        if self.start_time is not None:
+            seconds = (self.end_time or time.perf_counter()) - self.start_time
+        return {
+            'frames': self.frames,
+            'megabytes': round(self.bytes / 1e6, 1),
+            'seconds': round(seconds, 4),
+            'fps': round(self.frames / max(seconds, 1e-9), 2),
+            'megabytes_per_second': round(self.bytes / 1e6 / max(seconds, 1e-9), 1),
+            'renderer_wait_seconds': round(self.wait_time, 4)
+            }
+
+
+class FixedClock:
+    """
+    Replaces pygame's clock and display flip functions, for rendering a real time demo offline (see above).
+
+    writer:  FrameWriter for the frames flipped.
+    fps:     frame rate of the rendered frames.
+
+    @author: kalle
+    """
+
+    def __init__(self, writer, fps=60):
+
+        self.writer = writer
+        self.fps = fps
+        self.frame_time = 1000.0 / fps
+        self.ticks = 0.0
+        self.wait_time = 0.0  # time waited not yet covered by frames
+        self.originals = None
+
+    def install(self):
+
+        # replace pygame's functions; uninstall() restores them
+        clock = self
+
+        class Clock:
+            # pygame.time.Clock running on the fixed clock, never waiting
+            def tick(self, framerate=0):
+                return int(clock.frame_time)
+
+            tick_busy_loop = tick
+
+            def get_time(self):
+                return int(clock.frame_time)
+
+            def get_rawtime(self):
+                return 0
+
+            def get_fps(self):
+                return float(clock.fps)
+
+        self.originals = (pygame.time.get_ticks, pygame.time.wait, pygame.time.delay, pygame.time.Clock,
+                          pygame.display.flip, pygame.display.update)
+        (pygame.time.get_ticks, pygame.time.wait, pygame.time.delay, pygame.time.Clock,
+         pygame.display.flip, pygame.display.update) = (self.get_ticks, self.wait, self.wait, Clock, self.flip, self.update)
+
+    def uninstall(self):
+
+        if self.originals is not None:
+            (pygame.time.get_ticks, pygame.time.wait, pygame.time.delay, pygame.time.Clock,
+             pygame.display.flip, pygame.display.update) = self.originals
+            self.originals = None
+
+    def get_ticks(self):
+        return int(self.ticks)
+
+    def flip(self):
+
+        # one frame: write the screen and advance the clock
+        self.writer.write(pygame.display.get_surface())
+        self.ticks += self.frame_time
+
+    def update(self, rectangle=None):
+
+        # a partial update is a full frame here
+        self.flip()
+
+    def wait(self, milliseconds):
+
+        # the screen does not change while waiting; write it again for each frame waited
+        self.wait_time += milliseconds
+        while self.wait_time >= self.frame_time:
+            self.flip()
+            self.wait_time -= self.frame_time
+        return int(milliseconds)
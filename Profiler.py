@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+A frame profiler shared by the demos.
+
+Time is measured with time.perf_counter_ns() and added to named stages. Each stage keeps the time spent per frame
+in a preallocated ring buffer of the last n frames, which the demos use for their info display percentages and
+from which the p50 / p95 / p99 frame times can be exported.
+
+There are two ways to measure:
+    measure(name)     adds the time elapsed since the previous measure() call to stage name, i.e. the main loop
+                      is split into consecutive stages. This is how the demos have always measured.
+    with span(name):  measures a nested scope. The time is added to stage name, and is also included in whatever
+                      stage or span encloses it.
+
+Optionally the profiler records each measurement as an event in a preallocated ring buffer, which can be written
+as a Chrome trace JSON file (open in chrome://tracing or https://ui.perfetto.dev).
+
+When not enabled, measure() and next_frame() return immediately and span() returns a shared no-op context manager.
+
+@author: kalle
+"""
+import numpy as np
+import json
+from time import perf_counter_ns
+
+
+class NullSpan:
+    """
+    A do-nothing context manager, returned by span() when profiling is not enabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class ProfilerSpan:
+    """
+    Context manager measuring one stage as a nested scope.
+    """
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.profiler.span_stack.append(perf_counter_ns())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.end_span(self.stage)
+        return False
+
+
+class Profiler:
+    """
+    Stage timers for a frame loop.
+
+    stage_names:  list of stage names. The order is kept in reports and in the timers array.
+    frames:       number of frames kept in the ring buffers.
+    enabled:      if False, nothing is measured.
+    trace_events: size of the trace event ring buffer. 0 means no trace is recorded.
+
+    @author: kalle
+    """
+
+    def __init__(self, stage_names, frames=180, enabled=True, trace_events=0):
+
+        self.stage_names = list(stage_names)
+        self.stage_index = dict((name, i) for (i, name) in enumerate(self.stage_names))
+        self.frames = frames
+        self.enabled = enabled
+        # timers[stage, frame] is the time in nanoseconds spent in stage in that frame; frame is the current frame.
+        self.timers = np.zeros((len(self.stage_names), frames), dtype=np.int64)
+        self.totals = np.zeros((len(self.stage_names)), dtype=np.int64)
+        self.frame = 0
+        self.frame_count = 0
+        self.spans = [ProfilerSpan(self, i) for i in range(len(self.stage_names))]
+        self.span_stack = []
+        # trace event ring buffer
+        self.trace_size = trace_events
+        self.trace_count = 0
+        self.trace_stage = np.zeros((trace_events), dtype=np.int32)
+        self.trace_start = np.zeros((trace_events), dtype=np.int64)
+        self.trace_duration = np.zeros((trace_events), dtype=np.int64)
+        self.trace_depth = np.zeros((trace_events), dtype=np.int16)
+        self.start_time = perf_counter_ns()
+        self.last_time = self.start_time
+
+    def restart(self):
+
+        # start a new measurement from now without adding the elapsed time to any stage (e.g. after a pause).
+        self.last_time = perf_counter_ns()
+
+    def measure(self, name):
+
+        # add time elapsed from previous call to stage name
+        if not self.enabled:
+            return
+        new_time = perf_counter_ns()
+        i = self.stage_index[name]
+        self.timers[i, self.frame] += new_time - self.last_time
+        if self.trace_size > 0:
+            self.add_trace_event(i, self.last_time, new_time - self.last_time, len(self.span_stack))
+        self.last_time = new_time
+
+    def span(self, name):
+
+        # return a context manager measuring stage name as a nested scope
+        if not self.enabled:
+            return NULL_SPAN
+        return self.spans[self.stage_index[name]]
+
+    def end_span(self, i):
+
+        # close the innermost open span, adding its time to stage i
+        new_time = perf_counter_ns()
+        start_time = self.span_stack.pop()
+        self.timers[i, self.frame] += new_time - start_time
+        if self.trace_size > 0:
+            self.add_trace_event(i, start_time, new_time - start_time, len(self.span_stack) + 1)
+
+    def add_trace_event(self, i, start_time, duration, depth):
+
+        # store an event in the trace ring buffer, overwriting the oldest one when full
+        n = self.trace_count % self.trace_size
+        self.trace_stage[n] = i
+        self.trace_start[n] = start_time
+        self.trace_duration[n] = duration
+        self.trace_depth[n] = depth
+        self.trace_count += 1
+
+    def next_frame(self):
+
+        # move to next frame and clear its data
+        if not self.enabled:
+            return
+        self.totals += self.timers[:, self.frame]
+        self.frame_count += 1
+        self.frame += 1
+        if self.frame >= self.frames:
+            self.frame = 0
+        self.timers[:, self.frame] = 0
+
+    def completed_frames(self):
+
+        # return the timers of the completed frames still in the ring buffer (the current frame is not complete)
+        if self.frame_count >= self.frames:
+            return np.delete(self.timers, self.frame, axis=1)
+        else:
+            return self.timers[:, max(0, self.frame - self.frame_count):self.frame]
+
+    def percentiles(self, percents=(50, 95, 99)):
+
+        # return a dict of stage name: list of frame time percentiles in milliseconds over the frames in the ring buffer
+        timers = self.completed_frames()
+        if timers.shape[1] == 0:
+            return dict((name, [0.0] * len(percents)) for name in self.stage_names)
+        values = np.percentile(timers, percents, axis=1) / 1e6
+        return dict((name, [float(v) for v in values[:, i]]) for (i, name) in enumerate(self.stage_names))
+
+    def report(self, percents=(50, 95, 99)):
+
+        # return a JSON serializable summary of all frames measured
+        tot_time = max(1, int(np.sum(self.totals)))
+        frames = max(1, self.frame_count)
+        percentiles = self.percentiles(percents)
+        stages = {}
+        for (i, name) in enumerate(self.stage_names):
+            stage = {
+                'total_ms': float(self.totals[i] / 1e6),
+                'frame_ms': float(self.totals[i] / 1e6 / frames),
+                'percent': float(self.totals[i] * 100.0 / tot_time)
+                }
+            for (p, value) in zip(percents, percentiles[name]):
+                stage['p' + str(p) + '_ms'] = value
+            stages[name] = stage
+        return {'frames': self.frame_count, 'stages': stages}
+
+    def trace_events(self):
+
+        # return the recorded trace events in Chrome trace event format, oldest first
+        count = min(self.trace_count, self.trace_size)
+        order = (np.arange(count) + self.trace_count - count) % max(1, self.trace_size)
+        events = []
+        for n in order:
+            events.append({
+                'name': self.stage_names[self.trace_stage[n]],
+                'ph': 'X',
+                'ts': (int(self.trace_start[n]) - self.start_time) / 1000.0,
+                'dur': int(self.trace_duration[n]) / 1000.0,
+                'pid': 0,
+                'tid': 0,
+                'args': {'depth': int(self.trace_depth[n])}
+                })
+        return events
+
+    def write_trace(self, file_name, process_name='frame loop'):
+
+        # write the recorded trace events as a Chrome trace / Perfetto JSON file
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 0, 'args': {'name': process_name}}]
+        with open(file_name, 'w') as f:
+            json.dump({'traceEvents': events + self.trace_events(), 'displayTimeUnit': 'ms'}, f)
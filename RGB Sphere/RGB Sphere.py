@@ -4,6 +4,12 @@ import numpy as np
 import math
 import bisect
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from Rasterizer import fill_polygons, map_colors
+from Rotation import rotation_matrix
 
 
 class RGBSphere:
@@ -78,11 +84,8 @@ class RGBSphere:
 
         # the following for checking performance only
         self.info_display = True
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
         self.cross_product_count = 0
         self.draw_count = 0
@@ -98,7 +101,8 @@ class RGBSphere:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # load image for surface coloring
         self.image = pygame.image.load(image_filename).convert()
@@ -156,7 +160,7 @@ class RGBSphere:
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
     def run(self):
         """
@@ -249,7 +253,7 @@ class RGBSphere:
             if self.paused:
                 pygame.time.wait(100)
                 self.rotate_timer = pygame.time.get_ticks()
-                self.millisecs = pygame.time.get_ticks()
+                self.profiler.restart()
 
             else:
                 # main components executed here
@@ -411,7 +415,7 @@ class RGBSphere:
         self.rotate_timer = pygame.time.get_ticks()
 
         # rotate object
-        matrix = self.rotate_matrix(self.angles[0])
+        matrix = rotation_matrix(self.angles[0])
         # rotate onject nodes but only to required depth
         self.rotated_nodes = np.dot(self.nodes[:self.nodes_at_depth[self.depth + 1]], matrix)
         # add zPos and transform from 3D to 2D; add midScreen to center on screen.
@@ -420,26 +424,15 @@ class RGBSphere:
         # rotate lights
         if self.fill_surfaces:
             if self.light_speed > 0:
-                matrix = self.rotate_matrix(self.angles[1])
+                matrix = rotation_matrix(self.angles[1])
                 self.light_rotated_nodes[0, :] = np.dot(self.light_nodes[0, :], matrix)
                 if self.light_nr == 3:
-                    matrix = self.rotate_matrix(self.angles[2])
+                    matrix = rotation_matrix(self.angles[2])
                     self.light_rotated_nodes[1, :] = np.dot(self.light_nodes[1, :], matrix)
-                    matrix = self.rotate_matrix(self.angles[3])
+                    matrix = rotation_matrix(self.angles[3])
                     self.light_rotated_nodes[2, :] = np.dot(self.light_nodes[2, :], matrix)
             self.light_trans_nodes = (self.light_rotated_nodes[:, 0:2] * self.z_scale) / (self.light_rotated_nodes[:, 2:3] + self.z_pos) + self.mid_screen
 
-    def rotate_matrix(self, angles):
-
-        # define rotation matrix for given angles
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                         [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                         [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def clear_screen(self):
 
         # clear screen.
@@ -570,9 +563,11 @@ class RGBSphere:
 
         self.measure_time("prepare surfaces")
 
+        # draw all surfaces in one batch. Surfaces facing the viewer do not overlap, so the order does not matter.
         self.draw_count = np.shape(draw_surfs)[0]
-        for i in range(np.shape(draw_surfs)[0]):
-            pygame.draw.polygon(self.screen, color[i, :], self.trans_nodes[draw_surfs[i, :], :])
+        pixels = pygame.surfarray.pixels2d(self.screen)
+        fill_polygons(pixels, self.trans_nodes, draw_surfs, np.full((self.draw_count), np.shape(draw_surfs)[1]), map_colors(self.screen, color))
+        del pixels
 
         self.measure_time("draw")
 
@@ -1058,18 +1053,12 @@ class RGBSphere:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
     def update_surface_cross_product_vector(self, surface):
 
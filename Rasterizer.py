@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+A batched polygon rasterizer, filling a whole frame's polygons with a handful of NumPy operations.
+
+The polygons are given as a vertex array, a table of vertex indices per polygon, and one color per polygon.
+fill_polygons() computes where each polygon edge crosses each pixel row (at pixel centers), pairs the crossings
+into horizontal spans, and writes the span pixels to a surfarray.pixels2d() view of the surface. The cost in
+Python calls is constant; the work in NumPy grows with the number of edges, rows and pixels covered.
+
+Pixels whose center is inside a polygon are filled, using a top-left rule, so polygons sharing an edge neither
+overlap nor leave gaps between them. Polygons may be concave (even-odd fill rule).
+
+Drawing order is the order of the polygons, i.e. later polygons are drawn over earlier ones (painter's algorithm).
+If a z-buffer is given, the vertices must have a third column (depth, greater is further away), and each pixel is
+only drawn if it is nearer than what is already in the z-buffer. The z-buffer stores 1 / depth per pixel, which
+is linear in screen space, and should be cleared to zero for each frame.
+
+@author: kalle
+"""
+import numpy as np
+
+
+def map_colors(surface, colors):
+
+    # convert an array of (R, G, B) colors to mapped integer colors for surfarray.pixels2d(surface)
+    colors = np.asarray(colors).astype(np.int64).reshape(-1, 3)
+    shifts = surface.get_shifts()
+    losses = surface.get_losses()
+    mapped = np.zeros((colors.shape[0]), dtype=np.int64)
+    for i in range(3):
+        mapped |= (colors[:, i] >> losses[i]) << shifts[i]
+    # opaque alpha, if the surface has an alpha channel
+    mapped |= surface.get_masks()[3]
+    return mapped
+
+
+def polygon_edges(vertices, polygons, counts):
+
+    # return (polygon, start vertex, end vertex) for each edge of each polygon
+    polygons = np.asarray(polygons).reshape(np.shape(polygons)[0], -1)
+    counts = np.asarray(counts)
+    cols = np.arange(polygons.shape[1])
+    used = cols[None, :] < counts[:, None]
+    # the edge from the last vertex of a polygon goes back to its first vertex
+    next_nodes = np.where(cols[None, :] + 1 < counts[:, None], np.roll(polygons, -1, axis=1), polygons[:, 0:1])
+    return (np.nonzero(used)[0], polygons[used], next_nodes[used])
+
+
+def polygon_spans(vertices, polygons, counts, width, height):
+    """
+    Compute the horizontal spans covered by polygons on a width x height screen.
+    Returns arrays (polygon, y, x_start, x_end) with x_end exclusive, sorted by polygon, and the edge crossing
+    positions (x, and if vertices have a depth column, 1 / depth) at span start and end.
+    """
+    (poly, node_a, node_b) = polygon_edges(vertices, polygons, counts)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    y_a = vertices[node_a, 1]
+    y_b = vertices[node_b, 1]
+    # orient all edges top to bottom; horizontal edges do not cross any pixel row center.
+    down = y_a > y_b
+    (node_a, node_b) = (np.where(down, node_b, node_a), np.where(down, node_a, node_b))
+    (y_a, y_b) = (np.minimum(y_a, y_b), np.maximum(y_a, y_b))
+    # rows whose center (y + 0.5) is within [y_a, y_b)
+    row_a = np.clip(np.ceil(y_a - 0.5), 0, height).astype(np.int64)
+    row_b = np.clip(np.ceil(y_b - 0.5), 0, height).astype(np.int64)
+    rows = np.maximum(row_b - row_a, 0)
+    use = rows > 0
+    (poly, node_a, node_b, y_a, y_b, row_a, rows) = (poly[use], node_a[use], node_b[use], y_a[use], y_b[use], row_a[use], rows[use])
+
+    # expand edges to one crossing per row
+    edge = np.repeat(np.arange(np.size(rows)), rows)
+    y = row_a[edge] + (np.arange(np.size(edge)) - np.repeat(np.cumsum(rows) - rows, rows))
+    t = (y + 0.5 - y_a[edge]) / (y_b - y_a)[edge]
+    x = vertices[node_a[edge], 0] + t * (vertices[node_b[edge], 0] - vertices[node_a[edge], 0])
+    if vertices.shape[1] > 2:
+        w_a = 1.0 / vertices[node_a[edge], 2]
+        w = w_a + t * (1.0 / vertices[node_b[edge], 2] - w_a)
+    else:
+        w = None
+    poly = poly[edge]
+
+    # sort crossings by polygon, row and x, and pair them into spans
+    order = np.lexsort((x, poly * height + y))
+    start = order[0::2]
+    end = order[1::2]
+    x_start = np.clip(np.ceil(x[start] - 0.5), 0, width).astype(np.int64)
+    x_end = np.clip(np.ceil(x[end] - 0.5), 0, width).astype(np.int64)
+    if w is None:
+        return (poly[start], y[start], x_start, x_end, x[start], x[end], None, None)
+    else:
+        return (poly[start], y[start], x_start, x_end, x[start], x[end], w[start], w[end])
+
+
+def fill_polygons(pixels, vertices, polygons, counts, colors, zbuffer=None):
+    """
+    Fill polygons into pixels, a surfarray.pixels2d() view (or any (width, height) integer array).
+
+    vertices:  (N, 2) screen X, Y coordinates, or (N, 3) with depth when using a z-buffer.
+    polygons:  (P, M) vertex indices for each polygon; rows may be padded after counts vertices.
+    counts:    (P, ) number of vertices in each polygon.
+    colors:    (P, ) mapped colors, see map_colors().
+    zbuffer:   optional (width, height) float array of 1 / depth.
+    Returns the number of pixels drawn.
+    """
+    if np.shape(polygons)[0] == 0:
+        return 0
+    (width, height) = np.shape(pixels)
+    (poly, y, x_start, x_end, xf_start, xf_end, w_start, w_end) = polygon_spans(vertices, polygons, counts, width, height)
+    pix = np.maximum(x_end - x_start, 0)
+    total = int(np.sum(pix))
+
+    if zbuffer is None:
+        # painter's algorithm: pixels are written in polygon order, so later polygons overwrite earlier ones.
+        # spans are contiguous in the pixel buffer, so each pixel's index is its span's start index + its position.
+        (buffer, pitch) = pixel_buffer(pixels)
+        start = y * pitch + x_start - (np.cumsum(pix) - pix)
+        buffer[np.repeat(start, pix) + np.arange(total)] = np.repeat(np.asarray(colors)[poly], pix)
+        return total
+
+    # z-buffer: expand spans to pixels, interpolate 1 / depth along the span, keep the nearest (largest) per pixel,
+    # and draw only pixels where this polygon is the nearest.
+    span = np.repeat(np.arange(np.size(pix)), pix)
+    x = x_start[span] + (np.arange(total) - np.repeat(np.cumsum(pix) - pix, pix))
+    y = y[span]
+    t = (x + 0.5 - xf_start[span]) / np.maximum(xf_end - xf_start, 1e-9)[span]
+    w = w_start[span] + t * (w_end - w_start)[span]
+    z_flat = zbuffer.reshape(-1)
+    z_index = x * height + y
+    np.maximum.at(z_flat, z_index, w)
+    nearest = z_flat[z_index] == w
+    pixels[x[nearest], y[nearest]] = np.asarray(colors)[poly[span[nearest]]]
+    return np.count_nonzero(nearest)
+
+
+def pixel_buffer(pixels):
+
+    # return a flat view of a (width, height) pixel array with pixels contiguous along x, and its row pitch in pixels
+    (stride_x, stride_y) = pixels.strides
+    if stride_x != pixels.itemsize or stride_y % pixels.itemsize != 0:
+        raise ValueError('pixel array rows must be contiguous along x')
+    pitch = stride_y // pixels.itemsize
+    (width, height) = pixels.shape
+    buffer = np.lib.stride_tricks.as_strided(pixels, shape=((height - 1) * pitch + width, ), strides=(pixels.itemsize, ))
+    return (buffer, pitch)
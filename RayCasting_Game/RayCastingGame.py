@@ -2,6 +2,14 @@
 import pygame
 import numpy as np
 from sys import exit
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import argparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 
 class RayCastingGame:
@@ -15,12 +23,12 @@ class RayCastingGame:
     As time passes, your lamp grows dimmer - unless you collect light bulbs.
     The game ends when visibility is almost zero.
 
-    Keys: cursor keys to steer, A and Z to adjust speed.
+    Keys: cursor keys to steer, A and Z to adjust speed. R switches between the two ray casting engines (see raycast).
 
     @author: kalle
     """
 
-    def __init__(self, screen, target_fps):
+    def __init__(self, screen, target_fps, render_workers=1):
 
         self.screen = screen
         self.target_fps = target_fps
@@ -62,6 +70,13 @@ class RayCastingGame:
         self.pic_ray10 = pygame.image.load('Raytracing_10.jpg').convert()
         self.pic_coin = pygame.image.load('goldcoin2.png').convert()
         self.pic_coin.set_colorkey((0, 0, 0))
+        # pic_coin contains six frames of rotating coin. These are shared by all coins, so that the coins also share their scaled images (see SpriteCache).
+        self.pic_coin_frames = [self.pic_coin.subsurface((22, 22), (360, 360)),
+                                self.pic_coin.subsurface((416, 22), (732 - 416, 360)),
+                                self.pic_coin.subsurface((794, 22), (968 - 794, 360)),
+                                self.pic_coin.subsurface((190, 450), (250 - 190, 360)),
+                                self.pic_coin.subsurface((418, 450), (590 - 418, 360)),
+                                self.pic_coin.subsurface((670, 450), (984 - 670, 360))]
         self.pic_lightbulb = pygame.image.load('lightbulb3.png').convert()
         self.pic_lightbulb.set_colorkey((0, 0, 0))
         self.sound_collide = pygame.mixer.Sound('Raycast_collide.wav')
@@ -112,6 +127,13 @@ class RayCastingGame:
         self.view_blocks_time = 0
         self.view_blocks_target_time = 0
         self.view_shade = 0.7   # fraction of view after which shading starts
+        # shade lookup table: shade_table[level, value] is color component value shaded to level / (shade_levels - 1), so that shading is an integer gather.
+        # shade_channel_tables are the same for each color component (R, G, B) of mapped screen pixels (see shade_pixels), flattened and shifted in place.
+        self.shade_levels = 256
+        self.shade_table = (np.arange(256)[None, :] * np.arange(self.shade_levels)[:, None] // (self.shade_levels - 1)).astype(np.uint8)
+        self.shade_shifts = self.screen.get_shifts()[0:3]
+        self.shade_channel_tables = [(self.shade_table.astype(np.uint32) << shift).ravel() for shift in self.shade_shifts]
+        self.use_mips = True    # if True, distant walls use smaller versions of the block images (see Block.mip_chain), else always the full size images
         self.map_show_size = np.minimum(self.map_size, self.view_blocks * 2).astype(np.int16)  # the size of map area shown - limit to 2 x view_blocks
 
         self.proj_dist = np.tan(self.view_width * np.pi / 180) * self.width
@@ -127,6 +149,10 @@ class RayCastingGame:
         self.setup_items()
         self.item_data = np.zeros((len(self.items), 6), dtype=np.float)  # item data has visible item nr, angle, distance, x_coord, y_floor, y_ceiling
         self.items_visible = 0
+        # scaled (and shaded) item images are cached, with their height rounded to sprite_size_step pixels and alpha to sprite_alpha_step.
+        self.sprite_cache = SpriteCache(32 * 1024 * 1024)
+        self.sprite_size_step = 2
+        self.sprite_alpha_step = 8
         self.coin_rect = np.array([self.width * 5 / 6 - 4, 4, self.width * 1 / 6, self.width * 1 / 60], dtype=np.int16)  # defines coin progress bar
 
         # define ceiling and floor pics
@@ -142,6 +168,15 @@ class RayCastingGame:
         self.distance_correction = np.cos(np.linspace(-self.view_width / 2, self.view_width / 2, self.width) / 180.0 * np.pi)
         # grid_blocks will hold the data on where each block of rays (for single processing run) starts and ends
         self.grid_blocks = np.zeros((0))
+        # if True, rays are stepped along the grid lines only until a wall is hit (cast_rays_dda), else all grid lines in view are checked at once (cast_rays_grid)
+        self.use_dda = True
+        # floor and ceiling casting tables (see setup_floor_tables) and the packed pixels of floor and ceiling pics (see floor_texture)
+        self.setup_floor_tables()
+        self.floor_textures = {}
+        # render threads for casting the rays and drawing the walls, floor and ceiling in vertical strips of screen columns (see run_strips)
+        self.render_workers = 1
+        self.render_pool = None
+        self.set_render_workers(render_workers)
 
         self.screen_map = pygame.Surface(self.map_size * self.block_size, 0, self.screen)
         self.screen_map_visited = self.screen_map.copy()
@@ -161,11 +196,8 @@ class RayCastingGame:
 
         # the following for checking performance only
         self.info_display = False
-        self.millisecs = 0
         self.timer_avg_frames = 30
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
         # set up timers
@@ -180,17 +212,18 @@ class RayCastingGame:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # initialize timers
-        self.millisecs = pygame.time.get_ticks()
+        self.profiler.restart()
 
     def run(self):
         """
         Main loop.
         """
         time = pygame.time.get_ticks()
-        self.millisecs = time
+        self.profiler.restart()
         self.move_time = time
         self.anim_time = time
         self.view_blocks_time = time
@@ -221,6 +254,8 @@ class RayCastingGame:
                         self.view_blocks_target += 3.0
                     if event.key == pygame.K_i:
                         self.toggle_info_display()
+                    if event.key == pygame.K_r:
+                        self.toggle_dda()
                     # if event.key == pygame.K_SPACE:
                     #     self.pause()
                     if event.key == pygame.K_s:
@@ -395,9 +430,56 @@ class RayCastingGame:
         self.position = new_pos
         self.view_angle = self.pos_angle
 
+    def run_strips(self, function, x_left, x_right, *args):
+
+        # call function(strip_left, strip_right, *args) for vertical strips of screen columns covering x_left to x_right - 1.
+        # with render threads (see set_render_workers) there is a strip for each thread, all processed in parallel. The strips only write
+        # their own columns of the shared arrays (ray_data, the screen surfarray), and the NumPy operations doing most of the work release the GIL.
+        # single threaded, function is simply called for all the columns.
+        if self.render_pool is None:
+            function(x_left, x_right, *args)
+        else:
+            strips = np.linspace(x_left, x_right, self.render_workers + 1).astype(int).tolist()
+            futures = [self.render_pool.submit(function, strips[i], strips[i + 1], *args) for i in range(self.render_workers) if strips[i + 1] > strips[i]]
+            for future in futures:
+                future.result()  # waits for the strip, and raises any exception from it
+
+    def set_render_workers(self, render_workers):
+
+        # set the number of render threads. With 1, all rendering runs in the main thread.
+        if self.render_pool is not None:
+            self.render_pool.shutdown()
+            self.render_pool = None
+        self.render_workers = max(1, int(render_workers))
+        if self.render_workers > 1:
+            self.render_pool = ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix='render')
+
     def raycast(self, screen, block_size):
 
         # go through view horizontally i.e. from position and view_angle go from left view_angle_witdh / 2 to right view_angle_witdh / 2.
+        # the rays are cast in vertical strips of screen columns, in parallel if using render threads (see run_strips).
+        width = self.width  # this is the number of rays cast - ideally the width of the program window in pixels, so one ray per vertical line of pixels.
+        self.run_strips(self.raycast_columns, 0, width)
+
+        # figure out where each block starts and ends. If the same block and side are used continuously, this will be treated as one block.
+        # grid_changes contains the beginning of each block. These blocks can later be drawn in one go each as the source image is the same. Always include first and last.
+        # 1. np.diff: get the difference of each block to the preceding in each of [block, side, x_coord, y_coord].
+        # 2. sum the absolutes of these for each ray.
+        # 3. convert to int16 and get the indexes of each non-zero change. This means block and side changes are always accounted for (are >= 1), but small changes
+        #    (same or the very next) in grid position are not (are < 1).
+        # 4. combine the changes so that also the last ray of the preceding block is included, and add the first and last rays.
+        grid_changes = (np.sum(np.abs(np.diff(self.ray_data[:, :4], n=1, axis=0)), axis=1)).astype(np.int16).nonzero()[0] + 1
+        self.grid_blocks = np.zeros((np.shape(grid_changes)[0] * 2 + 2), np.int16)
+        # grid_blocks[0] = 0                    # first ray - this is already zero
+        self.grid_blocks[1:-1:2] = grid_changes - 1  # the last ray in the block before change
+        self.grid_blocks[2:-1:2] = grid_changes      # the first ray of the block after change
+        self.grid_blocks[-1] = width - 1             # the last ray
+
+        self.measure_time("calculate")
+
+    def raycast_columns(self, x_left, x_right):
+
+        # cast the rays of screen columns x_left to x_right - 1 and store the results in self.ray_data.
         # below "horizontal" and "vertical" refer to a map on the screen, not the view itself.
         # angle 0 degrees = "up", rotation clockwise
 
@@ -405,11 +487,9 @@ class RayCastingGame:
         pos = np.floor(self.position)
         pos_dec = self.position - pos
 
-        width = self.width  # this is the number of rays cast - ideally the width of the program window in pixels, so one ray per vertical line of pixels.
+        width = self.width
         view = int(self.view_blocks)  # nr of blocks: how far is visible (and, hence, how far must be calculated)
-        rng_width = np.arange(width)
-        # rng_view goes from zero to maximum view length in blocks.
-        rng_view = np.arange(view + 1)  # add 1 to make sure covers the viewable distance as blocks are "rounded down"
+        rng_width = np.arange(x_left, x_right)
         # calculate all angles etc. in one go - faster than looping
         # rads is an array (size: width) of all view angles in radians. Add 0.0001 to avoid exact 0/90/180/270 deg (and hence 0 sin/cos - div by zero)
         # rads are not evenly spaced, as they are on a line, not a circle radius. Their tangent is evenly spaced (when view_angle not yet applied),
@@ -426,6 +506,30 @@ class RayCastingGame:
         x_first = (pos_dec[1] + (sign_y - 1) / 2) * tan_a
         y_first = (pos_dec[0] - (sign_x + 1) / 2) / tan_a
 
+        # find the closest wall for each ray as an array of grid item, side (0 = up, 1 = right, 2 = down, 3 = left) map x, map y, and distance from viewer.
+        if self.use_dda:
+            pick_data = self.cast_rays_dda(pos, view, sin_a, cos_a, tan_a, sign_x, sign_y, x_first, y_first)
+        else:
+            pick_data = self.cast_rays_grid(pos, view, sin_a, cos_a, tan_a, sign_x, sign_y, x_first, y_first)
+
+        # y_top and y_bottom are screen y top and bottom coordinates for each x coordinate. Wall height is divided by its distance for each ray (corrected for "fish bowl")
+        dist_corr = pick_data[:, 4] * self.distance_correction[x_left:x_right]
+        # mark the blocks as "-1" when distance > self.view_blocks; these should not be drawn abd data are useless.
+        pick_data[:, 0:2][dist_corr > self.view_blocks] = -1
+        y_top = self.height / 2 - (self.wall_height * (1.0 - self.view_height)) / dist_corr
+        y_bottom = self.height / 2 + (self.wall_height * self.view_height) / dist_corr
+        # store these in self.ray_data
+        self.ray_data[x_left:x_right, :] = np.hstack((pick_data, dist_corr[:, None], y_top[:, None], y_bottom[:, None]))
+
+    def cast_rays_grid(self, pos, view, sin_a, cos_a, tan_a, sign_x, sign_y, x_first, y_first):
+
+        # find the closest wall for each ray by calculating all intersections of the rays with the grid lines within view in one go,
+        # and picking the first wall block from those. See raycast_columns() for the arguments.
+        width = np.size(sin_a)
+        rng_width = np.arange(width)
+        # rng_view goes from zero to maximum view length in blocks.
+        rng_view = np.arange(view + 1)  # add 1 to make sure covers the viewable distance as blocks are "rounded down"
+
         # vertical intersections of ray and grid; y coordinate increases/decreases by one, calculate respective x coordinate
         # x_coord_y is the "grid point" (no info on which side of grid) while x_coord_y_adj is the y coordinate adjusted for viewer position relative to it (includes side).
         #   i.e. if grid point is higher than viewer (sign_y = -1), 1 is added to bring x_coord_y_adj to the bottom of that grid point.
@@ -475,31 +579,73 @@ class RayCastingGame:
         # find the closest of these two - distance being item 4
         comb_closest = np.argmin(comb_data[:, :, 4], axis=0)
         # pick these for the closest data
-        pick_data = comb_data[comb_closest, rng_width, :]
-        # y_top and y_bottom are screen y top and bottom coordinates for each x coordinate. Wall height is divided by its distance for each ray (corrected for "fish bowl")
-        dist_corr = pick_data[:, 4] * self.distance_correction
-        # mark the blocks as "-1" when distance > self.view_blocks; these should not be drawn abd data are useless.
-        pick_data[:, 0:2][dist_corr > self.view_blocks] = -1
-        y_top = self.height / 2 - (self.wall_height * (1.0 - self.view_height)) / dist_corr
-        y_bottom = self.height / 2 + (self.wall_height * self.view_height) / dist_corr
-        # store these in self.ray_data
-        self.ray_data[:, :] = np.hstack((pick_data, dist_corr[:, None], y_top[:, None], y_bottom[:, None]))
+        return comb_data[comb_closest, rng_width, :]
+
+    def cast_rays_dda(self, pos, view, sin_a, cos_a, tan_a, sign_x, sign_y, x_first, y_first):
+
+        # find the closest wall for each ray by stepping the rays along the grid lines (DDA) only until they hit a wall, so that the work
+        # follows the distance to the walls, not view_blocks. Coordinates and distances are calculated as in cast_rays_grid, with the same results.
+        # the vertical and the horizontal intersections of each ray are stepped together, see dda_first_walls.
+        width = np.size(sin_a)
+        (line_nr, block) = self.dda_first_walls(
+            np.hstack((self.position[0] + x_first, self.position[1] + y_first)),
+            np.hstack((sign_y * tan_a, -(sign_x / tan_a))),
+            np.hstack((np.full((width), pos[1]), np.full((width), pos[0]))),
+            np.hstack((sign_y, -sign_x)),
+            view)
+        (vert_nr, horiz_nr) = (line_nr[:width], line_nr[width:])
+
+        # vertical intersections of ray and grid; see cast_rays_grid.
+        x_coord = self.position[0] + x_first + vert_nr * (sign_y * tan_a)
+        x_coord_y = pos[1] - (vert_nr + 1) * sign_y
+        x_coord_y_adj = x_coord_y - (np.sign(x_coord_y - pos[1]) - 1) / 2
+        vert_data = (np.vstack((block[:width], sign_y + 1, x_coord, x_coord_y_adj, np.abs((x_coord - self.position[0]) / sin_a)))).transpose()
 
-        # figure out where each block starts and ends. If the same block and side are used continuously, this will be treated as one block.
-        # grid_changes contains the beginning of each block. These blocks can later be drawn in one go each as the source image is the same. Always include first and last.
-        # 1. np.diff: get the difference of each block to the preceding in each of [block, side, x_coord, y_coord].
-        # 2. sum the absolutes of these for each ray.
-        # 3. convert to int16 and get the indexes of each non-zero change. This means block and side changes are always accounted for (are >= 1), but small changes
-        #    (same or the very next) in grid position are not (are < 1).
-        # 4. combine the changes so that also the last ray of the preceding block is included, and add the first and last rays.
-        grid_changes = (np.sum(np.abs(np.diff(self.ray_data[:, :4], n=1, axis=0)), axis=1)).astype(np.int16).nonzero()[0] + 1
-        self.grid_blocks = np.zeros((np.shape(grid_changes)[0] * 2 + 2), np.int16)
-        # grid_blocks[0] = 0                    # first ray - this is already zero
-        self.grid_blocks[1:-1:2] = grid_changes - 1  # the last ray in the block before change
-        self.grid_blocks[2:-1:2] = grid_changes      # the first ray of the block after change
-        self.grid_blocks[-1] = width - 1             # the last ray
+        # horizontal intersections of ray and grid
+        y_coord = self.position[1] + y_first - horiz_nr * (sign_x / tan_a)
+        y_coord_x = pos[0] + (horiz_nr + 1) * sign_x
+        y_coord_x_adj = y_coord_x - (np.sign(y_coord_x - pos[0]) - 1) / 2
+        horiz_data = (np.vstack((block[width:], sign_x + 2, y_coord_x_adj, y_coord, np.abs((y_coord - self.position[1]) / cos_a)))).transpose()
 
-        self.measure_time("calculate")
+        # combine data on vertical and horizontal first encountered walls and pick the closest
+        comb_data = np.stack((vert_data, horiz_data))
+        comb_closest = np.argmin(comb_data[:, :, 4], axis=0)
+        return comb_data[comb_closest, np.arange(width), :]
+
+    def dda_first_walls(self, coord_start, coord_step, line_start, line_sign, view):
+
+        # step rays along grid lines: for each ray, there are two rows (first all vertical intersections, then all horizontal), and the n'th (from 0)
+        # grid line crossed is at line_start - (n + 1) * line_sign, with the other coordinate of the ray there at coord_start + n * coord_step.
+        # all rows not yet finished are stepped together over a batch of grid lines, whose size doubles with each batch, and the rows having hit a wall
+        # are retired. Returns the number of the first grid line with a wall for each row, and the wall block, or view and the "stop block" (-1).
+        rows = np.arange(np.size(coord_start))  # the rows not finished
+        line_nr = np.full(np.shape(rows), view)
+        block = np.full(np.shape(rows), -1, dtype=np.int16)
+        # the map as a flat array: for vertical intersections the coordinate is x and the line y, for horizontal vice versa.
+        map_flat = self.map_array.ravel()
+        is_vert = rows < np.size(rows) // 2
+        coord_max = np.where(is_vert, self.map_size[0], self.map_size[1]) - 1
+        line_max = np.where(is_vert, self.map_size[1], self.map_size[0]) - 1
+        coord_mult = np.where(is_vert, self.map_size[1], 1)
+        line_mult = np.where(is_vert, 1, self.map_size[1])
+        first_nr = 0
+        batch_size = 4
+        while np.size(rows) > 0 and first_nr < view:
+            nrs = np.arange(first_nr, min(first_nr + batch_size, view))
+            coord = (np.minimum(np.maximum(coord_start[rows, None] + nrs * coord_step[rows, None], 0), coord_max[rows, None])).astype(np.int16)
+            line = (np.minimum(np.maximum(line_start[rows, None] - (nrs + 1) * line_sign[rows, None], 0), line_max[rows, None])).astype(np.int16)
+            grid = map_flat[coord * coord_mult[rows, None] + line * line_mult[rows, None]]
+            # find the first nonzero item's index for each row, if any
+            grid_first = (grid != 0).argmax(axis=1)
+            grid_block = grid[np.arange(np.size(rows)), grid_first]
+            hit = grid_block != 0
+            line_nr[rows[hit]] = nrs[grid_first[hit]]
+            block[rows[hit]] = grid_block[hit]
+            rows = rows[~hit]
+            first_nr += batch_size
+            batch_size *= 2
+
+        return (line_nr, block)
 
     def item_handling(self, screen, time):
 
@@ -550,6 +696,7 @@ class RayCastingGame:
                 if item.image_cnt > 0:
                     item.animate(time)  # first animate so that the item.image_used is selected from list correctly.
                     y_size = int((self.item_data[i, 4] - self.item_data[i, 5]) * item.size)  # use room height (in pixels) at item location and item size to determine image height
+                    y_size = int(y_size / self.sprite_size_step + 0.5) * self.sprite_size_step  # rounded for the sprite cache; within one pixel if step is 2
                     x_size = int(y_size * item.image_size[item.image_used, 0] / item.image_size[item.image_used, 1])  # keep aspect ratio by scaling x_size accordingly
                     # image screen x coordinates. Use offsets when image goes outside of screen
                     x_left = int(self.item_data[i, 3] - x_size / 2)
@@ -563,13 +710,23 @@ class RayCastingGame:
                         if np.max(wall_dist) > self.item_data[i, 2]:
                             # if not, we need a scaled item image. check if shading required
                             if self.item_data[i, 2] > self.view_blocks * self.view_shade:
-                                scaled_img_pre = pygame.transform.scale(item.images[item.image_used], (x_size, y_size))
-                                scaled_img_pre.set_alpha(int((self.view_blocks - self.item_data[i, 2]) / (self.view_blocks * (1.0 - self.view_shade)) * 255))
-                                scaled_img = pygame.Surface((x_size, y_size))
-                                scaled_img.blit(scaled_img_pre, (0, 0))
-                                scaled_img.set_colorkey(self.background_color)
+                                alpha = int((self.view_blocks - self.item_data[i, 2]) / (self.view_blocks * (1.0 - self.view_shade)) * 255)
+                                alpha = min(255, int(alpha / self.sprite_alpha_step + 0.5) * self.sprite_alpha_step)
                             else:
-                                scaled_img = pygame.transform.scale(item.images[item.image_used], (x_size, y_size))
+                                alpha = None
+                            # use the cached scaled image if there is one for this image (animation frame), size and shading.
+                            sprite_key = (item.images[item.image_used], y_size, alpha)
+                            scaled_img = self.sprite_cache.get(sprite_key)
+                            if scaled_img is None:
+                                if alpha is not None:
+                                    scaled_img_pre = pygame.transform.scale(item.images[item.image_used], (x_size, y_size))
+                                    scaled_img_pre.set_alpha(alpha)
+                                    scaled_img = pygame.Surface((x_size, y_size))
+                                    scaled_img.blit(scaled_img_pre, (0, 0))
+                                    scaled_img.set_colorkey(self.background_color)
+                                else:
+                                    scaled_img = pygame.transform.scale(item.images[item.image_used], (x_size, y_size))
+                                self.sprite_cache.put(sprite_key, scaled_img)
                             # figure out the x coordinate blocks not behind walls (ie. closer to viewer than wall at x)
                             # pad the check with False on either side to help np.diff find all blocks. Use nonzero()[0] to pick only the changes.
                             wall_check = np.diff(np.hstack((False, (wall_dist > self.item_data[i, 2]), False)), n=1).nonzero()[0]
@@ -616,26 +773,43 @@ class RayCastingGame:
 
     def draw_walls(self, screen):
 
-        # draw the walls, grid block by grid block.
+        # draw the walls, grid block by grid block, in vertical strips of screen columns (see run_strips).
 
-        # obtain a surfarray on screen to modify it pixel by pixel with NumPy
+        # obtain a surfarray on screen to modify it pixel by pixel with NumPy. The walls are drawn as mapped (32 bit) pixels, like the block textures.
         while screen.get_locked():
             screen.unlock()
-        rgb_array_dst = pygame.surfarray.pixels3d(screen)
+        rgb_array_dst = pygame.surfarray.pixels2d(screen)
+
+        # the strips only use the surfarray, so that no pygame calls are made in the render threads. background is the mapped background color.
+        background = screen.map_rgb(self.background_color)
+        self.run_strips(self.draw_walls_columns, 0, self.width, rgb_array_dst, background)
+
+        self.measure_time("draw walls")
+
+    def draw_walls_columns(self, x_start, x_end, rgb_array_dst, background):
+
+        # draw the walls of screen columns x_start to x_end - 1, cutting the grid blocks at the strip edges.
 
         # calculate where floor and ceiling end to be able to clear grid blocks not drawn as walls
         y_floor = self.height / 2 + (self.wall_height * self.view_height) / self.view_blocks  # this is the most distant visible floor y
         y_ceiling = self.height / 2 - (self.wall_height * (1.0 - self.view_height)) / self.view_blocks  # this is the most distant visible ceiling y
+        y_clear_top = max(0, int(y_ceiling - 1))
+        y_clear_bottom = min(int(self.height), int(y_ceiling - 1) + int(y_floor - y_ceiling + 3))
+
+        # the grid blocks in the strip: from the first one ending at or after x_start to the last one starting before x_end
+        first_block = np.searchsorted(self.grid_blocks[1::2], x_start)
+        last_block = np.searchsorted(self.grid_blocks[0::2], x_end)
 
         # process each grid block in one go
-        for i in range(0, np.size(self.grid_blocks), 2):
+        for i in range(first_block * 2, last_block * 2, 2):
+
+            x_left = max(int(self.grid_blocks[i]), x_start)
+            x_right = min(int(self.grid_blocks[i + 1]), x_end - 1)
 
             # check if the wall is visible
             block_nr = int(self.ray_data[self.grid_blocks[i], 0])
             if block_nr > 0:
 
-                x_left = self.grid_blocks[i]
-                x_right = self.grid_blocks[i + 1]
                 x_num = x_right - x_left + 1
                 # y_top and y_bottom are screen y coordinates for each x coordinate.
                 y_top = self.ray_data[x_left:x_right + 1, 6:7]
@@ -646,56 +820,116 @@ class RayCastingGame:
 
                 if y_num > 1:
 
-                    # figure out which image to use
+                    # figure out which image to use; the image data are prepared in the block (see Block.mip_chain)
                     block = self.wall_blocks[block_nr]
                     side_nr = int(self.ray_data[self.grid_blocks[i], 1])
-                    rgb_array_src = pygame.surfarray.pixels3d(block.images[side_nr][int(block.image_used[side_nr])])
-                    (x_size, y_size) = np.shape(rgb_array_src)[0:2]
+                    rgb_array_src = block.mip_textures[side_nr][int(block.image_used[side_nr])]
+                    (x_size, y_size) = block.mip_sizes[side_nr][0]
+
+                    # pick the mip level for each x coordinate: the level where one image pixel is about one screen pixel high, or the full size image
+                    # if the wall is closer. The wall height on screen follows the corrected distance, see self.raycast().
+                    if self.use_mips:
+                        mip_level = np.minimum(np.maximum(np.log2(y_size / (y_bottom[:, 0] - y_top[:, 0])), 0), len(block.mip_sizes[side_nr]) - 1).astype(np.intp)
+                    else:
+                        mip_level = np.zeros((x_num), dtype=np.intp)
+                    x_size = block.mip_sizes[side_nr][mip_level, 0]
+                    y_size = block.mip_sizes[side_nr][mip_level, 1:2]
 
                     # map y coordinates on source image. This will be a (y_num, x_num) array transposed.
                     # if y_top is negative i.e. picture starts above screen area, y_map will be positive for y = 0 (i.e. starting in mid-image).
                     # if y_top > y_min (i.e. image height at x is smaller than the drawing area height, y_map will be negative for y = 0.
-                    # ...and the same for the bottom side.
-                    y_map = ((np.arange(y_min, y_max + 1, dtype=np.int16) - y_top) * y_size / (y_bottom - y_top)).astype(np.int16)
+                    # ...and the same for the bottom side. Rounded down, so that the rows just above the image are not mapped to its first row, and
+                    # the result does not depend on y_min (which depends on the strip, see run_strips).
+                    y_map = np.floor((np.arange(y_min, y_max + 1, dtype=np.int16) - y_top) * y_size / (y_bottom - y_top)).astype(np.int16)
 
                     # map x coordinates on image based on side (0 = up, 1 = right, 2 = down, 3 = left) and the respective map coordinate.
                     # as block size = 1, use the decimal part of map coordinate to find the respective image x coordinate.
-                    # resize the map from one line to all lines (as all lines are the same). This will be a (y_num, x_num) array transposed.
                     if side_nr == 0:
-                        x_map = (np.resize(((0.999999 - (self.ray_data[x_left:x_right + 1, 2] - np.floor(self.ray_data[x_left:x_right + 1, 2])))
-                                            * x_size).astype(np.int16), (y_num, x_num))).transpose()
+                        x_map = ((0.999999 - (self.ray_data[x_left:x_right + 1, 2] - np.floor(self.ray_data[x_left:x_right + 1, 2]))) * x_size).astype(np.int16)
                     elif side_nr == 2:
-                        x_map = (np.resize(((self.ray_data[x_left:x_right + 1, 2] - np.floor(self.ray_data[x_left:x_right + 1, 2]))
-                                            * x_size).astype(np.int16), (y_num, x_num))).transpose()
+                        x_map = ((self.ray_data[x_left:x_right + 1, 2] - np.floor(self.ray_data[x_left:x_right + 1, 2])) * x_size).astype(np.int16)
                     elif side_nr == 1:
-                        x_map = (np.resize(((0.999999 - (self.ray_data[x_left:x_right + 1, 3] - np.floor(self.ray_data[x_left:x_right + 1, 3])))
-                                            * x_size).astype(np.int16), (y_num, x_num))).transpose()
+                        x_map = ((0.999999 - (self.ray_data[x_left:x_right + 1, 3] - np.floor(self.ray_data[x_left:x_right + 1, 3]))) * x_size).astype(np.int16)
                     else:
-                        x_map = (np.resize(((self.ray_data[x_left:x_right + 1, 3] - np.floor(self.ray_data[x_left:x_right + 1, 3]))
-                                            * x_size).astype(np.int16), (y_num, x_num))).transpose()
+                        x_map = ((self.ray_data[x_left:x_right + 1, 3] - np.floor(self.ray_data[x_left:x_right + 1, 3])) * x_size).astype(np.int16)
 
                     # pick the valid pixels i.e. y is mapped inside the source picture (valid is False when y is negative or greater than image height).
                     valid = (y_map >= 0) & (y_map < y_size)
+                    # the image pixel of each screen pixel in the flat mip chain: the level's first pixel, plus the image column and row.
+                    src_map = (block.mip_offsets[side_nr][mip_level] + x_map * y_size[:, 0])[:, None] + y_map
 
                     # draw all pixels of destination range but again dropping out the pixels not mapped on the image.
                     # picking the mapped image coordinates from source data; these arrays will be flattened when applying [valid].
 
                     if np.amax(self.ray_data[x_left:x_right + 1, 4]) > self.view_shade * self.view_blocks:
                         # add shading when objects are far away. Shading applied if max distance (not corrected) > self.view_shade * self.view_blocks
-                        shade = (np.resize(np.minimum(1.0, np.maximum(0.0, (self.view_blocks - self.ray_data[x_left:x_right + 1, 4])
-                                                                      / (self.view_blocks * (1.0 - self.view_shade)))), (y_num, x_num, 1))).transpose(1, 0, 2)
-                        # using shade array to phase the image to black in the distance.
-                        rgb_array_dst[x_left:x_left + x_num, y_min:y_min + y_num][valid] = rgb_array_src[x_map[valid], y_map[valid]] * shade[valid]
+                        shade = np.minimum(1.0, np.maximum(0.0, (self.view_blocks - self.ray_data[x_left:x_right + 1, 4]) / (self.view_blocks * (1.0 - self.view_shade))))
+                        shade_level = (np.resize((shade * (self.shade_levels - 1) + 0.5).astype(np.intp), (y_num, x_num))).transpose()
+                        # using shade levels and the shade tables to phase the image to black in the distance.
+                        rgb_array_dst[x_left:x_left + x_num, y_min:y_min + y_num][valid] = self.shade_pixels(rgb_array_src[src_map[valid]], shade_level[valid])
 
                     else:
                         # no shading required
-                        rgb_array_dst[x_left:x_left + x_num, y_min:y_min + y_num][valid] = rgb_array_src[x_map[valid], y_map[valid]]
+                        rgb_array_dst[x_left:x_left + x_num, y_min:y_min + y_num][valid] = rgb_array_src[src_map[valid]]
 
             else:
                 # if the wall block is not visible, clear the area.
-                screen.fill(self.background_color, (self.grid_blocks[i], y_ceiling - 1, self.grid_blocks[i + 1] - self.grid_blocks[i] + 1, y_floor - y_ceiling + 3))
-
-        self.measure_time("draw walls")
+                rgb_array_dst[x_left:x_right + 1, y_clear_top:y_clear_bottom] = background
+
+    def shade_pixels(self, pixels, shade_level):
+
+        # shade mapped (32 bit) screen pixels to shade levels (from 0 = black to shade_levels - 1 = unchanged) with the shade tables, component by component.
+        level_start = shade_level << 8
+        shaded = self.shade_channel_tables[0][level_start + ((pixels >> self.shade_shifts[0]) & 255)]
+        shaded |= self.shade_channel_tables[1][level_start + ((pixels >> self.shade_shifts[1]) & 255)]
+        shaded |= self.shade_channel_tables[2][level_start + ((pixels >> self.shade_shifts[2]) & 255)]
+        return shaded
+
+    def setup_floor_tables(self):
+
+        # tables for casting the floor and the ceiling. These depend only on the screen size and the field of view, so are calculated once.
+        # floor_row_dist and ceiling_row_dist: the distance of each screen row, counting from the screen edge (bottom or top) towards the middle,
+        # using the same formula as for calculating y_top and y_bottom for wall distance (see self.raycast()).
+        # ray_dir_sin and ray_dir_cos: the direction of each ray (as in self.raycast()) before rotating it to view_angle, divided by the
+        # fishbowl distance correction, so that ray direction * row distance is the map position of the pixel relative to the viewer.
+        y_coord = np.arange(int(np.ceil(self.height / 2)))
+        self.floor_row_dist = (self.wall_height * self.view_height) / (self.height / 2 - y_coord)
+        self.ceiling_row_dist = (self.wall_height * (1.0 - self.view_height)) / (self.height / 2 - y_coord)
+        rad_tan = np.tan(self.view_width * np.pi / 360)
+        rads = np.arctan((np.arange(self.width) / (self.width - 1) - 0.5) * rad_tan * 2) + 0.0001
+        self.ray_dir_sin = np.sin(rads) / self.distance_correction
+        self.ray_dir_cos = np.cos(rads) / self.distance_correction
+
+    def floor_texture(self, pic):
+
+        # the mapped (32 bit) pixels of a floor or ceiling pic, extracted once. The pics are converted to the screen format.
+        # stored in C order, so that the pixels can be picked with a flat index (see floor_map).
+        texture = self.floor_textures.get(pic)
+        if texture is None:
+            texture = np.ascontiguousarray(pygame.surfarray.array2d(pic))
+            self.floor_textures[pic] = texture
+        return texture
+
+    def floor_map(self, texture, block_size, dist, x_left, x_right):
+
+        # flat texture (see floor_texture) index of the floor or ceiling for rays (screen columns) x_left to x_right - 1 and row distances dist.
+        # the ray direction table is rotated to view_angle, and the map position is the viewer position + ray direction * row distance.
+        # this is calculated directly in image coordinates: the viewer position is taken modulo block_size blocks, and moved forward by
+        # whole image sizes so that all coordinates are positive (by the longest ray, so that this does not depend on the columns), and the
+        # remainder within the image is then an integer operation.
+        # single precision is plenty for image coordinates and considerably faster.
+        angle = self.view_angle * np.pi / 180
+        (sin_v, cos_v) = (np.sin(angle), np.cos(angle))
+        dir_x = self.ray_dir_sin[x_left:x_right] * cos_v + self.ray_dir_cos[x_left:x_right] * sin_v
+        dir_y = self.ray_dir_sin[x_left:x_right] * sin_v - self.ray_dir_cos[x_left:x_right] * cos_v
+        dist_32 = dist.astype(np.float32)
+        maps = []
+        for (direction, position, bl_size, size) in ((dir_x, self.position[0], block_size[0], np.shape(texture)[0] // block_size[0]),
+                                                     (dir_y, self.position[1], block_size[1], np.shape(texture)[1] // block_size[1])):
+            image_size = bl_size * size
+            image_start = np.mod(position, bl_size) * size + np.ceil(size * dist[-1] / self.distance_correction[0] / image_size) * image_size
+            maps.append(((direction * size).astype(np.float32)[:, None] * dist_32 + np.float32(image_start)).astype(np.int32) % image_size)
+        return maps[0] * np.shape(texture)[1] + maps[1]
 
     def draw_floor_or_ceiling_visible(self, screen, block_size, pic, is_floor=True):
 
@@ -707,55 +941,35 @@ class RayCastingGame:
         # obtain a surfarray on screen to modify it pixel by pixel with NumPy
         while screen.get_locked():
             screen.unlock()
-        rgb_array_dst = pygame.surfarray.pixels3d(screen)
+        rgb_array_dst = pygame.surfarray.pixels2d(screen)
 
-        rgb_array_src = pygame.surfarray.pixels3d(pic)
-        bl_x_size = block_size[0]
-        bl_y_size = block_size[1]
-        x_size = int(np.shape(rgb_array_src)[0] // bl_x_size)
-        y_size = int(np.shape(rgb_array_src)[1] // bl_y_size)
+        texture = self.floor_texture(pic)
 
-        # using the same formula as for calculating y_top and y_bottom for wall distance (see self.raycast())
-        # we can also calculate distance for each y_coord. This is the same for all rays / viewing angles.
+        # the distance for each y_coord is the same for all rays / viewing angles, see setup_floor_tables.
         if is_floor:
             y_num = int(self.height - np.amin(self.ray_data[:, 7]))
-            y_coord = np.arange(0, y_num)
-            dist = (self.wall_height * self.view_height) / (self.height / 2 - y_coord)
+            dist = self.floor_row_dist[:y_num]
         else:
             y_num = int(np.amax(self.ray_data[:, 6]))
-            y_coord = np.arange(0, y_num)
-            dist = (self.wall_height * (1.0 - self.view_height)) / (self.height / 2 - y_coord)
+            dist = self.ceiling_row_dist[:y_num]
 
         if y_num > 1:
-            # mapping these to our map coordinates simply use distance above and go linearly from viewer position to wall position for each ray
-            x_map = self.position[0] + (self.ray_data[:, 2:3] - self.position[0]) * dist / self.ray_data[:, 5:6]
-            y_map = self.position[1] + (self.ray_data[:, 3:4] - self.position[1]) * dist / self.ray_data[:, 5:6]
-
             # valid pixels are lower than wall bottom (floor) or higher than wall top (ceiling)
-            valid = (np.resize(dist, (self.width, y_num)) < np.repeat(np.minimum(self.ray_data[:, 5:6], self.view_blocks), y_num, axis=1))
-            x_map_valid = (np.mod(x_map[valid], bl_x_size) * x_size).astype(np.int16)
-            y_map_valid = (np.mod(y_map[valid], bl_y_size) * y_size).astype(np.int16)
+            valid = dist < np.minimum(self.ray_data[:, 5:6], self.view_blocks)
+            pixels = np.take(texture, self.floor_map(texture, block_size, dist, 0, self.width)[valid])
 
             if dist[-1] / self.distance_correction[0] > self.view_shade * self.view_blocks:
                 # add shading when floor/ceiling far away. Shading applied if distance (not corrected for fishbowl) > self.view_shade * self.view_blocks
                 shade = (np.minimum(1.0, np.maximum(0.0, (self.view_blocks - dist / self.distance_correction[:, None]) /
-                                                    (self.view_blocks * (1.0 - self.view_shade)))))[:, :, None]
-
-                if is_floor:
-                    rgb_array_dst[:, -1:-1 - y_num:-1][valid] = rgb_array_src[x_map_valid, y_map_valid] * shade[valid]
-                    self.measure_time("draw floor")
-                else:
-                    rgb_array_dst[:, :y_num][valid] = rgb_array_src[x_map_valid, y_map_valid] * shade[valid]
-                    self.measure_time("draw ceiling")
+                                                    (self.view_blocks * (1.0 - self.view_shade)))))
+                pixels = self.shade_pixels(pixels, (shade[valid] * (self.shade_levels - 1) + 0.5).astype(np.intp))
 
+            if is_floor:
+                rgb_array_dst[:, -1:-1 - y_num:-1][valid] = pixels
+                self.measure_time("draw floor")
             else:
-                # no shading needed
-                if is_floor:
-                    rgb_array_dst[:, -1:-1 - y_num:-1][valid] = rgb_array_src[x_map_valid, y_map_valid]
-                    self.measure_time("draw floor")
-                else:
-                    rgb_array_dst[:, :y_num][valid] = rgb_array_src[x_map_valid, y_map_valid]
-                    self.measure_time("draw ceiling")
+                rgb_array_dst[:, :y_num][valid] = pixels
+                self.measure_time("draw ceiling")
 
     def draw_floor_or_ceiling_whole(self, screen, block_size, pic, is_floor=True):
 
@@ -763,6 +977,73 @@ class RayCastingGame:
         # block_size defines how many map blocks the image (pic) should cover in (x, y)
         # if is_floor is False then will draw the ceiling.
         # this version draws the whole floor/ceiling rectangle, not testing for existing walls, so must be run before drawing walls.
+        # row distances and ray directions come from the tables (see setup_floor_tables), so each frame only rotates the ray directions
+        # to the view angle and picks the texture pixels.
+
+        # obtain a surfarray on screen to modify it pixel by pixel with NumPy
+        while screen.get_locked():
+            screen.unlock()
+        rgb_array_dst = pygame.surfarray.pixels2d(screen)
+
+        texture = self.floor_texture(pic)
+        min_block = np.min(self.ray_data[:, 0])  # to test if all blocks are walls i.e. min_block > 0
+
+        if is_floor:
+            y_top = self.height / 2 + (self.wall_height * self.view_height) / self.view_blocks  # this is the most distant visible floor y
+            if min_block > 0:
+                y_num = int(self.height - max(y_top, np.amin(self.ray_data[:, 7])))  # if floor is cut off before y_top by walls, use the highest cut off point
+            else:
+                y_num = int(self.height - y_top)
+            dist = self.floor_row_dist[:y_num]
+            # find the left and right edges of rectangle (ie. do not draw floor/ceiling if wall covers the whole vertical space left or right)
+            x_left = (self.ray_data[:, 7] < self.height).argmax()  # x_left is the first x where y is not below screen
+            x_right = self.width - (np.flip(self.ray_data[:, 7]) < self.height).argmax()  # x_right is the last x where  y is not below screen + 1
+        else:
+            y_bottom = self.height / 2 - (self.wall_height * (1.0 - self.view_height)) / self.view_blocks  # this is the most distant visible ceiling y
+            if min_block > 0:
+                y_num = int(min(y_bottom, np.amax(self.ray_data[:, 6])))  # if ceiling is cut off before y_bottom by walls, use the lowest cut off point
+            else:
+                y_num = int(y_bottom)
+            dist = self.ceiling_row_dist[:y_num]
+            # find the left and right edges of rectangle (ie. do not draw floor/ceiling if wall covers the whole vertical space left or right)
+            x_left = (self.ray_data[:, 6] > 0).argmax()  # x_left is the first x where y is positive
+            x_right = self.width - (np.flip(self.ray_data[:, 6]) > 0).argmax()  # x_right is the last x where y is positive + 1
+
+        if y_num > 1 and x_right > x_left:
+
+            self.run_strips(self.draw_floor_or_ceiling_columns, x_left, x_right, rgb_array_dst, texture, block_size, dist, is_floor)
+            if is_floor:
+                self.measure_time("draw floor")
+            else:
+                self.measure_time("draw ceiling")
+
+    def draw_floor_or_ceiling_columns(self, x_left, x_right, rgb_array_dst, texture, block_size, dist, is_floor):
+
+        # draw the floor or the ceiling of screen columns x_left to x_right - 1 up to row distances dist, see draw_floor_or_ceiling_whole.
+        y_num = np.size(dist)
+        pixels = np.take(texture, self.floor_map(texture, block_size, dist, x_left, x_right))
+
+        # add shading when floor/ceiling far away. Shading applied if distance (not corrected for fishbowl) > self.view_shade * self.view_blocks.
+        # as distance grows by row, only the rows from shade_start on can need it.
+        shade_start = np.searchsorted(dist, self.view_shade * self.view_blocks * self.distance_correction[0], side='right')
+        if shade_start < y_num:
+            shade = (np.minimum(1.0, np.maximum(0.0, (self.view_blocks - dist[shade_start:] / self.distance_correction[x_left:x_right, None]) /
+                                                (self.view_blocks * (1.0 - self.view_shade)))))
+            pixels[:, shade_start:] = self.shade_pixels(pixels[:, shade_start:], (shade * (self.shade_levels - 1) + 0.5).astype(np.intp))
+
+        if is_floor:
+            rgb_array_dst[x_left:x_right, -1:-1 - y_num:-1] = pixels
+        else:
+            rgb_array_dst[x_left:x_right, :y_num] = pixels
+
+    def draw_floor_or_ceiling_direct(self, screen, block_size, pic, is_floor=True):
+
+        # draw the floor or the ceiling - all in one go.
+        # block_size defines how many map blocks the image (pic) should cover in (x, y)
+        # if is_floor is False then will draw the ceiling.
+        # this version draws the whole floor/ceiling rectangle, not testing for existing walls, so must be run before drawing walls.
+        # this is the previous version of draw_floor_or_ceiling_whole, calculating the distance of each row and the map position of each pixel
+        # every frame, and shading with floats. Kept for comparison only (see benchmark_floor).
 
         # obtain a surfarray on screen to modify it pixel by pixel with NumPy
         while screen.get_locked():
@@ -831,6 +1112,92 @@ class RayCastingGame:
                     rgb_array_dst[x_left:x_right, :y_num] = (rgb_array_src[x_map.ravel(), y_map.ravel()]).reshape(x_right - x_left, y_num, 3)
                     self.measure_time("draw ceiling")
 
+    def benchmark_floor(self, frames=100, view_blocks=20.0, max_diff_percent=0.1):
+
+        # compare the cost of casting the full screen floor and ceiling with the tables (draw_floor_or_ceiling_whole) and the previous
+        # version (draw_floor_or_ceiling_direct), from random positions and angles. The walls are left out, so that the floor and the
+        # ceiling cover the screen up to view_blocks away. Prints the average time per frame and the share of pixels the versions
+        # draw clearly differently (mainly at texture pixel borders, as the table driven version uses single precision).
+        # raises a RuntimeError if that share is more than max_diff_percent, i.e. the versions do not draw the same floor and ceiling.
+        rng = np.random.default_rng(1)
+        free_blocks = np.argwhere(self.map_array == 0)
+        self.view_blocks = view_blocks
+        draw_times = {'direct': 0.0, 'table': 0.0}
+        diff_pixels = 0
+        for frame in range(frames):
+            self.position = free_blocks[rng.integers(len(free_blocks))] + rng.random(2) * 0.98 + 0.01
+            self.view_angle = rng.random() * 360.0
+            self.raycast(self.screen, self.block_size)
+            # no walls: keep the ray directions (ray_data columns 2 to 5) but mark the blocks as not visible
+            self.ray_data[:, 0:2] = -1
+            self.ray_data[:, 6:8] = self.height / 2
+            images = {}
+            for (name, draw) in (('direct', self.draw_floor_or_ceiling_direct), ('table', self.draw_floor_or_ceiling_whole)):
+                self.screen.fill(self.background_color)
+                start = perf_counter()
+                draw(self.screen, self.ceiling_block_size, self.pic_ceiling, False)
+                draw(self.screen, self.floor_block_size, self.pic_floor, True)
+                draw_times[name] += perf_counter() - start
+                images[name] = pygame.surfarray.array3d(self.screen).astype(np.int16)
+            diff_pixels += np.count_nonzero(np.max(np.abs(images['direct'] - images['table']), axis=2) > 8)
+
+        print('Floor and ceiling casting at %d x %d, %d frames, view_blocks %.1f:' % (self.width, self.height, frames, view_blocks))
+        print('  per pixel (direct): %8.2f ms per frame' % (draw_times['direct'] * 1000.0 / frames))
+        print('  table driven:       %8.2f ms per frame' % (draw_times['table'] * 1000.0 / frames))
+        # width and height are int16; convert before multiplying to avoid an overflow
+        diff_percent = diff_pixels * 100.0 / (frames * int(self.width) * int(self.height))
+        print('  speedup %.2f x, pixels differing: %.3f %%' % (draw_times['direct'] / draw_times['table'], diff_percent))
+        if diff_percent > max_diff_percent:
+            raise RuntimeError('Table driven floor and ceiling differ from per pixel in %.3f %% of pixels (tolerance %.3f %%)' % (diff_percent, max_diff_percent))
+
+    def benchmark_strips(self, frames=100, worker_counts=None):
+
+        # scaling report for the render threads: cast the rays and draw the ceiling, floor and walls (the parts rendered in strips, see run_strips)
+        # from random positions and angles with each number of render threads, by default 1, 2, 4... up to the number of CPU cores.
+        # prints the average time per frame of each part, the speedup over a single thread and per thread, and whether the frames were
+        # identical to the single threaded ones.
+        if worker_counts is None:
+            cores = os.cpu_count() or 1
+            worker_counts = sorted(set([2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores] + [cores]))
+        rng = np.random.default_rng(1)
+        free_blocks = np.argwhere(self.map_array == 0)
+        views = [(free_blocks[rng.integers(len(free_blocks))] + rng.random(2) * 0.98 + 0.01, rng.random() * 360.0) for frame in range(frames)]
+        parts = ('raycast', 'ceiling + floor', 'walls')
+        single_images = []
+        single_total = None
+
+        print('Strip rendering at %d x %d, %d frames, view_blocks %.1f, %d CPU cores:' % (self.width, self.height, frames, self.view_blocks, os.cpu_count() or 1))
+        print('%8s %10s %16s %10s %10s %9s %10s %10s' % ('workers', 'raycast', 'ceiling + floor', 'walls', 'total ms', 'speedup', 'per core', 'identical'))
+        for workers in worker_counts:
+            self.set_render_workers(workers)
+            part_times = dict((part, 0.0) for part in parts)
+            identical = 0
+            for (frame, (position, angle)) in enumerate(views):
+                self.position = position
+                self.view_angle = angle
+                self.screen.fill(self.background_color)
+                start = perf_counter()
+                self.raycast(self.screen, self.block_size)
+                part_start = perf_counter()
+                part_times['raycast'] += part_start - start
+                self.draw_floor_or_ceiling_whole(self.screen, self.ceiling_block_size, self.pic_ceiling, False)
+                self.draw_floor_or_ceiling_whole(self.screen, self.floor_block_size, self.pic_floor, True)
+                part_times['ceiling + floor'] += perf_counter() - part_start
+                part_start = perf_counter()
+                self.draw_walls(self.screen)
+                part_times['walls'] += perf_counter() - part_start
+                image = pygame.surfarray.array2d(self.screen)
+                if workers == worker_counts[0]:
+                    single_images.append(image)
+                identical += np.array_equal(image, single_images[frame])
+            total = sum(part_times.values())
+            if single_total is None:
+                single_total = total * worker_counts[0]  # if the report does not start from one thread, assume perfect scaling to it
+            print('%8d %10.2f %16.2f %10.2f %10.2f %8.2fx %9.2fx %6d / %d' % (workers, part_times['raycast'] * 1000.0 / frames, part_times['ceiling + floor'] * 1000.0 / frames,
+                                                                       part_times['walls'] * 1000.0 / frames, total * 1000.0 / frames, single_total / total,
+                                                                       single_total / total / workers, identical, frames))
+        self.set_render_workers(1)
+
     def draw_map_view(self, screen, block_size, map_position):
 
         # copies the map on screen and draws the player view on the map.
@@ -1042,14 +1409,7 @@ class RayCastingGame:
     def setup_coin_item(self, position, y_level):
 
         # set up a coin item (itype = 1). Add a random rotation speed element to make coins spin with different frequencies.
-        # pic_coin contains six frames of rotating coin
-        pic1 = self.pic_coin.subsurface((22, 22), (360, 360))
-        pic2 = self.pic_coin.subsurface((416, 22), (732 - 416, 360))
-        pic3 = self.pic_coin.subsurface((794, 22), (968 - 794, 360))
-        pic4 = self.pic_coin.subsurface((190, 450), (250 - 190, 360))
-        pic5 = self.pic_coin.subsurface((418, 450), (590 - 418, 360))
-        pic6 = self.pic_coin.subsurface((670, 450), (984 - 670, 360))
-        self.items.append(Item(1, position, y_level, 0.3, [pic1, pic2, pic3, pic4, pic5, pic6], 50 + np.random.randint(0, 33), 1, self.sound_pling))
+        self.items.append(Item(1, position, y_level, 0.3, self.pic_coin_frames, 50 + np.random.randint(0, 33), 1, self.sound_pling))
 
     def setup_items(self):
 
@@ -1084,6 +1444,11 @@ class RayCastingGame:
         # map display on/off
         self.show_map = not(self.show_map)
 
+    def toggle_dda(self):
+
+        # switch between the ray casting engines
+        self.use_dda = not(self.use_dda)
+
     def toggle_info_display(self):
 
         # info display on/off
@@ -1112,6 +1477,9 @@ class RayCastingGame:
             info_msg = f'dist. to wall:  [n/a]'
         self.plot_info_msg(self.screen_info, 0, y, info_msg)
         y += 15
+        info_msg = f'sprite cache:   {self.sprite_cache.hit_rate() * 100:5.1f}% {self.sprite_cache.bytes / 1048576:5.1f} MB'
+        self.plot_info_msg(self.screen_info, 0, y, info_msg)
+        y += 15
         # add measured times as percentage of total
         tot_time = np.sum(self.timers)
         if tot_time > 0:
@@ -1132,18 +1500,12 @@ class RayCastingGame:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 class Block:
@@ -1161,10 +1523,47 @@ class Block:
                 self.images.append(image_list[0])
                 self.images.append(image_list[0])
             self.image_cnt = np.array([len(self.images[0]), len(self.images[1]), len(self.images[2]), len(self.images[3])])
+            # copy the image data of each side once, with smaller versions of the images for distant walls (see mip_chain), so that drawing needs
+            # no surface access. The images must have been converted to the screen format, and all images of a side must be of the same size.
+            # sides using the same image list share the data.
+            self.mip_textures = []  # for each side, an array of (image, pixel) of mapped (32 bit) pixels, each row all levels of one image
+            self.mip_offsets = []   # for each side, the first pixel of each level in the rows
+            self.mip_sizes = []     # for each side, the (x, y) size of each level
+            for side_images in self.images:
+                for (prev_images, mip_textures, mip_offsets, mip_sizes) in zip(self.images, self.mip_textures, self.mip_offsets, self.mip_sizes):
+                    if prev_images is side_images:
+                        break
+                else:
+                    (mip_textures, mip_offsets, mip_sizes) = self.mip_chain(side_images)
+                self.mip_textures.append(mip_textures)
+                self.mip_offsets.append(mip_offsets)
+                self.mip_sizes.append(mip_sizes)
 
         self.image_used = np.zeros((4), dtype=np.float16)  # this is a float to keep accuracy; int() used when using this.
         self.image_cnt_max = np.amax(self.image_cnt)
 
+    def mip_chain(self, images, min_size=8):
+
+        # build a mip chain of each image: each level is half the size of the previous one, each pixel the average of 2 x 2 pixels, until
+        # the next level would be smaller than min_size. Returns all levels of each image in one row, as mapped (32 bit) pixels, column by
+        # column, the first pixel of each level in the rows, and the (x, y) size of each level.
+        image_levels = []
+        for image in images:
+            rgb = pygame.surfarray.array3d(image).astype(np.uint16)
+            levels = [pygame.surfarray.array2d(image)]
+            while min(np.shape(rgb)[0:2]) >= 2 * min_size:
+                (x_size, y_size) = (np.shape(rgb)[0] // 2, np.shape(rgb)[1] // 2)
+                rgb = (rgb[0:2 * x_size:2, 0:2 * y_size:2] + rgb[1:2 * x_size:2, 0:2 * y_size:2]
+                       + rgb[0:2 * x_size:2, 1:2 * y_size:2] + rgb[1:2 * x_size:2, 1:2 * y_size:2] + 2) // 4
+                level = pygame.Surface((x_size, y_size), 0, image)
+                pygame.surfarray.blit_array(level, rgb.astype(np.uint8))
+                levels.append(pygame.surfarray.array2d(level))
+            image_levels.append(levels)
+        mip_sizes = np.array([np.shape(level) for level in image_levels[0]])
+        mip_offsets = np.hstack((0, np.cumsum(mip_sizes[:, 0] * mip_sizes[:, 1])[:-1]))
+        mip_textures = np.stack([np.hstack([level.ravel() for level in levels]) for levels in image_levels])
+        return (mip_textures, mip_offsets, mip_sizes)
+
     def animate(self, img_add):
 
         # img_add should determine how may images forward to go in the animation list (and may be e.g. 0.4) and naturally should depend on time.
@@ -1206,11 +1605,69 @@ class Item:
         self.active = 0
 
 
+class SpriteCache:
+    """
+    Least recently used cache of scaled item images, keyed by e.g. image, size and shading.
+    Keeps images up to max_bytes in total, dropping the least recently used first. Counts hits and misses for the hit rate.
+    """
+
+    def __init__(self, max_bytes):
+
+        self.max_bytes = max_bytes
+        self.sprites = OrderedDict()  # key: (image, size in bytes), in order of use, the least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+
+        # return the cached image for key, or None if not cached.
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.sprites.move_to_end(key)
+        return sprite[0]
+
+    def put(self, key, image):
+
+        # cache image for key, dropping the least recently used images if over max_bytes. An image bigger than max_bytes is not cached.
+        image_bytes = image.get_pitch() * image.get_height()
+        if image_bytes > self.max_bytes:
+            return
+        if key in self.sprites:
+            self.bytes -= self.sprites.pop(key)[1]
+        self.sprites[key] = (image, image_bytes)
+        self.bytes += image_bytes
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.sprites.popitem(last=False)[1][1]
+
+    def hit_rate(self):
+
+        # share of get() calls finding a cached image
+        return self.hits / max(1, self.hits + self.misses)
+
+
 if __name__ == '__main__':
     """
     Prepare screen, objects etc.
     """
 
+    parser = argparse.ArgumentParser(description='RayCastingGame.')
+    parser.add_argument('--benchmark-floor', type=int, default=0, metavar='FRAMES',
+                        help='compare table driven and per pixel floor and ceiling casting over FRAMES frames headless (no window, no music), then exit')
+    parser.add_argument('--benchmark-threads', type=int, default=0, metavar='FRAMES',
+                        help='report how rendering in strips scales with the number of render threads over FRAMES frames headless, then exit')
+    parser.add_argument('--workers', type=int, default=1, metavar='N', help='render threads for casting rays and drawing walls, floor and ceiling in strips')
+    parser.add_argument('--size', default=None, metavar='WxH', help='screen size, e.g. 1920x1080 (default 720x400, or 1920x1080 for the benchmarks)')
+    args = parser.parse_args()
+    benchmark = args.benchmark_floor > 0 or args.benchmark_threads > 0
+    if benchmark:
+        # no window or sound; this must be set before initializing the display and the mixer
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
     # set screen size
     # first check available full screen modes
     pygame.display.init()
@@ -1220,16 +1677,26 @@ if __name__ == '__main__':
     # disp_size = (1280, 720)
     disp_size = (720, 400)
     # disp_size = (640, 360)
+    if args.size is not None:
+        disp_size = tuple(int(x) for x in args.size.lower().split('x'))
+    elif benchmark:
+        disp_size = (1920, 1080)
 
     pygame.font.init()
     pygame.mixer.init()
-    music_file = "alacrity.mod"  # this mod by Jellybean is available at e.g. http://janeway.exotica.org.uk/
-    pygame.mixer.music.load(music_file)
-    pygame.mixer.music.play(loops=-1)
+    if not benchmark:
+        music_file = "alacrity.mod"  # this mod by Jellybean is available at e.g. http://janeway.exotica.org.uk/
+        pygame.mixer.music.load(music_file)
+        pygame.mixer.music.play(loops=-1)
 
     screen = pygame.display.set_mode(disp_size)
     pygame.display.set_caption('RayCastingGame')
-    RayCastingGame(screen, 60).run()
+    if args.benchmark_floor > 0:
+        RayCastingGame(screen, 60).benchmark_floor(args.benchmark_floor)
+    elif args.benchmark_threads > 0:
+        RayCastingGame(screen, 60).benchmark_strips(args.benchmark_threads)
+    else:
+        RayCastingGame(screen, 60, args.workers).run()
 
     # exit; close display, stop music
     pygame.quit()
@@ -2,6 +2,10 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 
 class RayCasting:
@@ -78,11 +82,8 @@ class RayCasting:
 
         # the following for checking performance only
         self.info_display = True
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
         # set up timers
@@ -93,16 +94,17 @@ class RayCasting:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # initialize timers
-        self.millisecs = pygame.time.get_ticks()
+        self.profiler.restart()
 
     def run(self):
         """
         Main loop.
         """
-        self.millisecs = pygame.time.get_ticks()
+        self.profiler.restart()
 
         while self.running:
             for event in pygame.event.get():
@@ -489,18 +491,12 @@ class RayCasting:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
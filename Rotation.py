@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Rotation matrices shared by the demos.
+
+All demos rotate with the same matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles), built from the
+sines and cosines of the angles (radians). rotation_matrix() builds one matrix and rotation_matrices() many at once, as an
+(N, 3, 3) array, for scenes with many independently rotating objects.
+
+RotationCache keeps the matrices of recently used angles, so that angles not changing between frames, or repeating in a
+loop, are not recalculated. The angles are looked up quantized, i.e. rounded to multiples of quantum: a matrix is calculated
+from the first angles rounding to its key, and then used for any angles rounding to the same key.
+
+@author: kalle
+"""
+import numpy as np
+from collections import OrderedDict
+
+
+def rotation_matrix(angles):
+
+    # the matrix for X, Y, Z rotation for angles (X, Y, Z) in radians
+    (sx, sy, sz) = np.sin(angles)
+    (cx, cy, cz) = np.cos(angles)
+    return np.array([[cy * cz               , -cy * sz              , sy      ],
+                     [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
+                     [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
+
+
+def rotation_matrices(angles):
+
+    # the matrices for X, Y, Z rotation for an (N, 3) array of angles in radians, as an (N, 3, 3) array
+    angles = np.asarray(angles, dtype=np.float64).reshape((-1, 3))
+    (sx, sy, sz) = np.sin(angles).T
+    (cx, cy, cz) = np.cos(angles).T
+    matrices = np.empty((np.shape(angles)[0], 3, 3))
+    matrices[:, 0, 0] = cy * cz
+    matrices[:, 0, 1] = -cy * sz
+    matrices[:, 0, 2] = sy
+    matrices[:, 1, 0] = cx * sz + cz * sx * sy
+    matrices[:, 1, 1] = cx * cz - sx * sy * sz
+    matrices[:, 1, 2] = -cy * sx
+    matrices[:, 2, 0] = sx * sz - cx * cz * sy
+    matrices[:, 2, 1] = cz * sx + cx * sy * sz
+    matrices[:, 2, 2] = cx * cy
+    return matrices
+
+
+class RotationCache:
+    """
+    Rotation matrices of recently used angles.
+
+    quantum:   angles (radians) are looked up rounded to multiples of this.
+    max_size:  at most this many matrices are kept; the least recently used are dropped first.
+
+    @author: kalle
+    """
+
+    def __init__(self, quantum=1e-9, max_size=1024):
+
+        self.quantum = quantum
+        self.max_size = max_size
+        self.cache = OrderedDict()  # matrices by quantized angles, the least recently used first
+        # statistics for the info display and reports
+        self.hits = 0
+        self.misses = 0
+
+    def matrix(self, angles):
+
+        # the rotation matrix for angles (X, Y, Z). The matrix is shared, and must not be changed.
+        key = tuple(np.round(np.asarray(angles) / self.quantum).astype(np.int64).tolist())
+        matrix = self.cache.get(key)
+        if matrix is None:
+            matrix = rotation_matrix(angles)
+            self.misses += 1
+            self.store(key, matrix)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return matrix
+
+    def matrices(self, angles):
+
+        # the rotation matrices for an (N, 3) array of angles, as an (N, 3, 3) array. Those not cached are calculated in one batch.
+        angles = np.asarray(angles, dtype=np.float64).reshape((-1, 3))
+        keys = [tuple(key) for key in np.round(angles / self.quantum).astype(np.int64).tolist()]
+        matrices = np.empty((np.shape(angles)[0], 3, 3))
+        missing = []
+        for (i, key) in enumerate(keys):
+            matrix = self.cache.get(key)
+            if matrix is None:
+                missing.append(i)
+            else:
+                matrices[i] = matrix
+                self.cache.move_to_end(key)
+        self.hits += len(keys) - len(missing)
+        if len(missing) > 0:
+            if len(missing) < 4:
+                # a few matrices are faster to build one by one
+                for i in missing:
+                    matrices[i] = rotation_matrix(angles[i])
+            else:
+                matrices[missing] = rotation_matrices(angles[missing])
+            self.misses += len(missing)
+            for i in missing:
+                self.store(keys[i], matrices[i].copy())
+        return matrices
+
+    def store(self, key, matrix):
+
+        # add a matrix to the cache, dropping the least recently used if it is full
+        self.cache[key] = matrix
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled binary scene files for the vector object data read from XML.
+
+A scene file has a short fixed header, a JSON description of the scene and its arrays, and then the array data,
+each array aligned to 64 bytes. Reading the file memory-maps the array data, so starting from a compiled scene
+does not need to parse the XML or build the movements again.
+The file stores the hash of the source XML file, and is not used if it has changed. If the scene depends on the frame
+rate (e.g. movements interpolated per frame), the target_fps used is stored as well, and the file is not used for
+another target_fps.
+
+@author: kalle
+"""
+import numpy as np
+import hashlib
+import json
+import os
+
+SCENE_MAGIC = b'V3DSCENE'
+SCENE_VERSION = 6
+ALIGN = 64
+
+
+def fileHash(file_name):
+    # SHA-1 of a file's contents, as a hex string.
+    with open(file_name, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def cacheFileName(datafile):
+    # the compiled scene is stored next to the XML file.
+    return os.path.splitext(datafile)[0] + '.scene'
+
+
+def writeScene(cache_file, source_hash, scene, arrays, target_fps=None):
+    """
+    Write a scene to cache_file. scene is a JSON serializable dict, arrays a dict of numpy arrays by name.
+    Arrays with identical contents (e.g. copied objects) are stored only once.
+    target_fps is given if the scene depends on the frame rate, None if not.
+    """
+    array_info = {}
+    blocks = []
+    stored = {}
+    offset = 0
+    for (name, array) in arrays.items():
+        array = np.ascontiguousarray(array)
+        data = array.tobytes()
+        key = (array.dtype.str, data)
+        if key not in stored:
+            stored[key] = offset
+            blocks.append((offset, data))
+            offset += (len(data) + ALIGN - 1) // ALIGN * ALIGN
+        array_info[name] = (array.dtype.str, array.shape, stored[key])
+    header = json.dumps({
+        'source_hash': source_hash,
+        'target_fps': target_fps,
+        'scene': scene,
+        'arrays': array_info
+        }).encode('utf-8')
+    data_start = (len(SCENE_MAGIC) + 8 + len(header) + ALIGN - 1) // ALIGN * ALIGN
+    # write to a temporary file first, so that an interrupted write never leaves a broken scene file behind.
+    with open(cache_file + '.tmp', 'wb') as f:
+        f.write(SCENE_MAGIC)
+        f.write(np.array([SCENE_VERSION, len(header)], dtype='<u4').tobytes())
+        f.write(header)
+        for (block_offset, data) in blocks:
+            f.seek(data_start + block_offset)
+            f.write(data)
+        f.truncate(data_start + offset)
+    os.replace(cache_file + '.tmp', cache_file)
+
+
+def readScene(cache_file, source_hash, target_fps=None):
+    """
+    Read a scene written by writeScene. Returns (scene, arrays), with arrays being read-only views to the memory-mapped file,
+    or None if there is no valid scene file for the given source_hash and target_fps (as given to writeScene).
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    with open(cache_file, 'rb') as f:
+        if f.read(len(SCENE_MAGIC)) != SCENE_MAGIC:
+            return None
+        (version, header_len) = np.frombuffer(f.read(8), dtype='<u4')
+        if version != SCENE_VERSION:
+            return None
+        header = json.loads(f.read(int(header_len)).decode('utf-8'))
+    if header['source_hash'] != source_hash or header.get('target_fps') != target_fps:
+        return None
+    data_start = (len(SCENE_MAGIC) + 8 + int(header_len) + ALIGN - 1) // ALIGN * ALIGN
+    arrays = {}
+    if os.path.getsize(cache_file) > data_start:
+        # plain ndarray views to the memory map; memmap subclass arrays would add overhead to every operation using them.
+        data = np.asarray(np.memmap(cache_file, dtype=np.uint8, mode='r', offset=data_start))
+    for (name, (dtype, shape, offset)) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        if size == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = data[offset:offset + size].view(dtype).reshape(shape)
+    return (header['scene'], arrays)
@@ -3,6 +3,10 @@ import pygame
 import numpy as np
 from os import chdir
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Clipping import clip_polygons, split_polygons, rect_planes
 
 
 class BoxInABox:
@@ -145,30 +149,14 @@ class BoxInABox:
         self.transNodes = ((self.rotatedNodes[:, 0:2] + frame_pos[0:2])
                            / ((self.rotatedNodes[:, 2:3] + frame_pos[2] + self.zPos)) * self.zScale) + self.midScreen
 
+        # crop the outer frame, inner frame and center, each defined by four nodes
+        node_lists = self.cropEdges(self.transNodes[0:12, :].reshape((3, 4, 2)), np.array([4, 4, 4]))
         # draw outer frame
-        node_list = self.cropEdges((
-                self.transNodes[0, :],
-                self.transNodes[1, :],
-                self.transNodes[2, :],
-                self.transNodes[3, :]
-                ))
-        self.drawPolygon(self.screen,  (200, 200, 200),  node_list)
+        self.drawPolygon(self.screen,  (200, 200, 200),  node_lists[0])
         # draw inner frame
-        node_list = self.cropEdges((
-                self.transNodes[4, :],
-                self.transNodes[5, :],
-                self.transNodes[6, :],
-                self.transNodes[7, :]
-                ))
-        self.drawPolygon(self.screen,  (160, 160, 160),  node_list)
+        self.drawPolygon(self.screen,  (160, 160, 160),  node_lists[1])
         # draw black center and store it
-        node_list = self.cropEdges((
-                self.transNodes[ 8, :],
-                self.transNodes[ 9, :],
-                self.transNodes[10, :],
-                self.transNodes[11, :]
-                ))
-        rect = self.drawPolygon(self.screen, (0, 0, 0), node_list)
+        rect = self.drawPolygon(self.screen, (0, 0, 0), node_lists[2])
         if self.frameCount + 1 >= self.frameFrameCount:
             # last draw: store this rect as active drawing area
             self.frameRect = rect
@@ -222,7 +210,8 @@ class BoxInABox:
 
         rect_use = None
         screen_use.lock()
-        # loop through each surface and draw the visible ones.
+        # loop through each surface and pick the visible ones.
+        visible_surfaces = []
         for j in range(6):
             # calculate surface cross product vector
             vec_Viewer = self.rotatedNodes[self.surfaces[j, 1], :] + [0, 0, self.zPos + self.zoomZ]  # vec_Ciewer is from viewers (0, 0, 0) to node 1
@@ -235,21 +224,19 @@ class BoxInABox:
                 ])
             if np.dot(vec_Cross, vec_Viewer) < 0:
                 # surface is visible to Viewer
-                node_list = self.cropEdges((
-                        self.transNodes[self.surfaces[j, 0], :],
-                        self.transNodes[self.surfaces[j, 1], :],
-                        self.transNodes[self.surfaces[j, 2], :],
-                        self.transNodes[self.surfaces[j, 3], :]
-                        ))
-
-                # prepare color
-                color = [int(x * fade) for x in self.boxColors[boxNo, (boxNo + j) % 3]]
-                # draw polygon and store the area used.
-                rect = self.drawPolygon(screen_use, color, node_list)
-                if rect_use is None:
-                    rect_use = rect
-                else:
-                    rect_use = rect_use.union(rect)
+                visible_surfaces.append(j)
+
+        # crop the visible surfaces at once, and draw them
+        node_lists = self.cropEdges(self.transNodes[self.surfaces[visible_surfaces, :], :], np.full((len(visible_surfaces)), 4))
+        for (j, node_list) in zip(visible_surfaces, node_lists):
+            # prepare color
+            color = [int(x * fade) for x in self.boxColors[boxNo, (boxNo + j) % 3]]
+            # draw polygon and store the area used.
+            rect = self.drawPolygon(screen_use, color, node_list)
+            if rect_use is None:
+                rect_use = rect
+            else:
+                rect_use = rect_use.union(rect)
 
         # for other than the first box, blend them to the screen
         if boxNo > 0:
@@ -263,52 +250,15 @@ class BoxInABox:
             # clear the screen copy after use
             self.screenCopy.fill((0, 0, 0), rect_use)
 
-    def cropEdges(self, node_list, cropX=True, cropY=True):
-
-        # crop to screen size. "Auto crop" does not seem to work if points very far outside.
-        # takes list of nodes (X,Y) in drawing order as input.
-        # returns list of nodes (X,Y) cropped to screen edges.
-        # crop both X, Y, if cropX and cropY = True; X: i=0, Y: i=1
-
-        edges = np.zeros((4))
-        edges[0] = self.frameRect[0]
-        edges[1] = self.frameRect[1]
-        edges[2] = self.frameRect[2] + edges[0]  # Rect has left. top, width, height --> change to left, top, right, bottom
-        edges[3] = self.frameRect[3] + edges[1]
-        if self.frameCount >= 180:
-            i = 1
-        if len(node_list) > 2:
-            for i in range(2):
-                if (i == 0 and cropX is True) or (i == 1 and cropY is True):
-                    crop_nodes = []  # empty list
-                    prev_node = node_list[-1]
-                    for node in node_list:
-                        diff_node = node - prev_node  # surface side vector
-                        # start cropping from prev_node direction, as order must stay the same
-                        if node[i] >= edges[i] and prev_node[i] < edges[i]:
-                            # line crosses min, so add a "crop point". Start from previous node and add difference stopping to min
-                            crop_nodes.append(prev_node + diff_node * ((edges[i] - prev_node[i]) / diff_node[i]))
-                        if node[i] <= edges[i+2] and prev_node[i] > edges[i+2]:
-                            # line crosses max, so add a "crop point". Start from previous node and add difference stopping to max
-                            crop_nodes.append(prev_node + diff_node * ((edges[i+2] - prev_node[i]) / diff_node[i]))
-                        # then crop current node
-                        if node[i] < edges[i] and prev_node[i] >= edges[i]:
-                            # line crosses min, so add a "crop point". Start from previous node and add difference stopping to min
-                            crop_nodes.append(prev_node + diff_node * ((edges[i] - prev_node[i]) / diff_node[i]))
-                        if node[i] > edges[i+2] and prev_node[i] <= edges[i+2]:
-                            # line crosses max, so add a "crop point". Start from previous node and add difference stopping to max
-                            crop_nodes.append(prev_node + diff_node * ((edges[i+2] - prev_node[i]) / diff_node[i]))
-                        # always add current node, if it is on screen
-                        if node[i] >= edges[i] and node[i] <= edges[i+2]:
-                            crop_nodes.append(node)
-                        prev_node = node
-                    # for next i, copy results. Quit loop if no nodes to look at
-                    node_list = crop_nodes
-                    if len(node_list) < 3:
-                        break
-            # convert to integers
-            node_list = [(int(x[0] + 0.5), int(x[1] + 0.5)) for x in node_list]
-        return node_list
+    def cropEdges(self, polygons, counts, cropX=True, cropY=True):
+
+        # crop to the drawing area (frameRect). "Auto crop" does not seem to work if points very far outside.
+        # takes an array of polygons of shape (polygons, max nodes, 2), nodes (X,Y) in drawing order, and their node counts.
+        # returns a list of integer node arrays cropped to the drawing area edges; X and Y are cropped if cropX and cropY = True.
+        planes = rect_planes(self.frameRect.left, self.frameRect.top, self.frameRect.right, self.frameRect.bottom, cropX, cropY)
+        (buffer, offsets) = clip_polygons(polygons, counts, planes)
+        # convert to integers
+        return split_polygons((buffer + 0.5).astype(int), offsets)
 
     def drawPolygon(self, screen, color, node_list):
 
@@ -3,6 +3,10 @@ import pygame
 import numpy as np
 from os import chdir
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 class MilkyWay:
     """
@@ -47,11 +51,8 @@ class MilkyWay:
         self.stop = False
         self.rectUsed = [0, 0, 0, 0]
         self.infoDisplay = False
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
 
         self.timer_names.append("draw image")
@@ -60,7 +61,8 @@ class MilkyWay:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         self.angleAdd = np.array([0.7, 0.2, -3.0])
         self.nodes = np.array([
@@ -109,7 +111,7 @@ class MilkyWay:
         self.screenColorize.fill((0, 127, 220))                           # when not using the palette, this will be subtracted and result in continuous red, "clipped" green and blue
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
     def run(self):
         """ Main loop. """
@@ -340,17 +342,11 @@ class MilkyWay:
 
     def measureTime(self, timer_name):
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def nextTimeFrame(self):
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
@@ -3,6 +3,10 @@ import pygame
 import numpy as np
 from scipy.interpolate import interp1d
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 
 class ShadowBobs:
@@ -39,11 +43,8 @@ class ShadowBobs:
         self.running = True
         self.stop = False
         self.infoDisplay = False
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
 
         self.timer_names.append("blend bobs")
@@ -51,7 +52,8 @@ class ShadowBobs:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         self.setPalette()
         self.screen.fill(self.backgroundColor)
@@ -64,7 +66,7 @@ class ShadowBobs:
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
         self.bobTime = self.start_timer
 
         while self.running:
@@ -467,17 +469,11 @@ class ShadowBobs:
 
     def measureTime(self, timer_name):
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def nextTimeFrame(self):
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import pygame
 import numpy as np
-import math
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from VectorEngine import VectorObject, VectorAngles, surface_angles, project_nodes
 
 
 class SideEffectCube:
@@ -45,6 +48,7 @@ class SideEffectCube:
 
         self.prepareCube()
         for VectorObj in self.VectorObjs:
+            VectorObj.initGeometry()  # initialize cross product lengths
             VectorObj.initObject()  # initialize objects
         self.screen.fill(self.backgroundColor)
 
@@ -111,7 +115,7 @@ class SideEffectCube:
             self.zoomDirection = 0  # stop zoom when at the front
         self.totalFrames += 1
         if self.totalFrames == int(self.totalFrameCount / 2):
-            self.VectorObjs[0].rotateSpeed *= 2  # double the rotation speed at half way
+            self.VectorObjs[0].angles.rotate *= 2  # double the rotation speed at half way
         if self.totalFrames == self.totalFrameCount - self.zoomFrameCount:
             self.zoomDirection = -1  # inititate zooming out
         if self.totalFrames >= self.totalFrameCount:
@@ -269,8 +273,8 @@ class SideEffectCube:
 
         # set up two simple cubes. The second one will then be projected on the side of the other.
 
-        vobj = VectorObject()
-        vobj2 = VectorObject()
+        vobj = CubeObject()
+        vobj2 = CubeObject()
         # first add nodes, i.e. the corners of the cube, in (X, Y, Z) coordinates
         node_array = np.array([
                 [ 100.0, 100.0, 100.0],
@@ -304,8 +308,8 @@ class SideEffectCube:
         vobj.addSurfaces( 5, ( 69, 69,170), node_list)
         vobj2.addSurfaces(5, ( 69,170, 69), node_list)
 
-        vobj.rotateSpeed = np.array([2.1, -1.3, 1.55])
-        vobj2.rotateSpeed = np.array([2.75, 1.4, -0.95])
+        vobj.angles.rotate = np.array([2.1, -1.3, 1.55])
+        vobj2.angles.rotate = np.array([2.75, 1.4, -0.95])
 
         # add the object
         self.addVectorObj(vobj)
@@ -320,146 +324,48 @@ class SideEffectCube:
             self.starNodes[i + 5, :] = np.array([(i + 0.5) * 360 / 5, 0.4])
 
 
-class VectorObject:
+class CubeObject(VectorObject):
 
     """
-    Position is the object's coordinates.
-    Nodes are the predefined, static definition of object "corner points", around object position anchor point (0,0,0).
-    RotatedNodes are the Nodes rotated by the given Angles and moved to Position.
-    TransNodes are the RotatedNodes transformed from 3D to 2D (X.Y) screen coordinates.
+    A cube rotating with its own angles (angles.rotate per frame) in front of the viewer, at zPos (see VectorObject).
+    Unlike in the other demos, Z grows away from the viewer.
 
     @author: kalle
     """
     def __init__(self):
-        self.angles = np.array([0.0, 0.0, 0.0])
-        self.angleScale = (2.0 * np.pi) / 360.0             # to scale degrees.
-        self.rotationMatrix = np.zeros((3, 3))
-        self.rotateSpeed = np.array([0.0, 0.0, 0.0])
-        self.nodes = np.zeros((0, 3))                       # nodes will have unrotated X,Y,Z coordinates
-        self.rotatedNodes = np.zeros((0, 3))                # rotatedNodes will have X,Y,Z coordinates after rotation ("final 3D coordinates")
-        self.transNodes = np.zeros((0, 2))                  # transNodes will have X,Y coordinates
-        self.surfaces = []
-
-    def initObject(self):
-        self.updateSurfaceCrossProductVector()
-        self.updateSurfaceCrossProductLen()
-
-    def addNodes(self, node_array):
-        # add nodes (all at once)
-        self.nodes = node_array
-        self.rotatedNodes = node_array  # initialize rotatedNodes with nodes
+        VectorObject.__init__(self)
+        self.angles = VectorAngles()  # own angles for each cube
 
     def addSurfaces(self, idnum, color, node_list):
-        # add a Surface, defining its properties
-        surface = VectorObjectSurface()
-        surface.idnum = idnum
-        surface.color = color
-        surface.nodes = node_list
-        self.surfaces.append(surface)
+        # add a Surface, defining its properties. The cube surfaces have no edges and no back side.
+        VectorObject.addSurfaces(self, idnum, color, 0, 0, color, node_list)
 
     def increaseAngles(self):
-        self.angles += self.rotateSpeed
-        for i in range(3):
-            if self.angles[i] >= 360:
-                self.angles[i] -= 360
-            if self.angles[i] < 0:
-                self.angles[i] += 360
+        self.angles.setRotateAngles()
 
     def setRotationMatrix(self):
-        """ Set matrix for rotation using angles. """
-
-        (sx, sy, sz) = np.sin((self.angles) * self.angleScale)
-        (cx, cy, cz) = np.cos((self.angles) * self.angleScale)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles) including position shift.
-        # add a column of zeros for later position use
-        self.rotationMatrix = np.array([[cy * cz               , -cy * sz              , sy      ],
-                                        [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                                        [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
-    def updateSurfaceCrossProductVector(self):
-        # calculate cross product vector for each surface using rotatedNodes
-        # always use vectors (1, 0) and (1, 2) (numbers representing nodes)
-        # numpy "cross" was terribly slow, calculating directly as below takes about 10 % of the time.
-        for surface in self.surfaces:
-            vec_A = self.rotatedNodes[surface.nodes[2], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_B = self.rotatedNodes[surface.nodes[0], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_Cross = ([
-                vec_B[1] * vec_A[2] - vec_B[2] * vec_A[1],
-                vec_B[2] * vec_A[0] - vec_B[0] * vec_A[2],
-                vec_B[0] * vec_A[1] - vec_B[1] * vec_A[0]
-                ])
-            surface.crossProductVector = vec_Cross
-
-    def updateSurfaceCrossProductLen(self):
-        # calculate cross product vector length for each surface.
-        # this is constant and done only at init stage.
-        for surface in self.surfaces:
-            surface.setCrossProductLen()
+        self.angles.setRotationMatrix()
 
     def updateSurfaceAngleToViewer(self, zPos):
-        # calculate acute angle between surface plane and Viewer
+        # calculate acute angle between surface plane and Viewer, at zPos from the cube.
         # surface plane cross product vector and Viewer vector both from node 1.
-        for surface in self.surfaces:
-            vec_Viewer = self.rotatedNodes[surface.nodes[1], 0:3] + np.array([0, 0, zPos])
-            surface.setAngleToViewer(vec_Viewer)
-            if surface.angleToViewer > 0:
-                surface.visible = 1
-            else:
-                surface.visible = 0
+        vec_Viewer = self.rotatedNodes[self.surfaceNodes[:, 1], 0:3] + np.array([0, 0, zPos])
+        self.surfaceAngleToViewer = surface_angles(self.surfaceCrossProductVector, self.surfaceCrossProductLen, vec_Viewer,
+                                                   np.ones(np.shape(self.surfaceVisible), dtype=bool), self.surfaceAngleToViewer)
+        self.surfaceVisible = np.where(self.surfaceAngleToViewer > 0, 1, 0)
 
     def rotate(self):
         """
-        Apply a rotation defined by a given rotation matrix. First add
+        Apply a rotation defined by the rotation matrix of the cube's angles.
         """
-        self.rotatedNodes = np.dot(self.nodes, self.rotationMatrix)
+        self.rotatedNodes = np.dot(self.nodes[:, 0:3], self.angles.rotationMatrix)
 
     def transform(self, zScale, zPos, midScreen):
         """
         Add screen center.
         """
-        # add zPos and tranform from 3D to 2D; add midScreen to center on screen.
-        self.transNodes = (self.rotatedNodes[:, 0:2] * zScale) / (self.rotatedNodes[:, 2:3] + zPos) + midScreen
-
-
-class VectorObjectSurface:
-
-    """
-    Surfaces for a VectorObject.
-
-    @author: kalle
-    """
-
-    def __init__(self):
-        self.idnum = 0
-        # properties set when defining the object
-        self.nodes = []
-        self.color = (0, 0, 0)
-        # the following are calculated during program execution
-        self.crossProductVector = np.zeros((0, 3))
-        self.crossProductLen = 0.0   # precalculated length of the cross product vector - this is constant
-        self.angleToViewer = 0.0
-        self.angleToLightSource = 0.0
-        self.visible = 1
-
-    def setCrossProductVector(self, crossProductVector):
-        self.crossProductVector = crossProductVector
-
-    def setLightSourceVector(self, lightSourceVector):
-        self.lightSourceVector = lightSourceVector
-
-    def setCrossProductLen(self):
-        self.crossProductLen = self.vectorLen(self.crossProductVector)
-
-    def setAngleToViewer(self, vec_Viewer):
-        if self.crossProductLen > 0 and vec_Viewer.any() != 0:
-            # instead of true angle calculation using asin and vector lengths, a simple np.vdot is sufficient to find the sign (which defines if surface is visible)
-            # self.angleToViewer = math.asin(np.dot(self.crossProductVector, vec_Viewer) / (self.crossProductLen * np.linalg.norm(vec_Viewer)))
-            self.angleToViewer = np.dot(self.crossProductVector, vec_Viewer)
-
-    def vectorLen(self, vector):
-        # equivalent to numpy.linalg.norm for a 3D real vector, but much faster. math.sqrt is faster than numpy.sqrt.
-        return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+        # add zPos and tranform from 3D to 2D; add midScreen to center on screen. Z grows away from the viewer, hence the negative scale.
+        self.transNodes = project_nodes(self.rotatedNodes + np.array([0.0, 0.0, zPos]), -zScale, midScreen)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import pygame
 import numpy as np
+import argparse
+import os
+import sys
 from sys import exit
 import TitleText
 import TheStars
@@ -13,6 +16,8 @@ import TheWorld
 import Raytracing
 import Landscape
 import EndCredits
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from OfflineRender import FrameWriter, FixedClock
 
 
 class SoundVision:
@@ -145,14 +150,11 @@ class SoundVision:
 
             self.stop = True  # do not loop from the start
 
-        # exit; fade out, close display, stop music
+        # fade out; the display is closed by the caller
         pygame.mixer.music.fadeout(2500)
         self.wait(2000)
         self.prepareScreen(True)
 
-        pygame.quit()
-        exit()
-
     def prepareScreen(self, fadeout=False):
 
         # prepare screen for next part.
@@ -244,6 +246,23 @@ if __name__ == '__main__':
     Prepare screen, etc.
     """
 
+    parser = argparse.ArgumentParser(description='Sound Vision demo.')
+    parser.add_argument('--render', default=None, metavar='FILE', help='render offline (no window) to numbered frame files, e.g. frames/frame_%%05d.png (.png, .bmp, .tga, .jpg or .rgb for raw RGB)')
+    parser.add_argument('--encoder', default=None, metavar='COMMAND', help='render offline, piping raw RGB frames to COMMAND; {width}, {height} and {fps} are filled in')
+    parser.add_argument('--size', default=None, metavar='WxH', help='screen size, e.g. 3840x2160')
+    parser.add_argument('--fps', type=int, default=60, help='target frames per second, and the frame rate when rendering offline')
+    parser.add_argument('--writers', type=int, default=2, help='number of threads writing frame files when rendering offline')
+    parser.add_argument('--queue', type=int, default=8, metavar='FRAMES', help='number of rendered frames waiting to be written before rendering waits')
+    args = parser.parse_args()
+    render = args.render is not None or args.encoder is not None
+    if render:
+        # no window, no sound; these must be set before initializing the display and the mixer
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+    # set data directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
     # set screen size
     # first check available full screen modes
     pygame.display.init()
@@ -252,7 +271,9 @@ if __name__ == '__main__':
     # disp_size = disp_modes[9]  # selecting display size from available list. Assuming the 9th element is nice...
     disp_size = (1920, 1080)  # to force display size
     # disp_size = (1280, 720)
-    target_fps = 60  # target frames per second - good to set to monitor refresh rate, but will affect the running speed of some parts.
+    if args.size is not None:
+        disp_size = tuple(int(x) for x in args.size.lower().split('x'))
+    target_fps = args.fps  # target frames per second - good to set to monitor refresh rate, but will affect the running speed of some parts.
 
     # set up screen
     pygame.display.set_caption('Sound Vision')
@@ -264,4 +285,28 @@ if __name__ == '__main__':
     # initialize mixer
     pygame.mixer.init()
 
-    SoundVision(screen, target_fps).run()
+    if render:
+        # a fixed clock advancing one frame per display flip, with each frame written by a FrameWriter
+        frame_writer = FrameWriter(args.render, args.encoder, target_fps, args.writers, args.queue)
+        fixed_clock = FixedClock(frame_writer, target_fps)
+        fixed_clock.install()
+        try:
+            SoundVision(screen, target_fps).run()
+        except BaseException:
+            # write the frames rendered so far, but report the demo's own error rather than any writer error
+            fixed_clock.uninstall()
+            try:
+                frame_writer.close()
+            except Exception:
+                pass
+            raise
+        fixed_clock.uninstall()
+        stats = frame_writer.close()
+        print('%d frames written in %.1f seconds, %.1f fps, %.1f MB/s; rendering waited for the writers %.1f seconds' % (
+            stats['frames'], stats['seconds'], stats['fps'], stats['megabytes_per_second'], stats['renderer_wait_seconds']))
+    else:
+        SoundVision(screen, target_fps).run()
+
+    # exit; close display, stop music
+    pygame.quit()
+    exit()
@@ -3,6 +3,11 @@ import pygame
 import numpy as np
 from os import chdir
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from Rotation import rotation_matrix
 
 
 class TheGlobe:
@@ -50,11 +55,8 @@ class TheGlobe:
         # the following for checking performance only
         self.infoDisplay = False
         self.paused = False
-        self.millisecs = 0
         self.timer_avg_frames = 60
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
 
         # set up timers
@@ -66,11 +68,12 @@ class TheGlobe:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
         self.setupGlobeData()
 
@@ -157,7 +160,7 @@ class TheGlobe:
             [0, self.globeSize, 0],
             [0, 0, self.globeSize]
             ])
-        self.lightRNodes = np.dot(lightNodes, self.rotateMatrix(self.lightAngles * np.pi / 180.0))
+        self.lightRNodes = np.dot(lightNodes, rotation_matrix(self.lightAngles * np.pi / 180.0))
 
     def drawShade(self, layer):
         """
@@ -206,22 +209,9 @@ class TheGlobe:
         self.angles += self.rotation
 
         # rotate all nodes
-        self.rotatedNodes = np.dot(self.nodes, self.rotateMatrix(self.angles))
+        self.rotatedNodes = np.dot(self.nodes, rotation_matrix(self.angles))
         self.measureTime("rotate")
 
-    def rotateMatrix(self, angles):
-        """
-        Calculate and return rotation matrix.
-        """
-        # set matrix for rotation using angles.
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see https://en.wikipedia.org/wiki/Euler_angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                           [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                           [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def drawLand(self):
         """
         Draw the land mass / continents.
@@ -367,17 +357,11 @@ class TheGlobe:
 
     def measureTime(self, timer_name):
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def nextTimeFrame(self):
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
     def setupGlobeData(self):
 
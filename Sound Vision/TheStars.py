@@ -3,6 +3,10 @@ import pygame
 import numpy as np
 from os import chdir
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
 
 
 class TheStars:
@@ -47,16 +51,12 @@ class TheStars:
         # the following for checking performance only
         self.infoDisplay = False
         self.paused = False
-        self.millisecs = 0
         self.timer_avg_frames = 60
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
 
         # set up timers
         self.timer_names.append("clear")
@@ -67,7 +67,8 @@ class TheStars:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
         # set number of stars depending on screen size
         self.nrStars = int(self.width * self.height / 100)
@@ -340,17 +341,11 @@ class TheStars:
 
     def measureTime(self, timer_name):
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def nextTimeFrame(self):
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
 
 
 if __name__ == '__main__':
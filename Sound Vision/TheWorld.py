@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 import pygame
 import numpy as np
-import math
 from os import chdir
 from sys import exit
 from operator import itemgetter
 from scipy.interpolate import interp1d
 import copy
 import xml.etree.ElementTree as et
-from collections import Counter
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+import SceneCache
+from Rasterizer import fill_polygons, map_colors
+from DirtyRects import DirtyRects
+from Clipping import clip_polygons, pad_polygons, split_polygons, rect_planes
+from Rotation import RotationCache
+from VectorEngine import VectorObject, VectorAngles, VectorPosition, surfaceTable
 
 
 class TheWorld:
@@ -25,12 +33,15 @@ class TheWorld:
         self.screen_blends = self.screen.copy()
         self.screen_shadows = self.screen.copy()
         self.use_gfxdraw = False                        # pygame.gfxdraw is "experimental" and may be discontinued.
+        self.useRasterizer = False                      # if True, draw the surfaces of normal objects in batches with the NumPy rasterizer (no antialiasing)
         self.fullScreen = False
+        self.dirtyRects = DirtyRects(self.screen.get_size())   # screen areas drawn, so that only those are cleared and updated on the display
         self.backgroundColor = (0, 0, 0)
         self.fadeSpeed = 5.0                            # controls start and end fade speed (bigger = faster)
         self.fade = 1.0
         self.shadowColor = (140, 140, 140)              # strength of shadow: 255 = black shadow, 0 = no shadow
         self.VectorAnglesList = []
+        self.rotations = RotationCache()                # rotation matrices of recently used angles
         self.VectorMovementList = []
         self.viewerMovement = None
         self.VectorObjs = []
@@ -54,11 +65,8 @@ class TheWorld:
         self.clock = pygame.time.Clock()
         # the following for checking performance only
         self.infoDisplay = False
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1, 1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
 
         # initialize font and set font size
@@ -84,16 +92,18 @@ class TheWorld:
         self.timer_names.append("plot info")
         self.timer_names.append("display flip")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
 
-        self.prepareWorld("vectordata.xml")
+        self.loadWorld("vectordata.xml")
 
         for VectorObj in self.VectorObjs:
+            VectorObj.initGeometry()  # initialize cross product lengths and shadow edges
             VectorObj.initObject()  # initialize objects
 
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
 
         self.screen.fill(self.backgroundColor)
         # "all white" for surfaces used for blending
@@ -118,6 +128,8 @@ class TheWorld:
                         self.toggleFullScreen()
                     if event.key == pygame.K_i:
                         self.toggleInfoDisplay()
+                    if event.key == pygame.K_r:
+                        self.useRasterizer = not self.useRasterizer
                     if event.key == pygame.K_s:
                         # save screen, at half the resolution, using class name as file name
                         pygame.image.save(pygame.transform.scale(self.screen, (int(self.screen.get_size()[0] / 2), int(self.screen.get_size()[1] / 2))),
@@ -145,8 +157,8 @@ class TheWorld:
 
                 self.nextTimeFrame()
 
-                # switch between currently showed and the next screen (prepared in "buffer")
-                pygame.display.flip()
+                # switch between currently showed and the next screen (prepared in "buffer"), updating only the areas changed
+                self.dirtyRects.present()
                 self.measureTime("display flip")
                 self.clock.tick(self.target_fps)  # this keeps code running at max target_fps
                 self.measureTime("wait")
@@ -206,9 +218,10 @@ class TheWorld:
         Then apply the relevant rotation matrix with object position to each VectorObject.
         """
 
-        # calculate rotation matrices for all angle sets
-        for VectorAngles in self.VectorAnglesList:
-            VectorAngles.setRotationMatrix()
+        # calculate rotation matrices for all angle sets at once; angle sets not changed (or seen recently) are taken from the cache
+        matrices = self.rotations.matrices([VectorAngles.rotationAngles() for VectorAngles in self.VectorAnglesList])
+        for (VectorAngles, matrix) in zip(self.VectorAnglesList, matrices):
+            VectorAngles.rotationMatrix = matrix
         self.measureTime("rotation matrix")
 
         # rotate object positions, copy those to objects.
@@ -264,9 +277,9 @@ class TheWorld:
         Draw the VectorObjs on the screen.
         """
 
-        # clear screen. If ground object is used, do clearing there, not here.
+        # clear screen (the areas drawn in the previous frame). If ground object is used, do clearing there, not here.
         if self.groundObject is None:
-            self.screen.fill(self.backgroundColor)
+            self.dirtyRects.clear(self.screen, self.backgroundColor)
             self.measureTime("screen clear")
 
         # first sort VectorObjs so that the most distant is first, but prio classes separately.
@@ -279,8 +292,8 @@ class TheWorld:
             # draw shadows always first for all visible objects
             self.screen_shadows.lock()
             shadow_rect = None
-            for VectorObj in (vobj for vobj in self.VectorObjs if vobj.visible == 1 and vobj.prio == prio_nr and vobj.shadow == 1):
-                node_list = self.cropEdges(VectorObj.shadowTransNodes)
+            shadows = [vobj.shadowTransNodes for vobj in self.VectorObjs if vobj.visible == 1 and vobj.prio == prio_nr and vobj.shadow == 1]
+            for node_list in self.cropEdges(shadows):
                 rect = self.drawPolygon(self.screen_shadows, self.shadowColor, node_list, 0)
                 if shadow_rect is None:
                     shadow_rect = rect
@@ -294,6 +307,7 @@ class TheWorld:
                 while self.screen.get_locked():
                     self.screen.unlock()
                 self.screen.blit(self.screen_shadows, shadow_rect, shadow_rect, pygame.BLEND_MULT)
+                self.dirtyRects.add(shadow_rect)
                 # clear the surface copy after use back to "all white"
                 self.screen_shadows.fill((255, 255, 255), shadow_rect)
                 self.measureTime("draw shadows")
@@ -302,30 +316,40 @@ class TheWorld:
             self.screen.lock()
 
             # draw the actual objects
+            raster_objs = []
             for VectorObj in (vobj for vobj in self.VectorObjs if vobj.visible == 1 and vobj.prio == prio_nr):
 
+                if self.useRasterizer and VectorObj != self.groundObject and VectorObj.isFlat == 0 \
+                        and not np.any((VectorObj.surfaceEdgeWidth > 0) & (VectorObj.surfaceVisible == 1)):
+                    # collect consecutive normal objects and draw them in one batch
+                    raster_objs.append(VectorObj)
+                    continue
+                elif len(raster_objs) > 0:
+                    self.rasterizeObjects(raster_objs)
+                    raster_objs = []
+
                 if VectorObj == self.groundObject:
                     # special object to add ground data
                     transNodes = VectorObj.groundData(self.midScreen, self.zScale, self.objMinZ, self.groundZ, self.groundShadeNr)
                     # draw ground. transNodes is of shape(groundShadeNr + 2, 4) and each row has two (left & right) X,Y coordinates
                     surface = VectorObj.surfaces[0]  # just one ground surface
-                    # the first component is not part of the ground but used to clear the rest of the screen
-                    node_list = self.cropEdges([transNodes[0, 0:2], transNodes[0, 2:4], transNodes[1, 2:4], transNodes[1, 0:2]], False, True)  # X cropped
+                    # crop all parts of the ground at once. The first part is not part of the ground but used to clear the rest of the screen,
+                    # then come the ground shades, and last the whole ground area. X is already cropped.
+                    ground_nodes = np.stack((transNodes[:-1, 0:2], transNodes[:-1, 2:4], transNodes[1:, 2:4], transNodes[1:, 0:2]), axis=1)
+                    ground_nodes = np.vstack((ground_nodes, np.vstack((ground_nodes[1, 0:2, :], ground_nodes[-1, 2:4, :]))[None, :, :]))
+                    ground_lists = self.cropPolygons(ground_nodes, np.full((np.shape(ground_nodes)[0]), 4), False, True)
                     use_color = ([round(self.fade * x, 0) for x in self.backgroundColor])
-                    self.drawPolygon(self.screen, use_color, node_list, 0)
+                    self.dirtyRects.add(self.drawPolygon(self.screen, use_color, ground_lists[0], 0))
                     if self.groundBlendPrio is not None:
                         # fill the whole ground area with one color
-                        node_list = self.cropEdges([transNodes[1, 0:2], transNodes[1, 2:4], transNodes[self.groundShadeNr + 1, 2:4],
-                                                    transNodes[self.groundShadeNr + 1, 0:2]], False, True)  # X already cropped
                         use_color = ([round(self.fade * x, 0) for x in surface.color])
-                        self.drawPolygon(self.screen, use_color, node_list, 0)
+                        self.dirtyRects.add(self.drawPolygon(self.screen, use_color, ground_lists[-1], 0))
                         self.measureTime("ground + clear")
                         # draw the blends needed to "copy surface" for later blitting.
                         self.screen_blends.lock()
                         blend_rect = None
                         for i in range(self.groundShadeNr - 1):
-                            node_list = self.cropEdges([transNodes[i+1, 0:2], transNodes[i+1, 2:4], transNodes[i+2, 2:4],
-                                                        transNodes[i+2, 0:2]], False, True)  # X already cropped
+                            node_list = ground_lists[i + 1]
                             # set color for blending as all R,G,B being between 0 (all blended away) and 255 (no effect)
                             use_color = int((2.55 * self.groundZShade * (self.groundShadeNr - 1 - i) + 255.0 * i) / (self.groundShadeNr - 1) + 0.5)
                             rect = self.drawPolygon(self.screen_blends, (use_color, use_color, use_color), node_list, 0)
@@ -339,29 +363,30 @@ class TheWorld:
                     else:
                         # draw ground directly.
                         for i in range(self.groundShadeNr):
-                            node_list = self.cropEdges([transNodes[i+1, 0:2], transNodes[i+1, 2:4], transNodes[i+2, 2:4],
-                                                        transNodes[i+2, 0:2]], False, True)  # X already cropped
+                            node_list = ground_lists[i + 1]
                             # set color for blending as a percentage of surface color
                             color_shade = self.fade * ((self.groundZShade * (self.groundShadeNr - 1 - i) + 100.0 * i) / (self.groundShadeNr - 1)) / 100.0
                             use_color = ([round(color_shade * x, 0) for x in surface.color])
-                            self.drawPolygon(self.screen, use_color, node_list, surface.edgeWidth)
+                            self.dirtyRects.add(self.drawPolygon(self.screen, use_color, node_list, surface.edgeWidth))
                         self.measureTime("ground + clear")
 
                 else:
                     if VectorObj.isFlat == 1:
                         # flat objects have a single surface and a prebuilt list of transNodes
                         surface = VectorObj.surfaces[0]
-                        node_list = self.cropEdges(VectorObj.transNodes)
-                        self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth)
+                        node_list = self.cropEdges([VectorObj.transNodes])[0]
+                        self.dirtyRects.add(self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth))
                     else:
                         # first sort object surfaces so that the most distant is first. For concave objects there should be no overlap, though.
                         VectorObj.sortSurfacesByZPos()
                         # then draw surface by surface. This is the most common case, the above are for special objects.
-                        for surface in (surf for surf in VectorObj.surfaces if surf.visible == 1):
+                        for surface in (VectorObj.surfaces[surf_nr] for surf_nr in VectorObj.surfaceOrder if VectorObj.surfaceVisible[surf_nr] == 1):
                             # build a list of transNodes for this surface
                             node_list = ([VectorObj.transNodes[node][:2] for node in surface.nodes])
-                            self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth)
+                            self.dirtyRects.add(self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth))
                     self.measureTime("draw surfaces")
+            if len(raster_objs) > 0:
+                self.rasterizeObjects(raster_objs)
 
             if prio_nr == self.groundBlendPrio and blend_rect is not None:
                 # after groundBlendPrio, blit the "multiplied" screen copy to use a sliding color scale
@@ -369,6 +394,7 @@ class TheWorld:
                 while self.screen.get_locked():
                     self.screen.unlock()
                 self.screen.blit(self.screen_blends, blend_rect, blend_rect, pygame.BLEND_MULT)
+                self.dirtyRects.add(blend_rect)
                 self.screen.lock()
                 # clear the surface copy after use back to "all white"
                 self.screen_blends.fill((255, 255, 255), blend_rect)
@@ -387,13 +413,15 @@ class TheWorld:
         while self.screen.get_locked():
             self.screen.unlock()
 
+        info_rects = []
+
         # print viewer angles
         info_msg = (self.viewerMovement.angles.angName + " ang" + ' '*10)[:12]
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[0])))[-6:]
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[1])))[-6:]
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[2])))[-6:]
         f_screen = self.font.render(info_msg, False, [255, 255, 255])
-        self.screen.blit(f_screen, (10, 10))
+        info_rects.append(self.screen.blit(f_screen, (10, 10)))
 
         # print viewer position
         info_msg = ("viewer pos" + ' '*10)[:12]
@@ -401,66 +429,72 @@ class TheWorld:
         info_msg += (' '*10 + str(int(self.VectorPos.position[1])))[-6:]
         info_msg += (' '*10 + str(int(self.VectorPos.position[2])))[-6:]
         f_screen = self.font.render(info_msg, False, [255, 255, 255])
-        self.screen.blit(f_screen, (10, 30))
+        info_rects.append(self.screen.blit(f_screen, (10, 30)))
 
         # print movement loopPos
         info_msg = ("move pos" + ' '*10)[:12]
         for movement in self.VectorMovementList:
             info_msg += (' '*10 + str(int(movement.loopPos)))[-6:]
         f_screen = self.font.render(info_msg, False, [255, 255, 255])
-        self.screen.blit(f_screen, (10, 50))
+        info_rects.append(self.screen.blit(f_screen, (10, 50)))
 
         # add Frames Per Second
         fps = self.clock.get_fps()  # avg frame rate using the last ten frames
         info_msg = ("fps" + ' '*16)[:16] + (' '*10 + str(round(fps, 1)))[-7:]
-        self.screen.blit(self.font.render(info_msg, False, [255, 255, 255]), (10, 90))
+        info_rects.append(self.screen.blit(self.font.render(info_msg, False, [255, 255, 255]), (10, 90)))
 
         # add measured times as percentage of total
         tot_time = np.sum(self.timers)
         if tot_time > 0:
             for i in range(len(self.timer_names)):
                 info_msg = (self.timer_names[i] + ' '*16)[:16] + (' '*10 + str(round(np.sum(self.timers[i, :]) * 100 / tot_time, 1)))[-7:]
-                self.screen.blit(self.font.render(info_msg, False, [255, 255, 255]), (10, 110 + i * 20))
+                info_rects.append(self.screen.blit(self.font.render(info_msg, False, [255, 255, 255]), (10, 110 + i * 20)))
 
+        # the info area is drawn over, and needs clearing, on every frame
+        self.dirtyRects.add(info_rects[0].unionall(info_rects))
         self.measureTime("plot info")
 
-    def cropEdges(self, node_list, cropX=True, cropY=True):
-        # crop to screen size. "Auto crop" does not seem to work if points very far outside.
-        # takes list of nodes (X,Y) in drawing order as input.
-        # returns list of nodes (X,Y) cropped to screen edges.
-        # crop both X, Y, if cropX and cropY = True; X: i=0, Y: i=1
-        if len(node_list) > 2:
-            for i in range(2):
-                if (i == 0 and cropX is True) or (i == 1 and cropY is True):
-                    crop_nodes = []  # empty list
-                    prev_node = node_list[-1]
-                    for node in node_list:
-                        diff_node = node - prev_node  # surface side vector
-                        # start cropping from prev_node direction, as order must stay the same
-                        if node[i] >= 0 and prev_node[i] < 0:
-                            # line crosses 0, so add a "crop point". Start from previous node and add difference stopping to 0
-                            crop_nodes.append(prev_node + diff_node * ((0 - prev_node[i]) / diff_node[i]))
-                        if node[i] <= self.midScreen[i] * 2 and prev_node[i] > self.midScreen[i] * 2:
-                            # line crosses screen maximum, so add a "crop point". Start from previous node and add difference stopping to midScreen[i] * 2
-                            crop_nodes.append(prev_node + diff_node * ((self.midScreen[i] * 2 - prev_node[i]) / diff_node[i]))
-                        # then crop current node
-                        if node[i] < 0 and prev_node[i] >= 0:
-                            # line crosses 0, so add a "crop point". Start from previous node and add difference stopping to 0
-                            crop_nodes.append(prev_node + diff_node * ((0 - prev_node[i]) / diff_node[i]))
-                        if node[i] > self.midScreen[i] * 2 and prev_node[i] <= self.midScreen[i] * 2:
-                            # line crosses screen maximum, so add a "crop point". Start from previous node and add difference stopping to midScreen[i] * 2
-                            crop_nodes.append(prev_node + diff_node * ((self.midScreen[i] * 2 - prev_node[i]) / diff_node[i]))
-                        # always add current node, if it is on screen
-                        if node[i] >= 0 and node[i] <= self.midScreen[i] * 2:
-                            crop_nodes.append(node)
-                        prev_node = node
-                    # for next i, copy results. Quit loop if no nodes to look at
-                    node_list = crop_nodes
-                    if len(node_list) < 3:
-                        break
-            # convert to integers
-            node_list = [(int(x[0] + 0.5), int(x[1] + 0.5)) for x in node_list]
-        return node_list
+    def cropEdges(self, node_lists, cropX=True, cropY=True):
+        # crop polygons to screen size. "Auto crop" does not seem to work if points very far outside.
+        # takes a list of polygons, each a sequence of nodes (X,Y) in drawing order, and crops them all at once.
+        # returns a list of integer node arrays cropped to screen edges; X and Y are cropped if cropX and cropY = True.
+        (polygons, counts) = pad_polygons(node_lists)
+        return self.cropPolygons(polygons, counts, cropX, cropY)
+
+    def cropPolygons(self, polygons, counts, cropX=True, cropY=True):
+        # as cropEdges, for polygons in a padded array of shape (polygons, max nodes, 2) with their node counts (see Clipping.py).
+        (buffer, offsets) = clip_polygons(polygons, counts, rect_planes(0, 0, self.midScreen[0] * 2, self.midScreen[1] * 2, cropX, cropY))
+        # convert to integers
+        return split_polygons((buffer + 0.5).astype(int), offsets)
+
+    def rasterizeObjects(self, VectorObjs):
+
+        # draw the visible surfaces of VectorObjs, in this order, as one batch of polygons.
+        vertices = []
+        polygons = []
+        colors = []
+        node_offset = 0
+        for VectorObj in VectorObjs:
+            VectorObj.sortSurfacesByZPos()
+            for surface in (VectorObj.surfaces[surf_nr] for surf_nr in VectorObj.surfaceOrder if VectorObj.surfaceVisible[surf_nr] == 1):
+                polygons.append([node + node_offset for node in surface.nodes])
+                colors.append(surface.colorRGB(self.fade))
+            vertices.append(VectorObj.transNodes[:, 0:2])
+            node_offset += np.shape(VectorObj.transNodes)[0]
+        if len(polygons) > 0:
+            counts = np.array([len(node_list) for node_list in polygons])
+            # pad the node lists to equal length with their first node
+            polygons = np.array([node_list + node_list[0:1] * (np.max(counts) - len(node_list)) for node_list in polygons])
+            pixels = pygame.surfarray.pixels2d(self.screen)
+            vertices = np.vstack(vertices)
+            fill_polygons(pixels, vertices, polygons, counts, map_colors(self.screen, colors))
+            del pixels
+            # the area drawn is within the bounding rectangle of the vertices used
+            used = vertices[np.unique(polygons)]
+            (x0, y0) = np.floor(np.min(used, axis=0)).astype(int)
+            (x1, y1) = np.ceil(np.max(used, axis=0)).astype(int)
+            self.dirtyRects.add((x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+        self.measureTime("draw surfaces")
 
     def drawPolygon(self, screen, color, node_list, edgeWidth):
 
@@ -498,6 +532,7 @@ class TheWorld:
 
         # toggle between fulls creen and windowed mode
         pygame.display.toggle_fullscreen()
+        self.dirtyRects.force_full()
 
         # # switch between a windowed display and full screen
         # if self.fullScreen is True:
@@ -523,18 +558,168 @@ class TheWorld:
     def measureTime(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def nextTimeFrame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
+
+    def loadWorld(self, datafile):
+        """
+        Load angles, movements and objects. Uses the compiled scene file of datafile, if it is valid for this datafile and target_fps.
+        Otherwise reads datafile (XML) and compiles it to a scene file for the next start.
+        """
+        cache_file = SceneCache.cacheFileName(datafile)
+        source_hash = SceneCache.fileHash(datafile)
+        cached_scene = SceneCache.readScene(cache_file, source_hash, self.target_fps)
+        if cached_scene is None:
+            self.prepareWorld(datafile)
+            (scene, arrays) = self.compileWorld()
+            try:
+                SceneCache.writeScene(cache_file, source_hash, scene, arrays, self.target_fps)
+            except OSError:
+                pass  # e.g. a read-only directory. The data file will then simply be read again next time.
+        else:
+            (scene, arrays) = cached_scene
+            self.buildWorld(scene, arrays)
+
+    def compileWorld(self):
+        """
+        Convert the world (angles, movements, objects and positions) to a JSON serializable scene description and a dict of arrays.
+        References between them are stored as list indexes; -1 is used for None or for angles not in VectorAnglesList.
+        """
+        def listIndex(item_list, item):
+            for (i, list_item) in enumerate(item_list):
+                if list_item is item:
+                    return i
+            return -1
+
+        arrays = {}
+        arrays['angles.angles'] = np.array([angles.angles for angles in self.VectorAnglesList]).reshape((-1, 3))
+        arrays['angles.angleScale'] = np.array([angles.angleScale for angles in self.VectorAnglesList])
+        scene = {
+            'angles': [angles.angName for angles in self.VectorAnglesList],
+            'movements': [],
+            'objects': [],
+            'position': None,
+            'objPrios': self.VectorObjPrios,
+            'viewerMovement': listIndex(self.VectorMovementList, self.viewerMovement),
+            'lightObject': listIndex(self.VectorObjs, self.lightObject),
+            'groundObject': listIndex(self.VectorObjs, self.groundObject),
+            'groundBlendPrio': self.groundBlendPrio
+            }
+        for (i, mov) in enumerate(self.VectorMovementList):
+            scene['movements'].append({
+                'name': mov.moveName,
+                'angles': listIndex(self.VectorAnglesList, mov.angles),
+                'loop': [mov.loopStart, mov.loopEnd, mov.loopPos]
+                })
+            arrays['movement.%d.rotate' % i] = mov.rotate
+            arrays['movement.%d.timeSeries' % i] = mov.timeSeries
+            arrays['movement.%d.moveSeries' % i] = mov.moveSeries
+        for (i, vobj) in enumerate(self.VectorObjs):
+            scene['objects'].append({
+                'name': vobj.objName,
+                'prio': vobj.prio,
+                'shadow': vobj.shadow,
+                'isFlat': vobj.isFlat,
+                'minShade': vobj.minShade,
+                'nodeNum': vobj.nodeNum,
+                'angles': listIndex(self.VectorAnglesList, vobj.angles),
+                'movement': listIndex(self.VectorMovementList, vobj.movement)
+                })
+            arrays['object.%d.position' % i] = vobj.position
+            arrays['object.%d.nodes' % i] = vobj.nodes
+            # surfaces as a table, one row per surface. Surface nodes are padded with -1.
+            max_nodes = max([len(surface.nodes) for surface in vobj.surfaces] + [0])
+            arrays['object.%d.surfaceNodes' % i] = np.array([list(surface.nodes) + [-1] * (max_nodes - len(surface.nodes))
+                                                             for surface in vobj.surfaces], dtype=int).reshape((-1, max_nodes))
+            arrays['object.%d.surfaceIdNum' % i] = np.array([surface.idnum for surface in vobj.surfaces], dtype=int)
+            arrays['object.%d.surfaceColor' % i] = np.array([surface.color for surface in vobj.surfaces], dtype=int).reshape((-1, 3))
+            arrays['object.%d.surfaceBackColor' % i] = np.array([surface.backColor for surface in vobj.surfaces], dtype=int).reshape((-1, 3))
+            arrays['object.%d.surfaceEdgeWidth' % i] = np.array([surface.edgeWidth for surface in vobj.surfaces], dtype=int)
+            arrays['object.%d.surfaceShowBack' % i] = np.array([surface.showBack for surface in vobj.surfaces], dtype=int)
+        if len(self.VectorPos.objects) > 0:
+            scene['position'] = {
+                'name': self.VectorPos.objName,
+                'angles': listIndex(self.VectorAnglesList, self.VectorPos.angles),
+                'objects': [[node_num, listIndex(self.VectorObjs, vobj)] for (node_num, vobj) in self.VectorPos.objects]
+                }
+            arrays['position.position'] = self.VectorPos.position
+            arrays['position.nodes'] = self.VectorPos.nodes
+        return (scene, arrays)
+
+    def buildWorld(self, scene, arrays):
+        """
+        Build the world from a scene description and arrays produced by compileWorld.
+        Static arrays (nodes, movement series) are used as they are, others are copied as they will be changed while running.
+        """
+        for (i, angName) in enumerate(scene['angles']):
+            ang = VectorAngles()
+            ang.angName = angName
+            ang.angles = np.array(arrays['angles.angles'][i, :])
+            ang.angleScale = float(arrays['angles.angleScale'][i])
+            self.addVectorAnglesList(ang)
+
+        for (i, movedata) in enumerate(scene['movements']):
+            mov = VectorMovement()
+            mov.moveName = movedata['name']
+            if movedata['angles'] >= 0:
+                mov.angles = self.VectorAnglesList[movedata['angles']]
+            mov.rotate = np.array(arrays['movement.%d.rotate' % i])
+            mov.addTimeSeries(arrays['movement.%d.timeSeries' % i])
+            mov.addMoveSeries(arrays['movement.%d.moveSeries' % i])
+            (mov.loopStart, mov.loopEnd, mov.loopPos) = movedata['loop']
+            self.addVectorMovementList(mov)
+        if scene['viewerMovement'] >= 0:
+            self.viewerMovement = self.VectorMovementList[scene['viewerMovement']]
+
+        for (i, objdata) in enumerate(scene['objects']):
+            vobj = VectorObject()
+            vobj.objName = objdata['name']
+            vobj.prio = objdata['prio']
+            vobj.shadow = objdata['shadow']
+            vobj.isFlat = objdata['isFlat']
+            vobj.minShade = objdata['minShade']
+            vobj.position = np.array(arrays['object.%d.position' % i])
+            if objdata['angles'] >= 0:
+                vobj.angles = self.VectorAnglesList[objdata['angles']]
+            if objdata['movement'] >= 0:
+                vobj.movement = self.VectorMovementList[objdata['movement']]
+                vobj.movement.addObject(vobj)
+            else:
+                vobj.movement = None
+            vobj.nodeNum = objdata['nodeNum']
+            vobj.nodes = arrays['object.%d.nodes' % i]
+            vobj.rotatedNodes = vobj.nodes[:, 0:3]
+            # the surface table at once. Surface nodes are padded with -1 in the scene file, but with the first node in the table.
+            vobj.setSurfaceTable(*surfaceTable(
+                [[node for node in node_list if node >= 0] for node_list in arrays['object.%d.surfaceNodes' % i].tolist()],
+                arrays['object.%d.surfaceIdNum' % i],
+                arrays['object.%d.surfaceColor' % i],
+                arrays['object.%d.surfaceBackColor' % i],
+                arrays['object.%d.surfaceEdgeWidth' % i],
+                arrays['object.%d.surfaceShowBack' % i]
+                ))
+            self.addVectorObj(vobj)
+        self.VectorObjPrios = list(scene['objPrios'])
+        if scene['lightObject'] >= 0:
+            self.lightObject = self.VectorObjs[scene['lightObject']]
+        if scene['groundObject'] >= 0:
+            self.groundObject = self.VectorObjs[scene['groundObject']]
+        self.groundBlendPrio = scene['groundBlendPrio']
+
+        if scene['position'] is not None:
+            vobj = VectorPosition()
+            vobj.objName = scene['position']['name']
+            vobj.position = np.array(arrays['position.position'])
+            if scene['position']['angles'] >= 0:
+                vobj.angles = self.VectorAnglesList[scene['position']['angles']]
+            vobj.nodes = np.array(arrays['position.nodes'])
+            vobj.rotatedNodes = vobj.nodes[:, 0:3]
+            vobj.addObjects([(node_num, self.VectorObjs[obj_num]) for (node_num, obj_num) in scene['position']['objects']])
+            self.setVectorPos(vobj)
 
     def prepareWorld(self, datafile):
 
@@ -572,18 +757,19 @@ class TheWorld:
             # build movement timeseries array; [0] is time in seconds (if target_fps = movSpeed), [1:4] are positions X,Y,Z, [4:7] are angles X,Y,Z
             movSpeed = float(movements.findtext("speed", default="1"))
             for timedata in movements.iter('timeseries'):
-                mov_times = np.zeros((7, 0))
-                mov_point = np.zeros((7, 1))
+                mov_steps = []  # list of movement steps, collected first and then converted to an array at once
+                mov_point = np.zeros((7))
                 for stepdata in timedata.iter('movementstep'):
                     # steptime = float(stepdata.get("time"))
-                    mov_point[0, 0] = float(stepdata.get("time"))
-                    mov_point[1, 0] = float(stepdata.findtext("movepositionX", default=str(mov_point[1, 0])))
-                    mov_point[2, 0] = float(stepdata.findtext("movepositionY", default=str(mov_point[2, 0])))
-                    mov_point[3, 0] = float(stepdata.findtext("movepositionZ", default=str(mov_point[3, 0])))
-                    mov_point[4, 0] = float(stepdata.findtext("moveangleX", default="0"))
-                    mov_point[5, 0] = float(stepdata.findtext("moveangleY", default="0"))
-                    mov_point[6, 0] = float(stepdata.findtext("moveangleZ", default="0"))
-                    mov_times = np.hstack((mov_times, mov_point))
+                    mov_point[0] = float(stepdata.get("time"))
+                    mov_point[1] = float(stepdata.findtext("movepositionX", default=str(mov_point[1])))
+                    mov_point[2] = float(stepdata.findtext("movepositionY", default=str(mov_point[2])))
+                    mov_point[3] = float(stepdata.findtext("movepositionZ", default=str(mov_point[3])))
+                    mov_point[4] = float(stepdata.findtext("moveangleX", default="0"))
+                    mov_point[5] = float(stepdata.findtext("moveangleY", default="0"))
+                    mov_point[6] = float(stepdata.findtext("moveangleZ", default="0"))
+                    mov_steps.append(mov_point.copy())
+                mov_times = np.array(mov_steps).reshape((-1, 7)).T
                 # sort by time (first row), just in case ordering is wrong
                 mov_times = mov_times[:, mov_times[0, :].argsort()]
                 if viewer == "1":
@@ -651,9 +837,7 @@ class TheWorld:
                 for VectorObj in self.VectorObjs:
                     if VectorObj.objName == str(copyfrom):
                         # copy data from another object
-                        vobj = copy.deepcopy(VectorObj)  # copy properties
-                        vobj.angles = VectorObj.angles   # copy reference to angles, does not seem to work with deepcopy()
-                        vobj.movement = VectorObj.movement  # copy reference to movement, does not seem to work with deepcopy()
+                        vobj = VectorObj.instance()  # copy properties, sharing nodes and surfaces
                         is_copy = True
                         break
 
@@ -821,511 +1005,6 @@ class TheWorld:
             break
 
 
-class VectorObject:
-
-    """
-    Position is the object's coordinates.
-    Nodes are the predefined, static definition of object "corner points", around object position anchor point (0,0,0).
-    RotatedNodes are the Nodes rotated by the given Angles and moved to Position.
-    TransNodes are the RotatedNodes transformed from 3D to 2D (X.Y) screen coordinates.
-
-    @author: kalle
-    """
-
-    def __init__(self):
-        self.position = np.array([0.0, 0.0, 0.0, 1.0])      # position
-        self.nodePosition = np.array([0.0, 0.0, 0.0, 1.0])  # position before rotation
-        self.angles = VectorAngles()
-        self.movement = VectorMovement()
-        self.nodes = np.zeros((0, 4))                       # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
-        self.objRotatedNodes = np.zeros((0, 3))             # objRotatedNodes will have X,Y,Z coordinates after object rotation in place (object angles)
-        self.rotatedNodes = np.zeros((0, 3))                # rotatedNodes will have X,Y,Z coordinates after rotation ("final 3D coordinates")
-        self.transNodes = np.zeros((0, 2))                  # transNodes will have X,Y coordinates
-        self.nodeNum = 0                                    # number of object nodes. nodes, rotatedNodes and transNodes may contain also shadow nodes
-        self.shadow = 0
-        self.shadowNodeList = []                            # list of shadow nodes, in drawing order
-        self.shadowRotatedNodes = np.zeros((0, 3))          # rotatedNodes will have X,Y,Z coordinates
-        self.shadowTransNodes = np.zeros((0, 2))            # transNodes will have X,Y coordinates
-        self.surfaces = []
-        self.visible = 1
-        self.isFlat = 0
-        self.prio = 0                                       # priority order when drawn. Highest prio will be drawn first
-        self.objName = ""
-        self.minShade = 0.2                                 # shade (% of color) to use when surface is parallel to light source
-
-    def initObject(self):
-        self.updateSurfaceZPos()
-        self.updateSurfaceCrossProductVector()
-        self.updateSurfaceCrossProductLen()
-
-    def setPosition(self, position):
-        # move object by giving it a rotated position.
-        self.position = position
-
-    def setNodePosition(self, nodePosition):
-        # move object by giving it an unrotated position.
-        self.nodePosition = nodePosition
-
-    def setFlat(self):
-        # set isFlat
-        self.isFlat = 1
-
-    def addNodes(self, node_array):
-        # add nodes (all at once); add a column of ones for using position in transform
-        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
-        self.rotatedNodes = node_array  # initialize rotatedNodes with nodes (no added ones required)
-
-    def addSurfaces(self, idnum, color, edgeWidth, showBack, backColor, node_list):
-        # add a Surface, defining its properties
-        surface = VectorObjectSurface()
-        surface.idnum = idnum
-        surface.color = color
-        surface.edgeWidth = edgeWidth
-        surface.showBack = showBack
-        surface.backColor = backColor
-        surface.nodes = node_list
-        self.surfaces.append(surface)
-
-    def updateVisiblePos(self, objMinZ):
-        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
-        if self.isFlat == 0 and self.position[2] < objMinZ:
-            self.visible = 0
-        else:
-            self.visible = 1
-
-    def updateVisibleNodes(self, objMinZ):
-        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
-        if self.isFlat == 0:
-            if min(self.rotatedNodes[:, 2]) < objMinZ:
-                self.visible = 0
-            else:
-                self.visible = 1
-        else:
-            # for flat objects, check if the whole object is behind the viewing point (minZ)
-            if max(self.rotatedNodes[:, 2]) < objMinZ:
-                self.visible = 0
-            else:
-                self.visible = 1
-
-    def updateVisibleTrans(self, midScreen):
-        # check if object is visible. If not enough nodes or all X or Y coordinates are outside of screen, set to 0
-        if \
-            np.shape(self.transNodes)[0] < 3 \
-            or max(self.transNodes[:, 0]) < 0 \
-            or min(self.transNodes[:, 0]) > midScreen[0] * 2 \
-            or max(self.transNodes[:, 1]) < 0 \
-            or min(self.transNodes[:, 1]) > midScreen[1] * 2:
-            self.visible = 0
-        else:
-            self.visible = 1
-
-    def updateSurfaceZPos(self):
-        # calculate average Z position for each surface using rotatedNodes
-        for surface in self.surfaces:
-            zpos = sum([self.rotatedNodes[node, 2] for node in surface.nodes]) / len(surface.nodes)
-            surface.setZPos(zpos)
-            surface.setVisible(1)  # set all surfaces to "visible"
-
-    def updateSurfaceCrossProductVector(self):
-        # calculate cross product vector for each surface using rotatedNodes
-        # always use vectors (1, 0) and (1, 2) (numbers representing nodes)
-        # numpy "cross" was terribly slow, calculating directly as below takes about 10 % of the time.
-        for surface in self.surfaces:
-            vec_A = self.rotatedNodes[surface.nodes[2], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_B = self.rotatedNodes[surface.nodes[0], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_Cross = ([
-                vec_B[1] * vec_A[2] - vec_B[2] * vec_A[1],
-                vec_B[2] * vec_A[0] - vec_B[0] * vec_A[2],
-                vec_B[0] * vec_A[1] - vec_B[1] * vec_A[0]
-                ])
-            surface.setCrossProductVector(vec_Cross)
-
-    def updateSurfaceCrossProductLen(self):
-        # calculate cross product vector length for each surface.
-        # this is constant and done only at init stage.
-        for surface in self.surfaces:
-            surface.setCrossProductLen()
-
-    def updateSurfaceAngleToViewer(self):
-        # calculate acute angle between surface plane and Viewer
-        # surface plane cross product vector and Viewer vector both from node 1.
-        for surface in (surf for surf in self.surfaces if surf.visible == 1):
-            vec_Viewer = self.rotatedNodes[surface.nodes[1], 0:3]
-            surface.setAngleToViewer(vec_Viewer)
-            if surface.angleToViewer > 0 or surface.showBack == 1:
-                surface.setVisible(1)
-            else:
-                surface.setVisible(0)
-
-    def updateSurfaceAngleToLightSource(self, lightPosition):
-        # calculate acute angle between surface plane and light source, similar to above for Viewer.
-        # this is used to define shading and shadows; needed for visible surfaces using shading AND all surfaces, if shadow to be drawn.
-        for surface in (surf for surf in self.surfaces if (surf.visible == 1 and self.minShade < 1.0) or self.shadow == 1):
-            surface.setLightSourceVector(self.rotatedNodes[surface.nodes[1], 0:3] - lightPosition)
-            surface.setAngleToLightSource()
-
-    def updateSurfaceColorShade(self):
-        # calculate shade for surface.
-        for surface in (surf for surf in self.surfaces if surf.visible == 1):
-            surface.setColorShade(self.minShade)
-            if surface.showBack == 1:
-                surface.setBackColorShade(self.minShade)
-
-    def sortSurfacesByZPos(self):
-        # sorts surfaces by Z position so that the most distant comes first in list
-        self.surfaces.sort(key=lambda VectorObjectSurface: VectorObjectSurface.zpos, reverse=True)
-
-    def updateShadow(self, viewerAngles, lightNode, light_position, obj_pos, objMinZ, zScale, midScreen):
-        """
-        Update shadowTransNodes (a list of nodes which define the shadow of the object).
-        This routine assumes objects are "whole", that they do not have any holes - such objects should be built as several parts.
-        A more resilient way would be to calculate and draw a shadow for each surface separately, but leading to extra calculations and draws.
-        Update nodes by calculating and adding the required shadow nodes to the array.
-        Note for objects standing on the ground, the nodes where Y=0 are already there and need no calculation / adding.
-        """
-        shadow_edges = []  # list of object edges that belong to surfaces facing the lightsource, i.e. producing a shadow.
-        for surface in (surf for surf in self.surfaces if surf.angleToLightSource > 0 or surf.showBack == 1):
-            # add all egdes using the smaller node nr first in each edge node pair.
-            shadow_edges.extend([((min(surface.nodes[i], surface.nodes[i-1]), max(surface.nodes[i], surface.nodes[i-1]))) for i in range(len(surface.nodes))])
-        # get all edges which are in the list only once - these should define the outer perimeter. Inner edges are used twice.
-        use_edges = [list(c[0]) for c in (d for d in list(Counter(shadow_edges).items()) if d[1] == 1)]
-        # these edges should form a continuous line (the perimeter of the shadowed object). Prepare a list of nodes required:
-        node_list = []
-        node_list.append(use_edges[0][0])  # first node from first edge
-        node_list.append(use_edges[0][1])  # second node from first edge
-        prev_edge = use_edges[0]
-        for i in range(len(use_edges)):
-            if node_list[-1] != node_list[0]:
-                for edge in use_edges:
-                    if edge != prev_edge:  # do not check the edge itself
-                        if edge[0] == node_list[-1]:
-                            node_list.append(edge[1])  # this edge begins with previous node, add its end
-                            prev_edge = edge
-                            break
-                        if edge[1] == node_list[-1]:
-                            node_list.append(edge[0])  # this edge ends with previous node, add its beginning
-                            prev_edge = edge
-                            break
-            else:
-                break  # full circle reached
-        node_list = node_list[0:len(node_list) - 1]  # full circle - drop the last node (is equal to first)
-
-        # then project these nodes on the ground i.e. Y = 0. If necessary. Add the required shadowRotatedNodes.
-        self.shadowRotatedNodes = np.zeros((0, 4))
-        for node_num in range(len(node_list)):
-            node = node_list[node_num]
-            # check that node is not already on the ground level or too high compared to light source
-            if obj_pos[1] + self.objRotatedNodes[node, 1] > 3 and obj_pos[1] + self.objRotatedNodes[node, 1] < (lightNode[1] - 3):
-                # node must be projected. Add a shadow node and replace current node in node_list with it.
-                node_list[node_num] = self.nodeNum + np.shape(self.shadowRotatedNodes)[0]
-                diff_node = (obj_pos + self.objRotatedNodes[node,:]) - lightNode  # vector from lightNode to this node. In this space, Y=0 is ground
-                # the projection multiplier if based on above diff_node where Y=0 is ground, but it can be applied directly to rotatedNodes as well,
-                # skipping one rotation step.
-                diff_rotated_node = self.rotatedNodes[node, :] - light_position
-                self.shadowRotatedNodes = np.vstack((self.shadowRotatedNodes,
-                                                     np.hstack((light_position + diff_rotated_node * (lightNode[1] / -diff_node[1]), 1))))
-
-        # flatten rotated shadow nodes and build a list of shadowTransNodes. shadowTransNodes has all shadow nodes.
-        flat_nodes = np.zeros((0, 2))
-        if node_list[-1] < self.nodeNum:
-            prev_node = self.rotatedNodes[node_list[-1], 0:3]  # previous node XYZ coordinates
-        else:
-            prev_node = self.shadowRotatedNodes[node_list[-1] - self.nodeNum, 0:3]
-        for node_num in range(len(node_list)):
-            if node_list[node_num] < self.nodeNum:
-                node = self.rotatedNodes[node_list[node_num], 0:3]  # current node XYZ coordinates
-            else:
-                node = self.shadowRotatedNodes[node_list[node_num] - self.nodeNum, 0:3]
-            diff_node = node - prev_node  # surface side vector
-            # if both Z coordinates behind the viewer: do not draw at all, do not add a transNode
-            if (node[2] < objMinZ and prev_node[2] >= objMinZ) or (node[2] >= objMinZ and prev_node[2] < objMinZ):
-                # line crosses objMinZ, so add a "crop point". Start from previous node and add difference stopping to objMinZ. Flatten to 2D.
-                f_node = prev_node + diff_node * ((objMinZ - prev_node[2]) / diff_node[2])
-                flat_nodes = np.vstack((flat_nodes, (-f_node[0:2] * zScale) / f_node[2:3] + midScreen))
-            if node[2] >= objMinZ:
-                # add current node, if it is visible
-                if node_list[node_num] < self.nodeNum:
-                    flat_nodes = np.vstack((flat_nodes, self.transNodes[node_list[node_num], 0:2]))  # object node on the ground, already calculated
-                else:
-                    flat_nodes = np.vstack((flat_nodes, (-node[0:2] * zScale) / node[2:3] + midScreen))  # shadow node, needs flattening 3D to 2D
-            prev_node = node
-        self.shadowTransNodes = flat_nodes
-
-    def rotate(self, viewerAngles):
-        """
-        Apply a rotation defined by a given rotation matrix.
-        For objects with their own angles / rotation matrix, apply those first and store results in objRotatedNodes.
-        Could be done in one step but objRotatedNodes needed for shadow calculations.
-        """
-
-        if self.angles != viewerAngles:
-            # rotate object with its own angles "in place" ie. with synthetic zero vector as position
-            matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1, 3))))
-            self.objRotatedNodes = np.dot(self.nodes, matrix)
-        else:
-            # no own angles, just copy nodes then
-            self.objRotatedNodes = self.nodes[:, 0:3]
-        # then rotate with viewer angles. Add position to rotation matrix to enable both rotation and position change at once
-        matrix = np.vstack((viewerAngles.rotationMatrix, self.position[0:3]))
-        self.rotatedNodes = np.dot(np.hstack((self.objRotatedNodes, np.ones((np.shape(self.objRotatedNodes)[0], 1)))), matrix)
-
-    def transform(self, midScreen, zScale, objMinZ):
-        """
-        Flatten from 3D to 2D and add screen center.
-        First crop flat objects by Z coordinate so that they can be drawn even if some Z coordinates are behind the viewer.
-        """
-        if self.isFlat == 1:
-            # for flat objects, build a list of transNodes for the surface by first cropping the necessary surface sides to minZ
-            for surface in self.surfaces:
-                surface.setVisible(1)  # set all surfaces to "visible"
-                flat_nodes = np.zeros((0, 3))
-                for node_num in range(len(surface.nodes)):
-                    node = self.rotatedNodes[surface.nodes[node_num], 0:3]  # current node XYZ coordinates
-                    prev_node = self.rotatedNodes[surface.nodes[node_num - 1], 0:3]  # previous node XYZ coordinates
-                    diff_node = node - prev_node  # surface side vector
-                    # if both Z coordinates behind the viewer: do not draw at all, do not add a transNode
-                    if (node[2] < objMinZ and prev_node[2] >= objMinZ) or (node[2] >= objMinZ and prev_node[2] < objMinZ):
-                        # line crosses objMinZ, so add a "crop point". Start from previous node and add difference stopping to objMinZ
-                        flat_nodes = np.vstack((flat_nodes, prev_node + diff_node * ((objMinZ - prev_node[2]) / diff_node[2])))
-                    if node[2] >= objMinZ:
-                        # add current node, if it is visible
-                        flat_nodes = np.vstack((flat_nodes, node))
-                # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes
-                self.transNodes = (-flat_nodes[:, 0:2] * zScale) / (flat_nodes[:, 2:3]) + midScreen
-        else:
-            # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes.
-            # for normal objects, some of the transNodes will not be required, but possibly figuring out which are and processing them
-            #   individually could take more time than this.
-            self.transNodes = (self.rotatedNodes[:, 0:2] * zScale) / (-self.rotatedNodes[:, 2:3]) + midScreen
-
-    def groundData(self, midScreen, zScale, objMinZ, groundZ, groundShadeNr):
-        """
-        Calculate ground data for on a ground object.
-        Assumes the ground object "covers the ground" reasonably and isFlat = 1, has 4 nodes, and the perimeter is concave.
-        Ground settings are defined in VectorViewer.
-        Returns an array of shape(groundShadeNr + 2, 4) where each row has X,Y of left edge and X.Y of right edge starting from most distant.
-        The first array is used to clear the screen above the ground (so in effect this covers the whole screen).
-        """
-        # find the most distant node
-        maxZ = max(self.rotatedNodes[:, 2])
-        for nodenum in range(len(self.nodes)):
-            if self.rotatedNodes[nodenum, 2] == maxZ:
-                node = self.rotatedNodes[nodenum, :]
-                break
-        prev_node = self.rotatedNodes[nodenum - 1, :]
-        if nodenum == len(self.nodes) - 1:
-            next_node = self.rotatedNodes[0, :]
-        else:
-            next_node = self.rotatedNodes[nodenum + 1, :]
-
-        # get a straight line where Z (ie, distance from viewer) is constant. Start with the mid of farthest of the two lines.
-        # then find the point with matching Z coordinate on the other line.
-        # special cases: next_node or prev_node as far as node.
-        if node[2] == prev_node[2]:
-            mid1_node = node
-            mid2_node = prev_node
-        else:
-            if node[2] == next_node[2]:
-                mid1_node = node
-                mid2_node = next_node
-            else:
-                if next_node[2] > prev_node[2]:
-                    mid1_node = (next_node + node) / 2
-                    mid2_node = node + (prev_node - node) * (mid1_node[2] - node[2]) / (prev_node[2] - node[2])
-                else:
-                    mid1_node = (prev_node + node) / 2
-                    mid2_node = node + (next_node - node) * (mid1_node[2] - node[2]) / (next_node[2] - node[2])
-        if mid1_node[1] < mid2_node[1]:
-            # make sure mid1_node X < mid2_node X
-            mid1_node, mid2_node = mid2_node, mid1_node
-        # adjust Z
-        mid1_node = mid1_node * groundZ / mid1_node[2]
-        mid2_node = mid2_node * groundZ / mid2_node[2]
-        # finalize a square around object position
-        mid2_node_back = self.position[0:3] + (self.position[0:3] - mid1_node)  # from front left (mid1) to back right (mid2_back)
-        mid1_node_back = self.position[0:3] + (self.position[0:3] - mid2_node)  # from front right (mid2) to back left (mid1_back)
-
-        # then generate arrays with necessary node data and transNode data
-        left_nodes = np.zeros((groundShadeNr + 1, 3), dtype=float)
-        right_nodes = np.zeros((groundShadeNr + 1, 3), dtype=float)
-        # multipliers will span ground component span between groundZ/2 (furthest) and objMinZ
-        mult = (mid1_node[2] / 2 - objMinZ) / ((mid1_node[2] - mid1_node_back[2]) / 2)
-        # the most distant component (at groundZ). Most distant component will be very large (half of total)
-        left_nodes[0, :] = mid1_node
-        right_nodes[0, :] = mid2_node
-
-        # other components from groundZ/2 to objMinZ
-        for i in range(groundShadeNr):
-            mult_i = mult * math.sqrt((i+1) / groundShadeNr)
-            left_nodes[i+1, :] = (mid1_node * (1.0 - mult_i) + mid1_node_back * mult_i) / 2
-            right_nodes[i+1, :] = (mid2_node * (1.0 - mult_i) + mid2_node_back * mult_i) / 2
-        left_transNodes = (-left_nodes[:, 0:2] * zScale) / (left_nodes[:, 2:3]) + midScreen
-        right_transNodes = (-right_nodes[:, 0:2] * zScale) / (right_nodes[:, 2:3]) + midScreen
-
-        # crop these nodes to screen X edges
-        diff_transNodes = right_transNodes - left_transNodes
-        mult_nodes = right_transNodes[:, 0] / diff_transNodes[:, 0]
-        left_transNodes = right_transNodes - np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
-        diff_transNodes = right_transNodes - left_transNodes
-        mult_nodes = (midScreen[0] * 2) / diff_transNodes[:, 0]
-        right_transNodes = left_transNodes + np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
-
-        # the first component is "the top of the sky".
-        if left_transNodes[0, 1] < left_transNodes[1, 1]:
-            # "normal ground", add a node to the top of the screen
-            if left_transNodes[0, 1] < 0:
-                # if ground already covers the whole screen, use the top node
-                left_skynode = left_transNodes[0, :]
-            else:
-                left_skynode = np.array([0, 0])
-        else:
-            # inverted ground ie. going upside down, add a node to the bottom of the screen
-            if left_transNodes[0, 1] > midScreen[1] * 2:
-                # if ground already covers the whole screen, use the top node
-                left_skynode = left_transNodes[0, :]
-            else:
-                left_skynode = np.array([0, midScreen[1] * 2])
-        if right_transNodes[0, 1] < right_transNodes[1, 1]:
-            # "normal ground", add a node to the top of the screen
-            if right_transNodes[0, 1] < 0:
-                # if ground already covers the whole screen, use the top node
-                right_skynode = right_transNodes[0, :]
-            else:
-                right_skynode = np.array([midScreen[0] * 2, 0])
-        else:
-            # inverted ground ie. going upside down, add a node to the bottom of the screen
-            if right_transNodes[0, 1] > midScreen[1] * 2:
-                # if ground already covers the whole screen, use the top node
-                right_skynode = right_transNodes[0, :]
-            else:
-                right_skynode = midScreen * 2
-        # add the first component and build an array of all the transnodes
-        transNodes = np.vstack((np.hstack((left_skynode, right_skynode)), np.hstack((left_transNodes, right_transNodes))))
-
-        return(transNodes)
-
-
-class VectorObjectSurface:
-
-    """
-    Surfaces for a VectorObject.
-
-    @author: kalle
-    """
-
-    def __init__(self):
-        self.idnum = 0
-        # properties set when defining the object
-        self.nodes = []
-        self.color = (0, 0, 0)
-        self.edgeWidth = 0           # if 0, fills surface. Otherwise a wireframe (edges only), with edgeWidth thickness.
-        # the following are calculated during program execution
-        self.zpos = 0.0
-        self.crossProductVector = np.zeros((0, 3))
-        self.crossProductLen = 0.0   # precalculated length of the cross product vector - this is constant
-        self.lightSourceVector = np.zeros((0, 3))
-        self.angleToViewer = 0.0
-        self.angleToLightSource = 0.0
-        self.visible = 1
-        self.colorShade = 1.0        # Shade of color; 0 = black, 1 = full color
-
-    def setZPos(self, zpos):
-        self.zpos = zpos
-
-    def setVisible(self, visible):
-        self.visible = visible
-
-    def setCrossProductVector(self, crossProductVector):
-        self.crossProductVector = crossProductVector
-
-    def setLightSourceVector(self, lightSourceVector):
-        self.lightSourceVector = lightSourceVector
-
-    def setCrossProductLen(self):
-        self.crossProductLen = self.vectorLen(self.crossProductVector)
-
-    def setAngleToViewer(self, vec_Viewer):
-        if self.crossProductLen > 0 and vec_Viewer.any() != 0:
-            # instead of true angle calculation using asin and vector lengths, a simple np.vdot is sufficient to find the sign
-            #     (which defines if surface is visible)
-            # self.angleToViewer = math.asin(np.dot(self.crossProductVector, vec_Viewer) / (self.crossProductLen * np.linalg.norm(vec_Viewer)))
-            self.angleToViewer = np.dot(self.crossProductVector, vec_Viewer)
-
-    def setAngleToLightSource(self):
-        if self.crossProductLen > 0 and self.lightSourceVector.any() != 0:
-            # instead of true angle calculation using asin and vector lengths, a simple np.vdot is sufficient to find the sign
-            #     (which defines if surface is shadowed)
-            # self.angleToLightSource = math.asin(np.dot(self.crossProductVector, self.lightSourceVector)
-            #     / (self.crossProductLen * np.linalg.norm(self.lightSourceVector))) / (np.pi / 2)
-            self.angleToLightSource = np.dot(self.crossProductVector, self.lightSourceVector)
-
-    def setColorShade(self, minShade):
-        if self.angleToLightSource <= 0:
-            self.colorShade = minShade
-        else:
-            self.colorShade = minShade + (1.0 - minShade) * math.asin(self.angleToLightSource
-                                                                      / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
-
-    def setBackColorShade(self, minShade):
-        if self.angleToLightSource >= 0:
-            self.backColorShade = minShade
-        else:
-            self.backColorShade = minShade + (1.0 - minShade) * -math.asin(self.angleToLightSource
-                                                                           / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
-
-    def colorRGB(self, fade):
-        if self.angleToViewer > 0:
-            use_color = ([round(fade * self.colorShade * x, 0) for x in self.color])  # apply shading
-        else:
-            use_color = ([round(fade * self.backColorShade * x, 0) for x in self.backColor])  # apply shading to backside color
-        return use_color
-
-    def vectorLen(self, vector):
-        # equivalent to numpy.linalg.norm for a 3D real vector, but much faster. math.sqrt is faster than numpy.sqrt.
-        return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
-
-
-class VectorAngles:
-
-    """
-    Angles for rotating vector objects. For efficiency, one set of angles can be used for many objects.
-    Angles are defined for axes X (horizontal), Y (vertical), Z ("distance") in degrees (360).
-
-    @author: kalle
-    """
-
-    def __init__(self):
-        self.angles = np.array([0.0, 0.0, 0.0])
-        self.angleScale = (2.0 * np.pi) / 360.0  # to scale degrees.
-        self.angName = ""
-        self.rotationMatrix = np.zeros((3, 3))
-        self.rotateAngles = np.array([0.0, 0.0, 0.0])
-        self.rotate = np.array([0.0, 0.0, 0.0])
-
-    def setAngles(self, angles):
-        # Set rotation angles to fixed values.
-        self.angles = angles
-
-    def setRotateAngles(self):
-        self.rotateAngles += self.rotate
-        for i in range(3):
-            if self.rotateAngles[i] >= 360:
-                self.rotateAngles[i] -= 360
-            if self.rotateAngles[i] < 0:
-                self.rotateAngles[i] += 360
-
-    def setRotationMatrix(self):
-        # Set matrix for rotation using angles.
-
-        (sx, sy, sz) = np.sin((self.angles + self.rotateAngles) * self.angleScale)
-        (cx, cy, cz) = np.cos((self.angles + self.rotateAngles) * self.angleScale)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        self.rotationMatrix = np.array([[cy * cz               , -cy * sz              , sy      ],
-                                        [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                                        [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
-
 class VectorMovement:
 
     """
@@ -1375,37 +1054,6 @@ class VectorMovement:
         self.objects.append(VectorObject)
 
 
-class VectorPosition:
-
-    """
-    A vector object defining the positions of other objects in its nodes (see VectorObject).
-
-    @author: kalle
-    """
-
-    def __init__(self):
-        self.position = np.array([0.0, 0.0, 0.0, 1.0])
-        self.angles = VectorAngles()
-        self.nodes = np.zeros((0, 4))                   # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
-        self.rotatedNodes = np.zeros((0, 3))            # rotatedNodes will have X,Y,Z coordinates
-        self.objects = []                               # connects each node to a respective VectorObject
-        self.objName = ""
-
-    def addNodes(self, node_array):
-        # add nodes (all at once); add a column of ones for using position in transform
-        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
-        self.rotatedNodes = node_array  # initialize with nodes
-
-    def addObjects(self, object_list):
-        self.objects = object_list
-
-    def rotate(self):
-        # apply a rotation defined by a given rotation matrix.
-        matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1, 3))))
-        # apply rotation and position matrix to nodes
-        self.rotatedNodes = np.dot(self.nodes + self.position, matrix)
-
-
 if __name__ == '__main__':
     """
     Prepare screen & music and run.
@@ -1435,4 +1083,3 @@ if __name__ == '__main__':
     # exit; close display, stop music
     pygame.quit()
     exit()
-
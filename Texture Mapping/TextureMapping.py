@@ -2,6 +2,12 @@
 import pygame
 import numpy as np
 from sys import exit
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+from DirtyRects import DirtyRects
+from Rotation import rotation_matrix
 
 
 class TextureMapping:
@@ -48,6 +54,7 @@ class TextureMapping:
         self.rotated_nodes = np.zeros((16, 3))              # rotated_nodes will have X,Y,Z coordinates after rotation ("final 3D coordinates")
         self.trans_nodes = np.zeros((0, 2))                 # trans_nodes will have X,Y screen coordinates
         self.screen_rect = pygame.Rect((self.mid_screen), (1, 1))
+        self.dirty_rects = DirtyRects((self.width, self.height))  # screen areas changed, so that only those are updated on the display
 
         self.image_A = pygame.image.load('Alphaks.jpg').convert()
         self.image_array_A = pygame.surfarray.pixels2d(self.image_A)
@@ -116,10 +123,8 @@ class TextureMapping:
             self.info_display = False
         else:
             self.info_display = True
-        self.millisecs = 0
         self.timer_avg_frames = 60
         self.timer_names = []
-        self.timer_frame = 0
         self.font = pygame.font.SysFont('CourierNew', 15)
 
         # set up timers
@@ -133,7 +138,8 @@ class TextureMapping:
         self.timer_names.append("display flip")
         self.timer_names.append("plot info")
         self.timer_names.append("wait")
-        self.timers = np.zeros((len(self.timer_names), self.timer_avg_frames), dtype=int)
+        self.profiler = Profiler(self.timer_names, self.timer_avg_frames)
+        self.timers = self.profiler.timers
         self.timer_kpixels = np.zeros((self.timer_avg_frames), dtype=int)
         self.timer_time = np.zeros((self.timer_avg_frames), dtype=int)
 
@@ -143,7 +149,7 @@ class TextureMapping:
         """
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
         self.timer = pygame.time.get_ticks()
 
         while self.running:
@@ -211,7 +217,7 @@ class TextureMapping:
             if self.paused:
                 pygame.time.wait(100)
                 self.rotate_timer = pygame.time.get_ticks()
-                self.millisecs = pygame.time.get_ticks()
+                self.profiler.restart()
                 self.mode_timer += 100
 
             else:
@@ -264,8 +270,8 @@ class TextureMapping:
             while self.screen.get_locked():
                 self.screen.unlock()
 
-            # switch between currently showed and the next screen (prepared in "buffer")
-            pygame.display.flip()
+            # switch between currently showed and the next screen (prepared in "buffer"), updating only the areas changed
+            self.dirty_rects.present()
             self.measure_time("display flip")
             self.clock.tick(self.target_fps)  # this keeps code running at max target_fps
             self.measure_time("wait")
@@ -280,27 +286,17 @@ class TextureMapping:
 
     def rotate(self):
 
-        matrix = self.rotate_matrix_XYZ(self.angles)
+        matrix = rotation_matrix(self.angles)
         self.rotated_nodes = np.matmul(self.nodes, matrix)
         self.trans_nodes = ((self.rotated_nodes[:, 0:2] * self.z_scale) / (self.rotated_nodes[:, 2:3] + self.z_pos) + self.mid_screen).astype(np.int16)
         self.screen_rect = pygame.Rect(np.min(self.trans_nodes, axis=0) - 3, np.max(self.trans_nodes, axis=0) - np.min(self.trans_nodes, axis=0) + 6)
+        self.dirty_rects.add(self.screen_rect)
         self.measure_time("rotate")
 
-    def rotate_matrix_XYZ(self, angles):
-
-        # define rotation matrix for given angles
-        (sx, sy, sz) = np.sin(angles)
-        (cx, cy, cz) = np.cos(angles)
-
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        return np.array([[cy * cz               , -cy * sz              , sy      ],
-                         [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                         [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
     def clear(self):
 
-        # clear screen.
-        self.screen.fill(self.background_color, self.screen_rect)
+        # clear screen (the area drawn in the previous frame).
+        self.dirty_rects.add(self.screen.fill(self.background_color, self.screen_rect))
         self.measure_time("clear")
 
     def draw(self):
@@ -348,16 +344,16 @@ class TextureMapping:
                                       self.tutorial_img_data[1][1] * self.tutorial_img_data[1][2])), axis=0)
                     + 2).astype(np.int)
             pos = np.amin(np.vstack((self.tutorial_img_data[0][3], self.tutorial_img_data[1][3])), axis=0)
-            self.screen.fill(self.background_color, (pos, size))
+            self.dirty_rects.add(self.screen.fill(self.background_color, (pos, size)))
         else:
             # copy picture to screen
-            self.screen.blit(self.tutorial_img_data[surface][0], self.tutorial_img_data[surface][3])
+            self.dirty_rects.add(self.screen.blit(self.tutorial_img_data[surface][0], self.tutorial_img_data[surface][3]))
             # show sections
             color = np.array([40, 40, 220], dtype=np.uint8)
             for sd in self.scr_section_data:
                 if sd[0] == surface:
                     # draw section on rotating cube
-                    pygame.draw.polygon(self.screen, color, sd[1], 2)
+                    self.dirty_rects.add(pygame.draw.polygon(self.screen, color, sd[1], 2))
                     # draw section on still image. Get coordinates, apply scale and add position
                     nodes = (np.asarray(sd[2]) * self.tutorial_img_data[surface][1] + self.tutorial_img_data[surface][3]).astype(np.int)
                     pygame.draw.polygon(self.screen, color, nodes, 2)
@@ -502,6 +498,7 @@ class TextureMapping:
 
         # toggle between fullscreen and windowed mode
         pygame.display.toggle_fullscreen()
+        self.dirty_rects.force_full()
 
     def pause(self):
 
@@ -516,7 +513,7 @@ class TextureMapping:
 
         # switch between a windowed display and full screen
         if self.info_display:
-            self.screen.fill(self.background_color, (10, 10, 250, 105 + len(self.timer_names) * 15))
+            self.dirty_rects.add(self.screen.fill(self.background_color, (10, 10, 250, 105 + len(self.timer_names) * 15)))
             self.info_display = False
         else:
             self.info_display = True
@@ -527,12 +524,12 @@ class TextureMapping:
         while self.screen.get_locked():
             self.screen.unlock()
 
-        if self.timer_time[self.timer_frame - self.timer_avg_frames + 1] > 0:
-            kpixels = np.sum(self.timer_kpixels) / (self.timer_time[self.timer_frame] - self.timer_time[self.timer_frame - self.timer_avg_frames + 1])
+        if self.timer_time[self.profiler.frame - self.timer_avg_frames + 1] > 0:
+            kpixels = np.sum(self.timer_kpixels) / (self.timer_time[self.profiler.frame] - self.timer_time[self.profiler.frame - self.timer_avg_frames + 1])
         else:
             kpixels = 0
 
-        self.screen.fill(self.background_color, (10, 10, 250, 105 + len(self.timer_names) * 15))
+        self.dirty_rects.add(self.screen.fill(self.background_color, (10, 10, 250, 105 + len(self.timer_names) * 15)))
         # print object info
         self.plot_info_msg(self.screen, 10, 10, 'frames per sec: ' + (' '*10 + str(int(self.clock.get_fps())))[-7:])
         self.plot_info_msg(self.screen, 10, 25, 'kpixels per sec:' + (' '*10 + str(int(kpixels)))[-7:])
@@ -554,20 +551,14 @@ class TextureMapping:
     def measure_time(self, timer_name):
 
         # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        self.profiler.measure(timer_name)
 
     def next_time_frame(self):
 
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
-        self.timer_kpixels[self.timer_frame] = self.scr_cnt
-        self.timer_time[self.timer_frame] = pygame.time.get_ticks()
+        self.profiler.next_frame()
+        self.timer_kpixels[self.profiler.frame] = self.scr_cnt
+        self.timer_time[self.profiler.frame] = pygame.time.get_ticks()
 
     def setup_object(self):
 
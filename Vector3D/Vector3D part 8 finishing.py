@@ -1,19 +1,37 @@
 # -*- coding: utf-8 -*-
 import pygame
 import numpy as np
-import math
 import os
+import time
+import json
+import hashlib
+import argparse
+import threading
+import queue
 from operator import itemgetter
-from scipy.interpolate import interp1d
 import copy
 import xml.etree.ElementTree as et
-from collections import Counter
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Profiler import Profiler
+import SceneCache
+from Rasterizer import fill_polygons, map_colors
+from DirtyRects import DirtyRects
+from Clipping import clip_polygons, pad_polygons, split_polygons, rect_planes
+from Rotation import RotationCache
+from OfflineRender import FrameWriter
+from VectorEngine import VectorObject, VectorNodeArena, VectorGrid, VectorAngles, VectorMovement, VectorMovementSplines, VectorPosition, quadraticPieces, updateDrawOrder
+from VectorEngine import frustum_planes, spheres_in_frustum
 
 key_to_function = {
     pygame.K_ESCAPE: (lambda x: x.terminate()),         # ESC key to quit
     pygame.K_SPACE:  (lambda x: x.pause()),             # SPACE to pause
     pygame.K_f:      (lambda x: x.toggleFullScreen()),  # f to switch between windowed and full screen display
-    pygame.K_i:      (lambda x: x.toggleInfoDisplay())  # i to toggle info display on/off
+    pygame.K_i:      (lambda x: x.toggleInfoDisplay()), # i to toggle info display on/off
+    pygame.K_r:      (lambda x: x.toggleRasterizer()),  # r to switch between pygame.draw and the batched rasterizer
+    pygame.K_l:      (lambda x: x.toggleLod()),         # l to switch levels of detail on/off
+    pygame.K_c:      (lambda x: x.toggleCulling()),     # c to switch frustum culling on/off
+    pygame.K_g:      (lambda x: x.toggleGroundGradient())   # g to switch between ground shading with a gradient and with blend polygons
     }
 
 class VectorViewer:
@@ -32,41 +50,76 @@ class VectorViewer:
         self.font = pygame.font.SysFont('CourierNew', font_size)  # initialize font and set font size 
         self.music_file = music_file
         self.use_gfxdraw = False                        # pygame.gfxdraw is "experimental" and may be discontinued.
+        self.useRasterizer = False                      # if True, draw the surfaces of normal objects in batches with the NumPy rasterizer (no antialiasing)
         self.fullScreen = False
+        self.dirtyRects = DirtyRects((width, height))   # screen areas drawn, so that only those are cleared and updated on the display
         pygame.display.set_caption('VectorViewer')
         self.backgroundColor = (0,0,0)
         self.fadeSpeed = 5.0                            # controls start and end fade speed (bigger = faster)
         self.fade = 1.0
         self.shadowColor = (140,140,140)                # strength of shadow: 255 = black shadow, 0 = no shadow 
         self.VectorAnglesList = []
+        self.rotations = RotationCache()                # rotation matrices of recently used angles
         self.VectorMovementList = []
         self.viewerMovement = None
         self.VectorObjs = []
         self.VectorObjPrios = []
         self.VectorPos = VectorPosition()
+        self.nodeArena = None                           # all object nodes in one array, built when starting
+        self.objectOrder = np.zeros((0), dtype=int)     # VectorObjs drawing order (most distant first) as nodeArena object numbers, kept between frames
+        self.objectOrderKeys = np.zeros((0))            # object Z positions in objectOrder
+        self.objectsMoved = 0                           # objects and surfaces which changed places in the drawing order in the latest frame, and in total
+        self.surfacesMoved = 0
+        self.sortMovedTotal = np.zeros((2), dtype=np.int64)
         self.midScreen = np.array([width / 2, height / 2], dtype=float)
         self.zScale = width * 0.7                       # Scaling for z coordinates
         self.objMinZ = 100.0                            # minimum z coordinate for object visibility
+        self.objectsVisible = np.zeros((0), dtype=int)  # visibility of nodeArena objects in the latest frame
+        self.useCulling = True                          # if True, objects outside the view frustum are culled before rotating them, see cullObjects
+        self.cullCellSize = None                        # cell size of the culling grid; None chooses it by the number of objects
+        self.cullGrid = None                            # grid of the objects not moving, built when starting
+        self.cullMoving = np.zeros((0), dtype=int)      # VectorPos.objects numbers of moving objects, culled one by one...
+        self.cullMovingRadii = np.zeros((0))            # ... and their bounding radii
+        self.cullAlways = np.zeros((0), dtype=int)      # VectorPos.objects numbers of objects never culled (ground, light source)
+        self.cullRows = np.zeros((0), dtype=int)        # VectorPos node of each VectorPos.objects entry
+        self.cullArenaIndex = np.zeros((0), dtype=int)  # VectorPos.objects number of each nodeArena object
+        self.cullStats = (0, 0, 0, 0)                   # cells visible and in total, objects active and in total, in the latest frame
+        self.cullTotals = np.zeros((3), dtype=np.int64) # cells visible, objects tested and objects active in total, for the benchmark report
+        self.useLod = True                              # if True, objects with several levels of detail use the one matching their distance
+        self.lodHysteresis = 0.1                        # a level of detail is switched only when distance is this much (share) past the switch distance
+        self.lodPixels = (200.0, 40.0)                  # object size on screen (pixels) below which the automatically simplified levels of detail are used
         self.groundZ = 64000.0                          # for a ground object, maximum distance in Z
         self.groundZShade = 15.0                        # ground color strength (in percentage) at groundZ
         self.groundShadeNr = 16                         # number of ground elements with different shading
         self.groundBlendPrio = None                     # the prio after which ground belnding will be applied
+        self.groundGradient = False                     # if True, ground blending multiplies the screen with a gradient instead of using blend polygons
+        self.groundGradientMaxSlope = 0.05              # ground tilted more than this on screen is still blended with polygons, which is then faster
+        # blend multiplier (0 = all blended away, 255 = no effect) for each ground element, from the most distant,
+        # and the same as a lookup surface with one row of each multiplier, for blitting the ground gradient.
+        self.groundShades = [int((2.55 * self.groundZShade * (self.groundShadeNr - 1 - i) + 255.0 * i) / (self.groundShadeNr - 1) + 0.5)
+                             for i in range(self.groundShadeNr)]
+        self.groundShadeSurface = pygame.Surface((width, self.groundShadeNr), 0, self.screen)
+        for i in range(self.groundShadeNr):
+            self.groundShadeSurface.fill((self.groundShades[i], self.groundShades[i], self.groundShades[i]), (0, i, width, 1))
         self.groundObject = None
         self.lightObject = None
         self.lightNode = np.array([-500.0, 600.0, -1300.0])     # presets only used if no lightObject
         self.lightPosition = np.array([-500.0, 600.0, -1300.0])     # presets only used if no lightObject
-        self.target_fps = 60                            # affects movement speeds, sets maximum refresh rate
+        self.target_fps = 60                            # sets maximum refresh rate (movements follow time, not frames)
         self.running = True
         self.paused = True
         self.clock = pygame.time.Clock()
+        self.pipelineDepth = 0                          # if > 0, frames are calculated in a separate thread up to this many frames ahead of drawing
+        self.pipeline = None                            # queue of calculated frames (draw lists) waiting to be drawn
+        self.pipelineThread = None
+        self.frameTransNodes = []                       # buffers for the transNodes of the frames being calculated, waiting and being drawn
+        self.frameBuffer = 0
         # the following for checking performance only
         self.infoDisplay = False
-        self.millisecs = 0
         self.timer_avg_frames = 180
         self.timer_names = []
-        self.timers = np.zeros((1,1), dtype=int)
-        self.timer_frame = 0
         self.start_timer = 0
+        self.simulatedTime = None                       # if set, movements use this time (in milliseconds) instead of real time
             
     def setVectorPos(self, VectorPosObj):
         self.VectorPos = VectorPosObj
@@ -80,9 +133,530 @@ class VectorViewer:
     def addVectorMovementList(self, VectorMovement):
         self.VectorMovementList.append(VectorMovement)
 
+    def loadWorld(self, datafile):
+        """
+        Load angles, movements and objects. Uses the compiled scene file of datafile, if it is valid for this datafile.
+        Otherwise reads datafile (XML) and compiles it to a scene file for the next start.
+        """
+        cache_file = SceneCache.cacheFileName(datafile)
+        source_hash = SceneCache.fileHash(datafile)
+        cached_scene = SceneCache.readScene(cache_file, source_hash)
+        if cached_scene is None:
+            self.prepareWorld(datafile)
+            (scene, arrays) = self.compileWorld()
+            try:
+                SceneCache.writeScene(cache_file, source_hash, scene, arrays)
+            except OSError:
+                pass # e.g. a read-only directory. The data file will then simply be read again next time.
+        else:
+            (scene, arrays) = cached_scene
+            self.buildWorld(scene, arrays)
+        self.movementSplines = VectorMovementSplines(self.VectorMovementList)
+
+    def compileWorld(self):
+        """
+        Convert the world (angles, movements, objects and positions) to a JSON serializable scene description and a dict of arrays.
+        References between them are stored as list indexes; -1 is used for None or for angles not in VectorAnglesList.
+        """
+        def listIndex(item_list, item):
+            for (i, list_item) in enumerate(item_list):
+                if list_item is item:
+                    return i
+            return -1
+
+        arrays = {}
+        arrays['angles.angles'] = np.array([angles.angles for angles in self.VectorAnglesList]).reshape((-1, 3))
+        arrays['angles.angleScale'] = np.array([angles.angleScale for angles in self.VectorAnglesList])
+        scene = {
+            'angles': [angles.angName for angles in self.VectorAnglesList],
+            'movements': [],
+            'objects': [],
+            'position': None,
+            'objPrios': self.VectorObjPrios,
+            'viewerMovement': listIndex(self.VectorMovementList, self.viewerMovement),
+            'lightObject': listIndex(self.VectorObjs, self.lightObject),
+            'groundObject': listIndex(self.VectorObjs, self.groundObject),
+            'groundBlendPrio': self.groundBlendPrio
+            }
+        for (i, mov) in enumerate(self.VectorMovementList):
+            scene['movements'].append({
+                'name': mov.moveName,
+                'angles': listIndex(self.VectorAnglesList, mov.angles),
+                'loop': [mov.loopStart, mov.loopEnd, mov.loopPos],
+                'speed': mov.speed,
+                'angleForward': mov.angleForward.tolist()
+                })
+            arrays['movement.%d.rotate' % i] = mov.rotate
+            arrays['movement.%d.timeSeries' % i] = mov.timeSeries
+            arrays['movement.%d.breaks' % i] = mov.breaks
+            arrays['movement.%d.coefs' % i] = mov.coefs
+        for (i, vobj) in enumerate(self.VectorObjs):
+            # instances refer to the first object having the same surface tables
+            instance_of = -1
+            for (j, other) in enumerate(self.VectorObjs[0:i]):
+                if other.surfaceNodes is vobj.surfaceNodes:
+                    instance_of = j
+                    break
+            scene['objects'].append({
+                'name': vobj.objName,
+                'instanceOf': instance_of,
+                'sharedNodes': instance_of >= 0 and self.VectorObjs[instance_of].nodes is vobj.nodes,
+                'prio': vobj.prio,
+                'shadow': vobj.shadow,
+                'isFlat': vobj.isFlat,
+                'minShade': vobj.minShade,
+                'nodeNum': vobj.nodeNum,
+                'lodDistances': vobj.lodDistances,
+                'lodSizes': vobj.lodSizes,
+                'angles': listIndex(self.VectorAnglesList, vobj.angles),
+                'movement': listIndex(self.VectorMovementList, vobj.movement)
+                })
+            arrays['object.%d.position' % i] = vobj.position
+            arrays['object.%d.nodes' % i] = vobj.nodes
+            arrays['object.%d.surfaceNodes' % i] = vobj.surfaceNodes
+            arrays['object.%d.surfaceNodeNum' % i] = vobj.surfaceNodeNum
+            arrays['object.%d.surfaceIdNum' % i] = vobj.surfaceIdNum
+            arrays['object.%d.surfaceColor' % i] = vobj.surfaceColor
+            arrays['object.%d.surfaceBackColor' % i] = vobj.surfaceBackColor
+            arrays['object.%d.surfaceEdgeWidth' % i] = vobj.surfaceEdgeWidth
+            arrays['object.%d.surfaceShowBack' % i] = vobj.surfaceShowBack
+            for lod in range(1, len(vobj.lodDistances)):
+                # other levels of detail; the surface tables of level 0 are stored above.
+                for name in ('surfaceNodes', 'surfaceNodeNum', 'surfaceIdNum', 'surfaceColor', 'surfaceBackColor', 'surfaceEdgeWidth', 'surfaceShowBack'):
+                    arrays['object.%d.lod.%d.%s' % (i, lod, name)] = vobj.lodTables[lod][name]
+        if len(self.VectorPos.objects) > 0:
+            scene['position'] = {
+                'name': self.VectorPos.objName,
+                'angles': listIndex(self.VectorAnglesList, self.VectorPos.angles),
+                'objects': [[node_num, listIndex(self.VectorObjs, vobj)] for (node_num, vobj) in self.VectorPos.objects]
+                }
+            arrays['position.position'] = self.VectorPos.position
+            arrays['position.nodes'] = self.VectorPos.nodes
+        return (scene, arrays)
+
+    def buildWorld(self, scene, arrays):
+        """
+        Build the world from a scene description and arrays produced by compileWorld.
+        Static arrays (nodes, surfaces, movement series) are used as they are, others are copied as they will be changed while running.
+        """
+        for (i, angName) in enumerate(scene['angles']):
+            ang = VectorAngles()
+            ang.angName = angName
+            ang.angles = np.array(arrays['angles.angles'][i, :])
+            ang.angleScale = float(arrays['angles.angleScale'][i])
+            self.addVectorAnglesList(ang)
+
+        for (i, movedata) in enumerate(scene['movements']):
+            mov = VectorMovement()
+            mov.moveName = movedata['name']
+            if movedata['angles'] >= 0:
+                mov.angles = self.VectorAnglesList[movedata['angles']]
+            mov.rotate = np.array(arrays['movement.%d.rotate' % i])
+            mov.addTimeSeries(arrays['movement.%d.timeSeries' % i])
+            mov.addSplines(arrays['movement.%d.breaks' % i], arrays['movement.%d.coefs' % i])
+            (mov.loopStart, mov.loopEnd, mov.loopPos) = movedata['loop']
+            mov.speed = movedata['speed']
+            mov.angleForward = np.array(movedata['angleForward'])
+            self.addVectorMovementList(mov)
+        if scene['viewerMovement'] >= 0:
+            self.viewerMovement = self.VectorMovementList[scene['viewerMovement']]
+
+        for (i, objdata) in enumerate(scene['objects']):
+            if objdata['instanceOf'] >= 0:
+                vobj = self.VectorObjs[objdata['instanceOf']].instance()
+            else:
+                vobj = VectorObject()
+            vobj.objName = objdata['name']
+            vobj.prio = objdata['prio']
+            vobj.shadow = objdata['shadow']
+            vobj.isFlat = objdata['isFlat']
+            vobj.minShade = objdata['minShade']
+            vobj.position = np.array(arrays['object.%d.position' % i])
+            if objdata['angles'] >= 0:
+                vobj.angles = self.VectorAnglesList[objdata['angles']]
+            if objdata['movement'] >= 0:
+                vobj.movement = self.VectorMovementList[objdata['movement']]
+                vobj.movement.addObject(vobj)
+            else:
+                vobj.movement = None
+            vobj.nodeNum = objdata['nodeNum']
+            if objdata['instanceOf'] < 0 or not objdata['sharedNodes']:
+                vobj.nodes = arrays['object.%d.nodes' % i]
+                vobj.rotatedNodes = vobj.nodes[:, 0:3]
+            if objdata['instanceOf'] >= 0:
+                # an instance has its own surface properties (which may have been modified), but shares the rest
+                for lod in range(len(objdata['lodDistances'])):
+                    vobj.setLod(lod)
+                    lod_name = 'object.%d.' % i if lod == 0 else 'object.%d.lod.%d.' % (i, lod)
+                    vobj.surfaceColor = arrays[lod_name + 'surfaceColor']
+                    vobj.surfaceBackColor = arrays[lod_name + 'surfaceBackColor']
+                    vobj.surfaceEdgeWidth = arrays[lod_name + 'surfaceEdgeWidth']
+                    vobj.surfaceShowBack = arrays[lod_name + 'surfaceShowBack']
+            else:
+                vobj.setSurfaceTable(
+                    arrays['object.%d.surfaceNodes' % i],
+                    arrays['object.%d.surfaceNodeNum' % i],
+                    arrays['object.%d.surfaceIdNum' % i],
+                    arrays['object.%d.surfaceColor' % i],
+                    arrays['object.%d.surfaceBackColor' % i],
+                    arrays['object.%d.surfaceEdgeWidth' % i],
+                    arrays['object.%d.surfaceShowBack' % i]
+                    )
+                for lod in range(1, len(objdata['lodDistances'])):
+                    vobj.addLod(objdata['lodDistances'][lod], objdata['lodSizes'][lod])
+                    vobj.setSurfaceTable(*[arrays['object.%d.lod.%d.%s' % (i, lod, name)] for name in (
+                        'surfaceNodes', 'surfaceNodeNum', 'surfaceIdNum', 'surfaceColor', 'surfaceBackColor', 'surfaceEdgeWidth', 'surfaceShowBack')])
+                vobj.initGeometry()
+            vobj.setLod(0)
+            # automatic levels of detail depend on the screen size; the scene may have been compiled for another
+            vobj.scaleLods(self.zScale)
+            self.addVectorObj(vobj)
+        self.VectorObjPrios = list(scene['objPrios'])
+        if scene['lightObject'] >= 0:
+            self.lightObject = self.VectorObjs[scene['lightObject']]
+        if scene['groundObject'] >= 0:
+            self.groundObject = self.VectorObjs[scene['groundObject']]
+        self.groundBlendPrio = scene['groundBlendPrio']
+
+        if scene['position'] is not None:
+            vobj = VectorPosition()
+            vobj.objName = scene['position']['name']
+            vobj.position = np.array(arrays['position.position'])
+            if scene['position']['angles'] >= 0:
+                vobj.angles = self.VectorAnglesList[scene['position']['angles']]
+            vobj.nodes = np.array(arrays['position.nodes'])
+            vobj.rotatedNodes = vobj.nodes[:, 0:3]
+            vobj.addObjects([(node_num, self.VectorObjs[obj_num]) for (node_num, obj_num) in scene['position']['objects']])
+            self.setVectorPos(vobj)
+
+    def prepareWorld(self, datafile):
+
+        # read data file defining angles, movements and objects
+        vecdata = et.parse(datafile)
+
+        root = vecdata.getroot()
+        
+        for angles in root.iter('vectorangles'):
+            ang = VectorAngles()
+            ang.angName = angles.get('name')
+            ang.angles[0] = float(angles.findtext("angleX", default="0"))
+            ang.angles[1] = float(angles.findtext("angleY", default="0"))
+            ang.angles[2] = float(angles.findtext("angleZ", default="0"))
+            self.addVectorAnglesList(ang)
+
+        for movements in root.iter('movement'):
+            mov = VectorMovement()
+            mov.moveName = movements.get('name')
+
+            viewer = None
+            viewer = movements.get('viewer')
+
+            angleName = movements.findtext("anglesref", None)
+            for angles in self.VectorAnglesList:
+                if angles.angName == angleName:
+                    mov.angles = angles
+                    if viewer == "1":
+                        angles.angleScale = -angles.angleScale # change viewer angles to negative by changing angleScale to negative
+                    break
+            mov.rotate[0] = float(movements.findtext("rotateX", default="0"))
+            mov.rotate[1] = float(movements.findtext("rotateY", default="0"))
+            mov.rotate[2] = float(movements.findtext("rotateZ", default="0"))
+
+            # build movement timeseries array; [0] is movement time, [1:4] are positions X,Y,Z, [4:7] are angles X,Y,Z
+            # speed is movement time per 60 steps, played at 50 steps per second, i.e. speed * 50 / 60 movement time per second.
+            mov.speed = float(movements.findtext("speed", default="1")) * 50.0 / 60.0
+            for timedata in movements.iter('timeseries'):
+                mov_steps = [] # list of movement steps, collected first and then converted to an array at once
+                mov_point = np.zeros((7))
+                for stepdata in timedata.iter('movementstep'):
+                    #steptime = float(stepdata.get("time"))
+                    mov_point[0] = float(stepdata.get("time"))
+                    mov_point[1] = float(stepdata.findtext("movepositionX", default=str(mov_point[1])))
+                    mov_point[2] = float(stepdata.findtext("movepositionY", default=str(mov_point[2])))
+                    mov_point[3] = float(stepdata.findtext("movepositionZ", default=str(mov_point[3])))
+                    mov_point[4] = float(stepdata.findtext("moveangleX", default="0"))
+                    mov_point[5] = float(stepdata.findtext("moveangleY", default="0"))
+                    mov_point[6] = float(stepdata.findtext("moveangleZ", default="0"))
+                    mov_steps.append(mov_point.copy())
+                mov_times = np.array(mov_steps).reshape((-1, 7)).T
+                # sort by time (first row), just in case ordering is wrong
+                mov_times = mov_times[:,mov_times[0,:].argsort()]
+                if viewer == "1":
+                    # for viewer, invert sign of Y coordinate
+                    mov_times[1,:] = -1 * mov_times[1,:]
+                mov.addTimeSeries(mov_times)
+                # out of the time series, build the movement as a quadratic spline, stored as polynomial pieces evaluated at any time.
+                mov.addSplines(*quadraticPieces(mov_times[0,:], mov_times[1:7,:]))
+
+                # angleforward means that object angles should be such that it is rotated according to movement vector, always facing towards movement
+                # NOTE: Tested for Y only! Not well defined for XYZ anyway.
+                mov_angleforward = movements.findtext("angleforward", default="off")
+                if mov_angleforward != "off":
+                    mov.angleForward = np.array([mov_angleforward.find(axis) >= 0 for axis in "XYZ"])
+                break # only one time series accepted
+            
+            mov.loopEnd = 0 # preset
+            for loopdata in movements.iter('loop'):
+                mov.loopStart = float(loopdata.findtext("loopstart", default="0"))
+                mov.loopEnd = float(loopdata.findtext("loopend", default="0"))
+                mov.loopPos = float(loopdata.findtext("looppos", default="0"))
+                break # only one loop accepted
+
+            self.addVectorMovementList(mov)
+            # define this (last added) movement as the viewer movement if so specified.
+            if viewer == "1":
+                self.viewerMovement = self.VectorMovementList[-1]
+       
+        for vecobjs in root.iter('vectorobject'):
+            vobj = VectorObject()
+            vobj.objName = vecobjs.get('name')
+            vobj.prio = int(vecobjs.findtext("prio", default="0"))
+            # check if object is a light source. Will be set later.
+            lightsource = None
+            lightsource = vecobjs.get('lightsource')
+            # check if object is the ground. Will be set later.
+            ground = None
+            ground = vecobjs.get('ground')
+            if ground == "1":
+                self.groundBlendPrio = int(vecobjs.findtext("blendprio", default=None))          
+                
+            if vecobjs.findtext('shadow', 'OFF').upper() == "ON":
+                vobj.shadow = 1
+            else:
+                vobj.shadow = 0
+
+            # check if object is a copy of another, previously defined object
+            copyfrom = None
+            copyfrom = vecobjs.get('copyfrom')
+            is_copy = False
+            if copyfrom is not None:
+                for VectorObj in self.VectorObjs:
+                    if VectorObj.objName == str(copyfrom):
+                        # copy data from another object. The copy is an instance sharing the geometry of the original.
+                        vobj = VectorObj.instance()
+                        vobj.objName = vecobjs.get('name')
+                        is_copy = True
+                        break
+                        
+            # set position and references to angles and movement
+            for posdata in vecobjs.iter('position'):
+                vobj.position[0] = float(posdata.findtext("positionX", default="0"))
+                vobj.position[1] = float(posdata.findtext("positionY", default="0")) 
+                vobj.position[2] = -float(posdata.findtext("positionZ", default="0")) # inverted for easier coordinates definition
+            angleName = vecobjs.findtext("anglesref", None)
+            for angles in self.VectorAnglesList:
+                if angles.angName == angleName:
+                    vobj.angles = angles
+                    break
+            vobj.movement = None
+            movementName = vecobjs.findtext("movementref", None)
+            for movement in self.VectorMovementList:
+                if movement.moveName == movementName:
+                    vobj.movement = movement
+                    break
+               
+            # get (or set) some default values. Not needed for copied objects.
+            if is_copy == True: 
+                def_minshade = str(vobj.minShade)
+            else: 
+                def_minshade = "0.3"
+                def_color = (def_colorR, def_colorG, def_colorB) = (128, 128, 128)
+                # if not a copied object, read default values for some surface properties
+                for def_colordata in vecobjs.iter('defcolor'):
+                    def_colorR = def_colordata.findtext("defcolorR", default="128")
+                    def_colorG = def_colordata.findtext("defcolorG", default="128")
+                    def_colorB = def_colordata.findtext("defcolorB", default="128")
+                    def_color = (int(def_colorR), int(def_colorG), int(def_colorB))
+                    break
+                def_backColor = (def_backColorR, def_backColorG, def_backColorB) = def_color
+                for def_backcolordata in vecobjs.iter('defbackcolor'):
+                    def_backColorR = def_backcolordata.findtext("defbackcolorR", default=str(def_backColorR))
+                    def_backColorG = def_backcolordata.findtext("defbackcolorG", default=str(def_backColorG))
+                    def_backColorB = def_backcolordata.findtext("defbackcolorB", default=str(def_backColorB))
+                    def_backColor = (int(def_backColorR), int(def_backColorG), int(def_backColorB))
+                    break
+                def_edgeWidth = vecobjs.findtext("defedgewidth", default="0")
+                def_showBack = vecobjs.findtext("defshowback", default="0")           
+            vobj.minShade = float(vecobjs.findtext("minshade", default=def_minshade))
+            
+            lod_node_start = {} # first node of each level of detail having its own nodelist
+            if is_copy == False:
+                # add nodes ie. "points" or "corners". No changes allowed for copied objects.
+                # nodelists with a lod attribute belong to other levels of detail (see surfacelist below), and are added after the object's own nodes.
+                lod_nodes = {}
+                for nodedata in vecobjs.findall('nodelist'):
+                    lod = int(nodedata.get("lod", "0"))
+                    if lod in lod_nodes:
+                        continue # only one nodelist per level of detail accepted
+                    node_count = int(nodedata.get("numnodes"))
+                    lod_nodes[lod] = np.zeros((node_count, 3))
+                    for node in nodedata.iter('node'):
+                        node_num = int(node.get("ID"))
+                        lod_nodes[lod][node_num, 0] = float(node.findtext("nodeX", default="0"))
+                        lod_nodes[lod][node_num, 1] = float(node.findtext("nodeY", default="0"))
+                        lod_nodes[lod][node_num, 2] = -float(node.findtext("nodeZ", default="0")) # inverted for easier coordinates definition
+                vobj.nodeNum = np.shape(lod_nodes[0])[0]
+                vobj_nodes = lod_nodes[0]
+                for lod in sorted(lod_nodes):
+                    if lod > 0:
+                        lod_node_start[lod] = np.shape(vobj_nodes)[0]
+                        vobj_nodes = np.vstack((vobj_nodes, lod_nodes[lod]))
+                vobj.addNodes(vobj_nodes)
+
+            # check for initangles ie. initial rotation. Default is none which requires no action.
+            for angledata in vecobjs.iter('initangles'):
+                angleXadd = float(angledata.findtext("angleXadd", default="0"))
+                angleYadd = float(angledata.findtext("angleYadd", default="0"))
+                angleZadd = float(angledata.findtext("angleZadd", default="0"))
+                if angleXadd != 0 or angleYadd != 0 or angleZadd != 0: 
+                    storeangles = copy.copy(vobj.angles.angles) # store temporarily
+                    storeposition = copy.copy(vobj.position) # store temporarily
+                    vobj.angles.angles = np.array([angleXadd, angleYadd, angleZadd]) # use the requested initial rotation
+                    vobj.position = np.array([0.0, 0.0, 0.0, 1.0]) # set position temporarily to zero for initial rotation
+                    vobj.angles.setRotationMatrix()
+                    vobj.rotate(vobj.angles)
+                    vobj.nodes = np.hstack((vobj.rotatedNodes, np.ones((np.shape(vobj.rotatedNodes)[0], 1)))) # overwrite original nodes with rotated (to init angles) nodes
+                    vobj.angles.angles = storeangles
+                    vobj.position = storeposition
+                    
+            # add surfaces ie. 2D flat polygons. 
+            # surfacelists with a lod attribute define other levels of detail, used from rotated Z distance given as their distance attribute onwards.
+            # their surfaces refer to the nodelist with the same lod, if there is one, and to the object's own nodes otherwise.
+            # copied objects copy all levels of detail; surface changes by ID apply to all levels.
+            prev_lod = 0
+            for surfacedata in sorted(vecobjs.findall('surfacelist'), key=lambda surfacedata: int(surfacedata.get("lod", "0"))):
+                lod = int(surfacedata.get("lod", "0"))
+                if lod != prev_lod:
+                    if is_copy == True:
+                        break
+                    vobj.addLod(float(surfacedata.get("distance")))
+                    prev_lod = lod
+                node_start = lod_node_start.get(lod, 0)
+                for surf in surfacedata.iter('surface'):
+                    idnum = int(surf.get("ID"))
+                    
+                    if is_copy == True:
+                        for surfobj in vobj.surfaces:
+                            if surfobj.idnum == idnum:
+                                break
+                        def_color = surfobj.color
+                        def_backColor = surfobj.backColor
+                        def_edgeWidth = str(surfobj.edgeWidth)
+                        def_showBack = str(surfobj.showBack)
+                        
+                    color = def_color
+                    for colordata in surf.iter('color'):
+                        colorR = int(colordata.findtext("colorR", default=def_colorR))
+                        colorG = int(colordata.findtext("colorG", default=def_colorG))
+                        colorB = int(colordata.findtext("colorB", default=def_colorB))
+                        color = (colorR, colorG, colorB)
+                        break
+                    backColor = def_backColor
+                    for backColordata in surf.iter('backColor'):
+                        backColorR = int(backColordata.findtext("backColorR", default=def_backColorR))
+                        backColorG = int(backColordata.findtext("backColorG", default=def_backColorG))
+                        backColorB = int(backColordata.findtext("backColorB", default=def_backColorB))
+                        backColor = (backColorR, backColorG, backColorB)
+                        break
+                    edgeWidth = int(surf.findtext("edgewidth", default=def_edgeWidth))
+                    showBack = int(surf.findtext("showback", default=def_showBack))
+                    if is_copy == False:
+                        # create a list of nodes. No changes allowed for copied objects.
+                        node_list = []
+                        for nodelist in surf.iter('nodelist'):
+                            for node in nodelist.iter('node'):
+                                node_order = int(node.get("order"))
+                                node_refID = int(node.get("refID")) + node_start
+                                node_list.append((node_order, node_refID))
+                        node_list.sort(key=itemgetter(0)) # sort nodes by node_order
+                        node_list = list(zip(*node_list))[1] # pick just the node references
+                        vobj.addSurfaces(idnum, color, edgeWidth, showBack, backColor, node_list)
+                    else:
+                        vobj.modifySurfaces(idnum, color, edgeWidth, showBack, backColor)
+            vobj.setLod(0)
+                                
+            # check if is a flat object (one surface only)
+            if len(vobj.surfaces) == 1:
+                vobj.isFlat = 1
+            # if no levels of detail were defined, add automatically simplified ones. Copied objects already have them, and share the geometry data.
+            if is_copy == False:
+                if vobj.isFlat == 0 and len(vobj.lodDistances) == 1:
+                    self.simplifyObject(vobj)
+                vobj.initGeometry()
+            # add object prio to prio list, if not there
+            if not vobj.prio in self.VectorObjPrios:
+                self.VectorObjPrios.append(vobj.prio)
+            # add the object
+            self.addVectorObj(vobj)
+
+            # add it to a movement's list of objects, if so specified
+            if self.VectorObjs[-1].movement is not None:
+                self.VectorObjs[-1].movement.addObject(self.VectorObjs[-1])
+            # define this (last added) object as light source or ground if so specified
+            if lightsource is not None:
+                self.lightObject = self.VectorObjs[-1]
+            # define this (last added) object as ground if so specified
+            if ground is not None:
+                self.groundObject = self.VectorObjs[-1]
+
+        # sort prio list
+        self.VectorObjPrios.sort(reverse=True)
+
+        # define a vector position object holding all the positions of other objects in its nodes
+        for vecobjs in root.iter('positionobject'):
+            vobj = VectorPosition()                   
+            vobj.objName = vecobjs.get('name')
+            for posdata in vecobjs.iter('position'):
+                vobj.position[0] = float(posdata.findtext("positionX", default="0"))
+                vobj.position[1] = float(posdata.findtext("positionY", default="0"))
+                vobj.position[2] = float(posdata.findtext("positionZ", default="1500"))
+            angleName = vecobjs.findtext("anglesref", None)
+            for angles in self.VectorAnglesList:
+                if angles.angName == angleName:
+                    vobj.angles = angles
+                    break
+            # get nodes from existing objects
+            vobj_nodes = np.zeros((0, 3))
+            object_num = 0
+            object_list = []
+            for VectorObj in self.VectorObjs:
+                vobj_nodes = np.vstack((vobj_nodes, VectorObj.position[0:3]))
+                object_list.append((object_num, VectorObj))  # reference to object position data row and respective object
+                object_num += 1
+            vobj.addNodes(vobj_nodes)
+            vobj.addObjects(object_list)           
+            # set the object
+            self.setVectorPos(vobj)
+            break
+
+    def tileWorld(self, tiles, spacing=2400.0):
+        """
+        Repeat the buildings (objects not moving and not flat) on a tiles x tiles grid, spacing apart, with the original scene in
+        the middle, for testing large scenes. The copies are instances sharing the geometry of the originals (see VectorObject.instance).
+        Must be called after loading the world and before running.
+        """
+        buildings = [(node_num, VectorObj) for (node_num, VectorObj) in self.VectorPos.objects if VectorObj.movement is None and VectorObj.isFlat == 0]
+        node_list = [self.VectorPos.nodes[:, 0:3]]
+        object_list = list(self.VectorPos.objects)
+        for tile_x in range(tiles):
+            for tile_z in range(tiles):
+                offset = np.array([tile_x - tiles // 2, 0, tile_z - tiles // 2]) * spacing
+                if not np.any(offset != 0):
+                    continue  # the original scene
+                for (node_num, VectorObj) in buildings:
+                    vobj = VectorObj.instance()
+                    vobj.objName = VectorObj.objName + "_" + str(tile_x) + "_" + str(tile_z)
+                    self.addVectorObj(vobj)
+                    object_list.append((len(object_list), vobj))
+                    node_list.append(self.VectorPos.nodes[node_num:node_num + 1, 0:3] + offset)
+        self.VectorPos.addNodes(np.vstack(node_list))
+        self.VectorPos.addObjects(object_list)
+
     def run(self):
         """ Main loop. """
                   
+        self.nodeArena = VectorNodeArena(self.VectorObjs, self.VectorPos)
+        self.buildCullGrid()
         for VectorObj in self.VectorObjs:
             VectorObj.initObject() # initialize objects
 
@@ -97,12 +671,15 @@ class VectorViewer:
  
         # initialize timers
         self.start_timer = pygame.time.get_ticks()
-        self.millisecs = self.start_timer
+        self.profiler.restart()
         
         # "all white" for surfaces used for blending
         self.screen_blends.fill((255,255,255))
         self.screen_shadows.fill((255,255,255))
         
+        if self.pipelineDepth > 0:
+            self.startPipeline()
+        
         while self.running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -116,10 +693,14 @@ class VectorViewer:
             
             else:
                 # main components executed here
-                self.movement()
-                self.rotate()
-                self.calculate()
-                self.display()
+                if self.pipelineDepth > 0:
+                    # the frame has been calculated in the pipeline thread
+                    self.drawFrame(self.nextPipelineFrame())
+                else:
+                    self.movement()
+                    self.rotate()
+                    self.calculate()
+                    self.display()
                 if self.infoDisplay == True:
                     self.plotInfo()
                 
@@ -129,93 +710,290 @@ class VectorViewer:
                     
                 self.nextTimeFrame()                
 
-                # switch between currently showed and the next screen (prepared in "buffer")
-                pygame.display.flip()
+                # switch between currently showed and the next screen (prepared in "buffer"), updating only the areas changed
+                self.dirtyRects.present()
                 self.measureTime("display flip")
                 self.clock.tick(self.target_fps) # this keeps code running at max target_fps
                 self.measureTime("wait")
 
         # exit; close display, stop music
+        self.stopPipeline()
         pygame.display.quit()
         pygame.mixer.quit()
                                                          
+    def benchmark(self, frames, report_file, checksum_every=60, trace_file=None, frame_writer=None):
+        """ 
+        Headless benchmark. Renders frames as fast as possible without music, advancing movements by exactly one frame
+        (1000 / target_fps milliseconds of simulated time) per frame, so that results are repeatable.
+        Writes a JSON report of the time spent in each timer (incl. p50 / p95 / p99 frame times), frames per second, and
+        checksums of every checksum_every'th frame. If trace_file is given, also writes a Chrome trace of all timers.
+        If pipelineDepth > 0, frames are calculated in the pipeline thread, and its timers are reported separately.
+        If frame_writer (a FrameWriter) is given, each frame is also written to it, and its throughput is included in the report.
+        """
+        self.nodeArena = VectorNodeArena(self.VectorObjs, self.VectorPos)
+        self.buildCullGrid()
+        for VectorObj in self.VectorObjs:
+            VectorObj.initObject() # initialize objects
+
+        # use a simulated clock for movements, and keep timers for every frame
+        frame_time = 1000.0 / self.target_fps
+        self.simulatedTime = 0.0
+        for VectorMovement in self.VectorMovementList:
+            VectorMovement.prevTime = self.simulatedTime
+        trace_events = 0
+        if trace_file is not None:
+            trace_events = 64 * frames
+        self.profiler = Profiler(self.timer_names, frames + 1, trace_events=trace_events)
+        self.timers = self.profiler.timers
+        checksums = {}
+
+        # "all white" for surfaces used for blending
+        self.screen_blends.fill((255,255,255))
+        self.screen_shadows.fill((255,255,255))
+
+        start_time = time.perf_counter()
+        if self.pipelineDepth > 0:
+            self.startPipeline(frames, frame_time, trace_events)
+        self.profiler.restart()
+        for frame in range(frames):
+            if self.pipelineDepth > 0:
+                self.drawFrame(self.nextPipelineFrame())
+            else:
+                self.simulatedTime += frame_time
+                self.movement()
+                self.rotate()
+                self.calculate()
+                self.display()
+            while self.screen.get_locked():
+                self.screen.unlock()
+            self.dirtyRects.present()
+            self.measureTime("display flip")
+            if frame_writer is not None:
+                frame_writer.write(self.screen)
+                self.measureTime("frame write")
+
+            # checksum and events are not timed.
+            self.nextTimeFrame()
+            if frame % checksum_every == 0:
+                checksums[str(frame)] = hashlib.sha1(pygame.image.tostring(self.screen, 'RGB')).hexdigest()
+            pygame.event.pump()
+            self.profiler.restart()
+        total_time = time.perf_counter() - start_time
+
+        report = {
+            'frames': frames,
+            'resolution': [self.width, self.height],
+            'target_fps': self.target_fps,
+            'seconds': round(total_time, 4),
+            'fps': round(frames / total_time, 2),
+            'timers': self.profiler.report()['stages'],
+            'display_updates': {'full': self.dirtyRects.full_frames, 'partial': self.dirtyRects.partial_frames},
+            'sort_moved': {'objects': int(self.sortMovedTotal[0]), 'surfaces': int(self.sortMovedTotal[1])},
+            'rotation_cache': {'hits': self.rotations.hits, 'misses': self.rotations.misses},
+            'culling': {'enabled': self.useCulling, 'cells': len(self.cullGrid.cellRadii), 'objects': len(self.VectorPos.objects),
+                        'avg_cells_visible': round(self.cullTotals[0] / frames, 2), 'avg_objects_tested': round(self.cullTotals[1] / frames, 2),
+                        'avg_objects_active': round(self.cullTotals[2] / frames, 2)},
+            'checksums': checksums
+            }
+        if self.pipelineDepth > 0:
+            report['pipeline_depth'] = self.pipelineDepth
+            report['pipeline_timers'] = self.pipelineProfiler.report()['stages']
+        if frame_writer is not None:
+            report['frame_writer'] = frame_writer.close()
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        if trace_file is not None:
+            self.profiler.write_trace(trace_file, 'Vector3D benchmark')
+            if self.pipelineDepth > 0:
+                self.pipelineProfiler.write_trace(os.path.splitext(trace_file)[0] + '_pipeline.json', 'Vector3D benchmark pipeline')
+        self.stopPipeline()
+        pygame.display.quit()
+        return report
+
+    def startPipeline(self, frames=None, frame_time=None, trace_events=0):
+        """
+        Start calculating frames in a separate thread (see computeFrames), at most pipelineDepth frames ahead of the frame being drawn.
+        If frames is given, only that many frames are calculated. If frame_time is given, movements use simulated time advancing by
+        frame_time per frame. The pipeline thread has its own timers, in pipelineProfiler.
+        """
+        self.pipeline = queue.Queue(maxsize=self.pipelineDepth)
+        self.pipelineProfiler = Profiler(self.timer_names, self.profiler.frames, trace_events=trace_events)
+        self.pipelineThread = threading.Thread(target=self.computeFrames, args=(frames, frame_time), daemon=True)
+        self.pipelineThread.start()
+
+    def stopPipeline(self):
+
+        # stop the pipeline thread, discarding any frames calculated but not drawn
+        if self.pipelineThread is not None:
+            thread = self.pipelineThread
+            self.pipelineThread = None
+            while thread.is_alive():
+                try:
+                    self.pipeline.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.pipeline = None
+
+    def computeFrames(self, frames, frame_time):
+        """
+        Pipeline thread: calculate frames and put their draw lists to the pipeline queue, waiting when it is full.
+        Runs until frames frames are calculated (if given) or the pipeline is stopped. Errors are passed to the drawing thread.
+        As only the draw lists are passed on, the objects are free to be updated for the next frame while the previous ones are drawn.
+        """
+        frame = 0
+        try:
+            self.pipelineProfiler.restart()
+            while self.pipelineThread is threading.current_thread() and (frames is None or frame < frames):
+                if frame_time is not None:
+                    self.simulatedTime += frame_time
+                self.movement()
+                self.rotate()
+                self.calculate()
+                draw_list = self.drawList()
+                self.pipelineProfiler.next_frame()
+                while self.pipelineThread is threading.current_thread():
+                    try:
+                        self.pipeline.put(draw_list, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                # time waiting for the queue is not measured
+                self.pipelineProfiler.restart()
+                frame += 1
+        except Exception as error:
+            self.pipeline.put(error)
+
+    def nextPipelineFrame(self):
+
+        # return the draw list of the next frame calculated in the pipeline thread, waiting for it if necessary
+        draw_list = self.pipeline.get()
+        if isinstance(draw_list, Exception):
+            raise draw_list
+        self.measureTime("pipeline wait")
+        return draw_list
+
     def movement(self):
         """ 
         Apply movement. Movements may change object positions and rotate angles.
         """
                     
+        # move forward in each movement loop based on elapsed time, and evaluate all movements' splines at their positions at once
         for VectorMovement in self.VectorMovementList:
-            # move forward in precalculated movement loop based on elapsed time
-            # position is a float and the actual movement is interpolated between the two closest observations
-            VectorMovement.moveLoop()
-            loop_pos = int(VectorMovement.loopPos)
-            mult = VectorMovement.loopPos - loop_pos
-            
+            VectorMovement.moveLoop(self.simulatedTime)
+        moves = self.movementSplines.evaluate([VectorMovement.loopPos for VectorMovement in self.VectorMovementList])
+
+        for (VectorMovement, move) in zip(self.VectorMovementList, moves):
             # apply movement to angles
             if VectorMovement.angles is not None:
                 VectorMovement.setRotateAngles()  # additional constant rotation
-                VectorMovement.angles.setAngles(
-                        (1.0 - mult) * VectorMovement.moveSeries[3:6, loop_pos]
-                        + mult * VectorMovement.moveSeries[3:6, loop_pos + 1]
-                        + VectorMovement.rotateAngles
-                        )
+                VectorMovement.angles.setAngles(move[3:6] + VectorMovement.rotateAngles)
 
             if VectorMovement == self.viewerMovement:
-                # check for fade at start and end
-                if loop_pos < 255 / self.fadeSpeed:
-                    self.fade = (loop_pos * self.fadeSpeed) / 255
-                elif loop_pos > VectorMovement.loopEnd - 255 / self.fadeSpeed:
-                    self.fade = ((VectorMovement.loopEnd - loop_pos) * self.fadeSpeed) / 255
-                else:
-                    self.fade = 1.0
+                # check for fade at start and end. fadeSpeed is in fade steps (of 255) per 1/50 second.
+                fade_time = 255 / (self.fadeSpeed * 50.0)
+                self.fade = min(1.0, (VectorMovement.loopPos - VectorMovement.breaks[0]) / VectorMovement.speed / fade_time,
+                                (VectorMovement.loopEnd - VectorMovement.loopPos) / VectorMovement.speed / fade_time)
                 # set viewer position, if viewer movement. Note Y coordinate must be reversed
-                self.VectorPos.position = np.array([
-                        (1.0 - mult) * VectorMovement.moveSeries[0, loop_pos] + mult * VectorMovement.moveSeries[0, loop_pos + 1],
-                        -((1.0 - mult) * VectorMovement.moveSeries[1, loop_pos] + mult * VectorMovement.moveSeries[1, loop_pos + 1]),
-                        (1.0 - mult) * VectorMovement.moveSeries[2, loop_pos] + mult * VectorMovement.moveSeries[2, loop_pos + 1],
-                        1
-                        ])
+                self.VectorPos.position = np.array([move[0], -move[1], move[2], 1])
             else:
                 # copy new position from movement to each object position (for other than viewer movement)
                 for (node_num, VectorObj) in self.VectorPos.objects:
                     if VectorObj.movement == VectorMovement:
-                        self.VectorPos.nodes[node_num, 0:3] = (1.0 - mult) * VectorMovement.moveSeries[0:3, loop_pos] + mult * VectorMovement.moveSeries[0:3, loop_pos + 1] 
+                        self.VectorPos.nodes[node_num, 0:3] = move[0:3]
 
         self.measureTime("movements")
 
+    def buildCullGrid(self):
+        """
+        Build the culling data (see cullObjects) for the objects in VectorPos: a grid of those not moving, and the bounding radii of the others.
+        The ground and the light source are never culled.
+        """
+        self.cullRows = np.array([node_num for (node_num, VectorObj) in self.VectorPos.objects], dtype=int)
+        radii = np.array([VectorObj.boundingRadius for (node_num, VectorObj) in self.VectorPos.objects])
+        always = np.array([VectorObj is self.groundObject or VectorObj is self.lightObject for (node_num, VectorObj) in self.VectorPos.objects], dtype=bool)
+        static = np.array([VectorObj.movement is None for (node_num, VectorObj) in self.VectorPos.objects], dtype=bool) & ~always
+        static_nrs = np.nonzero(static)[0]
+        self.cullGrid = VectorGrid(self.VectorPos.nodes[self.cullRows[static_nrs], 0:3], radii[static_nrs], static_nrs, self.cullCellSize)
+        self.cullMoving = np.nonzero(~static & ~always)[0]
+        self.cullMovingRadii = radii[self.cullMoving]
+        self.cullAlways = np.nonzero(always)[0]
+        object_nrs = dict((id(VectorObj), i) for (i, (node_num, VectorObj)) in enumerate(self.VectorPos.objects))
+        self.cullArenaIndex = np.array([object_nrs[id(VectorObj)] for VectorObj in self.nodeArena.objects], dtype=int)
+        self.cullTotals[:] = 0
+
+    def cullObjects(self):
+        """
+        Return an array (bool) by VectorPos.objects, True for objects whose bounding spheres are at least partly within the view frustum.
+        Objects not moving are culled with the grid, whole cells first (see VectorGrid); moving objects are tested one by one.
+        VectorPos must have been rotated.
+        """
+        planes = frustum_planes(self.midScreen, self.zScale, self.objMinZ)
+        centers = self.VectorPos.rotatedNodes[self.cullRows, 0:3]
+        active = np.zeros((len(self.cullRows)), dtype=bool)
+        active[self.cullGrid.cull(self.VectorPos.position, self.VectorPos.angles.rotationMatrix, centers, planes)] = True
+        active[self.cullMoving] = spheres_in_frustum(centers[self.cullMoving], self.cullMovingRadii, planes)
+        active[self.cullAlways] = True
+        active_count = int(np.count_nonzero(active))
+        self.cullStats = (self.cullGrid.cellsVisible, len(self.cullGrid.cellRadii), active_count, len(active))
+        self.cullTotals += (self.cullGrid.cellsVisible, self.cullGrid.objectsTested + len(self.cullMoving), active_count)
+        return active
+
     def rotate(self):
         """ 
         Rotate all objects. First calculate rotation matrix.
         Then apply the relevant rotation matrix with object position to each VectorObject.
+        If culling is used, only the objects at least partly within the view frustum are processed; the others are not visible.
         """
                 
-        # calculate rotation matrices for all angle sets
-        for VectorAngles in self.VectorAnglesList:
-            VectorAngles.setRotationMatrix()
+        # calculate rotation matrices for all angle sets at once; angle sets not changed (or seen recently) are taken from the cache
+        matrices = self.rotations.matrices([VectorAngles.rotationAngles() for VectorAngles in self.VectorAnglesList])
+        for (VectorAngles, matrix) in zip(self.VectorAnglesList, matrices):
+            VectorAngles.rotationMatrix = matrix
         self.measureTime("rotation matrix")
         
-        # rotate object positions, copy those to objects.
+        # rotate object positions, cull objects outside the view, and copy the positions to the objects left.
         self.VectorPos.rotate() 
-        for (node_num, VectorObj) in self.VectorPos.objects:
+        if self.useCulling == True:
+            active = self.cullObjects()
+            objects = [self.VectorPos.objects[i] for i in np.nonzero(active)[0]]
+            arena_active = active[self.cullArenaIndex]
+        else:
+            objects = self.VectorPos.objects
+            arena_active = None
+        for (node_num, VectorObj) in objects:
             VectorObj.setPosition(self.VectorPos.rotatedNodes[node_num, :])
             VectorObj.setNodePosition(self.VectorPos.nodes[node_num, :])
             # also copy light  source object position to light position, if such object is defined.
             if self.lightObject == VectorObj: 
                 self.lightPosition = self.VectorPos.rotatedNodes[node_num, :]
                 self.lightNode = self.VectorPos.nodes[node_num, 0:3]
+            # choose the level of detail by distance
+            if self.useLod == True:
+                VectorObj.updateLod(self.lodHysteresis)
+            else:
+                VectorObj.setLod(0)
         self.measureTime("positions")
 
-        # rotate and flatten (transform) objects
-        for VectorObj in self.VectorObjs:
-            VectorObj.updateVisiblePos(self.objMinZ) # test for object position Z
-            if VectorObj.visible == 1:
-                VectorObj.rotate(self.viewerMovement.angles) # rotates objects in 3D
-                VectorObj.updateVisibleNodes(self.objMinZ) # test for object minimum Z
-                self.measureTime("rotate")
-                if VectorObj.visible == 1:
-                    VectorObj.transform(self.midScreen, self.zScale, self.objMinZ) # flattens to 2D
-                    VectorObj.updateVisibleTrans(self.midScreen) # test for outside of screen
-                    self.measureTime("transform 2D")
+        # rotate and flatten (transform) all objects at once, in the node arena
+        positions = self.VectorPos.rotatedNodes[self.nodeArena.posIndex, 0:3]
+        self.nodeArena.rotate(self.viewerMovement.angles, positions, arena_active) # rotates objects in 3D
+        self.measureTime("rotate")
+        self.nodeArena.transform(self.midScreen, self.zScale) # flattens to 2D
+        visible = self.nodeArena.updateVisible(positions, self.objMinZ, self.midScreen) # test for object Z and outside of screen
+        # only objects whose visibility changed, and visible flat objects, need updating.
+        if np.size(self.objectsVisible) != np.size(visible):
+            self.objectsVisible = np.full(np.shape(visible), -1)
+        update_nrs = np.nonzero((visible != self.objectsVisible) | ((visible == 1) & self.nodeArena.isFlat))[0]
+        self.objectsVisible = visible
+        for arena_nr in update_nrs:
+            VectorObj = self.nodeArena.objects[arena_nr]
+            obj_visible = visible[arena_nr]
+            VectorObj.visible = obj_visible
+            if obj_visible == 1 and VectorObj.isFlat == 1:
+                # flat objects are cropped to minimum Z surface by surface, so they are flattened separately
+                VectorObj.transform(self.midScreen, self.zScale, self.objMinZ)
+                VectorObj.updateVisibleTrans(self.midScreen)
+        self.measureTime("transform 2D")
             
     def calculate(self):
         """ 
@@ -245,116 +1023,216 @@ class VectorViewer:
         """ 
         Draw the VectorObjs on the screen. 
         """
+        self.drawFrame(self.drawList())
 
+    def drawList(self):
+        """ 
+        Build the list of drawing operations for the VectorObjs, in drawing order; see drawFrame.
+        The operations only refer to data built here, not to the objects, so that the next frame can be calculated while this one is
+        being drawn (see computeFrames).
+        """
+        draw_list = []
         # clear screen. If ground object is used, do clearing there, not here. 
         if self.groundObject is None:
-            self.screen.fill(self.backgroundColor)
-            self.measureTime("screen clear")
+            draw_list.append(('fill', self.backgroundColor))
+            draw_list.append(('measure', "screen clear"))
                    
-        # first sort VectorObjs so that the most distant is first, but prio classes separately.
-        # prio classes allow e.g. to draw all roads first and only then other objects
-        self.VectorObjs.sort(key=lambda VectorObject: (VectorObject.prio, VectorObject.position[2]), reverse=True)
+        # first sort VectorObjs so that the most distant is first. Prio classes are drawn separately, see below.
+        # the order is kept from the previous frame; it changes little between frames, and is not sorted at all if it still holds.
+        if np.size(self.objectOrder) != len(self.VectorObjs):
+            arena_nrs = dict((id(VectorObj), i) for (i, VectorObj) in enumerate(self.nodeArena.objects))
+            self.objectOrder = np.array([arena_nrs[id(VectorObj)] for VectorObj in self.VectorObjs], dtype=int)
+            self.objectOrderKeys = np.zeros((len(self.VectorObjs)))
+        (self.objectOrder, self.objectsMoved) = updateDrawOrder(self.objectOrder, self.nodeArena.positions[:, 2], self.objectOrderKeys)
+        if self.objectsMoved > 0:
+            self.VectorObjs = [self.nodeArena.objects[i] for i in self.objectOrder]
+        self.surfacesMoved = 0
         
-        # draw prio by prio
+        # the rasterizer uses the arena transNodes as vertices; they are copied to this frame's buffer when needed.
+        trans_nodes = None
+        
+        # draw prio by prio. prio classes allow e.g. to draw all roads first and only then other objects
+        visible_objs = [VectorObj for VectorObj in self.VectorObjs if VectorObj.visible == 1]
         for prio_nr in self.VectorObjPrios:
 
             # draw shadows always first for all visible objects
-            self.screen_shadows.lock()
-            shadow_rect = None
-            for VectorObj in (vobj for vobj in self.VectorObjs if vobj.visible == 1 and vobj.prio == prio_nr and vobj.shadow == 1):
-                node_list = self.cropEdges(VectorObj.shadowTransNodes)                
-                rect = self.drawPolygon(self.screen_shadows, self.shadowColor, node_list, 0)
-                if shadow_rect is None:
-                    shadow_rect = rect
-                else:
-                    shadow_rect = shadow_rect.union(rect)
-            while self.screen_shadows.get_locked():
-                self.screen_shadows.unlock()
-            if shadow_rect is not None:
-                # blit the "multiplied" screen copy to add shadows on main screen
-                # release any locks on screen
-                while self.screen.get_locked():
-                    self.screen.unlock()
-                self.screen.blit(self.screen_shadows, shadow_rect, shadow_rect, pygame.BLEND_MULT)
-                # clear the surface copy after use back to "all white"
-                self.screen_shadows.fill((255,255,255), shadow_rect)
-                self.measureTime("draw shadows")
+            shadows = [VectorObj.shadowTransNodes for VectorObj in visible_objs if VectorObj.prio == prio_nr and VectorObj.shadow == 1]
+            if len(shadows) > 0:
+                shadows = self.cropEdges(shadows)
+                draw_list.append(('shadows', shadows))
+                draw_list.append(('measure', "draw shadows"))
                 
-            # lock screen for drawing operations
-            self.screen.lock()
-    
             # draw the actual objects
-            for VectorObj in (vobj for vobj in self.VectorObjs if vobj.visible == 1 and vobj.prio == prio_nr):
+            raster_objs = []
+            for VectorObj in (vobj for vobj in visible_objs if vobj.prio == prio_nr):
+
+                if self.useRasterizer and VectorObj != self.groundObject and VectorObj.isFlat == 0 \
+                        and not np.any(VectorObj.surfaceEdgeWidth[VectorObj.surfaceVisible == 1] > 0):
+                    # collect consecutive normal objects and draw them in one batch
+                    raster_objs.append(VectorObj)
+                    continue
+                elif len(raster_objs) > 0:
+                    trans_nodes = self.rasterList(draw_list, raster_objs, trans_nodes)
+                    raster_objs = []
 
                 if VectorObj == self.groundObject:
                     # special object to add ground data
                     transNodes = VectorObj.groundData(self.midScreen, self.zScale, self.objMinZ, self.groundZ, self.groundShadeNr)
                     # draw ground. transNodes is of shape(groundShadeNr + 2, 4) and each row has two (left & right) X,Y coordinates
                     surface = VectorObj.surfaces[0]  # just one ground surface                      
-                    # the first component is not part of the ground but used to clear the rest of the screen
-                    node_list = self.cropEdges([transNodes[0,0:2], transNodes[0,2:4], transNodes[1,2:4], transNodes[1,0:2]], False, True) # X already cropped
+                    # crop all parts of the ground at once. The first part is not part of the ground but used to clear the rest of the screen,
+                    # then come the ground shades, and last the whole ground area. X is already cropped.
+                    ground_nodes = np.stack((transNodes[:-1, 0:2], transNodes[:-1, 2:4], transNodes[1:, 2:4], transNodes[1:, 0:2]), axis=1)
+                    ground_nodes = np.vstack((ground_nodes, np.vstack((ground_nodes[1, 0:2, :], ground_nodes[-1, 2:4, :]))[None, :, :]))
+                    ground_lists = self.cropPolygons(ground_nodes, np.full((np.shape(ground_nodes)[0]), 4), False, True)
                     use_color = ([round(self.fade * x, 0) for x in self.backgroundColor]) 
-                    self.drawPolygon(self.screen, use_color, node_list, 0)                   
+                    draw_list.append(('polygon', use_color, ground_lists[0], 0))
                     if self.groundBlendPrio is not None:
                         # fill the whole ground area with one color
-                        node_list = self.cropEdges([transNodes[1,0:2], transNodes[1,2:4], transNodes[self.groundShadeNr + 1,2:4], transNodes[self.groundShadeNr + 1,0:2]], False, True) # X already cropped
                         use_color = ([round(self.fade * x, 0) for x in surface.color]) 
-                        self.drawPolygon(self.screen, use_color, node_list, 0)                   
-                        self.measureTime("ground + clear")
-                        # draw the blends needed to "copy surface" for later blitting.
-                        self.screen_blends.lock()
-                        blend_rect = None
-                        for i in range(self.groundShadeNr - 1):
-                            node_list = self.cropEdges([transNodes[i+1,0:2], transNodes[i+1,2:4], transNodes[i+2,2:4], transNodes[i+2,0:2]], False, True) # X already cropped
-                            # set color for blending as all R,G,B being between 0 (all blended away) and 255 (no effect)
-                            use_color = int((2.55 * self.groundZShade * (self.groundShadeNr - 1 - i) + 255.0 * i) / (self.groundShadeNr - 1) + 0.5)
-                            rect = self.drawPolygon(self.screen_blends, (use_color,use_color,use_color), node_list, 0)
-                            if blend_rect is None:
-                                blend_rect = rect
-                            else:
-                                blend_rect = blend_rect.union(rect)
-                        while self.screen_blends.get_locked():
-                            self.screen_blends.unlock()
-                        self.measureTime("draw blends")
+                        draw_list.append(('polygon', use_color, ground_lists[-1], 0))
+                        draw_list.append(('measure', "ground + clear"))
+                        gradient = None
+                        if self.groundGradient:
+                            # build the gradient to multiply the screen with, instead of the blends.
+                            gradient = self.groundGradientSegments(transNodes)
+                        if gradient is not None:
+                            draw_list.append(('gradient', ) + gradient)
+                        else:
+                            # draw the blends needed to "copy surface" for later blitting.
+                            blends = []
+                            for i in range(self.groundShadeNr - 1):
+                                # set color for blending as all R,G,B being between 0 (all blended away) and 255 (no effect)
+                                use_color = self.groundShades[i]
+                                blends.append(((use_color,use_color,use_color), ground_lists[i + 1]))
+                            draw_list.append(('blends', blends))
+                        draw_list.append(('measure', "draw blends"))
                     else:
                         # draw ground directly.
                         for i in range(self.groundShadeNr):
-                            node_list = self.cropEdges([transNodes[i+1,0:2], transNodes[i+1,2:4], transNodes[i+2,2:4], transNodes[i+2,0:2]], False, True) # X already cropped
                             # set color for blending as a percentage of surface color
                             color_shade = self.fade * ((self.groundZShade * (self.groundShadeNr - 1 - i) + 100.0 * i) / (self.groundShadeNr - 1)) / 100.0  
                             use_color = ([round(color_shade * x, 0) for x in surface.color])
-                            self.drawPolygon(self.screen, use_color, node_list, surface.edgeWidth)
-                        self.measureTime("ground + clear")
+                            draw_list.append(('polygon', use_color, ground_lists[i + 1], surface.edgeWidth))
+                        draw_list.append(('measure', "ground + clear"))
                    
                 else:
                     if VectorObj.isFlat == 1:
                         # flat objects have a single surface and a prebuilt list of transNodes
                         surface = VectorObj.surfaces[0]
-                        node_list = self.cropEdges(VectorObj.transNodes)
-                        self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth)
+                        node_list = self.cropEdges([VectorObj.transNodes])[0]
+                        draw_list.append(('polygon', surface.colorRGB(self.fade), node_list, surface.edgeWidth))
                     else:
                         # first sort object surfaces so that the most distant is first. For concave objects there should be no overlap, though.
-                        VectorObj.sortSurfacesByZPos()
+                        self.surfacesMoved += VectorObj.sortSurfacesByZPos()
+                        colors = VectorObj.surfaceColorsRGB(self.fade)
                         # then draw surface by surface. This is the most common case, the above are for special objects.
-                        for surface in (surf for surf in VectorObj.surfaces if surf.visible == 1):
-                            # build a list of transNodes for this surface
-                            node_list = ([VectorObj.transNodes[node][:2] for node in surface.nodes])
-                            self.drawPolygon(self.screen, surface.colorRGB(self.fade), node_list, surface.edgeWidth)       
-                    self.measureTime("draw surfaces")
+                        surf_order = VectorObj.surfaceOrder
+                        for surf_nr in surf_order[VectorObj.surfaceVisible[surf_order] == 1]:
+                            # pick the transNodes for this surface
+                            node_list = VectorObj.transNodes[VectorObj.surfaceNodes[surf_nr, 0:VectorObj.surfaceNodeNum[surf_nr]], 0:2]
+                            draw_list.append(('polygon', colors[surf_nr], node_list, VectorObj.surfaceEdgeWidth[surf_nr]))
+                    draw_list.append(('measure', "draw surfaces"))
+            if len(raster_objs) > 0:
+                trans_nodes = self.rasterList(draw_list, raster_objs, trans_nodes)
             
-            if prio_nr == self.groundBlendPrio and blend_rect is not None:
+            if prio_nr == self.groundBlendPrio:
                 # after groundBlendPrio, blit the "multiplied" screen copy to use a sliding color scale
-                # release any locks on screen
+                draw_list.append(('blend blit', ))
+
+        self.sortMovedTotal += (self.objectsMoved, self.surfacesMoved)
+        self.measureTime("draw list")
+        return draw_list
+
+    def drawFrame(self, draw_list):
+        """ 
+        Draw a list of drawing operations built by drawList on the screen. The operations are:
+            ('fill', color)                                 clear the screen (the areas drawn in the previous frame, see DirtyRects)
+            ('polygon', color, node_list, edgeWidth)        draw a polygon
+            ('shadows', [node_list, ...])                   draw shadows, multiplying the screen with the shadow color
+            ('blends', [(color, node_list), ...])           draw polygons on the blend surface, to be used by the next 'blend blit'
+            ('gradient', x, y, width, shade_nr)             a ground gradient (see groundGradientSegments), to be used by the next 'blend blit'
+            ('blend blit', )                                multiply the screen with the blend surface or the gradient
+            ('raster', vertices, polygons, counts, colors)  draw polygons with the rasterizer (see Rasterizer.fill_polygons)
+            ('measure', timer_name)                         add the time spent since the previous measure to a timer
+        """
+        blend_rect = None
+        gradient = None
+        # lock screen for drawing operations
+        self.screen.lock()
+        for operation in draw_list:
+            kind = operation[0]
+            if kind == 'polygon':
+                self.dirtyRects.add(self.drawPolygon(self.screen, operation[1], operation[2], operation[3]))
+            elif kind == 'measure':
+                self.measureTime(operation[1])
+            elif kind == 'fill':
                 while self.screen.get_locked():
                     self.screen.unlock()
-                self.screen.blit(self.screen_blends, blend_rect, blend_rect, pygame.BLEND_MULT)
+                self.dirtyRects.clear(self.screen, operation[1])
                 self.screen.lock()
+            elif kind == 'shadows':
+                self.screen_shadows.lock()
+                shadow_rect = None
+                for node_list in operation[1]:
+                    rect = self.drawPolygon(self.screen_shadows, self.shadowColor, node_list, 0)
+                    if shadow_rect is None:
+                        shadow_rect = rect
+                    else:
+                        shadow_rect = shadow_rect.union(rect)
+                while self.screen_shadows.get_locked():
+                    self.screen_shadows.unlock()
+                # blit the "multiplied" screen copy to add shadows on main screen
+                # release any locks on screen
+                while self.screen.get_locked():
+                    self.screen.unlock()
+                self.screen.blit(self.screen_shadows, shadow_rect, shadow_rect, pygame.BLEND_MULT)
+                self.dirtyRects.add(shadow_rect)
                 # clear the surface copy after use back to "all white"
-                self.screen_blends.fill((255,255,255), blend_rect)
-                self.measureTime("draw blends")
+                self.screen_shadows.fill((255,255,255), shadow_rect)
+                self.screen.lock()
+            elif kind == 'blends':
+                self.screen_blends.lock()
+                for (color, node_list) in operation[1]:
+                    rect = self.drawPolygon(self.screen_blends, color, node_list, 0)
+                    if blend_rect is None:
+                        blend_rect = rect
+                    else:
+                        blend_rect = blend_rect.union(rect)
+                while self.screen_blends.get_locked():
+                    self.screen_blends.unlock()
+            elif kind == 'gradient':
+                gradient = operation[1:]
+            elif kind == 'blend blit':
+                if gradient is not None:
+                    self.dirtyRects.add(self.blitGradient(*gradient))
+                    gradient = None
+                    self.measureTime("draw blends")
+                if blend_rect is not None:
+                    # release any locks on screen
+                    while self.screen.get_locked():
+                        self.screen.unlock()
+                    self.screen.blit(self.screen_blends, blend_rect, blend_rect, pygame.BLEND_MULT)
+                    self.dirtyRects.add(blend_rect)
+                    self.screen.lock()
+                    # clear the surface copy after use back to "all white"
+                    self.screen_blends.fill((255,255,255), blend_rect)
+                    self.measureTime("draw blends")
+            elif kind == 'raster':
+                (vertices, polygons, counts, colors) = operation[1:]
+                pixels = pygame.surfarray.pixels2d(self.screen)
+                fill_polygons(pixels, vertices, polygons, counts, map_colors(self.screen, colors))
+                del pixels
+                # the area drawn is within the bounding rectangle of the vertices used
+                used = vertices[np.unique(polygons), 0:2]
+                (x0, y0) = np.floor(np.min(used, axis=0)).astype(int)
+                (x1, y1) = np.ceil(np.max(used, axis=0)).astype(int)
+                self.dirtyRects.add((x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+                self.measureTime("draw surfaces")
                 
         # unlock screen
-        self.screen.unlock()
+        while self.screen.get_locked():
+            self.screen.unlock()
 
     def plotInfo(self):
         """ 
@@ -366,13 +1244,15 @@ class VectorViewer:
         while self.screen.get_locked():
             self.screen.unlock()
 
+        info_rects = []
+
         # print viewer angles
         info_msg = (self.viewerMovement.angles.angName + " ang" + ' '*10)[:12]
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[0])))[-6:]    
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[1])))[-6:]    
         info_msg += (' '*10 + str(int(self.viewerMovement.angles.angles[2])))[-6:]    
         f_screen = self.font.render(info_msg, False, [255,255,255])
-        self.screen.blit(f_screen, (10,10))
+        info_rects.append(self.screen.blit(f_screen, (10,10)))
 
         # print viewer position
         info_msg = ("viewer pos" + ' '*10)[:12]
@@ -380,67 +1260,162 @@ class VectorViewer:
         info_msg += (' '*10 + str(int(self.VectorPos.position[1])))[-6:]    
         info_msg += (' '*10 + str(int(self.VectorPos.position[2])))[-6:]    
         f_screen = self.font.render(info_msg, False, [255,255,255])
-        self.screen.blit(f_screen, (10,30))
+        info_rects.append(self.screen.blit(f_screen, (10,30)))
 
         # print movement loopPos
         info_msg = ("move pos" + ' '*10)[:12]
         for movement in self.VectorMovementList:
             info_msg += (' '*10 + str(int(movement.loopPos)))[-6:]    
         f_screen = self.font.render(info_msg, False, [255,255,255])
-        self.screen.blit(f_screen, (10,50))
+        info_rects.append(self.screen.blit(f_screen, (10,50)))
+
+        # print number of visible objects using each level of detail
+        info_msg = ("lod objects" + ' '*10)[:12]
+        if self.useLod == True:
+            lod_counts = np.bincount([vobj.lod for vobj in self.VectorObjs if vobj.visible == 1], minlength=3)
+            for lod_count in lod_counts:
+                info_msg += (' '*10 + str(lod_count))[-6:]
+        else:
+            info_msg += "   off"
+        f_screen = self.font.render(info_msg, False, [255,255,255])
+        info_rects.append(self.screen.blit(f_screen, (10,70)))
+
+        # print number of objects and surfaces which changed places in the drawing order
+        info_msg = ("sort moved" + ' '*10)[:12]
+        info_msg += (' '*10 + str(self.objectsMoved))[-6:]
+        info_msg += (' '*10 + str(self.surfacesMoved))[-6:]
+        f_screen = self.font.render(info_msg, False, [255,255,255])
+        info_rects.append(self.screen.blit(f_screen, (10,90)))
+
+        # print culling: grid cells visible and in total, objects left and in total
+        info_msg = ("culled" + ' '*10)[:12]
+        if self.useCulling == True:
+            for cull_count in self.cullStats:
+                info_msg += (' '*10 + str(cull_count))[-6:]
+        else:
+            info_msg += "   off"
+        f_screen = self.font.render(info_msg, False, [255,255,255])
+        info_rects.append(self.screen.blit(f_screen, (10,110)))
 
         # add Frames Per Second
         fps = self.clock.get_fps() # avg frame rate using the last ten frames
         info_msg = ("fps" + ' '*16)[:16] + (' '*10 + str(round(fps, 1)))[-7:]
-        self.screen.blit(self.font.render(info_msg, False, [255,255,255]), (10,90))
+        info_rects.append(self.screen.blit(self.font.render(info_msg, False, [255,255,255]), (10,130)))
         
-        # add measured times as percentage of total
+        # add measured times as percentage of total. With a pipeline, its timers are added, still as percentage of the drawing thread total.
         tot_time = np.sum(self.timers)
+        timers = self.timers
+        if self.pipelineThread is not None:
+            timers = timers + self.pipelineProfiler.timers
         if tot_time > 0:
             for i in range(len(self.timer_names)):
-                info_msg = (self.timer_names[i] + ' '*16)[:16] + (' '*10 + str(round(np.sum(self.timers[i,:]) * 100 / tot_time, 1)))[-7:]
-                self.screen.blit(self.font.render(info_msg, False, [255,255,255]), (10, 110 + i * 20))
+                info_msg = (self.timer_names[i] + ' '*16)[:16] + (' '*10 + str(round(np.sum(timers[i,:]) * 100 / tot_time, 1)))[-7:]
+                info_rects.append(self.screen.blit(self.font.render(info_msg, False, [255,255,255]), (10, 150 + i * 20)))
         
+        # the info area is drawn over, and needs clearing, on every frame
+        self.dirtyRects.add(info_rects[0].unionall(info_rects))
         self.measureTime("plot info")
         
-    def cropEdges(self, node_list, cropX = True, cropY = True):
-        # crop to screen size. "Auto crop" does not seem to work if points very far outside.
-        # takes list of nodes (X,Y) in drawing order as input.
-        # returns list of nodes (X,Y) cropped to screen edges.
-        # crop both X, Y, if cropX and cropY = True; X: i=0, Y: i=1
-        if len(node_list) > 2:
-            for i in range(2):
-                if (i == 0 and cropX == True) or (i == 1 and cropY == True):
-                    crop_nodes = [] # empty list
-                    prev_node = node_list[-1]
-                    for node in node_list:
-                        diff_node = node - prev_node # surface side vector
-                        # start cropping from prev_node direction, as order must stay the same
-                        if node[i] >= 0 and prev_node[i] < 0:
-                            # line crosses 0, so add a "crop point". Start from previous node and add difference stopping to 0
-                            crop_nodes.append(prev_node + diff_node * ((0 - prev_node[i]) / diff_node[i]))
-                        if node[i] <= self.midScreen[i] * 2 and prev_node[i] > self.midScreen[i] * 2:
-                            # line crosses screen maximum, so add a "crop point". Start from previous node and add difference stopping to midScreen[i] * 2
-                            crop_nodes.append(prev_node + diff_node * ((self.midScreen[i] * 2 - prev_node[i]) / diff_node[i]))
-                        # then crop current node
-                        if node[i] < 0 and prev_node[i] >= 0:
-                            # line crosses 0, so add a "crop point". Start from previous node and add difference stopping to 0
-                            crop_nodes.append(prev_node + diff_node * ((0 - prev_node[i]) / diff_node[i]))
-                        if node[i] > self.midScreen[i] * 2 and prev_node[i] <= self.midScreen[i] * 2:
-                            # line crosses screen maximum, so add a "crop point". Start from previous node and add difference stopping to midScreen[i] * 2
-                            crop_nodes.append(prev_node + diff_node * ((self.midScreen[i] * 2 - prev_node[i]) / diff_node[i]))         
-                        # always add current node, if it is on screen
-                        if node[i] >= 0 and node[i] <= self.midScreen[i] * 2:
-                            crop_nodes.append(node)
-                        prev_node = node
-                    # for next i, copy results. Quit loop if no nodes to look at
-                    node_list = crop_nodes
-                    if len(node_list) < 3:
-                        break               
-            # convert to integers
-            node_list = [(int(x[0] + 0.5), int(x[1] + 0.5)) for x in node_list]
-        return node_list
+    def cropEdges(self, node_lists, cropX = True, cropY = True):
+        # crop polygons to screen size. "Auto crop" does not seem to work if points very far outside.
+        # takes a list of polygons, each a sequence of nodes (X,Y) in drawing order, and crops them all at once.
+        # returns a list of integer node arrays cropped to screen edges; X and Y are cropped if cropX and cropY = True.
+        (polygons, counts) = pad_polygons(node_lists)
+        return self.cropPolygons(polygons, counts, cropX, cropY)
+
+    def cropPolygons(self, polygons, counts, cropX = True, cropY = True):
+        # as cropEdges, for polygons in a padded array of shape (polygons, max nodes, 2) with their node counts (see Clipping.py).
+        (buffer, offsets) = clip_polygons(polygons, counts, rect_planes(0, 0, self.midScreen[0] * 2, self.midScreen[1] * 2, cropX, cropY))
+        # convert to integers
+        return split_polygons((buffer + 0.5).astype(int), offsets)
                               
+
+    def groundGradientSegments(self, transNodes):
+        """
+        Build the ground shading gradient from ground data (see VectorObject.groundData), to be blitted by blitGradient.
+        The lines between ground elements are parallel on screen, so the shade of a pixel (x, y) depends only on v = y - slope * x.
+        The ground element numbers are first stored by v in a ramp (a lookup array), built like the blend polygons would be drawn,
+        and then each screen row is split to horizontal segments of the same shade.
+        Returns arrays of the X, Y, width and ground element number of each segment to be shaded, or None if the ground is
+        tilted more than groundGradientMaxSlope, as the segments would then be too many to be faster than the blend polygons.
+        """
+        lines = transNodes[1:, :]  # left X,Y and right X,Y of each line, starting from the most distant
+        slope = (lines[0, 3] - lines[0, 1]) / (lines[0, 2] - lines[0, 0])
+        if not abs(slope) <= self.groundGradientMaxSlope:
+            return None
+        shifts = np.floor(slope * np.arange(self.width) + 0.5).astype(np.int64)
+        # the range of v on screen, and the v of each line (its Y at X = 0) rounded like the cropped polygons
+        v_min = -np.max(shifts)
+        v_max = self.height - 1 - np.min(shifts)
+        v_lines = np.clip(np.floor(lines[:, 1] - slope * lines[:, 0] + 0.5), v_min - 1, v_max + 1).astype(np.int64) - v_min
+        # the nearest element is not shaded (its multiplier is 255), nor is anything outside the ground
+        no_shade = self.groundShadeNr - 1
+        ramp = np.full((v_max - v_min + 1), no_shade, dtype=np.int64)
+        for i in range(self.groundShadeNr - 1):
+            # element i is between lines i and i + 1, edges included, and drawn over the more distant elements
+            (v0, v1) = np.sort(v_lines[i:i + 2])
+            ramp[max(v0, 0):max(v1 + 1, 0)] = i
+
+        # runs of v with the same shade, v_start to v_end inclusive
+        starts = np.flatnonzero(np.diff(ramp, prepend=-1))
+        ends = np.append(starts[1:], np.size(ramp)) - 1
+        shaded = ramp[starts] != no_shade
+        if not np.any(shaded):
+            return (np.zeros((0), dtype=np.int64), ) * 4
+        (v_start, v_end, shade_nr) = (starts[shaded] + v_min, ends[shaded] + v_min, ramp[starts[shaded]])
+        # the columns where each run is on each screen row; shifts grow or diminish with X
+        rows = np.arange(max(v_start[0] + np.min(shifts), 0), min(v_end[-1] + np.max(shifts), self.height - 1) + 1)[:, None]
+        if shifts[-1] >= shifts[0]:
+            x0 = np.searchsorted(shifts, rows - v_end, 'left')
+            x1 = np.searchsorted(shifts, rows - v_start, 'right')
+        else:
+            x0 = self.width - np.searchsorted(shifts[::-1], rows - v_start, 'right')
+            x1 = self.width - np.searchsorted(shifts[::-1], rows - v_end, 'left')
+        use = x1 > x0
+        return (x0[use], np.broadcast_to(rows, np.shape(x0))[use], (x1 - x0)[use], np.broadcast_to(shade_nr, np.shape(x0))[use])
+
+    def blitGradient(self, x, y, width, shade_nr):
+        """
+        Multiply the screen with a ground gradient built by groundGradientSegments, blitting each segment from the row of
+        groundShadeSurface with its shade, using BLEND_MULT. Returns the Rect changed.
+        """
+        if np.size(x) == 0:
+            return None
+        # release any locks on screen
+        while self.screen.get_locked():
+            self.screen.unlock()
+        self.screen.blits([(self.groundShadeSurface, (x_i, y_i), (0, nr, width_i, 1), pygame.BLEND_MULT)
+                           for (x_i, y_i, width_i, nr) in zip(x.tolist(), y.tolist(), width.tolist(), shade_nr.tolist())], doreturn=False)
+        self.screen.lock()
+        return pygame.Rect(np.min(x), np.min(y), np.max(x + width) - np.min(x), np.max(y) - np.min(y) + 1)
+
+    def rasterList(self, draw_list, VectorObjs, trans_nodes):
+        
+        # add a drawing operation for the visible surfaces of VectorObjs, in this order, as one batch of polygons for the rasterizer.
+        # the vertices are the arena transNodes, copied to one of the frame buffers (at most pipelineDepth + 2 frames are in use at once).
+        # returns the copied transNodes, to be used for the rest of the frame.
+        if trans_nodes is None:
+            if len(self.frameTransNodes) != self.pipelineDepth + 2 or np.shape(self.frameTransNodes[0]) != np.shape(self.nodeArena.transNodes):
+                self.frameTransNodes = [np.zeros(np.shape(self.nodeArena.transNodes)) for i in range(self.pipelineDepth + 2)]
+            self.frameBuffer = (self.frameBuffer + 1) % len(self.frameTransNodes)
+            trans_nodes = self.frameTransNodes[self.frameBuffer]
+            trans_nodes[:, :] = self.nodeArena.transNodes
+        polygons = []
+        counts = []
+        colors = []
+        for VectorObj in VectorObjs:
+            self.surfacesMoved += VectorObj.sortSurfacesByZPos()
+            surf_order = VectorObj.surfaceOrder
+            surfs = surf_order[VectorObj.surfaceVisible[surf_order] == 1]
+            polygons.append(VectorObj.surfaceNodes[surfs, :] + VectorObj.arenaOffset)
+            counts.append(VectorObj.surfaceNodeNum[surfs])
+            colors.append(VectorObj.surfaceColorsRGB(self.fade)[surfs, :])
+        # surface tables of different objects may have different widths; pad with the first node
+        width = max(np.shape(p)[1] for p in polygons)
+        polygons = np.vstack([np.hstack((p, np.repeat(p[:, 0:1], width - np.shape(p)[1], axis=1))) for p in polygons])
+        draw_list.append(('raster', trans_nodes, polygons, np.hstack(counts), np.vstack(colors)))
+        return trans_nodes
+
     def drawPolygon(self, screen, color, node_list, edgeWidth):
 
         # draws a filled antialiased polygon, returns its Rect (area covered)
@@ -454,6 +1429,42 @@ class VectorViewer:
         else:
             return pygame.Rect(0,0,0,0)
                 
+    def simplifyObject(self, VectorObj):
+
+        # add automatically simplified levels of detail to an object: first with neighbouring surfaces in the same plane merged,
+        # and then collapsed to its bounding box. Each is used when the object is smaller on screen than the respective lodPixels,
+        # and only if it has fewer surfaces than the previous level.
+        used_nodes = VectorObj.nodes[np.unique(VectorObj.surfaceNodes), 0:3]
+        size = 2.0 * np.max(np.sqrt(np.sum((used_nodes - (np.min(used_nodes, axis=0) + np.max(used_nodes, axis=0)) / 2.0) ** 2, axis=1)))
+        for (pixels, simplify) in ((self.lodPixels[0], VectorObj.mergedSurfaces), (self.lodPixels[1], VectorObj.boundingBoxSurfaces)):
+            simplified = simplify()
+            if simplified is not None and np.shape(simplified[1][0])[0] < np.shape(VectorObj.surfaceNodes)[0]:
+                (new_nodes, surface_table) = simplified
+                VectorObj.addLodNodes(new_nodes)
+                VectorObj.addLod(size * self.zScale / pixels, size / pixels)
+                VectorObj.setSurfaceTable(*surface_table)
+        VectorObj.setLod(0)
+
+    def toggleLod(self):
+
+        # switch levels of detail on/off. When off, all objects are drawn at full detail (from the next rotate on).
+        self.useLod = not self.useLod
+
+    def toggleCulling(self):
+
+        # switch frustum culling on/off. When off, all objects are rotated and tested for visibility.
+        self.useCulling = not self.useCulling
+
+    def toggleGroundGradient(self):
+
+        # switch between ground shading with a gradient and with blend polygons
+        self.groundGradient = not self.groundGradient
+
+    def toggleRasterizer(self):
+
+        # switch between drawing surfaces with pygame.draw and the batched rasterizer
+        self.useRasterizer = not self.useRasterizer
+
     def terminate(self):
 
         self.running = False   
@@ -479,6 +1490,7 @@ class VectorViewer:
         self.screen_shadows = self.screen.copy()
         self.screen_blends.fill((255,255,255))
         self.screen_shadows.fill((255,255,255))
+        self.dirtyRects.force_full()
        
     def toggleInfoDisplay(self):
         
@@ -489,590 +1501,45 @@ class VectorViewer:
             self.infoDisplay = True
 
     def measureTime(self, timer_name):
-        # add time elapsed from previous call to selected timer
-        i = self.timer_names.index(timer_name)
-        new_time = pygame.time.get_ticks()
-        self.timers[i, self.timer_frame] += (new_time - self.millisecs)
-        self.millisecs = new_time
+        # add time elapsed from previous call to selected timer. The pipeline thread has its own timers.
+        if self.pipelineThread is not None and self.pipelineThread is threading.current_thread():
+            self.pipelineProfiler.measure(timer_name)
+        else:
+            self.profiler.measure(timer_name)
         
     def nextTimeFrame(self):
         # move to next timer and clear data
-        self.timer_frame += 1
-        if self.timer_frame >= self.timer_avg_frames:
-            self.timer_frame = 0
-        self.timers[:, self.timer_frame] = 0
+        self.profiler.next_frame()
                
-class VectorObject:
-
-    """
-    Position is the object's coordinates.
-    Nodes are the predefined, static definition of object "corner points", around object position anchor point (0,0,0).
-    RotatedNodes are the Nodes rotated by the given Angles and moved to Position.
-    TransNodes are the RotatedNodes transformed from 3D to 2D (X.Y) screen coordinates.
-    
-    @author: kalle
-    """
-    def __init__(self):
-        self.position = np.array([0.0, 0.0, 0.0, 1.0])      # position
-        self.nodePosition = np.array([0.0, 0.0, 0.0, 1.0])  # position before rotation
-        self.angles = VectorAngles()
-        self.movement = VectorMovement()
-        self.nodes = np.zeros((0, 4))                       # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
-        self.objRotatedNodes = np.zeros((0, 3))             # objRotatedNodes will have X,Y,Z coordinates after object rotation in place (object angles)
-        self.rotatedNodes = np.zeros((0, 3))                # rotatedNodes will have X,Y,Z coordinates after rotation ("final 3D coordinates")
-        self.transNodes = np.zeros((0, 2))                  # transNodes will have X,Y coordinates
-        self.nodeNum = 0                                    # number of object nodes. nodes, rotatedNodes and transNodes may contain also shadow nodes
-        self.shadow = 0
-        self.shadowNodeList = []                            # list of shadow nodes, in drawing order
-        self.shadowRotatedNodes = np.zeros((0, 3))          # rotatedNodes will have X,Y,Z coordinates
-        self.shadowTransNodes = np.zeros((0, 2))            # transNodes will have X,Y coordinates
-        self.surfaces = []
-        self.visible = 1
-        self.isFlat = 0
-        self.prio = 0                                       # priority order when drawn. Highest prio will be drawn first
-        self.objName = ""
-        self.minShade = 0.2                                 # shade (% of color) to use when surface is parallel to light source
-
-    def initObject(self):
-        self.updateSurfaceZPos()
-        self.updateSurfaceCrossProductVector()
-        self.updateSurfaceCrossProductLen()
-
-    def setPosition(self, position):
-        # move object by giving it a rotated position.
-        self.position = position 
-
-    def setNodePosition(self, nodePosition):
-        # move object by giving it an unrotated position.
-        self.nodePosition = nodePosition 
-
-    def setFlat(self):
-        # set isFlat
-        self.isFlat = 1 
-
-    def addNodes(self, node_array):
-        # add nodes (all at once); add a column of ones for using position in transform
-        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
-        self.rotatedNodes = node_array # initialize rotatedNodes with nodes (no added ones required)
-
-    def addSurfaces(self, idnum, color, edgeWidth, showBack, backColor, node_list):
-        # add a Surface, defining its properties
-        surface = VectorObjectSurface()
-        surface.idnum = idnum
-        surface.color = color
-        surface.edgeWidth = edgeWidth
-        surface.showBack = showBack
-        surface.backColor = backColor
-        surface.nodes = node_list
-        self.surfaces.append(surface)
-    
-    def updateVisiblePos(self, objMinZ):
-        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
-        if self.isFlat == 0 and self.position[2] < objMinZ: 
-            self.visible = 0
-        else:
-            self.visible = 1
-
-    def updateVisibleNodes(self, objMinZ):
-        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
-        if self.isFlat == 0:
-            if min(self.rotatedNodes[:, 2]) < objMinZ: 
-                self.visible = 0
-            else:
-                self.visible = 1
-        else:
-            # for flat objects, check if the whole object is behind the viewing point (minZ)
-            if max(self.rotatedNodes[:, 2]) < objMinZ:
-                self.visible = 0
-            else:
-                self.visible = 1
-
-    def updateVisibleTrans(self, midScreen):
-        # check if object is visible. If not enough nodes or all X or Y coordinates are outside of screen, set to 0
-        if \
-            np.shape(self.transNodes)[0] < 3 \
-            or max(self.transNodes[:, 0]) < 0 \
-            or min(self.transNodes[:, 0]) > midScreen[0] * 2 \
-            or max(self.transNodes[:, 1]) < 0 \
-            or min(self.transNodes[:, 1]) > midScreen[1] * 2:
-            self.visible = 0
-        else:
-            self.visible = 1
-
-    def updateSurfaceZPos(self):
-        # calculate average Z position for each surface using rotatedNodes
-        for surface in self.surfaces:
-            zpos = sum([self.rotatedNodes[node, 2] for node in surface.nodes]) / len(surface.nodes) 
-            surface.setZPos(zpos)
-            surface.setVisible(1) # set all surfaces to "visible" 
-        
-    def updateSurfaceCrossProductVector(self):
-        # calculate cross product vector for each surface using rotatedNodes
-        # always use vectors (1, 0) and (1, 2) (numbers representing nodes)
-        # numpy "cross" was terribly slow, calculating directly as below takes about 10 % of the time.
-        for surface in self.surfaces:
-            vec_A = self.rotatedNodes[surface.nodes[2], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_B = self.rotatedNodes[surface.nodes[0], 0:3] - self.rotatedNodes[surface.nodes[1], 0:3]
-            vec_Cross =  ([
-                vec_B[1] * vec_A[2] - vec_B[2] * vec_A[1],
-                vec_B[2] * vec_A[0] - vec_B[0] * vec_A[2],
-                vec_B[0] * vec_A[1] - vec_B[1] * vec_A[0]
-                ])
-            surface.setCrossProductVector(vec_Cross)
-
-    def updateSurfaceCrossProductLen(self):
-        # calculate cross product vector length for each surface.
-        # this is constant and done only at init stage.
-        for surface in self.surfaces:
-            surface.setCrossProductLen()
-
-    def updateSurfaceAngleToViewer(self):
-        # calculate acute angle between surface plane and Viewer
-        # surface plane cross product vector and Viewer vector both from node 1.
-        for surface in (surf for surf in self.surfaces if surf.visible == 1):
-            vec_Viewer = self.rotatedNodes[surface.nodes[1], 0:3] 
-            surface.setAngleToViewer(vec_Viewer)
-            if surface.angleToViewer > 0 or surface.showBack == 1:
-                surface.setVisible(1)
-            else:
-                surface.setVisible(0)
-
-    def updateSurfaceAngleToLightSource(self, lightPosition):
-        # calculate acute angle between surface plane and light source, similar to above for Viewer.
-        # this is used to define shading and shadows; needed for visible surfaces using shading AND all surfaces, if shadow to be drawn.
-        for surface in (surf for surf in self.surfaces if (surf.visible == 1 and self.minShade < 1.0) or self.shadow == 1):
-            surface.setLightSourceVector(self.rotatedNodes[surface.nodes[1], 0:3] - lightPosition)
-            surface.setAngleToLightSource()
-
-    def updateSurfaceColorShade(self):
-        # calculate shade for surface. 
-        for surface in (surf for surf in self.surfaces if surf.visible == 1):
-            surface.setColorShade(self.minShade)
-            if surface.showBack == 1: surface.setBackColorShade(self.minShade)
-
-    def sortSurfacesByZPos(self):
-        # sorts surfaces by Z position so that the most distant comes first in list
-        self.surfaces.sort(key=lambda VectorObjectSurface: VectorObjectSurface.zpos, reverse=True)
-
-    def updateShadow(self, viewerAngles, lightNode, light_position, obj_pos, objMinZ, zScale, midScreen):
-        """ 
-        Update shadowTransNodes (a list of nodes which define the shadow of the object).
-        This routine assumes objects are "whole", that they do not have any holes - such objects should be built as several parts.
-        A more resilient way would be to calculate and draw a shadow for each surface separately, but leading to extra calculations and draws.
-        Update nodes by calculating and adding the required shadow nodes to the array.
-        Note for objects standing on the ground, the nodes where Y=0 are already there and need no calculation / adding.
-        """
-        shadow_edges = [] # list of object edges that belong to surfaces facing the lightsource, i.e. producing a shadow.
-        for surface in (surf for surf in self.surfaces if surf.angleToLightSource > 0 or surf.showBack == 1):
-            # add all egdes using the smaller node nr first in each edge node pair.
-            shadow_edges.extend([((min(surface.nodes[i], surface.nodes[i-1]), max(surface.nodes[i], surface.nodes[i-1]))) for i in range(len(surface.nodes))])
-        # get all edges which are in the list only once - these should define the outer perimeter. Inner edges are used twice.
-        use_edges = [list(c[0]) for c in (d for d in list(Counter(shadow_edges).items()) if d[1] == 1)]
-        # these edges should form a continuous line (the perimeter of the shadowed object). Prepare a list of nodes required:
-        node_list = []
-        node_list.append(use_edges[0][0]) # first node from first edge
-        node_list.append(use_edges[0][1]) # second node from first edge
-        prev_edge = use_edges[0]
-        for i in range(len(use_edges)): 
-            if node_list[-1] != node_list[0]:
-                for edge in use_edges:
-                    if edge != prev_edge: # do not check the edge itself
-                        if edge[0] == node_list[-1]:
-                            node_list.append(edge[1]) # this edge begins with previous node, add its end
-                            prev_edge = edge
-                            break
-                        if edge[1] == node_list[-1]:
-                            node_list.append(edge[0]) # this edge ends with previous node, add its beginning
-                            prev_edge = edge
-                            break
-            else:
-                break # full circle reached
-        node_list = node_list[0:len(node_list) - 1] # full circle - drop the last node (is equal to first)
-        
-        # then project these nodes on the ground i.e. Y = 0. If necessary. Add the required shadowRotatedNodes.
-        self.shadowRotatedNodes = np.zeros((0, 4))
-        for node_num in range(len(node_list)):
-            node = node_list[node_num]
-            # check that node is not already on the ground level or too high compared to light source
-            if obj_pos[1] + self.objRotatedNodes[node, 1] > 3 and obj_pos[1] + self.objRotatedNodes[node, 1] < (lightNode[1] - 3):
-                # node must be projected. Add a shadow node and replace current node in node_list with it.
-                node_list[node_num] = self.nodeNum + np.shape(self.shadowRotatedNodes)[0]
-                diff_node = (obj_pos + self.objRotatedNodes[node,:]) - lightNode # vector from lightNode to this node. In this space, Y=0 is ground
-                # the projection multiplier if based on above diff_node where Y=0 is ground, but it can be applied directly to rotatedNodes as well, skipping one rotation step. 
-                diff_rotated_node = self.rotatedNodes[node,:] - light_position
-                self.shadowRotatedNodes = np.vstack((self.shadowRotatedNodes, np.hstack((light_position + diff_rotated_node * (lightNode[1] / -diff_node[1]), 1))))
-        
-        # flatten rotated shadow nodes and build a list of shadowTransNodes. shadowTransNodes has all shadow nodes.
-        flat_nodes = np.zeros((0, 2))
-        if node_list[-1] < self.nodeNum:
-            prev_node = self.rotatedNodes[node_list[-1], 0:3] # previous node XYZ coordinates
-        else:
-            prev_node = self.shadowRotatedNodes[node_list[-1] - self.nodeNum, 0:3]
-        for node_num in range(len(node_list)):
-            if node_list[node_num] < self.nodeNum:
-                node = self.rotatedNodes[node_list[node_num], 0:3] # current node XYZ coordinates
-            else:
-                node = self.shadowRotatedNodes[node_list[node_num] - self.nodeNum, 0:3]
-            diff_node = node - prev_node # surface side vector
-            # if both Z coordinates behind the viewer: do not draw at all, do not add a transNode
-            if (node[2] < objMinZ and prev_node[2] >= objMinZ) or (node[2] >= objMinZ and prev_node[2] < objMinZ):
-                # line crosses objMinZ, so add a "crop point". Start from previous node and add difference stopping to objMinZ. Flatten to 2D.
-                f_node = prev_node + diff_node * ((objMinZ - prev_node[2]) / diff_node[2])
-                flat_nodes = np.vstack((flat_nodes, (-f_node[0:2] * zScale) / f_node[2:3] + midScreen))
-            if node[2] >= objMinZ:
-                # add current node, if it is visible
-                if node_list[node_num] < self.nodeNum:
-                    flat_nodes = np.vstack((flat_nodes, self.transNodes[node_list[node_num], 0:2])) # object node on the ground, already calculated
-                else:
-                    flat_nodes = np.vstack((flat_nodes, (-node[0:2] * zScale) / node[2:3] + midScreen)) # shadow node, needs flattening 3D to 2D
-            prev_node = node
-        self.shadowTransNodes = flat_nodes
-        
-            
-    def rotate(self, viewerAngles):
-        """ 
-        Apply a rotation defined by a given rotation matrix.
-        For objects with their own angles / rotation matrix, apply those first and store results in objRotatedNodes.
-        Could be done in one step but objRotatedNodes needed for shadow calculations.
-        """
-
-        if self.angles != viewerAngles:
-            # rotate object with its own angles "in place" ie. with synthetic zero vector as position
-            matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1,3))))
-            self.objRotatedNodes = np.dot(self.nodes, matrix)
-        else:
-            # no own angles, just copy nodes then
-            self.objRotatedNodes = self.nodes[:,0:3]
-        # then rotate with viewer angles. Add position to rotation matrix to enable both rotation and position change at once
-        matrix = np.vstack((viewerAngles.rotationMatrix, self.position[0:3]))
-        self.rotatedNodes = np.dot(np.hstack((self.objRotatedNodes, np.ones((np.shape(self.objRotatedNodes)[0], 1)))), matrix)
-
-    def transform(self, midScreen, zScale, objMinZ):
-        """ 
-        Flatten from 3D to 2D and add screen center.
-        First crop flat objects by Z coordinate so that they can be drawn even if some Z coordinates are behind the viewer.
-        """
-        if self.isFlat == 1:
-            # for flat objects, build a list of transNodes for the surface by first cropping the necessary surface sides to minZ
-            for surface in self.surfaces:
-                surface.setVisible(1) # set all surfaces to "visible" 
-                flat_nodes = np.zeros((0, 3))
-                for node_num in range(len(surface.nodes)):
-                    node = self.rotatedNodes[surface.nodes[node_num], 0:3] # current node XYZ coordinates
-                    prev_node = self.rotatedNodes[surface.nodes[node_num - 1], 0:3] # previous node XYZ coordinates
-                    diff_node = node - prev_node # surface side vector
-                    # if both Z coordinates behind the viewer: do not draw at all, do not add a transNode
-                    if (node[2] < objMinZ and prev_node[2] >= objMinZ) or (node[2] >= objMinZ and prev_node[2] < objMinZ):
-                        # line crosses objMinZ, so add a "crop point". Start from previous node and add difference stopping to objMinZ
-                        flat_nodes = np.vstack((flat_nodes, prev_node + diff_node * ((objMinZ - prev_node[2]) / diff_node[2])))
-                    if node[2] >= objMinZ:
-                        # add current node, if it is visible
-                        flat_nodes = np.vstack((flat_nodes, node))
-                # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes
-                self.transNodes = (-flat_nodes[:, 0:2] * zScale) / (flat_nodes[:, 2:3]) + midScreen
-        else:            
-            # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes.
-            # for normal objects, some of the transNodes will not be required, but possibly figuring out which are and processing them
-            #   individually could take more time than this.
-            self.transNodes = (self.rotatedNodes[:, 0:2] * zScale) / (-self.rotatedNodes[:, 2:3]) + midScreen
-
-    def groundData(self, midScreen, zScale, objMinZ, groundZ, groundShadeNr):
-        """ 
-        Calculate ground data for on a ground object.
-        Assumes the ground object "covers the ground" reasonably and isFlat = 1, has 4 nodes, and the perimeter is concave.
-        Ground settings are defined in VectorViewer.
-        Returns an array of shape(groundShadeNr + 2, 4) where each row has X,Y of left edge and X.Y of right edge starting from most distant.
-        The first array is used to clear the screen above the ground (so in effect this covers the whole screen).
-        """
-        # find the most distant node
-        maxZ = max(self.rotatedNodes[:, 2])
-        for nodenum in range(len(self.nodes)):
-            if self.rotatedNodes[nodenum, 2] == maxZ:
-                node = self.rotatedNodes[nodenum, :]
-                break
-        prev_node = self.rotatedNodes[nodenum - 1, :]
-        if nodenum == len(self.nodes) - 1:
-            next_node = self.rotatedNodes[0, :]
-        else:
-            next_node = self.rotatedNodes[nodenum + 1, :]
-            
-        # get a straight line where Z (ie, distance from viewer) is constant. Start with the mid of farthest of the two lines.
-        # then find the point with matching Z coordinate on the other line.
-        # special cases: next_node or prev_node as far as node.
-        if node[2] == prev_node[2]:
-            mid1_node = node
-            mid2_node = prev_node
-        else:
-            if node[2] == next_node[2]:
-                mid1_node = node
-                mid2_node = next_node
-            else:
-                if next_node[2] > prev_node[2]:
-                    mid1_node = (next_node + node) / 2
-                    mid2_node = node + (prev_node - node) * (mid1_node[2] - node[2]) / (prev_node[2] - node[2])
-                else:
-                    mid1_node = (prev_node + node) / 2
-                    mid2_node = node + (next_node - node) * (mid1_node[2] - node[2]) / (next_node[2] - node[2])
-        if mid1_node[1] < mid2_node[1]:
-            # make sure mid1_node X < mid2_node X
-            mid1_node, mid2_node = mid2_node, mid1_node
-        # adjust Z
-        mid1_node = mid1_node * groundZ / mid1_node[2]
-        mid2_node = mid2_node * groundZ / mid2_node[2]
-        # finalize a square around object position
-        mid2_node_back = self.position[0:3] + (self.position[0:3] - mid1_node) # from front left (mid1) to back right (mid2_back)
-        mid1_node_back = self.position[0:3] + (self.position[0:3] - mid2_node) # from front right (mid2) to back left (mid1_back)
-
-        # then generate arrays with necessary node data and transNode data
-        left_nodes = np.zeros((groundShadeNr + 1, 3), dtype=float)
-        right_nodes = np.zeros((groundShadeNr + 1, 3), dtype=float)
-        # multipliers will span ground component span between groundZ/2 (furthest) and objMinZ
-        mult = (mid1_node[2] / 2 - objMinZ) / ((mid1_node[2] - mid1_node_back[2]) / 2)
-        # the most distant component (at groundZ). Most distant component will be very large (half of total)
-        left_nodes[0,:] = mid1_node  
-        right_nodes[0,:] = mid2_node                
-
-        # other components from groundZ/2 to objMinZ
-        for i in range(groundShadeNr):
-            mult_i =  mult * math.sqrt((i+1) / groundShadeNr)
-            left_nodes[i+1,:] = (mid1_node * (1.0 - mult_i) + mid1_node_back * mult_i) / 2
-            right_nodes[i+1,:] = (mid2_node * (1.0 - mult_i) + mid2_node_back * mult_i) / 2         
-        left_transNodes = (-left_nodes[:, 0:2] * zScale) / (left_nodes[:, 2:3]) + midScreen
-        right_transNodes = (-right_nodes[:, 0:2] * zScale) / (right_nodes[:, 2:3]) + midScreen
-        
-        # crop these nodes to screen X edges
-        diff_transNodes = right_transNodes - left_transNodes
-        mult_nodes = right_transNodes[:, 0] / diff_transNodes[:, 0] 
-        left_transNodes = right_transNodes - np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
-        diff_transNodes = right_transNodes - left_transNodes
-        mult_nodes = (midScreen[0] * 2) / diff_transNodes[:,0]
-        right_transNodes = left_transNodes + np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
-
-        # the first component is "the top of the sky".
-        if left_transNodes[0,1] < left_transNodes[1,1]:
-            # "normal ground", add a node to the top of the screen
-            if left_transNodes[0,1] < 0:
-                # if ground already covers the whole screen, use the top node
-                left_skynode = left_transNodes[0,:]
-            else:
-                left_skynode = np.array([0, 0])
-        else:
-            # inverted ground ie. going upside down, add a node to the bottom of the screen
-            if left_transNodes[0,1] > midScreen[1] * 2:
-                # if ground already covers the whole screen, use the top node
-                left_skynode = left_transNodes[0,:]
-            else:
-                left_skynode = np.array([0, midScreen[1] * 2])
-        if right_transNodes[0,1] < right_transNodes[1,1]:
-            # "normal ground", add a node to the top of the screen
-            if right_transNodes[0,1] < 0:
-                # if ground already covers the whole screen, use the top node
-                right_skynode = right_transNodes[0,:]
-            else:
-                right_skynode = np.array([midScreen[0] * 2, 0])
-        else:
-            # inverted ground ie. going upside down, add a node to the bottom of the screen
-            if right_transNodes[0,1] > midScreen[1] * 2:
-                # if ground already covers the whole screen, use the top node
-                right_skynode = right_transNodes[0,:]
-            else:
-                right_skynode = midScreen * 2               
-        # add the first component and build an array of all the transnodes
-        transNodes = np.vstack((np.hstack((left_skynode, right_skynode)), np.hstack((left_transNodes, right_transNodes))))
-        
-        return(transNodes)        
-                
-class VectorObjectSurface:
-
-    """
-    Surfaces for a VectorObject.
-    
-    @author: kalle
-    """
-    def __init__(self):
-        self.idnum = 0
-        # properties set when defining the object
-        self.nodes = []
-        self.color = (0,0,0)
-        self.edgeWidth = 0           # if 0, fills surface. Otherwise a wireframe (edges only), with edgeWidth thickness.
-        # the following are calculated during program execution
-        self.zpos = 0.0
-        self.crossProductVector = np.zeros((0,3))
-        self.crossProductLen = 0.0   # precalculated length of the cross product vector - this is constant
-        self.lightSourceVector = np.zeros((0,3))
-        self.angleToViewer = 0.0
-        self.angleToLightSource = 0.0
-        self.visible = 1
-        self.colorShade = 1.0        # Shade of color; 0 = black, 1 = full color
-
-    def setZPos(self, zpos):
-        self.zpos = zpos
- 
-    def setVisible(self, visible):
-        self.visible = visible
-        
-    def setCrossProductVector(self, crossProductVector):
-        self.crossProductVector = crossProductVector
-
-    def setLightSourceVector(self, lightSourceVector):
-        self.lightSourceVector = lightSourceVector
-
-    def setCrossProductLen(self):
-        self.crossProductLen = self.vectorLen(self.crossProductVector)
-
-    def setAngleToViewer(self, vec_Viewer):
-        if self.crossProductLen > 0 and vec_Viewer.any() != 0:
-            # instead of true angle calculation using asin and vector lengths, a simple np.vdot is sufficient to find the sign (which defines if surface is visible) 
-            # self.angleToViewer = math.asin(np.dot(self.crossProductVector, vec_Viewer) / (self.crossProductLen * np.linalg.norm(vec_Viewer)))
-            self.angleToViewer = np.dot(self.crossProductVector, vec_Viewer) 
- 
-    def setAngleToLightSource(self):
-        if self.crossProductLen > 0 and self.lightSourceVector.any() != 0:
-            # instead of true angle calculation using asin and vector lengths, a simple np.vdot is sufficient to find the sign (which defines if surface is shadowed) 
-            # self.angleToLightSource = math.asin(np.dot(self.crossProductVector, self.lightSourceVector) / (self.crossProductLen * np.linalg.norm(self.lightSourceVector))) / (np.pi / 2)
-            self.angleToLightSource = np.dot(self.crossProductVector, self.lightSourceVector)
-        
-    def setColorShade(self, minShade):
-        if self.angleToLightSource <= 0:
-            self.colorShade = minShade
-        else:
-            self.colorShade = minShade + (1.0 - minShade) * math.asin(self.angleToLightSource / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
-        
-    def setBackColorShade(self, minShade):
-        if self.angleToLightSource >= 0:
-            self.backColorShade = minShade
-        else:
-            self.backColorShade = minShade + (1.0 - minShade) * -math.asin(self.angleToLightSource / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
-
-    def colorRGB(self, fade):
-        if self.angleToViewer > 0:
-            use_color = ([round(fade * self.colorShade * x, 0) for x in self.color]) # apply shading
-        else: 
-            use_color = ([round(fade * self.backColorShade * x, 0) for x in self.backColor]) # apply shading to backside color
-        return use_color
-
-    def vectorLen(self, vector):
-        # equivalent to numpy.linalg.norm for a 3D real vector, but much faster. math.sqrt is faster than numpy.sqrt.
-        return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
-
-class VectorAngles:
-
-    """
-    Angles for rotating vector objects. For efficiency, one set of angles can be used for many objects.
-    Angles are defined for axes X (horizontal), Y (vertical), Z ("distance") in degrees (360).
-    
-    @author: kalle
-    """
-    def __init__(self):
-        self.angles = np.array([0.0, 0.0, 0.0])
-        self.angleScale = (2.0 * np.pi) / 360.0 # to scale degrees.
-        self.angName = ""
-        self.rotationMatrix = np.zeros((3,3))
-        self.rotateAngles = np.array([0.0, 0.0, 0.0])
-        self.rotate = np.array([0.0, 0.0, 0.0])
-    
-    def setAngles(self, angles):
-        # Set rotation angles to fixed values. 
-        self.angles = angles
-     
-    def setRotateAngles(self):
-        self.rotateAngles += self.rotate
-        for i in range(3):
-            if self.rotateAngles[i] >= 360: self.rotateAngles[i] -= 360
-            if self.rotateAngles[i] < 0: self.rotateAngles[i] += 360
-
-    def setRotationMatrix(self):
-        # Set matrix for rotation using angles.
-        
-        (sx, sy, sz) = np.sin((self.angles + self.rotateAngles) * self.angleScale)
-        (cx, cy, cz) = np.cos((self.angles + self.rotateAngles) * self.angleScale)
- 
-        # build a matrix for X, Y, Z rotation (in that order, see Wikipedia: Euler angles).
-        self.rotationMatrix = np.array([[cy * cz               , -cy * sz              , sy      ],
-                                        [cx * sz + cz * sx * sy, cx * cz - sx * sy * sz, -cy * sx],
-                                        [sx * sz - cx * cz * sy, cz * sx + cx * sy * sz, cx * cy ]])
-
-class VectorMovement:
-
-    """
-    Movement handling. This class directs position and/or angles rotation.
-
-    @author: kalle
-    """
-    def __init__(self):
-        self.moveName = ""
-        self.angles = VectorAngles()
-        self.rotate = np.array([0.0, 0.0, 0.0])
-        self.rotateAngles = np.array([0.0, 0.0, 0.0])
-        self.timeSeries = np.zeros((7,0))
-        self.moveSeries = np.zeros((6,0))
-        self.objects = []                               # list of objects controlled by this movement (typically just one)
-        self.loopStart = 0
-        self.loopEnd = -1                               # will be set >= 0 by starting procedure
-        self.loopPos = 0.0                              # float as position can be a fraction  
-        self.prevTime = pygame.time.get_ticks()
-
-    def setAngles(self, angles):
-        self.angles = angles
-
-    def setRotateAngles(self):
-        self.rotateAngles += self.rotate
-        for i in range(3):
-            if self.rotateAngles[i] >= 360: self.rotateAngles[i] -= 360
-            if self.rotateAngles[i] < 0: self.rotateAngles[i] += 360
-    
-    def moveLoop(self):
-        new_time = pygame.time.get_ticks()
-        self.loopPos += (new_time - self.prevTime) / 20.0 # increase by 50 / second (1000 ms / 20)
-        self.prevTime = new_time
-        if self.loopPos >= self.loopEnd:
-            self.loopPos = self.loopPos - int(self.loopPos) + self.loopStart # back to loop start, preserving any fractions
-        
-    def addTimeSeries(self, time_array):
-        self.timeSeries = time_array
-        
-    def addMoveSeries(self, move_array):
-        self.moveSeries = move_array
-           
-    def addObject(self, VectorObject):
-        self.objects.append(VectorObject)
-    
-class VectorPosition:
-
-    """
-    A vector object defining the positions of other objects in its nodes (see VectorObject).
-    
-    @author: kalle
-    """
-    def __init__(self):
-        self.position = np.array([0.0, 0.0, 0.0, 1.0])
-        self.angles = VectorAngles()
-        self.nodes = np.zeros((0, 4))                   # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
-        self.rotatedNodes = np.zeros((0, 3))            # rotatedNodes will have X,Y,Z coordinates
-        self.objects = []                               # connects each node to a respective VectorObject
-        self.objName = ""
-        
-    def addNodes(self, node_array):
-        # add nodes (all at once); add a column of ones for using position in transform
-        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
-        self.rotatedNodes = node_array # initialize with nodes
-        
-    def addObjects(self, object_list):
-        self.objects = object_list
-
-    def rotate(self):
-        # apply a rotation defined by a given rotation matrix.
-        matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1, 3))))
-        # apply rotation and position matrix to nodes
-        self.rotatedNodes = np.dot(self.nodes + self.position, matrix)      
-        
 if __name__ == '__main__':
     """ 
     Prepare screen, read objects etc. from file.
     """
 
+    parser = argparse.ArgumentParser(description='Vector3D city.')
+    parser.add_argument('--benchmark', type=int, default=0, metavar='FRAMES', help='render FRAMES frames headless (no window, no music) as fast as possible')
+    parser.add_argument('--report', default='benchmark.json', help='benchmark report file (JSON)')
+    parser.add_argument('--checksum-every', type=int, default=60, metavar='N', help='store a checksum of every Nth frame in the benchmark report')
+    parser.add_argument('--trace', default=None, metavar='FILE', help='write a Chrome trace (JSON) of the benchmark timers')
+    parser.add_argument('--rasterizer', action='store_true', help='draw surfaces with the batched NumPy rasterizer (key r switches while running)')
+    parser.add_argument('--no-lod', action='store_true', help='always draw objects at full detail (key l switches while running)')
+    parser.add_argument('--no-culling', action='store_true', help='rotate and test all objects instead of culling those outside the view first (key c switches while running)')
+    parser.add_argument('--cull-cell', type=float, default=None, metavar='SIZE', help='cell size of the culling grid (default: about four objects per cell)')
+    parser.add_argument('--tile', type=int, default=1, metavar='N', help='repeat the buildings on an N x N grid, for testing large scenes')
+    parser.add_argument('--ground-gradient', action='store_true', help='shade the ground by multiplying with a gradient instead of blend polygons (key g switches while running)')
+    parser.add_argument('--pipeline', type=int, default=0, metavar='DEPTH', help='calculate frames in a separate thread, up to DEPTH frames ahead of drawing')
+    parser.add_argument('--render', default=None, metavar='FILE', help='write the benchmark frames to numbered files, e.g. frames/frame_%%05d.png (.png, .bmp, .tga, .jpg or .rgb for raw RGB)')
+    parser.add_argument('--encoder', default=None, metavar='COMMAND', help='pipe the benchmark frames as raw RGB to COMMAND; {width}, {height} and {fps} are filled in')
+    parser.add_argument('--size', default=None, metavar='WxH', help='screen size, e.g. 3840x2160')
+    parser.add_argument('--writers', type=int, default=2, help='number of threads writing frame files')
+    parser.add_argument('--queue', type=int, default=8, metavar='FRAMES', help='number of rendered frames waiting to be written before rendering waits')
+    args = parser.parse_args()
+    if args.benchmark > 0:
+        # no window; this must be set before initializing the display
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
     # set data directory
-    os.chdir("E:/development/python/RealTime3DwithPython/Vector3D")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
     # set screen size
     # first check available full screen modes
@@ -1081,6 +1548,8 @@ if __name__ == '__main__':
     # disp_modes = pygame.display.list_modes(0, pygame.FULLSCREEN | pygame.DOUBLEBUF | pygame.HWSURFACE)
     # disp_size = disp_modes[4] # selecting display size from available list. Assuming the 5th element is nice...
     disp_size = (1280, 800)
+    if args.size is not None:
+        disp_size = tuple(int(x) for x in args.size.lower().split('x'))
     if disp_size[1] >= 800:
         font_size = 18
     else:
@@ -1088,7 +1557,8 @@ if __name__ == '__main__':
         
     # initialize font & mixer
     pygame.font.init()
-    pygame.mixer.init()
+    if args.benchmark == 0:
+        pygame.mixer.init()
 
     music_file = "sinking2.mod"  # this mod by Jellybean is available at e.g. http://janeway.exotica.org.uk/release.php?id=45536
     vv = VectorViewer(disp_size[0], disp_size[1], music_file, font_size)
@@ -1102,6 +1572,8 @@ if __name__ == '__main__':
     vv.timer_names.append("crossprodvec")
     vv.timer_names.append("object angles")
     vv.timer_names.append("shadow calc")
+    vv.timer_names.append("draw list")
+    vv.timer_names.append("pipeline wait")
     vv.timer_names.append("screen clear")
     vv.timer_names.append("ground + clear")
     vv.timer_names.append("draw blends")
@@ -1109,290 +1581,27 @@ if __name__ == '__main__':
     vv.timer_names.append("draw surfaces")
     vv.timer_names.append("plot info")
     vv.timer_names.append("display flip")
+    vv.timer_names.append("frame write")
     vv.timer_names.append("wait")
-    vv.timers = np.zeros((len(vv.timer_names), vv.timer_avg_frames), dtype=int)
-
-    # read data file defining angles, movements and objects
-    vecdata = et.parse("vectordata.xml")
-
-    root = vecdata.getroot()
-    
-    for angles in root.iter('vectorangles'):
-        ang = VectorAngles()
-        ang.angName = angles.get('name')
-        ang.angles[0] = float(angles.findtext("angleX", default="0"))
-        ang.angles[1] = float(angles.findtext("angleY", default="0"))
-        ang.angles[2] = float(angles.findtext("angleZ", default="0"))
-        vv.addVectorAnglesList(ang)
-
-    for movements in root.iter('movement'):
-        mov = VectorMovement()
-        mov.moveName = movements.get('name')
-
-        viewer = None
-        viewer = movements.get('viewer')
-
-        angleName = movements.findtext("anglesref", None)
-        for angles in vv.VectorAnglesList:
-            if angles.angName == angleName:
-                mov.angles = angles
-                if viewer == "1":
-                    angles.angleScale = -angles.angleScale # change viewer angles to negative by changing angleScale to negative
-                break
-        mov.rotate[0] = float(movements.findtext("rotateX", default="0"))
-        mov.rotate[1] = float(movements.findtext("rotateY", default="0"))
-        mov.rotate[2] = float(movements.findtext("rotateZ", default="0"))
-
-        # build movement timeseries array; [0] is time in seconds (if target_fps = movSpeed), [1:4] are positions X,Y,Z, [4:7] are angles X,Y,Z
-        movSpeed = float(movements.findtext("speed", default="1"))
-        for timedata in movements.iter('timeseries'):
-            mov_times = np.zeros((7, 0))
-            mov_point = np.zeros((7, 1))
-            for stepdata in timedata.iter('movementstep'):
-                #steptime = float(stepdata.get("time"))
-                mov_point[0, 0] = float(stepdata.get("time"))
-                mov_point[1, 0] = float(stepdata.findtext("movepositionX", default=str(mov_point[1, 0])))
-                mov_point[2, 0] = float(stepdata.findtext("movepositionY", default=str(mov_point[2, 0])))
-                mov_point[3, 0] = float(stepdata.findtext("movepositionZ", default=str(mov_point[3, 0])))
-                mov_point[4, 0] = float(stepdata.findtext("moveangleX", default="0"))
-                mov_point[5, 0] = float(stepdata.findtext("moveangleY", default="0"))
-                mov_point[6, 0] = float(stepdata.findtext("moveangleZ", default="0"))
-                mov_times = np.hstack((mov_times, mov_point))
-            # sort by time (first row), just in case ordering is wrong
-            mov_times = mov_times[:,mov_times[0,:].argsort()]
-            if viewer == "1":
-                # for viewer, invert sign of Y coordinate
-                mov_times[1,:] = -1 * mov_times[1,:]
-            mov.addTimeSeries(mov_times)
-            # out of the time series, build frame by frame movement using interpolation. 
-            fx = interp1d(mov_times[0,:], mov_times[1:7,:], kind='quadratic')
-            # data needed for the whole range of time series. Use speed = "time" per second.
-            num_times = int((mov_times[0,-1] - mov_times[0,0]) * vv.target_fps / movSpeed)
-            time_frames = np.linspace(mov_times[0,0], mov_times[0,-1], num=num_times, endpoint=True)
-            mov_moves = fx(time_frames)
-
-            mov_angleforward = movements.findtext("angleforward", default="off")
-            if mov_angleforward != "off":
-                # angleforward means that object angles should be such that it is rotated according to movement vector, always facing towards movement
-                # NOTE: Tested for Y only! Not well defined for XYZ anyway.
-                mov_diffs = mov_moves[0:3,1:] - mov_moves[0:3,:-1]
-                mov_diffs = np.hstack((mov_diffs, mov_diffs[:,-1:])) # copy second last diff to last
-                if mov_angleforward.find("X") >= 0:
-                    mov_moves[3,:] += np.arctan2(mov_diffs[1,:], mov_diffs[2,:]) * 180 / np.pi
-                if mov_angleforward.find("Y") >= 0:
-                    mov_moves[4,:] += np.arctan2(mov_diffs[0,:], -mov_diffs[2,:]) * 180 / np.pi
-                if mov_angleforward.find("Z") >= 0:
-                    mov_moves[5,:] += np.arctan2(mov_diffs[0,:], mov_diffs[1,:]) * 180 / np.pi
-                
-            mov.addMoveSeries(mov_moves)
-            break # only one time series accepted
-        
-        mov.loopEnd = 0 # preset
-        for loopdata in movements.iter('loop'):
-            mov.loopStart = int(float(loopdata.findtext("loopstart", default="0")) * vv.target_fps / movSpeed)
-            mov.loopEnd = int(float(loopdata.findtext("loopend", default="0")) * vv.target_fps / movSpeed)
-            mov.loopPos = int(float(loopdata.findtext("looppos", default="0")) * vv.target_fps / movSpeed)
-            break # only one loop accepted
-
-        vv.addVectorMovementList(mov)
-        # define this (last added) movement as the viewer movement if so specified.
-        if viewer == "1":
-            vv.viewerMovement = vv.VectorMovementList[-1]
-   
-    for vecobjs in root.iter('vectorobject'):
-        vobj = VectorObject()
-        vobj.objName = vecobjs.get('name')
-        vobj.prio = int(vecobjs.findtext("prio", default="0"))
-        # check if object is a light source. Will be set later.
-        lightsource = None
-        lightsource = vecobjs.get('lightsource')
-        # check if object is the ground. Will be set later.
-        ground = None
-        ground = vecobjs.get('ground')
-        if ground == "1":
-            vv.groundBlendPrio = int(vecobjs.findtext("blendprio", default=None))          
-            
-        if vecobjs.findtext('shadow', 'OFF').upper() == "ON":
-            vobj.shadow = 1
-        else:
-            vobj.shadow = 0
-
-        # check if object is a copy of another, previously defined object
-        copyfrom = None
-        copyfrom = vecobjs.get('copyfrom')
-        is_copy = False
-        if copyfrom is not None:
-            for VectorObj in vv.VectorObjs:
-                if VectorObj.objName == str(copyfrom):
-                    # copy data from another object
-                    vobj = copy.deepcopy(VectorObj) # copy properties
-                    vobj.angles = VectorObj.angles  # copy reference to angles, does not seem to work with deepcopy()
-                    vobj.movement = VectorObj.movement  # copy reference to movement, does not seem to work with deepcopy()
-                    is_copy = True
-                    break
-                    
-        # set position and references to angles and movement
-        for posdata in vecobjs.iter('position'):
-            vobj.position[0] = float(posdata.findtext("positionX", default="0"))
-            vobj.position[1] = float(posdata.findtext("positionY", default="0")) 
-            vobj.position[2] = -float(posdata.findtext("positionZ", default="0")) # inverted for easier coordinates definition
-        angleName = vecobjs.findtext("anglesref", None)
-        for angles in vv.VectorAnglesList:
-            if angles.angName == angleName:
-                vobj.angles = angles
-                break
-        vobj.movement = None
-        movementName = vecobjs.findtext("movementref", None)
-        for movement in vv.VectorMovementList:
-            if movement.moveName == movementName:
-                vobj.movement = movement
-                break
-           
-        # get (or set) some default values. Not needed for copied objects.
-        if is_copy == True: 
-            def_minshade = str(vobj.minShade)
-        else: 
-            def_minshade = "0.3"
-            def_color = (def_colorR, def_colorG, def_colorB) = (128, 128, 128)
-            # if not a copied object, read default values for some surface properties
-            for def_colordata in vecobjs.iter('defcolor'):
-                def_colorR = def_colordata.findtext("defcolorR", default="128")
-                def_colorG = def_colordata.findtext("defcolorG", default="128")
-                def_colorB = def_colordata.findtext("defcolorB", default="128")
-                def_color = (int(def_colorR), int(def_colorG), int(def_colorB))
-                break
-            def_backColor = (def_backColorR, def_backColorG, def_backColorB) = def_color
-            for def_backcolordata in vecobjs.iter('defbackcolor'):
-                def_backColorR = def_backcolordata.findtext("defbackcolorR", default=str(def_backColorR))
-                def_backColorG = def_backcolordata.findtext("defbackcolorG", default=str(def_backColorG))
-                def_backColorB = def_backcolordata.findtext("defbackcolorB", default=str(def_backColorB))
-                def_backColor = (int(def_backColorR), int(def_backColorG), int(def_backColorB))
-                break
-            def_edgeWidth = vecobjs.findtext("defedgewidth", default="0")
-            def_showBack = vecobjs.findtext("defshowback", default="0")           
-        vobj.minShade = float(vecobjs.findtext("minshade", default=def_minshade))
-        
-        if is_copy == False:
-            # add nodes ie. "points" or "corners". No changes allowed for copied objects.
-            for nodedata in vecobjs.iter('nodelist'):
-                vobj.nodeNum = int(nodedata.get("numnodes"))
-                vobj_nodes = np.zeros((vobj.nodeNum, 3))
-                for node in nodedata.iter('node'):
-                    node_num = int(node.get("ID"))
-                    vobj_nodes[node_num, 0] = float(node.findtext("nodeX", default="0"))
-                    vobj_nodes[node_num, 1] = float(node.findtext("nodeY", default="0"))
-                    vobj_nodes[node_num, 2] = -float(node.findtext("nodeZ", default="0")) # inverted for easier coordinates definition
-                vobj.addNodes(vobj_nodes)
-                break # only one nodelist accepted
-
-        # check for initangles ie. initial rotation. Default is none which requires no action.
-        for angledata in vecobjs.iter('initangles'):
-            angleXadd = float(angledata.findtext("angleXadd", default="0"))
-            angleYadd = float(angledata.findtext("angleYadd", default="0"))
-            angleZadd = float(angledata.findtext("angleZadd", default="0"))
-            if angleXadd != 0 or angleYadd != 0 or angleZadd != 0: 
-                storeangles = copy.copy(vobj.angles.angles) # store temporarily
-                storeposition = copy.copy(vobj.position) # store temporarily
-                vobj.angles.angles = np.array([angleXadd, angleYadd, angleZadd]) # use the requested initial rotation
-                vobj.position = np.array([0.0, 0.0, 0.0, 1.0]) # set position temporarily to zero for initial rotation
-                vobj.angles.setRotationMatrix()
-                vobj.rotate(vobj.angles)
-                vobj.nodes = np.hstack((vobj.rotatedNodes, np.ones((np.shape(vobj.rotatedNodes)[0], 1)))) # overwrite original nodes with rotated (to init angles) nodes
-                vobj.angles.angles = storeangles
-                vobj.position = storeposition
-                
-        # add surfaces ie. 2D flat polygons. 
-        for surfacedata in vecobjs.iter('surfacelist'):
-            for surf in surfacedata.iter('surface'):
-                idnum = int(surf.get("ID"))
-                
-                if is_copy == True:
-                    for surfobj in vobj.surfaces:
-                        if surfobj.idnum == idnum:
-                            break
-                    def_color = surfobj.color
-                    def_backColor = surfobj.backColor
-                    def_edgeWidth = str(surfobj.edgeWidth)
-                    def_showBack = str(surfobj.showBack)
-                    
-                color = def_color
-                for colordata in surf.iter('color'):
-                    colorR = int(colordata.findtext("colorR", default=def_colorR))
-                    colorG = int(colordata.findtext("colorG", default=def_colorG))
-                    colorB = int(colordata.findtext("colorB", default=def_colorB))
-                    color = (colorR, colorG, colorB)
-                    break
-                backColor = def_backColor
-                for backColordata in surf.iter('backColor'):
-                    backColorR = int(backColordata.findtext("backColorR", default=def_backColorR))
-                    backColorG = int(backColordata.findtext("backColorG", default=def_backColorG))
-                    backColorB = int(backColordata.findtext("backColorB", default=def_backColorB))
-                    backColor = (backColorR, backColorG, backColorB)
-                    break
-                edgeWidth = int(surf.findtext("edgewidth", default=def_edgeWidth))
-                showBack = int(surf.findtext("showback", default=def_showBack))
-                if is_copy == False:
-                    # create a list of nodes. No changes allowed for copied objects.
-                    node_list = []
-                    for nodelist in surf.iter('nodelist'):
-                        for node in nodelist.iter('node'):
-                            node_order = int(node.get("order"))
-                            node_refID = int(node.get("refID"))
-                            node_list.append((node_order, node_refID))
-                    node_list.sort(key=itemgetter(0)) # sort nodes by node_order
-                    node_list = list(zip(*node_list))[1] # pick just the node references
-                    vobj.addSurfaces(idnum, color, edgeWidth, showBack, backColor, node_list)
-                else:
-                    vobj.modifySurfaces(idnum, color, edgeWidth, showBack, backColor)
-                            
-        # check if is a flat object (one surface only)
-        if len(vobj.surfaces) == 1:
-            vobj.isFlat = 1
-        # add object prio to prio list, if not there
-        if not vobj.prio in vv.VectorObjPrios:
-            vv.VectorObjPrios.append(vobj.prio)
-        # add the object
-        vv.addVectorObj(vobj)
-
-        # add it to a movement's list of objects, if so specified
-        if vv.VectorObjs[-1].movement is not None:
-            vv.VectorObjs[-1].movement.addObject(vv.VectorObjs[-1])
-        # define this (last added) object as light source or ground if so specified
-        if lightsource is not None:
-            vv.lightObject = vv.VectorObjs[-1]
-        # define this (last added) object as ground if so specified
-        if ground is not None:
-            vv.groundObject = vv.VectorObjs[-1]
-
-    # sort prio list
-    vv.VectorObjPrios.sort(reverse=True)
-
-    # define a vector position object holding all the positions of other objects in its nodes
-    for vecobjs in root.iter('positionobject'):
-        vobj = VectorPosition()                   
-        vobj.objName = vecobjs.get('name')
-        for posdata in vecobjs.iter('position'):
-            vobj.position[0] = float(posdata.findtext("positionX", default="0"))
-            vobj.position[1] = float(posdata.findtext("positionY", default="0"))
-            vobj.position[2] = float(posdata.findtext("positionZ", default="1500"))
-        angleName = vecobjs.findtext("anglesref", None)
-        for angles in vv.VectorAnglesList:
-            if angles.angName == angleName:
-                vobj.angles = angles
-                break
-        # get nodes from existing objects
-        vobj_nodes = np.zeros((0, 3))
-        object_num = 0
-        object_list = []
-        for VectorObj in vv.VectorObjs:
-            vobj_nodes = np.vstack((vobj_nodes, VectorObj.position[0:3]))
-            object_list.append((object_num, VectorObj))  # reference to object position data row and respective object
-            object_num += 1
-        vobj.addNodes(vobj_nodes)
-        vobj.addObjects(object_list)           
-        # set the object
-        vv.setVectorPos(vobj)
-        break
-    
-    # run the main program
-    vv.run()
+    vv.profiler = Profiler(vv.timer_names, vv.timer_avg_frames)
+    vv.timers = vv.profiler.timers
+
+    vv.useRasterizer = args.rasterizer
+    vv.useLod = not args.no_lod
+    vv.groundGradient = args.ground_gradient
+    vv.pipelineDepth = args.pipeline
+    vv.useCulling = not args.no_culling
+    vv.cullCellSize = args.cull_cell
+    vv.loadWorld("vectordata.xml")
+    if args.tile > 1:
+        vv.tileWorld(args.tile)
+
+    if args.benchmark > 0:
+        frame_writer = None
+        if args.render is not None or args.encoder is not None:
+            frame_writer = FrameWriter(args.render, args.encoder, vv.target_fps, args.writers, args.queue)
+        report = vv.benchmark(args.benchmark, args.report, args.checksum_every, args.trace, frame_writer)
+        print('%d frames, %.1f fps, report written to %s' % (report['frames'], report['fps'], args.report))
+    else:
+        # run the main program
+        vv.run()
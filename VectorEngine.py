@@ -0,0 +1,1412 @@
+# -*- coding: utf-8 -*-
+"""
+The vector object engine shared by the Vector3D demos and Sound Vision: objects, their surfaces, angles, movements and
+positions, with the per frame calculations done for all surfaces (or all objects) at once with NumPy.
+
+Object model. A VectorObject keeps its surfaces in a surface table, one row per surface in each of a set of arrays (node
+numbers, colors, cross product vectors, angles, shades, visibility...), so that every calculation is a handful of array
+operations on the whole table. VectorObject.surfaces still gives a VectorObjectSurface for each row, with the attributes
+and methods of the earlier per surface objects, and VectorObject, VectorAngles, VectorMovement and VectorPosition keep
+the method names the demos use, so that a demo can switch to this module by replacing its own classes with an import.
+VectorNodeArena keeps the nodes of all objects in one array, for rotating, projecting and testing them all at once.
+
+Culling. Each VectorObject has a bounding sphere (its position and boundingRadius). VectorGrid is a static uniform grid of
+the objects not moving, with a bounding sphere for each cell, so that whole cells outside the view frustum (see
+frustum_planes) are dropped with one test each, before any per object work; only the objects in the cells left are
+tested one by one. VectorNodeArena can then rotate and project only the objects left (see VectorNodeArena.rotate).
+
+Kernels. The surface calculations are functions of plain arrays, used by VectorObject and usable without it:
+    surface_z_positions()   average Z of each surface (drawing order)
+    surface_normals()       cross product vector of each surface
+    vector_lengths()        lengths of vectors (rows)
+    surface_angles()        sign of the angle between each surface and the viewer or the light source (visibility)
+    surface_shades()        front and back side shade of each surface from its angle to the light source
+    surface_colors()        shaded color of each surface
+    project_nodes()         perspective projection of nodes to the screen
+    frustum_planes()        the planes bounding the view, for culling
+    spheres_in_frustum()    bounding spheres at least partly within the view (culling)
+Running this module times each kernel against the equivalent per surface loop, checking that the results agree:
+    python VectorEngine.py --surfaces 100 1000 10000
+
+@author: kalle
+"""
+import pygame
+import numpy as np
+import math
+import time
+import argparse
+from scipy.interpolate import make_interp_spline
+from Clipping import clip_polygons, near_plane
+from Rotation import rotation_matrix
+
+
+def surface_z_positions(rotated_nodes, surface_nodes, node_mask, node_num):
+
+    # average Z of the nodes of each surface. surface_nodes are padded (see VectorObject.setSurfaceTable) and node_mask is 1.0 for actual nodes.
+    return np.sum(rotated_nodes[surface_nodes, 2] * node_mask, axis=1) / node_num
+
+
+def surface_normals(rotated_nodes, surface_nodes):
+
+    # cross product vector of each surface, always using vectors (1, 0) and (1, 2) (numbers representing surface nodes).
+    # numpy "cross" was terribly slow for single vectors, calculating directly for all surfaces at once as below is much faster.
+    vec_A = rotated_nodes[surface_nodes[:, 2], 0:3] - rotated_nodes[surface_nodes[:, 1], 0:3]
+    vec_B = rotated_nodes[surface_nodes[:, 0], 0:3] - rotated_nodes[surface_nodes[:, 1], 0:3]
+    return np.column_stack((
+        vec_B[:, 1] * vec_A[:, 2] - vec_B[:, 2] * vec_A[:, 1],
+        vec_B[:, 2] * vec_A[:, 0] - vec_B[:, 0] * vec_A[:, 2],
+        vec_B[:, 0] * vec_A[:, 1] - vec_B[:, 1] * vec_A[:, 0]
+        ))
+
+
+def vector_lengths(vectors):
+
+    # length of each vector (row)
+    return np.sqrt(np.sum(vectors * vectors, axis=1))
+
+
+def surface_angles(normals, normal_lengths, vectors, use, previous):
+
+    # angle between each surface and a vector from its node 1 (to the viewer, or from the light source). Instead of true angle
+    # calculation using asin and vector lengths, the dot product with the cross product vector is sufficient to find the sign,
+    # which defines if the surface is visible (or lit). Surfaces not used, with a zero cross product or vector keep the previous value.
+    use = use & (normal_lengths > 0) & np.any(vectors != 0, axis=1)
+    return np.where(use, np.sum(normals * vectors, axis=1), previous)
+
+
+def surface_shades(light_angles, normal_lengths, light_vectors, min_shade):
+
+    # shade (share of color) of the front and the back side of each surface, from min_shade (parallel to the light, or facing away
+    # from it) to 1.0 (facing the light). light_angles are from surface_angles. Returns (shades, back_shades).
+    light_len = vector_lengths(light_vectors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # surfaces with zero length vectors get a nan angle here, but the angle is then never used.
+        light_angle = np.arcsin(np.clip(light_angles / (normal_lengths * light_len), -1.0, 1.0)) / (np.pi / 2)
+    shades = np.where(light_angles <= 0, min_shade, min_shade + (1.0 - min_shade) * light_angle)
+    back_shades = np.where(light_angles >= 0, min_shade, min_shade + (1.0 - min_shade) * -light_angle)
+    return (shades, back_shades)
+
+
+def surface_colors(viewer_angles, shades, back_shades, colors, back_colors, fade):
+
+    # shaded color of each surface as an array of shape (surfaces, 3); the back side color is used if the surface is facing away.
+    front = viewer_angles > 0
+    shade = np.where(front, shades, back_shades)
+    return np.round((fade * shade)[:, None] * np.where(front[:, None], colors, back_colors), 0)
+
+
+def project_nodes(nodes, z_scale, mid_screen, out=None):
+
+    # perspective: node (X, Y, Z) to screen (X * z_scale / -Z, Y * z_scale / -Z) + mid_screen, into out (nodes, 2) if given.
+    # nodes behind the viewer give meaningless results; those must be cropped (see Clipping.near_plane) or not drawn.
+    if out is None:
+        out = np.empty((np.shape(nodes)[0], 2))
+    np.multiply(nodes[:, 0:2], z_scale, out=out)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out /= -nodes[:, 2:3]
+    out += mid_screen
+    return out
+
+
+def frustum_planes(mid_screen, z_scale, min_z):
+
+    # the planes bounding the view (see project_nodes) as (normals, offsets): a point p is on the inside of plane i if
+    # normals[i] . p + offsets[i] >= 0. The screen edges give the four planes through the viewer, and min_z the near plane.
+    (mid_x, mid_y) = mid_screen
+    normals = np.array([
+        [-z_scale, 0.0, mid_x],     # left edge: screen X >= 0
+        [z_scale, 0.0, mid_x],      # right edge: screen X <= 2 * mid_x
+        [0.0, -z_scale, mid_y],     # top edge
+        [0.0, z_scale, mid_y],      # bottom edge
+        [0.0, 0.0, 1.0]             # near plane: Z >= min_z
+        ])
+    lengths = vector_lengths(normals)
+    return (normals / lengths[:, None], np.array([0.0, 0.0, 0.0, 0.0, -min_z]))
+
+
+def spheres_in_frustum(centers, radii, planes, margin=1.0):
+
+    # True for each sphere (view coordinates) not entirely on the outside of any of the planes (see frustum_planes).
+    # the test is conservative: a sphere outside the view but near a corner of it may pass. margin covers rounding.
+    (normals, offsets) = planes
+    distances = np.dot(centers, normals.T) + offsets
+    return np.all(distances >= -(radii + margin)[:, None], axis=1)
+
+
+def concatenated_ranges(starts, counts):
+
+    # the indexes of slices (start, count) concatenated, i.e. np.hstack([np.arange(start, start + count), ...]) without the loop
+    ends = np.cumsum(counts)
+    total = ends[-1] if len(ends) > 0 else 0
+    return np.arange(total) + np.repeat(starts - (ends - counts), counts)
+
+
+class VectorObject:
+
+    """
+    Position is the object's coordinates.
+    Nodes are the predefined, static definition of object "corner points", around object position anchor point (0,0,0).
+    RotatedNodes are the Nodes rotated by the given Angles and moved to Position.
+    TransNodes are the RotatedNodes transformed from 3D to 2D (X.Y) screen coordinates.
+
+    @author: kalle
+    """
+    def __init__(self):
+        self.position = np.array([0.0, 0.0, 0.0, 1.0])      # position
+        self.nodePosition = np.array([0.0, 0.0, 0.0, 1.0])  # position before rotation
+        self.angles = VectorAngles()
+        self.movement = VectorMovement()
+        self.nodes = np.zeros((0, 4))                       # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
+        self.objRotatedNodes = np.zeros((0, 3))             # objRotatedNodes will have X,Y,Z coordinates after object rotation in place (object angles)
+        self.rotatedNodes = np.zeros((0, 3))                # rotatedNodes will have X,Y,Z coordinates after rotation ("final 3D coordinates")
+        self.transNodes = np.zeros((0, 2))                  # transNodes will have X,Y coordinates
+        self.nodeNum = 0                                    # number of object nodes. nodes, rotatedNodes and transNodes may contain also shadow nodes
+        self.boundingRadius = 0.0                           # radius of a sphere around position containing all nodes, for culling
+        self.arenaOffset = 0                                # first node of this object in the VectorNodeArena arrays
+        self.shadow = 0
+        self.shadowNodeList = []                            # list of shadow nodes, in drawing order
+        self.shadowRotatedNodes = np.zeros((0, 3))          # rotatedNodes will have X,Y,Z coordinates
+        self.shadowTransNodes = np.zeros((0, 2))            # transNodes will have X,Y coordinates
+        self.edgeNodes = np.zeros((0, 2), dtype=int)        # all surface edges as node pairs (smaller node first), for finding the shadow perimeter
+        self.edgeUseEdges = np.zeros((0), dtype=int)        # each use of an edge by a surface: edge number...
+        self.edgeUseSurfaces = np.zeros((0), dtype=int)     # ... and the surface using it
+        self.shadowRotatedBuffer = np.zeros((0, 3))         # preallocated space for shadowRotatedNodes
+        self.shadowTransBuffer = np.zeros((0, 2))           # preallocated space for shadowTransNodes
+        self.surfaces = []                                  # VectorObjectSurface views to the surface table below, in definition order
+        # surface table: one row per surface. Surface data is kept in arrays so that all surfaces can be processed at once.
+        self.surfaceNodes = np.zeros((0, 3), dtype=int)     # node numbers of each surface in drawing order, padded with the first node
+        self.surfaceNodeMask = np.zeros((0, 3))             # 1.0 for actual nodes, 0.0 for padding in surfaceNodes
+        self.surfaceNodeNum = np.zeros((0), dtype=int)      # number of nodes in each surface
+        self.surfaceIdNum = np.zeros((0), dtype=int)
+        self.surfaceColor = np.zeros((0, 3), dtype=int)
+        self.surfaceBackColor = np.zeros((0, 3), dtype=int)
+        self.surfaceEdgeWidth = np.zeros((0), dtype=int)
+        self.surfaceShowBack = np.zeros((0), dtype=int)
+        self.surfaceZPos = np.zeros((0))
+        self.surfaceCrossProductVector = np.zeros((0, 3))
+        self.surfaceCrossProductLen = np.zeros((0))
+        self.surfaceLightSourceVector = np.zeros((0, 3))
+        self.surfaceAngleToViewer = np.zeros((0))
+        self.surfaceAngleToLightSource = np.zeros((0))
+        self.surfaceVisible = np.zeros((0), dtype=int)
+        self.surfaceColorShade = np.zeros((0))
+        self.surfaceBackColorShade = np.zeros((0))
+        self.surfaceOrder = np.zeros((0), dtype=int)        # surface numbers in drawing order (most distant first)
+        self.surfaceOrderKeys = np.zeros((0))               # surfaceZPos in surfaceOrder
+        self.lod = 0                                        # current level of detail; 0 is the full object
+        self.lodDistances = [0.0]                           # rotated Z distance from which each level of detail is used
+        self.lodSizes = [None]                              # object size / screen size (pixels) of levels used by size on screen, else None (see scaleLods)
+        self.lodTables = [None]                             # surface tables and shadow edges of the levels of detail not currently used
+        self.visible = 1
+        self.isFlat = 0
+        self.prio = 0                                       # priority order when drawn. Highest prio will be drawn first
+        self.objName = ""
+        self.minShade = 0.2                                 # shade (% of color) to use when surface is parallel to light source
+
+    def initGeometry(self):
+        # initialize the data shared by all instances of the object (see instance()) for each level of detail, ending with level 0:
+        # cross product lengths and edge tables, and the bounding radius. Must be done after nodes and surfaces have been set.
+        self.rotatedNodes = self.nodes[:, 0:3]
+        if np.shape(self.nodes)[0] > 0:
+            self.boundingRadius = float(np.max(vector_lengths(self.nodes[:, 0:3])))
+        for lod in reversed(range(len(self.lodDistances))):
+            self.setLod(lod)
+            self.updateSurfaceCrossProductVector()
+            self.updateSurfaceCrossProductLen()
+            self.initShadowEdges()
+
+    def initObject(self):
+        # initialize the instance data of each level of detail, ending with level 0.
+        for lod in reversed(range(len(self.lodDistances))):
+            self.setLod(lod)
+            self.updateSurfaceZPos()
+            self.updateSurfaceCrossProductVector()
+        if self.shadow == 1:
+            # the shadow perimeter has at most as many nodes as the object, and cropping can at most double that.
+            self.shadowRotatedBuffer = np.zeros((np.shape(self.nodes)[0], 3))
+            self.shadowTransBuffer = np.zeros((2 * np.shape(self.nodes)[0], 2))
+
+    def instance(self):
+        """
+        Return a new object sharing the geometry of this object: nodes, and for each level of detail the surface table, cross product
+        lengths and edge tables. Surface properties (colors etc.) are shared as well, until modified (see modifySurfaces).
+        Position, angles, movement and the other properties are copied; visibility and the surface buffers calculated
+        when running are the instance's own. The nodes can be replaced (e.g. for initangles); nothing else depends on them.
+        """
+        vobj = VectorObject()
+        for name in ('objName', 'angles', 'movement', 'nodeNum', 'boundingRadius', 'shadow', 'isFlat', 'prio', 'minShade'):
+            setattr(vobj, name, getattr(self, name))
+        vobj.position = self.position.copy()
+        vobj.nodePosition = self.nodePosition.copy()
+        vobj.nodes = self.nodes
+        vobj.rotatedNodes = self.rotatedNodes
+        vobj.lodDistances = list(self.lodDistances)
+        vobj.lodSizes = list(self.lodSizes)
+        vobj.lodTables = [None] * len(self.lodDistances)
+        for lod in reversed(range(len(self.lodDistances))):
+            if lod == self.lod:
+                table = dict((name, getattr(self, name)) for name in self.lodTableNames)
+            else:
+                table = self.lodTables[lod]
+            vobj.setLod(lod)
+            vobj.setSurfaceTable(*[table[name] for name in (
+                'surfaceNodes', 'surfaceNodeNum', 'surfaceIdNum', 'surfaceColor', 'surfaceBackColor', 'surfaceEdgeWidth', 'surfaceShowBack')])
+            for name in ('surfaceNodeMask', 'surfaceCrossProductLen', 'edgeNodes', 'edgeUseEdges', 'edgeUseSurfaces'):
+                setattr(vobj, name, table[name])
+        return vobj
+
+    def initShadowEdges(self):
+        # build the edge table needed for shadows: each edge (node pair) once, and which surfaces use which edges.
+        # this is constant and done only at init stage.
+        node_pos = np.arange(np.shape(self.surfaceNodes)[1])
+        prev_pos = (node_pos[None, :] - 1) % self.surfaceNodeNum[:, None] # previous node in each surface, the last node for the first one
+        prev_nodes = np.take_along_axis(self.surfaceNodes, prev_pos, axis=1)
+        used = self.surfaceNodeMask > 0
+        edge_nodes = np.column_stack((
+            np.minimum(self.surfaceNodes[used], prev_nodes[used]),
+            np.maximum(self.surfaceNodes[used], prev_nodes[used])
+            ))
+        (self.edgeNodes, self.edgeUseEdges) = np.unique(edge_nodes, axis=0, return_inverse=True)
+        self.edgeUseEdges = self.edgeUseEdges.ravel()
+        self.edgeUseSurfaces = np.nonzero(used)[0]
+
+    # the arrays that are separate for each level of detail
+    lodTableNames = (
+        'surfaces', 'surfaceNodes', 'surfaceNodeMask', 'surfaceNodeNum', 'surfaceIdNum', 'surfaceColor', 'surfaceBackColor',
+        'surfaceEdgeWidth', 'surfaceShowBack', 'surfaceZPos', 'surfaceCrossProductVector', 'surfaceCrossProductLen',
+        'surfaceLightSourceVector', 'surfaceAngleToViewer', 'surfaceAngleToLightSource', 'surfaceVisible', 'surfaceColorShade',
+        'surfaceBackColorShade', 'surfaceOrder', 'surfaceOrderKeys', 'edgeNodes', 'edgeUseEdges', 'edgeUseSurfaces'
+        )
+
+    def addLod(self, distance, size=None):
+        # add a level of detail used from rotated Z distance onwards, and make it the current one. Its surfaces are added (or set) after this.
+        # all levels of detail share the nodes; a level may use only some of them, or nodes added for it with addLodNodes.
+        # if the level is used when the object is smaller on screen than some size, size is the object size divided by that (in pixels),
+        # and distance depends on the screen's z scale; see scaleLods.
+        self.lodDistances.append(distance)
+        self.lodSizes.append(size)
+        self.lodTables.append(None)
+        self.setLod(len(self.lodDistances) - 1)
+        self.setSurfaceTable(np.zeros((0, 3), dtype=int), np.zeros((0), dtype=int), np.zeros((0), dtype=int), np.zeros((0, 3), dtype=int),
+                             np.zeros((0, 3), dtype=int), np.zeros((0), dtype=int), np.zeros((0), dtype=int))
+        self.edgeNodes = np.zeros((0, 2), dtype=int)
+        self.edgeUseEdges = np.zeros((0), dtype=int)
+        self.edgeUseSurfaces = np.zeros((0), dtype=int)
+
+    def scaleLods(self, zScale):
+        # set the distances of the levels of detail used by size on screen (see addLod) for the screen's z scale.
+        for (lod, size) in enumerate(self.lodSizes):
+            if size is not None:
+                self.lodDistances[lod] = size * zScale
+
+    def addLodNodes(self, node_array):
+        # add nodes after the existing ones, for a level of detail. Returns the number of the first added node.
+        first_node = np.shape(self.nodes)[0]
+        self.nodes = np.vstack((self.nodes, np.hstack((node_array, np.ones((len(node_array), 1))))))
+        self.rotatedNodes = self.nodes[:, 0:3]
+        return first_node
+
+    def setLod(self, lod):
+        # switch to level of detail lod, storing the current level's tables.
+        if lod != self.lod:
+            self.lodTables[self.lod] = dict((name, getattr(self, name)) for name in self.lodTableNames)
+            if self.lodTables[lod] is not None: # None for a level just added
+                for (name, value) in self.lodTables[lod].items():
+                    setattr(self, name, value)
+            self.lodTables[lod] = None
+            self.lod = lod
+
+    def updateLod(self, lodHysteresis):
+        # choose the level of detail by the rotated Z distance of the object. To avoid switching back and forth at a switch distance,
+        # a lower level of detail is taken into use only when lodHysteresis (share) further away, and left only when that much nearer.
+        lod = self.lod
+        while lod + 1 < len(self.lodDistances) and self.position[2] > self.lodDistances[lod + 1] * (1.0 + lodHysteresis):
+            lod += 1
+        while lod > 0 and self.position[2] < self.lodDistances[lod] * (1.0 - lodHysteresis):
+            lod -= 1
+        self.setLod(lod)
+
+    def surfaceVectorArea(self):
+        # vector area of each surface: its direction is perpendicular to the surface and its length is the surface area.
+        surface_nodes = self.nodes[self.surfaceNodes, 0:3]
+        return 0.5 * np.sum(np.cross(surface_nodes, np.roll(surface_nodes, -1, axis=1)), axis=1) # padding (first node) adds nothing
+
+    def mergedSurfaces(self):
+        """
+        Simplify the current surfaces by merging neighbouring surfaces which are in the same plane and have the same properties.
+        Returns (new nodes, surface table) for addLodNodes and setSurfaceTable. No new nodes are needed.
+        Nodes on a straight line along the merged surface perimeter are dropped. Surfaces which would have holes are not merged.
+        """
+        nodes = self.nodes[:, 0:3]
+        surf_count = np.shape(self.surfaceNodes)[0]
+        area = self.surfaceVectorArea()
+        area_len = np.sqrt(np.sum(area * area, axis=1))
+        normal = area / np.maximum(area_len, 1e-12)[:, None]
+        plane = np.sum(normal * nodes[self.surfaceNodes[:, 0]], axis=1)
+        tolerance = 1e-6 * max(1.0, np.max(np.abs(nodes)))
+        node_lists = [list(self.surfaceNodes[surf_nr, 0:self.surfaceNodeNum[surf_nr]]) for surf_nr in range(surf_count)]
+        # combine surfaces sharing an edge (in opposite directions), using a simple union-find
+        group = list(range(surf_count))
+        def root(surf_nr):
+            while group[surf_nr] != surf_nr:
+                surf_nr = group[surf_nr]
+            return surf_nr
+        edges = {}
+        for (surf_nr, node_list) in enumerate(node_lists):
+            for (node_a, node_b) in zip(node_list, node_list[1:] + node_list[:1]):
+                edges[(node_a, node_b)] = surf_nr
+        for ((node_a, node_b), surf_nr) in edges.items():
+            other_nr = edges.get((node_b, node_a))
+            if other_nr is not None and area_len[surf_nr] > 0 and area_len[other_nr] > 0 \
+                    and np.dot(normal[surf_nr], normal[other_nr]) > 1.0 - 1e-9 and abs(plane[surf_nr] - plane[other_nr]) < tolerance \
+                    and self.surfaceIdNum[surf_nr] == self.surfaceIdNum[other_nr] \
+                    and np.all(self.surfaceColor[surf_nr] == self.surfaceColor[other_nr]) \
+                    and np.all(self.surfaceBackColor[surf_nr] == self.surfaceBackColor[other_nr]) \
+                    and self.surfaceEdgeWidth[surf_nr] == self.surfaceEdgeWidth[other_nr] \
+                    and self.surfaceShowBack[surf_nr] == self.surfaceShowBack[other_nr]:
+                group[root(other_nr)] = root(surf_nr)
+
+        surf_nrs = []
+        merged_lists = []
+        for surf_nr in range(surf_count):
+            members = [other_nr for other_nr in range(surf_count) if root(other_nr) == surf_nr]
+            if len(members) == 0:
+                continue
+            node_list = None
+            if len(members) > 1:
+                node_list = self.mergedPerimeter([node_lists[other_nr] for other_nr in members], nodes, np.sum(area[members], axis=0), tolerance)
+            if node_list is None:
+                # a single surface, or a merge which did not work out: keep the surfaces as they are
+                surf_nrs += members
+                merged_lists += [node_lists[other_nr] for other_nr in members]
+            else:
+                surf_nrs.append(members[0])
+                merged_lists.append(node_list)
+        order = np.argsort(surf_nrs, kind='stable') # keep the original surface order
+        surf_nrs = np.array(surf_nrs)[order]
+        return (np.zeros((0, 3)), surfaceTable(
+            [merged_lists[i] for i in order], self.surfaceIdNum[surf_nrs], self.surfaceColor[surf_nrs], self.surfaceBackColor[surf_nrs],
+            self.surfaceEdgeWidth[surf_nrs], self.surfaceShowBack[surf_nrs]))
+
+    def mergedPerimeter(self, node_lists, nodes, area, tolerance):
+        # return the perimeter node list of surfaces (in node_lists) in the same plane, or None if it is not a single closed line.
+        edges = set()
+        for node_list in node_lists:
+            edges.update(zip(node_list, node_list[1:] + node_list[:1]))
+        # inner edges are used in both directions
+        next_nodes = {}
+        for (node_a, node_b) in edges:
+            if (node_b, node_a) not in edges:
+                if node_a in next_nodes:
+                    return None
+                next_nodes[node_a] = node_b
+        node_list = [next(iter(next_nodes))]
+        while next_nodes[node_list[-1]] != node_list[0]:
+            node_list.append(next_nodes[node_list[-1]])
+            if len(node_list) > len(next_nodes):
+                return None
+        if len(node_list) != len(next_nodes):
+            return None # there are holes
+        # drop nodes on a straight line
+        straight = True
+        while straight and len(node_list) > 3:
+            straight = False
+            for i in range(len(node_list)):
+                (prev_node, node, next_node) = nodes[[node_list[i - 1], node_list[i], node_list[(i + 1) % len(node_list)]]]
+                if np.sqrt(np.sum(np.cross(node - prev_node, next_node - node) ** 2)) < tolerance * np.sqrt(np.sum((next_node - prev_node) ** 2)):
+                    del node_list[i]
+                    straight = True
+                    break
+        # the cross product vector is calculated at the second node, so start from a node where the perimeter is convex.
+        for i in range(len(node_list)):
+            (prev_node, node, next_node) = nodes[[node_list[i - 1], node_list[i], node_list[(i + 1) % len(node_list)]]]
+            if np.dot(np.cross(prev_node - node, next_node - node), area) < 0:
+                return node_list[i - 1:] + node_list[:i - 1] if i > 0 else node_list[-1:] + node_list[:-1]
+        return None
+
+    def boundingBoxSurfaces(self):
+        """
+        Simplify the current surfaces to the (up to) six sides of their bounding box.
+        Returns (new nodes, surface table) for addLodNodes and setSurfaceTable; the new nodes are the corners of the box.
+        Each surface is assigned to the box side in the main direction of the surface, on the side of the box center the surface is.
+        The box side gets the area weighted average color of its surfaces, and the other properties of the biggest one.
+        Sides with no surfaces (like the bottom of a house) are left out.
+        Returns None for objects which are not box like: with surfaces showing their back side or drawn as wireframe, or mostly
+        not facing along the axes.
+        """
+        if np.any(self.surfaceShowBack == 1) or np.any(self.surfaceEdgeWidth > 0):
+            return None
+        area = self.surfaceVectorArea()
+        area_len = np.sqrt(np.sum(area * area, axis=1))
+        if np.sum(np.max(np.abs(area), axis=1)) < 0.9 * np.sum(area_len):
+            return None
+        nodes = self.nodes[:, 0:3]
+        used_nodes = nodes[np.unique(self.surfaceNodes)]
+        box_min = np.min(used_nodes, axis=0)
+        box_max = np.max(used_nodes, axis=0)
+        # box corner i is at box_max in X if bit 2 of i is set, Y bit 1, Z bit 0
+        corners = np.array([[(box_min, box_max)[(i >> (2 - axis)) & 1][axis] for axis in range(3)] for i in range(8)])
+        first_node = np.shape(nodes)[0]
+        surf_axis = np.argmax(np.abs(area), axis=1)
+        surf_center = np.sum(nodes[self.surfaceNodes] * self.surfaceNodeMask[:, :, None], axis=1) / self.surfaceNodeNum[:, None]
+        surf_side = (surf_center[np.arange(np.shape(area)[0]), surf_axis] > (box_min + box_max)[surf_axis] / 2.0).astype(int)
+        node_lists = []
+        surf_nrs = []
+        colors = []
+        back_colors = []
+        for axis in range(3):
+            (axis_b, axis_c) = [other for other in range(3) if other != axis]
+            for side in range(2):
+                members = np.nonzero((surf_axis == axis) & (surf_side == side) & (area_len > 0))[0]
+                if np.size(members) == 0:
+                    continue
+                # the four corners of this box side in a circular order, and the same direction as its surfaces
+                node_list = [first_node + (side << (2 - axis)) + (b << (2 - axis_b)) + (c << (2 - axis_c)) for (b, c) in ((0, 0), (1, 0), (1, 1), (0, 1))]
+                side_nodes = corners[np.array(node_list) - first_node]
+                side_area = 0.5 * np.sum(np.cross(side_nodes, np.roll(side_nodes, -1, axis=0)), axis=0)
+                if np.dot(side_area, np.sum(area[members], axis=0)) < 0:
+                    node_list.reverse()
+                if np.all(side_area == 0):
+                    continue # flat box
+                weights = area_len[members] / np.sum(area_len[members])
+                node_lists.append(node_list)
+                surf_nrs.append(members[np.argmax(area_len[members])])
+                colors.append(np.round(np.sum(self.surfaceColor[members] * weights[:, None], axis=0)))
+                back_colors.append(np.round(np.sum(self.surfaceBackColor[members] * weights[:, None], axis=0)))
+        surf_nrs = np.array(surf_nrs, dtype=int)
+        return (corners, surfaceTable(
+            node_lists, self.surfaceIdNum[surf_nrs], np.array(colors, dtype=int).reshape((-1, 3)), np.array(back_colors, dtype=int).reshape((-1, 3)),
+            self.surfaceEdgeWidth[surf_nrs], self.surfaceShowBack[surf_nrs]))
+
+    def setPosition(self, position):
+        # move object by giving it a rotated position.
+        self.position = position
+
+    def setNodePosition(self, nodePosition):
+        # move object by giving it an unrotated position.
+        self.nodePosition = nodePosition
+
+    def setFlat(self):
+        # set isFlat
+        self.isFlat = 1
+
+    def addNodes(self, node_array):
+        # add nodes (all at once); add a column of ones for using position in transform
+        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
+        self.rotatedNodes = node_array # initialize rotatedNodes with nodes (no added ones required)
+
+    def addSurfaces(self, idnum, color, edgeWidth, showBack, backColor, node_list):
+        # add a Surface, defining its properties. Adds a row to the surface table and a view to it in surfaces list.
+        node_num = len(node_list)
+        pad_num = node_num - np.shape(self.surfaceNodes)[1]
+        surface_nodes = self.surfaceNodes
+        if pad_num > 0:
+            # more nodes than in any previous surface: widen the table, padding with the first node of each surface
+            surface_nodes = np.hstack((surface_nodes, np.repeat(surface_nodes[:, 0:1], pad_num, axis=1)))
+        new_nodes = np.full((1, np.shape(surface_nodes)[1]), node_list[0], dtype=int)
+        new_nodes[0, 0:node_num] = node_list
+        self.setSurfaceTable(
+            np.vstack((surface_nodes, new_nodes)),
+            np.hstack((self.surfaceNodeNum, node_num)),
+            np.hstack((self.surfaceIdNum, idnum)),
+            np.vstack((self.surfaceColor, color)),
+            np.vstack((self.surfaceBackColor, backColor)),
+            np.hstack((self.surfaceEdgeWidth, edgeWidth)),
+            np.hstack((self.surfaceShowBack, showBack))
+            )
+
+    def setSurfaceTable(self, surfaceNodes, surfaceNodeNum, surfaceIdNum, surfaceColor, surfaceBackColor, surfaceEdgeWidth, surfaceShowBack):
+        # set all surfaces at once, replacing any previous surfaces. surfaceNodes must be padded with the first node of each surface.
+        surface_count = np.shape(surfaceNodes)[0]
+        self.surfaceNodes = surfaceNodes
+        self.surfaceNodeNum = surfaceNodeNum
+        self.surfaceNodeMask = (np.arange(np.shape(surfaceNodes)[1]) < surfaceNodeNum[:, None]).astype(float)
+        self.surfaceIdNum = surfaceIdNum
+        self.surfaceColor = surfaceColor
+        self.surfaceBackColor = surfaceBackColor
+        self.surfaceEdgeWidth = surfaceEdgeWidth
+        self.surfaceShowBack = surfaceShowBack
+        self.surfaceZPos = np.zeros((surface_count))
+        self.surfaceCrossProductVector = np.zeros((surface_count, 3))
+        self.surfaceCrossProductLen = np.zeros((surface_count))
+        self.surfaceLightSourceVector = np.zeros((surface_count, 3))
+        self.surfaceAngleToViewer = np.zeros((surface_count))
+        self.surfaceAngleToLightSource = np.zeros((surface_count))
+        self.surfaceVisible = np.ones((surface_count), dtype=int)
+        self.surfaceColorShade = np.ones((surface_count))
+        self.surfaceBackColorShade = np.ones((surface_count))
+        self.surfaceOrder = np.arange(surface_count)
+        self.surfaceOrderKeys = np.zeros((surface_count))
+        self.surfaces = [VectorObjectSurface(self, surf_nr) for surf_nr in range(surface_count)]
+
+    def modifySurfaces(self, idnum, color, edgeWidth, showBack, backColor):
+        # modify the properties of (copied) surfaces having the given idnum, in all levels of detail. Nodes cannot be modified.
+        for lod in range(len(self.lodDistances)):
+            self.setLod(lod)
+            surf_nrs = self.surfaceIdNum == idnum
+            # the properties may be shared with other instances, so modify a copy
+            self.surfaceColor = self.surfaceColor.copy()
+            self.surfaceBackColor = self.surfaceBackColor.copy()
+            self.surfaceEdgeWidth = self.surfaceEdgeWidth.copy()
+            self.surfaceShowBack = self.surfaceShowBack.copy()
+            self.surfaceColor[surf_nrs, :] = color
+            self.surfaceBackColor[surf_nrs, :] = backColor
+            self.surfaceEdgeWidth[surf_nrs] = edgeWidth
+            self.surfaceShowBack[surf_nrs] = showBack
+        self.setLod(0)
+
+    def updateVisiblePos(self, objMinZ):
+        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
+        if self.isFlat == 0 and self.position[2] < objMinZ:
+            self.visible = 0
+        else:
+            self.visible = 1
+
+    def updateVisibleNodes(self, objMinZ):
+        # check if object is visible. If any of node Z coordinates are too close to viewer, set to 0, unless is flat
+        if self.isFlat == 0:
+            if min(self.rotatedNodes[:, 2]) < objMinZ:
+                self.visible = 0
+            else:
+                self.visible = 1
+        else:
+            # for flat objects, check if the whole object is behind the viewing point (minZ)
+            if max(self.rotatedNodes[:, 2]) < objMinZ:
+                self.visible = 0
+            else:
+                self.visible = 1
+
+    def updateVisibleTrans(self, midScreen):
+        # check if object is visible. If not enough nodes or all X or Y coordinates are outside of screen, set to 0
+        if \
+            np.shape(self.transNodes)[0] < 3 \
+            or max(self.transNodes[:, 0]) < 0 \
+            or min(self.transNodes[:, 0]) > midScreen[0] * 2 \
+            or max(self.transNodes[:, 1]) < 0 \
+            or min(self.transNodes[:, 1]) > midScreen[1] * 2:
+            self.visible = 0
+        else:
+            self.visible = 1
+
+    def updateSurfaceZPos(self):
+        # calculate average Z position for each surface using rotatedNodes
+        self.surfaceZPos = surface_z_positions(self.rotatedNodes, self.surfaceNodes, self.surfaceNodeMask, self.surfaceNodeNum)
+        self.surfaceVisible[:] = 1 # set all surfaces to "visible"
+
+    def updateSurfaceCrossProductVector(self):
+        # calculate cross product vector for each surface using rotatedNodes
+        self.surfaceCrossProductVector = surface_normals(self.rotatedNodes, self.surfaceNodes)
+
+    def updateSurfaceCrossProductLen(self):
+        # calculate cross product vector length for each surface.
+        # this is constant and done only at init stage.
+        self.surfaceCrossProductLen = vector_lengths(self.surfaceCrossProductVector)
+
+    def updateSurfaceAngleToViewer(self):
+        # calculate acute angle between surface plane and Viewer
+        # surface plane cross product vector and Viewer vector both from node 1.
+        visible = self.surfaceVisible == 1
+        vec_Viewer = self.rotatedNodes[self.surfaceNodes[:, 1], 0:3]
+        self.surfaceAngleToViewer = surface_angles(self.surfaceCrossProductVector, self.surfaceCrossProductLen, vec_Viewer, visible, self.surfaceAngleToViewer)
+        self.surfaceVisible = np.where(visible & ((self.surfaceAngleToViewer > 0) | (self.surfaceShowBack == 1)), 1, 0)
+
+    def updateSurfaceAngleToLightSource(self, lightPosition):
+        # calculate acute angle between surface plane and light source, similar to above for Viewer.
+        # this is used to define shading and shadows; needed for visible surfaces using shading AND all surfaces, if shadow to be drawn.
+        if self.shadow == 1:
+            use_surfaces = np.ones(np.shape(self.surfaceVisible), dtype=bool)
+        elif self.minShade < 1.0:
+            use_surfaces = self.surfaceVisible == 1
+        else:
+            return
+        vec_Light = self.rotatedNodes[self.surfaceNodes[:, 1], 0:3] - lightPosition
+        self.surfaceLightSourceVector = np.where(use_surfaces[:, None], vec_Light, self.surfaceLightSourceVector)
+        self.surfaceAngleToLightSource = surface_angles(self.surfaceCrossProductVector, self.surfaceCrossProductLen, vec_Light, use_surfaces,
+                                                        self.surfaceAngleToLightSource)
+
+    def updateSurfaceColorShade(self):
+        # calculate shade for surface (and its back side, if shown).
+        visible = self.surfaceVisible == 1
+        (shade, back_shade) = surface_shades(self.surfaceAngleToLightSource, self.surfaceCrossProductLen, self.surfaceLightSourceVector, self.minShade)
+        self.surfaceColorShade = np.where(visible, shade, self.surfaceColorShade)
+        self.surfaceBackColorShade = np.where(visible & (self.surfaceShowBack == 1), back_shade, self.surfaceBackColorShade)
+
+    def surfaceColorsRGB(self, fade):
+        # shaded colors for all surfaces as an array of shape (surfaces, 3). Back side color used if surface is facing away.
+        return surface_colors(self.surfaceAngleToViewer, self.surfaceColorShade, self.surfaceBackColorShade, self.surfaceColor, self.surfaceBackColor, fade)
+
+    def sortSurfacesByZPos(self):
+        # sorts surfaces by Z position so that the most distant comes first in surfaceOrder, starting from the previous order.
+        # returns the number of surfaces which changed places.
+        (self.surfaceOrder, moved) = updateDrawOrder(self.surfaceOrder, self.surfaceZPos, self.surfaceOrderKeys)
+        return moved
+
+    def updateShadow(self, viewerAngles, lightNode, light_position, obj_pos, objMinZ, zScale, midScreen):
+        """
+        Update shadowTransNodes (a list of nodes which define the shadow of the object).
+        This routine assumes objects are "whole", that they do not have any holes - such objects should be built as several parts.
+        A more resilient way would be to calculate and draw a shadow for each surface separately, but leading to extra calculations and draws.
+        The perimeter is found using the edge table built by initShadowEdges, and its nodes are then projected on the ground.
+        Note for objects standing on the ground, the nodes where Y=0 are already there and need no projection.
+        """
+        # edges of surfaces facing the lightsource produce a shadow. Edges used by only one such surface define the outer perimeter; inner edges are used twice.
+        facing = (self.surfaceAngleToLightSource > 0) | (self.surfaceShowBack == 1)
+        edge_count = np.bincount(self.edgeUseEdges, weights=facing[self.edgeUseSurfaces], minlength=np.shape(self.edgeNodes)[0])
+        use_edges = self.edgeNodes[edge_count == 1]
+        if np.shape(use_edges)[0] < 3:
+            self.shadowNodeList = []
+            self.shadowTransNodes = self.shadowTransBuffer[0:0, :]
+            return
+
+        # these edges should form a continuous line. Build a table of the (two) perimeter neighbours of each node, and walk it around.
+        edge_ends = use_edges.ravel()
+        edge_others = use_edges[:, ::-1].ravel()
+        end_order = np.argsort(edge_ends, kind='stable')
+        edge_ends = edge_ends[end_order]
+        second = np.hstack((False, edge_ends[1:] == edge_ends[:-1])).astype(int) # 0 for the first edge of each node, 1 for the second
+        neighbours = np.full((np.shape(self.nodes)[0], 2), -1, dtype=int)
+        neighbours[edge_ends, second] = edge_others[end_order]
+        neighbours = neighbours.tolist()
+        node_list = [int(use_edges[0, 0]), int(use_edges[0, 1])]
+        prev_node = node_list[0]
+        for i in range(np.shape(use_edges)[0]):
+            (next_node, other_node) = neighbours[node_list[-1]]
+            if next_node == prev_node:
+                next_node = other_node
+            if next_node < 0 or next_node == node_list[0]:
+                break # full circle reached
+            prev_node = node_list[-1]
+            node_list.append(next_node)
+        self.shadowNodeList = node_list
+
+        # then project these nodes on the ground i.e. Y = 0, if they are not already on the ground level or too high compared to light source.
+        nodes = np.array(node_list)
+        node_num = len(node_list)
+        node_heights = obj_pos[1] + self.objRotatedNodes[nodes, 1]
+        project = (node_heights > 3) & (node_heights < (lightNode[1] - 3))
+        # the projection multiplier is based on the vector from lightNode to the node, where Y=0 is ground, but it can be applied directly to rotatedNodes as well.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            project_mult = np.where(project, lightNode[1] / (lightNode[1] - node_heights), 1.0)
+        shadow_nodes = self.shadowRotatedBuffer[0:node_num, :]
+        np.subtract(self.rotatedNodes[nodes, :], light_position, out=shadow_nodes)
+        shadow_nodes *= project_mult[:, None]
+        shadow_nodes += light_position
+        shadow_nodes[~project, :] = self.rotatedNodes[nodes[~project], :]
+        self.shadowRotatedNodes = shadow_nodes
+
+        # crop the perimeter to objMinZ. For each side (previous node to node), add a crop point if it crosses objMinZ, and then the node if it is visible.
+        prev_nodes = np.roll(shadow_nodes, 1, axis=0)
+        visible = shadow_nodes[:, 2] >= objMinZ
+        crosses = visible != np.roll(visible, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crop_mult = (objMinZ - prev_nodes[:, 2]) / (shadow_nodes[:, 2] - prev_nodes[:, 2])
+        crop_nodes = prev_nodes + (shadow_nodes - prev_nodes) * crop_mult[:, None]
+        flat_nodes = np.stack((crop_nodes, shadow_nodes), axis=1)[np.column_stack((crosses, visible))]
+
+        # flatten to 2D
+        trans_num = np.shape(flat_nodes)[0]
+        shadow_trans = self.shadowTransBuffer[0:trans_num, :]
+        np.multiply(flat_nodes[:, 0:2], -zScale, out=shadow_trans)
+        shadow_trans /= flat_nodes[:, 2:3]
+        shadow_trans += midScreen
+        self.shadowTransNodes = shadow_trans
+
+    def rotate(self, viewerAngles):
+        """
+        Apply a rotation defined by a given rotation matrix.
+        For objects with their own angles / rotation matrix, apply those first and store results in objRotatedNodes.
+        Could be done in one step but objRotatedNodes needed for shadow calculations.
+        """
+
+        if self.angles != viewerAngles:
+            # rotate object with its own angles "in place" ie. with synthetic zero vector as position
+            matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1,3))))
+            self.objRotatedNodes = np.dot(self.nodes, matrix)
+        else:
+            # no own angles, just copy nodes then
+            self.objRotatedNodes = self.nodes[:,0:3]
+        # then rotate with viewer angles. Add position to rotation matrix to enable both rotation and position change at once
+        matrix = np.vstack((viewerAngles.rotationMatrix, self.position[0:3]))
+        self.rotatedNodes = np.dot(np.hstack((self.objRotatedNodes, np.ones((np.shape(self.objRotatedNodes)[0], 1)))), matrix)
+
+    def transform(self, midScreen, zScale, objMinZ):
+        """
+        Flatten from 3D to 2D and add screen center.
+        First crop flat objects by Z coordinate so that they can be drawn even if some Z coordinates are behind the viewer.
+        """
+        if self.isFlat == 1:
+            # for flat objects, build a list of transNodes for the surface by first cropping the necessary surface sides to minZ
+            # if all Z coordinates are behind the viewer, there will be no transNodes.
+            self.surfaceVisible[:] = 1 # set all surfaces to "visible"
+            (flat_nodes, offsets) = clip_polygons(self.rotatedNodes[self.surfaceNodes, 0:3], self.surfaceNodeNum, [near_plane(objMinZ)])
+            # flat objects have a single surface
+            flat_nodes = flat_nodes[offsets[-2]:offsets[-1], :]
+            # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes
+            self.transNodes = project_nodes(flat_nodes, zScale, midScreen)
+        else:
+            # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes.
+            # for normal objects, some of the transNodes will not be required, but possibly figuring out which are and processing them
+            #   individually could take more time than this.
+            self.transNodes = project_nodes(self.rotatedNodes, zScale, midScreen)
+
+    def groundData(self, midScreen, zScale, objMinZ, groundZ, groundShadeNr):
+        """
+        Calculate ground data for on a ground object.
+        Assumes the ground object "covers the ground" reasonably and isFlat = 1, has 4 nodes, and the perimeter is concave.
+        Ground settings are defined in VectorViewer.
+        Returns an array of shape(groundShadeNr + 2, 4) where each row has X,Y of left edge and X.Y of right edge starting from most distant.
+        The first array is used to clear the screen above the ground (so in effect this covers the whole screen).
+        """
+        # find the most distant node
+        nodenum = np.argmax(self.rotatedNodes[0:len(self.nodes), 2])
+        node = self.rotatedNodes[nodenum, :]
+        prev_node = self.rotatedNodes[nodenum - 1, :]
+        next_node = self.rotatedNodes[(nodenum + 1) % len(self.nodes), :]
+
+        # get a straight line where Z (ie, distance from viewer) is constant. Start with the mid of farthest of the two lines.
+        # then find the point with matching Z coordinate on the other line.
+        # special cases: next_node or prev_node as far as node.
+        if node[2] == prev_node[2]:
+            mid1_node = node
+            mid2_node = prev_node
+        else:
+            if node[2] == next_node[2]:
+                mid1_node = node
+                mid2_node = next_node
+            else:
+                if next_node[2] > prev_node[2]:
+                    mid1_node = (next_node + node) / 2
+                    mid2_node = node + (prev_node - node) * (mid1_node[2] - node[2]) / (prev_node[2] - node[2])
+                else:
+                    mid1_node = (prev_node + node) / 2
+                    mid2_node = node + (next_node - node) * (mid1_node[2] - node[2]) / (next_node[2] - node[2])
+        if mid1_node[1] < mid2_node[1]:
+            # make sure mid1_node X < mid2_node X
+            mid1_node, mid2_node = mid2_node, mid1_node
+        # adjust Z
+        mid1_node = mid1_node * groundZ / mid1_node[2]
+        mid2_node = mid2_node * groundZ / mid2_node[2]
+        # finalize a square around object position
+        mid2_node_back = self.position[0:3] + (self.position[0:3] - mid1_node) # from front left (mid1) to back right (mid2_back)
+        mid1_node_back = self.position[0:3] + (self.position[0:3] - mid2_node) # from front right (mid2) to back left (mid1_back)
+
+        # then generate arrays with necessary node data and transNode data
+        # multipliers will span ground component span between groundZ/2 (furthest) and objMinZ
+        mult = (mid1_node[2] / 2 - objMinZ) / ((mid1_node[2] - mid1_node_back[2]) / 2)
+        # the most distant component (at groundZ) first. Most distant component will be very large (half of total)
+        # then the other components from groundZ/2 to objMinZ
+        mult_i = mult * np.sqrt(np.arange(1, groundShadeNr + 1) / groundShadeNr)[:, None]
+        left_nodes = np.vstack((mid1_node, (mid1_node * (1.0 - mult_i) + mid1_node_back * mult_i) / 2))
+        right_nodes = np.vstack((mid2_node, (mid2_node * (1.0 - mult_i) + mid2_node_back * mult_i) / 2))
+        left_transNodes = (-left_nodes[:, 0:2] * zScale) / (left_nodes[:, 2:3]) + midScreen
+        right_transNodes = (-right_nodes[:, 0:2] * zScale) / (right_nodes[:, 2:3]) + midScreen
+
+        # crop these nodes to screen X edges
+        diff_transNodes = right_transNodes - left_transNodes
+        mult_nodes = right_transNodes[:, 0] / diff_transNodes[:, 0]
+        left_transNodes = right_transNodes - np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
+        diff_transNodes = right_transNodes - left_transNodes
+        mult_nodes = (midScreen[0] * 2) / diff_transNodes[:,0]
+        right_transNodes = left_transNodes + np.multiply(np.transpose(np.vstack((mult_nodes, mult_nodes))), diff_transNodes)
+
+        # the first component is "the top of the sky".
+        if left_transNodes[0,1] < left_transNodes[1,1]:
+            # "normal ground", add a node to the top of the screen
+            if left_transNodes[0,1] < 0:
+                # if ground already covers the whole screen, use the top node
+                left_skynode = left_transNodes[0,:]
+            else:
+                left_skynode = np.array([0, 0])
+        else:
+            # inverted ground ie. going upside down, add a node to the bottom of the screen
+            if left_transNodes[0,1] > midScreen[1] * 2:
+                # if ground already covers the whole screen, use the top node
+                left_skynode = left_transNodes[0,:]
+            else:
+                left_skynode = np.array([0, midScreen[1] * 2])
+        if right_transNodes[0,1] < right_transNodes[1,1]:
+            # "normal ground", add a node to the top of the screen
+            if right_transNodes[0,1] < 0:
+                # if ground already covers the whole screen, use the top node
+                right_skynode = right_transNodes[0,:]
+            else:
+                right_skynode = np.array([midScreen[0] * 2, 0])
+        else:
+            # inverted ground ie. going upside down, add a node to the bottom of the screen
+            if right_transNodes[0,1] > midScreen[1] * 2:
+                # if ground already covers the whole screen, use the top node
+                right_skynode = right_transNodes[0,:]
+            else:
+                right_skynode = midScreen * 2
+        # add the first component and build an array of all the transnodes
+        transNodes = np.vstack((np.hstack((left_skynode, right_skynode)), np.hstack((left_transNodes, right_transNodes))))
+
+        return(transNodes)
+
+
+def surfaceTable(node_lists, idnums, colors, backColors, edgeWidths, showBacks):
+    # surface table arrays for VectorObject.setSurfaceTable from a list of node lists and arrays of the other surface properties.
+    width = max([3] + [len(node_list) for node_list in node_lists])
+    surface_nodes = np.array([list(node_list) + [node_list[0]] * (width - len(node_list)) for node_list in node_lists], dtype=int).reshape((-1, width))
+    node_nums = np.array([len(node_list) for node_list in node_lists], dtype=int)
+    return (surface_nodes, node_nums, np.array(idnums, dtype=int), np.array(colors, dtype=int).reshape((-1, 3)),
+            np.array(backColors, dtype=int).reshape((-1, 3)), np.array(edgeWidths, dtype=int), np.array(showBacks, dtype=int))
+
+
+def quadraticPieces(times, values):
+    # the quadratic interpolating spline of values (rows) at times, as polynomial pieces (see VectorMovement). Returns (breaks, coefs).
+    spline = make_interp_spline(times, values.T, k=2)
+    breaks = np.unique(spline.t)
+    # evaluate each piece in its middle, away from the knots, and move the expansion to the start of the piece
+    mids = (breaks[:-1] + breaks[1:]) / 2
+    h = (mids - breaks[:-1])[:, None]
+    (a, b, c) = (spline(mids), spline(mids, 1), spline(mids, 2) / 2)
+    return (breaks, np.stack((c, b - 2 * c * h, a - b * h + c * h * h), axis=1))
+
+
+def updateDrawOrder(order, keys, order_keys):
+    """
+    Update a drawing order kept between frames: order has item numbers, the item with the greatest key first.
+    keys are the new keys by item number, and order_keys a preallocated array for them in order.
+    Returns the new order and the number of items which changed places. Items with equal keys keep their previous order.
+    Usually the keys are still in order, and nothing needs to be sorted; if not, the stable argsort (timsort) of the keys in
+    the previous order merges the runs already in order, so its cost grows with how much the order changed.
+    """
+    keys.take(order, out=order_keys)
+    if (order_keys[:-1] >= order_keys[1:]).all():
+        return (order, 0)
+    new_order = np.argsort(-order_keys, kind='stable')
+    moved = np.count_nonzero(new_order != np.arange(np.size(new_order)))
+    return (order[new_order], moved)
+
+
+def surfaceTableProperty(table_name, convert=None):
+    # property reading and writing a VectorObjectSurface's row in the named surface table of its VectorObject.
+    def getter(self):
+        value = getattr(self.vobj, table_name)[self.surfNr]
+        return value if convert is None else convert(value)
+    def setter(self, value):
+        getattr(self.vobj, table_name)[self.surfNr] = value
+    return property(getter, setter)
+
+
+class VectorNodeArena:
+
+    """
+    The nodes of all VectorObjects in one contiguous array, so that rotation, perspective and visibility tests are done once per frame for all objects.
+    Instances (objects sharing their nodes, see VectorObject.instance) with the same angle set are rotated together: their nodes and objRotatedNodes
+    are stored once, as a geometry, and only rotatedNodes and transNodes, which depend on object position, are stored for each object.
+    Each object's nodes and objRotatedNodes are views to its geometry's slice of the arena arrays, and rotatedNodes and transNodes to its own slice.
+    Objects sharing an angle set are stored next to each other, so that their object rotation is a single matrix multiplication.
+    If only some objects are active (e.g. the others have been culled, see VectorGrid), only their nodes are moved and projected.
+
+    @author: kalle
+    """
+    def __init__(self, VectorObjs, VectorPos):
+        # order objects by angle set and geometry, keeping the original order otherwise
+        angles_list = []
+        for VectorObj in VectorObjs:
+            if not any(VectorObj.angles is angles for angles in angles_list):
+                angles_list.append(VectorObj.angles)
+        geometries = [] # (angles, nodes, objects)
+        for angles in angles_list:
+            for VectorObj in VectorObjs:
+                if VectorObj.angles is angles:
+                    for (geom_angles, geom_nodes, geom_objects) in geometries:
+                        if geom_angles is angles and geom_nodes is VectorObj.nodes:
+                            geom_objects.append(VectorObj)
+                            break
+                    else:
+                        geometries.append((angles, VectorObj.nodes, [VectorObj]))
+        self.objects = [VectorObj for (angles, nodes, geom_objects) in geometries for VectorObj in geom_objects]
+        # VectorPos node (ie. position) of each object
+        pos_rows = dict((id(VectorObj), node_num) for (node_num, VectorObj) in VectorPos.objects)
+        self.posIndex = np.array([pos_rows[id(VectorObj)] for VectorObj in self.objects], dtype=int)
+        self.isFlat = np.array([VectorObj.isFlat == 1 for VectorObj in self.objects])
+        self.nodeNums = np.array([np.shape(VectorObj.nodes)[0] for VectorObj in self.objects], dtype=int) # each object must have nodes
+        self.nodeOffsets = np.hstack((0, np.cumsum(self.nodeNums)[:-1]))
+        # geometry nodes, rotated with object angles and then with viewer angles
+        geometry_nums = np.array([np.shape(nodes)[0] for (angles, nodes, geom_objects) in geometries], dtype=int)
+        geometry_offsets = np.hstack((0, np.cumsum(geometry_nums)[:-1]))
+        self.nodes = np.vstack([nodes for (angles, nodes, geom_objects) in geometries])
+        self.objRotatedNodes = self.nodes[:, 0:3].copy()
+        self.viewRotatedNodes = self.nodes[:, 0:3].copy()
+        # for each object node, the respective geometry node
+        self.nodeIndex = np.hstack([np.arange(start, start + node_num) for (start, node_num, (angles, nodes, geom_objects))
+                                    in zip(geometry_offsets, geometry_nums, geometries) for VectorObj in geom_objects])
+        self.rotatedNodes = self.nodes[self.nodeIndex, 0:3]
+        self.transNodes = np.zeros((np.shape(self.rotatedNodes)[0], 2))
+        self.positions = np.zeros((len(self.objects), 3))  # rotated object positions of the current frame
+        self.active = None                                  # objects rotated in the current frame, by object (bool), or None for all
+        self.activeNodes = None                             # the nodes of the active objects
+        # slices (angles, start node, end node) of geometries sharing an angle set
+        self.angleGroups = []
+        for angles in angles_list:
+            geom_nrs = [i for i in range(len(geometries)) if geometries[i][0] is angles]
+            self.angleGroups.append((angles, geometry_offsets[geom_nrs[0]], geometry_offsets[geom_nrs[-1]] + geometry_nums[geom_nrs[-1]]))
+        # replace object node arrays with views to the arena
+        for (start, node_num, (angles, nodes, geom_objects)) in zip(geometry_offsets, geometry_nums, geometries):
+            geom_nodes = self.nodes[start:start + node_num, :]
+            geom_objRotatedNodes = self.objRotatedNodes[start:start + node_num, :]
+            for VectorObj in geom_objects:
+                VectorObj.nodes = geom_nodes
+                VectorObj.objRotatedNodes = geom_objRotatedNodes
+        for (VectorObj, start, node_num) in zip(self.objects, self.nodeOffsets, self.nodeNums):
+            VectorObj.rotatedNodes = self.rotatedNodes[start:start + node_num, :]
+            VectorObj.transNodes = self.transNodes[start:start + node_num, :]
+            VectorObj.arenaOffset = start
+
+    def rotate(self, viewerAngles, positions, active=None):
+        # rotate objects first with their own angles "in place", and then with viewer angles, adding (rotated) object positions.
+        # the rotations are done once for each geometry; instances only add their position. If active (bool by object) is given,
+        # only the active objects get their rotatedNodes (and transNodes, see transform); the others keep those of an earlier frame.
+        for (angles, start, end) in self.angleGroups:
+            if angles is viewerAngles:
+                # no own angles, just copy nodes then
+                self.objRotatedNodes[start:end, :] = self.nodes[start:end, 0:3]
+            else:
+                np.dot(self.nodes[start:end, 0:3], angles.rotationMatrix, out=self.objRotatedNodes[start:end, :])
+        np.dot(self.objRotatedNodes, viewerAngles.rotationMatrix, out=self.viewRotatedNodes)
+        self.active = active
+        if active is None:
+            self.activeNodes = None
+            np.take(self.viewRotatedNodes, self.nodeIndex, axis=0, out=self.rotatedNodes)
+            self.rotatedNodes += np.repeat(positions, self.nodeNums, axis=0)
+        else:
+            self.activeNodes = concatenated_ranges(self.nodeOffsets[active], self.nodeNums[active])
+            rotated_nodes = self.viewRotatedNodes[self.nodeIndex[self.activeNodes]]
+            rotated_nodes += np.repeat(positions[active], self.nodeNums[active], axis=0)
+            self.rotatedNodes[self.activeNodes] = rotated_nodes
+        self.positions[:, :] = positions
+
+    def transform(self, midScreen, zScale):
+        # apply perspective using Z coordinates and add midScreen to center on screen to get to transNodes.
+        # nodes behind the viewer give meaningless results, but such objects will not be visible.
+        if self.activeNodes is None:
+            project_nodes(self.rotatedNodes, zScale, midScreen, self.transNodes)
+        else:
+            self.transNodes[self.activeNodes] = project_nodes(self.rotatedNodes[self.activeNodes], zScale, midScreen)
+
+    def updateVisible(self, positions, objMinZ, midScreen):
+        # test visibility for all objects, returns an array of 1 (visible) or 0 (not visible) by object.
+        # normal objects must have their position and all nodes beyond minimum Z, and at least some nodes on screen.
+        # flat objects are visible if any of their nodes is beyond minimum Z. Flat objects will be tested for screen separately.
+        # objects not active in the current frame (see rotate) are not visible.
+        min_z = np.minimum.reduceat(self.rotatedNodes[:, 2], self.nodeOffsets)
+        max_z = np.maximum.reduceat(self.rotatedNodes[:, 2], self.nodeOffsets)
+        with np.errstate(invalid='ignore'):
+            min_trans = np.minimum.reduceat(self.transNodes, self.nodeOffsets, axis=0)
+            max_trans = np.maximum.reduceat(self.transNodes, self.nodeOffsets, axis=0)
+            on_screen = (self.nodeNums >= 3) & np.all(max_trans >= 0, axis=1) & np.all(min_trans <= midScreen * 2, axis=1)
+        visible = np.where(self.isFlat, max_z >= objMinZ, (positions[:, 2] >= objMinZ) & (min_z >= objMinZ) & on_screen)
+        if self.active is not None:
+            visible &= self.active
+        return visible.astype(int)
+
+
+class VectorGrid:
+
+    """
+    A static uniform grid over the X, Z (ground) plane, for culling objects not moving against the view frustum.
+    Each object is a bounding sphere (world position and radius) and is stored in the cell of its position. Each cell has the
+    bounding box (AABB) of its objects' spheres and a bounding sphere around that box, so that whole cells are culled first,
+    with one test each, and only the objects in the cells left are tested one by one.
+    numbers are the object numbers returned by cull(), by default 0, 1, 2... in the order given. cellSize is the cell edge
+    length; by default it is chosen for about four objects per cell.
+
+    @author: kalle
+    """
+    def __init__(self, positions, radii, numbers=None, cellSize=None):
+        positions = np.asarray(positions, dtype=np.float64)[:, 0:3]
+        radii = np.asarray(radii, dtype=np.float64)
+        if numbers is None:
+            numbers = np.arange(len(radii))
+        if cellSize is None and len(radii) > 0:
+            extent = np.maximum(np.ptp(positions[:, 0::2], axis=0), 1.0)
+            cellSize = math.sqrt(extent[0] * extent[1] * 4.0 / len(radii))
+        self.cellSize = max(cellSize or 1.0, 1.0)
+        self.numbers = np.asarray(numbers, dtype=int)
+        self.objectCenters = positions
+        self.objectRadii = radii
+        # objects by cell: the objects of cell i are objectOrder[cellStarts[i]:cellStarts[i + 1]]
+        cells = np.floor(positions[:, 0::2] / self.cellSize).astype(np.int64)
+        (self.cellKeys, cell_nrs) = np.unique(cells, axis=0, return_inverse=True)
+        cell_nrs = cell_nrs.ravel()
+        self.objectOrder = np.argsort(cell_nrs, kind='stable')
+        self.cellStarts = np.searchsorted(cell_nrs[self.objectOrder], np.arange(len(self.cellKeys) + 1))
+        if len(radii) > 0:
+            low = np.minimum.reduceat((positions - radii[:, None])[self.objectOrder], self.cellStarts[:-1], axis=0)
+            high = np.maximum.reduceat((positions + radii[:, None])[self.objectOrder], self.cellStarts[:-1], axis=0)
+        else:
+            (low, high) = (np.zeros((0, 3)), np.zeros((0, 3)))
+        self.cellCenters = (low + high) / 2.0
+        self.cellRadii = vector_lengths(high - low) / 2.0
+        # statistics of the latest cull()
+        self.cellsVisible = 0
+        self.objectsTested = 0
+
+    def cull(self, viewPosition, viewMatrix, objectCenters, planes):
+        # return the numbers of the objects whose bounding spheres are at least partly within the frustum planes (see frustum_planes).
+        # cell centers are moved and rotated to view coordinates as positions are (see VectorPosition.rotate), and objectCenters
+        # are the object positions already in view coordinates, indexed by object number.
+        cell_centers = np.dot(self.cellCenters + viewPosition[0:3], viewMatrix)
+        cells = np.nonzero(spheres_in_frustum(cell_centers, self.cellRadii, planes))[0]
+        self.cellsVisible = len(cells)
+        starts = self.cellStarts[cells]
+        candidates = self.objectOrder[concatenated_ranges(starts, self.cellStarts[cells + 1] - starts)]
+        self.objectsTested = len(candidates)
+        numbers = self.numbers[candidates]
+        return numbers[spheres_in_frustum(objectCenters[numbers], self.objectRadii[candidates], planes)]
+
+
+class VectorObjectSurface:
+
+    """
+    Surfaces for a VectorObject.
+    The surface data is stored in the surface table (arrays) of the VectorObject; this is a view to one row of that table.
+
+    @author: kalle
+    """
+    def __init__(self, vobj, surfNr):
+        self.vobj = vobj             # the VectorObject holding the surface table
+        self.surfNr = surfNr         # row in the surface table
+
+    # properties set when defining the object
+    idnum = surfaceTableProperty('surfaceIdNum', int)
+    color = surfaceTableProperty('surfaceColor', tuple)
+    backColor = surfaceTableProperty('surfaceBackColor', tuple)
+    edgeWidth = surfaceTableProperty('surfaceEdgeWidth', int)  # if 0, fills surface. Otherwise a wireframe (edges only), with edgeWidth thickness.
+    showBack = surfaceTableProperty('surfaceShowBack', int)
+    # the following are calculated during program execution
+    zpos = surfaceTableProperty('surfaceZPos')
+    crossProductVector = surfaceTableProperty('surfaceCrossProductVector')
+    crossProductLen = surfaceTableProperty('surfaceCrossProductLen')  # precalculated length of the cross product vector - this is constant
+    lightSourceVector = surfaceTableProperty('surfaceLightSourceVector')
+    angleToViewer = surfaceTableProperty('surfaceAngleToViewer')
+    angleToLightSource = surfaceTableProperty('surfaceAngleToLightSource')
+    visible = surfaceTableProperty('surfaceVisible', int)
+    colorShade = surfaceTableProperty('surfaceColorShade')  # Shade of color; 0 = black, 1 = full color
+    backColorShade = surfaceTableProperty('surfaceBackColorShade')
+
+    @property
+    def nodes(self):
+        return tuple(self.vobj.surfaceNodes[self.surfNr, 0:self.vobj.surfaceNodeNum[self.surfNr]])
+
+    def setZPos(self, zpos):
+        self.zpos = zpos
+
+    def setVisible(self, visible):
+        self.visible = visible
+
+    def setCrossProductVector(self, crossProductVector):
+        self.crossProductVector = crossProductVector
+
+    def setLightSourceVector(self, lightSourceVector):
+        self.lightSourceVector = lightSourceVector
+
+    def setCrossProductLen(self):
+        self.crossProductLen = self.vectorLen(self.crossProductVector)
+
+    def setAngleToViewer(self, vec_Viewer):
+        if self.crossProductLen > 0 and vec_Viewer.any() != 0:
+            self.angleToViewer = np.dot(self.crossProductVector, vec_Viewer)
+
+    def setAngleToLightSource(self):
+        if self.crossProductLen > 0 and self.lightSourceVector.any() != 0:
+            self.angleToLightSource = np.dot(self.crossProductVector, self.lightSourceVector)
+
+    def setColorShade(self, minShade):
+        if self.angleToLightSource <= 0:
+            self.colorShade = minShade
+        else:
+            self.colorShade = minShade + (1.0 - minShade) * math.asin(self.angleToLightSource / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
+
+    def setBackColorShade(self, minShade):
+        if self.angleToLightSource >= 0:
+            self.backColorShade = minShade
+        else:
+            self.backColorShade = minShade + (1.0 - minShade) * -math.asin(self.angleToLightSource / (self.crossProductLen * self.vectorLen(self.lightSourceVector))) / (np.pi / 2)
+
+    def colorRGB(self, fade):
+        if self.angleToViewer > 0:
+            use_color = ([round(fade * self.colorShade * x, 0) for x in self.color]) # apply shading
+        else:
+            use_color = ([round(fade * self.backColorShade * x, 0) for x in self.backColor]) # apply shading to backside color
+        return use_color
+
+    def vectorLen(self, vector):
+        # equivalent to numpy.linalg.norm for a 3D real vector, but much faster. math.sqrt is faster than numpy.sqrt.
+        return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+
+
+class VectorAngles:
+
+    """
+    Angles for rotating vector objects. For efficiency, one set of angles can be used for many objects.
+    Angles are defined for axes X (horizontal), Y (vertical), Z ("distance") in degrees (360).
+
+    @author: kalle
+    """
+    def __init__(self):
+        self.angles = np.array([0.0, 0.0, 0.0])
+        self.angleScale = (2.0 * np.pi) / 360.0 # to scale degrees.
+        self.angName = ""
+        self.rotationMatrix = np.zeros((3,3))
+        self.rotateAngles = np.array([0.0, 0.0, 0.0])
+        self.rotate = np.array([0.0, 0.0, 0.0])
+
+    def setAngles(self, angles):
+        # Set rotation angles to fixed values.
+        self.angles = angles
+
+    def setRotateAngles(self):
+        self.rotateAngles += self.rotate
+        for i in range(3):
+            if self.rotateAngles[i] >= 360: self.rotateAngles[i] -= 360
+            if self.rotateAngles[i] < 0: self.rotateAngles[i] += 360
+
+    def rotationAngles(self):
+        # the angles to rotate with, in radians.
+        return (self.angles + self.rotateAngles) * self.angleScale
+
+    def setRotationMatrix(self):
+        # Set matrix for rotation using angles. VectorViewer.rotate sets the matrices of all angle sets at once instead.
+        self.rotationMatrix = rotation_matrix(self.rotationAngles())
+
+
+class VectorMovement:
+
+    """
+    Movement handling. This class directs position and/or angles rotation.
+
+    @author: kalle
+    """
+    def __init__(self):
+        self.moveName = ""
+        self.angles = VectorAngles()
+        self.rotate = np.array([0.0, 0.0, 0.0])
+        self.rotateAngles = np.array([0.0, 0.0, 0.0])
+        self.timeSeries = np.zeros((7,0))
+        self.breaks = np.zeros((2))                     # movement times where the spline pieces start, and where the last one ends
+        self.coefs = np.zeros((1,3,6))                  # spline piece i is coefs[i,0] * u**2 + coefs[i,1] * u + coefs[i,2], u = time - breaks[i]
+        self.angleForward = np.zeros((3), dtype=bool)   # angles X,Y,Z to turn towards the direction of the movement
+        self.objects = []                               # list of objects controlled by this movement (typically just one)
+        self.speed = 1.0                                # movement time per second
+        self.loopStart = 0.0
+        self.loopEnd = -1.0                             # will be set >= 0 by starting procedure
+        self.loopPos = 0.0                              # position in movement time
+        self.prevTime = pygame.time.get_ticks()
+
+    def setAngles(self, angles):
+        self.angles = angles
+
+    def setRotateAngles(self):
+        self.rotateAngles += self.rotate
+        for i in range(3):
+            if self.rotateAngles[i] >= 360: self.rotateAngles[i] -= 360
+            if self.rotateAngles[i] < 0: self.rotateAngles[i] += 360
+
+    def moveLoop(self, new_time=None):
+        # move forward based on time elapsed since previous call. Uses real time unless a (simulated) time in milliseconds is given.
+        if new_time is None:
+            new_time = pygame.time.get_ticks()
+        self.loopPos += (new_time - self.prevTime) * self.speed / 1000.0
+        self.prevTime = new_time
+        if self.loopPos >= self.loopEnd:
+            if self.loopEnd > self.loopStart:
+                self.loopPos = self.loopStart + (self.loopPos - self.loopEnd) % (self.loopEnd - self.loopStart) # back to loop start, preserving any fractions
+            else:
+                self.loopPos = self.loopStart
+
+    def addTimeSeries(self, time_array):
+        self.timeSeries = time_array
+
+    def addSplines(self, breaks, coefs):
+        self.breaks = breaks
+        self.coefs = coefs
+
+    def addObject(self, VectorObject):
+        self.objects.append(VectorObject)
+
+
+class VectorMovementSplines:
+
+    """
+    The spline pieces of all movements, for evaluating their positions and angles at once.
+    The pieces are stored one movement after the other, with each movement's piece start times shifted to follow those of the
+    previous movement, so that one search finds the pieces for the given times of all movements. The search is made in the
+    piece starts other than the first of each movement: movement m is then found m pieces short of its piece.
+
+    @author: kalle
+    """
+    def __init__(self, movements):
+        self.timeStart = np.array([mov.breaks[0] for mov in movements])
+        self.timeSpan = np.array([mov.breaks[-1] - mov.breaks[0] for mov in movements])
+        self.shift = np.hstack((0.0, np.cumsum(self.timeSpan)[:-1]))
+        self.movementNumbers = np.arange(len(movements))
+        self.pieceStarts = np.hstack([mov.breaks[:-1] - mov.breaks[0] + shift for (mov, shift) in zip(movements, self.shift)] + [np.zeros((0))])
+        self.innerStarts = np.hstack([mov.breaks[1:-1] - mov.breaks[0] + shift for (mov, shift) in zip(movements, self.shift)] + [np.zeros((0))])
+        self.coefs = np.concatenate([mov.coefs for mov in movements] + [np.zeros((0, 3, 6))], axis=0)
+        # u**powers * powerScale gives the terms for the values (u**2, u, 1) and the derivatives (2 * u, 1, 0) of a piece
+        self.powers = np.array([[2.0, 1.0, 0.0], [1.0, 0.0, 0.0]])
+        self.powerScale = np.array([[1.0, 1.0, 1.0], [2.0, 1.0, 0.0]])
+        # movements with angles turned towards the direction of the movement, and their angles (X, Y, Z as 0, 1, 2)
+        self.forwardAxes = [(i, np.nonzero(mov.angleForward)[0].tolist()) for (i, mov) in enumerate(movements) if np.any(mov.angleForward)]
+
+    def evaluate(self, times):
+        # positions X,Y,Z and angles X,Y,Z of each movement at the given movement times, as a (movements, 6) array.
+        shifted = np.minimum(np.maximum(times - self.timeStart, 0.0), self.timeSpan) + self.shift
+        pieces = np.searchsorted(self.innerStarts, shifted, side='right') + self.movementNumbers
+        u = (shifted - self.pieceStarts[pieces])[:, None, None]
+        values = np.matmul(u ** self.powers * self.powerScale, self.coefs[pieces])
+        moves = values[:, 0, :]
+        for (i, axes) in self.forwardAxes:
+            # the direction of the movement is the derivative of the position: angle X from (Y, Z), Y from (X, -Z), Z from (X, Y)
+            (dx, dy, dz) = values[i, 1, 0:3].tolist()
+            forward = (math.atan2(dy, dz), math.atan2(dx, -dz), math.atan2(dx, dy))
+            for axis in axes:
+                moves[i, 3 + axis] += forward[axis] * 180 / math.pi
+        return moves
+
+
+class VectorPosition:
+
+    """
+    A vector object defining the positions of other objects in its nodes (see VectorObject).
+
+    @author: kalle
+    """
+    def __init__(self):
+        self.position = np.array([0.0, 0.0, 0.0, 1.0])
+        self.angles = VectorAngles()
+        self.nodes = np.zeros((0, 4))                   # nodes will have unrotated X,Y,Z coordinates plus a column of ones for position handling
+        self.rotatedNodes = np.zeros((0, 3))            # rotatedNodes will have X,Y,Z coordinates
+        self.objects = []                               # connects each node to a respective VectorObject
+        self.objName = ""
+
+    def addNodes(self, node_array):
+        # add nodes (all at once); add a column of ones for using position in transform
+        self.nodes = np.hstack((node_array, np.ones((len(node_array), 1))))
+        self.rotatedNodes = node_array # initialize with nodes
+
+    def addObjects(self, object_list):
+        self.objects = object_list
+
+    def rotate(self):
+        # apply a rotation defined by a given rotation matrix.
+        matrix = np.vstack((self.angles.rotationMatrix, np.zeros((1, 3))))
+        # apply rotation and position matrix to nodes
+        self.rotatedNodes = np.dot(self.nodes + self.position, matrix)
+
+
+def benchmark_kernels(surface_count, repeats=20):
+    """
+    Time each kernel for surface_count random quadrilaterals against the equivalent loop over the surfaces (as in the
+    earlier, per surface VectorObjectSurface), checking that the results agree.
+    Returns a list of (kernel, kernel seconds, loop seconds, results agree), the times being the best of repeats.
+    """
+    rng = np.random.default_rng(1)
+    nodes = rng.uniform(-1000.0, 1000.0, (surface_count * 4, 3)) - np.array([0.0, 0.0, 3000.0])
+    surface_nodes = np.arange(surface_count * 4).reshape((surface_count, 4))
+    node_mask = np.ones((surface_count, 4))
+    node_num = np.full((surface_count), 4)
+    node_lists = surface_nodes.tolist()
+    use = np.ones((surface_count), dtype=bool)
+    light_position = np.array([500.0, 2000.0, -1000.0])
+    colors = rng.integers(0, 256, (surface_count, 3))
+    back_colors = rng.integers(0, 256, (surface_count, 3))
+    (min_shade, fade, z_scale, mid_screen) = (0.3, 0.8, 1080, np.array([960.0, 540.0]))
+    normals = surface_normals(nodes, surface_nodes)
+    lengths = vector_lengths(normals)
+    viewer_vectors = nodes[surface_nodes[:, 1]]
+    light_vectors = viewer_vectors - light_position
+    viewer_angles = surface_angles(normals, lengths, viewer_vectors, use, np.zeros((surface_count)))
+    light_angles = surface_angles(normals, lengths, light_vectors, use, np.zeros((surface_count)))
+    (shades, back_shades) = surface_shades(light_angles, lengths, light_vectors, min_shade)
+
+    def vector_len(vector):
+        return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+
+    def loop_normals():
+        result = []
+        for node_list in node_lists:
+            vec_A = nodes[node_list[2], 0:3] - nodes[node_list[1], 0:3]
+            vec_B = nodes[node_list[0], 0:3] - nodes[node_list[1], 0:3]
+            result.append([
+                vec_B[1] * vec_A[2] - vec_B[2] * vec_A[1],
+                vec_B[2] * vec_A[0] - vec_B[0] * vec_A[2],
+                vec_B[0] * vec_A[1] - vec_B[1] * vec_A[0]
+                ])
+        return result
+
+    def loop_angles(vectors):
+        result = []
+        for i in range(surface_count):
+            angle = 0.0
+            if lengths[i] > 0 and vectors[i].any() != 0:
+                angle = np.dot(normals[i], vectors[i])
+            result.append(angle)
+        return result
+
+    def loop_shades():
+        result = []
+        for i in range(surface_count):
+            if light_angles[i] <= 0:
+                shade = min_shade
+            else:
+                shade = min_shade + (1.0 - min_shade) * math.asin(light_angles[i] / (lengths[i] * vector_len(light_vectors[i]))) / (np.pi / 2)
+            if light_angles[i] >= 0:
+                back_shade = min_shade
+            else:
+                back_shade = min_shade + (1.0 - min_shade) * -math.asin(light_angles[i] / (lengths[i] * vector_len(light_vectors[i]))) / (np.pi / 2)
+            result.append((shade, back_shade))
+        return np.array(result).T
+
+    def loop_colors():
+        result = []
+        for i in range(surface_count):
+            if viewer_angles[i] > 0:
+                result.append([round(fade * shades[i] * x, 0) for x in colors[i]])
+            else:
+                result.append([round(fade * back_shades[i] * x, 0) for x in back_colors[i]])
+        return result
+
+    cases = [
+        ('surface_z_positions', lambda: surface_z_positions(nodes, surface_nodes, node_mask, node_num),
+         lambda: [sum([nodes[node, 2] for node in node_list]) / len(node_list) for node_list in node_lists]),
+        ('surface_normals', lambda: surface_normals(nodes, surface_nodes), loop_normals),
+        ('vector_lengths', lambda: vector_lengths(normals), lambda: [vector_len(vector) for vector in normals]),
+        ('surface_angles', lambda: surface_angles(normals, lengths, light_vectors, use, np.zeros((surface_count))),
+         lambda: loop_angles(light_vectors)),
+        ('surface_shades', lambda: np.array(surface_shades(light_angles, lengths, light_vectors, min_shade)), loop_shades),
+        ('surface_colors', lambda: surface_colors(viewer_angles, shades, back_shades, colors, back_colors, fade), loop_colors),
+        ('project_nodes', lambda: project_nodes(nodes, z_scale, mid_screen),
+         lambda: [(node[0] * z_scale / -node[2] + mid_screen[0], node[1] * z_scale / -node[2] + mid_screen[1]) for node in nodes])
+        ]
+    results = []
+    for (name, kernel, loop) in cases:
+        times = []
+        for function in (kernel, loop):
+            best = None
+            for i in range(repeats):
+                start = time.perf_counter()
+                result = function()
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            times.append((best, np.array(result, dtype=float)))
+        results.append((name, times[0][0], times[1][0], np.allclose(times[0][1], times[1][1])))
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Vector engine kernel micro-benchmark.')
+    parser.add_argument('--surfaces', type=int, nargs='+', default=[100, 1000, 10000], help='numbers of surfaces to time the kernels with')
+    parser.add_argument('--repeats', type=int, default=20, help='time the best of this many runs')
+    args = parser.parse_args()
+
+    print('%-20s %9s %12s %12s %9s  %s' % ('kernel', 'surfaces', 'kernel ms', 'loop ms', 'speedup', 'results'))
+    for surface_count in args.surfaces:
+        for (name, kernel_seconds, loop_seconds, agree) in benchmark_kernels(surface_count, args.repeats):
+            print('%-20s %9d %12.4f %12.4f %9.1f  %s' % (name, surface_count, kernel_seconds * 1000, loop_seconds * 1000,
+                                                         loop_seconds / max(kernel_seconds, 1e-9), 'agree' if agree else 'DIFFER'))